@@ -14,6 +14,19 @@ import re
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from itertools import combinations
+import os
+import sys
+import math
+from snowflake_query_builder import build_date_range_predicate, build_hash_shard_predicate
+from snowflake_llm_helpers import classify_tool_payload
+from snowflake_llm_phase1_cache import (
+    is_phase1_cache_enabled,
+    is_closed_update_date,
+    hash_phase1_config,
+    build_phase1_cache_key,
+    read_phase1_cache,
+    write_phase1_cache
+)
 
 # ============================================================================
 # PHASE 1 FOUNDATION FUNCTIONS (INCLUDED FOR STANDALONE EXECUTION)
@@ -27,6 +40,8 @@ def infer_tool_message_type(text_value, department_name=None):
     - If it has 'tool_calls' -> return 'tool'
     - If it has 'tool_call_id' -> return 'tool response'
     Returns 'tool' | 'tool response' | None
+    Payloads already parsed by build_tool_call_index (snowflake_llm_helpers) can be passed
+    as dicts, so the TEXT is not parsed a second time.
     """
     try:
         parsed = None
@@ -44,31 +59,8 @@ def infer_tool_message_type(text_value, department_name=None):
                         parsed = json.loads(cleaned_str)
                     except Exception:
                         return None
-        if not isinstance(parsed, dict):
-            return None
-
-        # General detection first (top-level)
-        if parsed.get('tool_calls'):
-            return 'tool'
-        if parsed.get('tool_call_id'):
-            return 'tool response'
-
-        # Also check inside content if it's a dict
-        content_obj = parsed.get('content')
-        if isinstance(content_obj, dict):
-            if content_obj.get('tool_calls'):
-                return 'tool'
-            if content_obj.get('tool_call_id'):
-                return 'tool response'
-
-        # Fallback: detect messages shaped like {"name": <str>, "arguments": { ... }}
-        name_exists = 'name' in parsed and isinstance(parsed.get('name'), str) and parsed.get('name')
-        arguments_obj = parsed.get('arguments')
-        arguments_is_object = isinstance(arguments_obj, dict)
-        if name_exists and arguments_is_object:
-            return 'tool'
-
-        return None
+        # Same detection rules as the tool-call index
+        return classify_tool_payload(parsed)
     except Exception:
         return None
 
@@ -200,6 +192,91 @@ def get_snowflake_departments_config():
     }
 
 
+def get_phase1_column_registry():
+    """
+    Raw chat columns needed by each consumer of the Phase 1 output.
+    'filters' is always loaded; the other keys match the prompt 'conversion_type' values.
+    """
+    return {
+        'filters': ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'MESSAGE_TYPE', 'SENT_BY', 'TEXT',
+                    'TARGET_SKILL_PER_MESSAGE', 'THROUGH_SKILL'],
+        'execution_id': ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'TARGET_SKILL_PER_MESSAGE', 'EXECUTION_ID'],
+        'xml': ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'MESSAGE_TYPE', 'SENT_BY', 'TEXT', 'TARGET_SKILL_PER_MESSAGE',
+                'SKILL', 'AGENT_NAME', 'CUSTOMER_NAME', 'SHADOWED_BY', 'EXECUTION_ID'],
+        'segment': ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'MESSAGE_TYPE', 'SENT_BY', 'TEXT', 'TARGET_SKILL_PER_MESSAGE',
+                    'AGENT_NAME', 'CUSTOMER_NAME', 'EXECUTION_ID'],
+        'json': ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'MESSAGE_TYPE', 'SENT_BY', 'TEXT', 'TARGET_SKILL_PER_MESSAGE',
+                 'AGENT_NAME', 'CUSTOMER_NAME', 'SHADOWED_BY', 'EXECUTION_ID'],
+        'xml3d': ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'MESSAGE_TYPE', 'SENT_BY', 'TEXT', 'TARGET_SKILL_PER_MESSAGE',
+                  'CUSTOMER_NAME', 'EXECUTION_ID']
+    }
+
+
+def get_phase1_projected_columns(conversion_types=None):
+    """
+    Resolve the columns to load for a set of conversion types.
+
+    Args:
+        conversion_types: Iterable of conversion types (xml, segment, json, xml3d); None loads
+                          the columns of every registered consumer
+
+    Returns:
+        Ordered list of column names (filter columns first)
+    """
+    registry = get_phase1_column_registry()
+
+    if conversion_types is None:
+        consumers = list(registry.keys())
+    else:
+        unknown_types = [conversion_type for conversion_type in conversion_types if conversion_type not in registry]
+        if unknown_types:
+            raise ValueError(f"No column registry entry for conversion types: {unknown_types}")
+        consumers = ['filters', 'execution_id'] + list(conversion_types)
+
+    projected_columns = []
+    for consumer in consumers:
+        for column in registry[consumer]:
+            if column not in projected_columns:
+                projected_columns.append(column)
+
+    return projected_columns
+
+
+# Column names per source table, looked up once per process (validate_phase1_columns)
+_phase1_table_columns = {}
+
+
+def get_phase1_table_columns(session: snowpark.Session, table_name, refresh=False):
+    """
+    Upper-cased column names of a table, from SHOW COLUMNS on first use and cached for the process.
+    """
+    cache_key = table_name.upper()
+    if refresh or cache_key not in _phase1_table_columns:
+        _phase1_table_columns[cache_key] = {
+            row['column_name'].upper() for row in session.sql(f"SHOW COLUMNS IN {table_name}").collect()
+        }
+    return _phase1_table_columns[cache_key]
+
+
+def validate_phase1_columns(session: snowpark.Session, table_name, columns):
+    """
+    Fail fast if a table is missing any of the projected columns.
+    The column list is cached per table; it is looked up again before reporting missing columns,
+    so a column added since the first load is picked up.
+
+    Raises:
+        ValueError: listing the missing columns
+    """
+    table_columns = get_phase1_table_columns(session, table_name)
+    missing_columns = [column for column in columns if column.upper() not in table_columns]
+    if missing_columns:
+        table_columns = get_phase1_table_columns(session, table_name, refresh=True)
+        missing_columns = [column for column in columns if column.upper() not in table_columns]
+
+    if missing_columns:
+        raise ValueError(f"Table {table_name} is missing required columns: {missing_columns}")
+
+
 def create_snowflake_date_range(target_date=None):
     """
     Create date range for Snowflake filtering.
@@ -225,7 +302,121 @@ def create_snowflake_date_range(target_date=None):
     }
 
 
-def preprocess_data_snowflake_phase1(df, department_name, target_date=None):
+# Low-cardinality chat columns stored as categoricals after preprocessing
+PHASE1_CATEGORY_COLUMNS = ['MESSAGE_TYPE', 'SENT_BY', 'TARGET_SKILL_PER_MESSAGE', 'THROUGH_SKILL', 'SKILL', 'AGENT_NAME']
+# Columns preprocessing normalizes with astype(str).str.strip()
+PHASE1_STRIPPED_COLUMNS = ['MESSAGE_TYPE', 'SENT_BY', 'TARGET_SKILL_PER_MESSAGE']
+# Free-text columns whose repeated values (bot templates) are interned
+PHASE1_INTERNED_COLUMNS = ['TEXT']
+# Only columns with at most this share of distinct values are converted/interned
+PHASE1_COMPACT_MAX_UNIQUE_RATIO = 0.5
+
+
+def _ensure_empty_category(categorical):
+    """
+    Add '' as a category so downstream .fillna('') keeps working on categorical columns.
+    """
+    if '' in categorical.categories:
+        return categorical
+    return categorical.add_categories([''])
+
+
+def to_stripped_category(series):
+    """
+    Categorical equivalent of series.astype(str).str.strip(): each distinct value is
+    converted and stripped once instead of once per row. Nulls become 'nan'/'None' like astype(str).
+    """
+    codes, uniques = pd.factorize(series)
+    labels = pd.Index(uniques, dtype=object).astype(str)
+    
+    null_mask = codes == -1
+    if null_mask.any():
+        null_codes, null_uniques = pd.factorize(series[null_mask].astype(str))
+        codes = codes.copy()
+        codes[null_mask] = null_codes + len(labels)
+        labels = labels.append(pd.Index(null_uniques, dtype=object))
+    
+    category_codes, categories = pd.factorize(labels.str.strip())
+    categorical = pd.Categorical.from_codes(category_codes[codes], categories=categories)
+    return pd.Series(_ensure_empty_category(categorical), index=series.index, name=series.name)
+
+
+def intern_repeated_values(series):
+    """
+    Make equal values share one Python object (bot templates repeat thousands of times),
+    keeping the object dtype so string handling downstream is unchanged.
+    """
+    codes, uniques = pd.factorize(series)
+    values = np.asarray(uniques, dtype=object)[codes]
+    null_mask = codes == -1
+    if null_mask.any():
+        values[null_mask] = series.to_numpy(dtype=object)[null_mask]
+    return pd.Series(values, index=series.index, name=series.name)
+
+
+def column_memory_bytes(series):
+    """
+    Memory held by a column. Object columns count each distinct Python object once,
+    so interned values are not double-counted (memory_usage(deep=True) counts every row).
+    """
+    if series.dtype == object:
+        values = series.to_numpy()
+        distinct_objects = {id(value): value for value in values}
+        return int(values.nbytes + sum(sys.getsizeof(value) for value in distinct_objects.values()))
+    return int(series.memory_usage(deep=True, index=False))
+
+
+def compact_chat_frame(df, strip_columns=None, report=True):
+    """
+    Compact a raw chat frame: low-cardinality columns become categoricals and repeated
+    TEXT values are interned. Filters and converters work on the result unchanged
+    (categorical columns always include '' so .fillna('') is still valid).
+    
+    Args:
+        df: Raw chat DataFrame
+        strip_columns: Columns to also normalize with str().strip() (defaults to PHASE1_STRIPPED_COLUMNS)
+        report: Print per-column memory before and after
+    
+    Returns:
+        Tuple: (compacted_df, memory_report) where memory_report is
+               {column: {'before_bytes', 'after_bytes'}} for the compacted columns
+    """
+    strip_columns = PHASE1_STRIPPED_COLUMNS if strip_columns is None else strip_columns
+    memory_report = {}
+    df = df.copy(deep=False)
+    
+    for column in PHASE1_CATEGORY_COLUMNS + PHASE1_INTERNED_COLUMNS:
+        if column not in df.columns:
+            continue
+        
+        series = df[column]
+        is_stripped = column in strip_columns
+        if not is_stripped:
+            if len(series) == 0 or series.nunique(dropna=False) > len(series) * PHASE1_COMPACT_MAX_UNIQUE_RATIO:
+                continue
+        
+        before_bytes = column_memory_bytes(series) if report else None
+        if is_stripped:
+            df[column] = to_stripped_category(series)
+        elif column in PHASE1_INTERNED_COLUMNS:
+            df[column] = intern_repeated_values(series)
+        elif not isinstance(series.dtype, pd.CategoricalDtype):
+            df[column] = pd.Series(_ensure_empty_category(pd.Categorical(series)), index=series.index, name=column)
+        
+        if report:
+            memory_report[column] = {'before_bytes': before_bytes, 'after_bytes': column_memory_bytes(df[column])}
+    
+    if report and memory_report:
+        total_before = sum(entry['before_bytes'] for entry in memory_report.values())
+        total_after = sum(entry['after_bytes'] for entry in memory_report.values())
+        print(f"    🗜️  Compacted columns: {total_before / 1024 / 1024:.2f} MB → {total_after / 1024 / 1024:.2f} MB")
+        for column, entry in memory_report.items():
+            print(f"       {column}: {entry['before_bytes'] / 1024:.1f} KB → {entry['after_bytes'] / 1024:.1f} KB")
+    
+    return df, memory_report
+
+
+def preprocess_data_snowflake_phase1(df, department_name, target_date=None, partition_columns=None):
     """
     Phase 1 preprocessing: Basic data cleaning and date filtering for Snowflake.
     Adapted from main_analytics.py preprocessing logic.
@@ -234,6 +425,8 @@ def preprocess_data_snowflake_phase1(df, department_name, target_date=None):
         df: Raw DataFrame from Snowflake table
         department_name: Department name for filtering
         target_date: Target date for analysis
+        partition_columns: Optional leading sort/dedupe keys (e.g. ['DAY_OFFSET']) so several
+                           independently loaded windows can be preprocessed in one pass
     
     Returns:
         Preprocessed DataFrame
@@ -253,18 +446,18 @@ def preprocess_data_snowflake_phase1(df, department_name, target_date=None):
     df['MESSAGE_SENT_TIME'] = pd.to_datetime(df['MESSAGE_SENT_TIME'])
     
     # Sort by conversation ID and message sent time (critical for proper analysis)
-    df = df.sort_values(by=['CONVERSATION_ID', 'MESSAGE_SENT_TIME'])
+    partition_columns = list(partition_columns) if partition_columns else []
+    df = df.sort_values(by=partition_columns + ['CONVERSATION_ID', 'MESSAGE_SENT_TIME'])
     
     # Drop duplicates based on conversation ID, message sent time, and text content
     original_count = len(df)
-    df = df.drop_duplicates(subset=['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'TEXT'], keep='first')
+    df = df.drop_duplicates(subset=partition_columns + ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'TEXT'], keep='first')
     if len(df) < original_count:
         print(f"    🧹 Removed {original_count - len(df)} duplicate rows")
     
-    # Clean and standardize text fields
-    for col in ['MESSAGE_TYPE', 'SENT_BY', 'TARGET_SKILL_PER_MESSAGE']:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.strip()
+    # Clean and standardize text fields (stripped once per distinct value into categoricals)
+    # and intern repeated TEXT values
+    df, _ = compact_chat_frame(df)
     
     print(f"    ✅ Preprocessing complete: {len(df)} rows, {df['CONVERSATION_ID'].nunique()} conversations")
     
@@ -298,95 +491,76 @@ def filter_conversations_snowflake_engagement(df, department_name, departments_c
     bot_skills = dept_config['bot_skills']
     
     # Get all unique conversation IDs
-    all_conversations = set(df['CONVERSATION_ID'].unique())
+    conversation_ids = df['CONVERSATION_ID']
+    all_conversations = set(conversation_ids.unique())
     print(f"    📊 Total conversations: {len(all_conversations)}")
     
+    # Lower-case the message type / sender once and reuse the masks for every filter
+    is_normal_message = df['MESSAGE_TYPE'].str.lower() == 'normal message'
+    sent_by = df['SENT_BY'].str.lower()
+    
+    # N8N_TEST conversations (by TARGET_SKILL_PER_MESSAGE or THROUGH_SKILL) are computed once
+    # and subtracted from every conversation set below
+    n8n_target_skill_conversations = set(conversation_ids[
+        df['TARGET_SKILL_PER_MESSAGE'].str.contains('N8N_TEST', na=False, case=False)
+    ].unique())
+    n8n_through_skill_conversations = set(conversation_ids[
+        df['THROUGH_SKILL'].str.contains('N8N_TEST', na=False, case=False)
+    ].unique())
+    n8n_conversations = n8n_target_skill_conversations | n8n_through_skill_conversations
+    
     # Filter 1: Conversations with consumer normal messages
-    consumer_normal_messages = df[
-        (df['MESSAGE_TYPE'].str.lower() == 'normal message') &
-        (df['SENT_BY'].str.lower() == 'consumer')
-    ]
-    conversations_with_consumer = set(consumer_normal_messages['CONVERSATION_ID'].unique())
+    conversations_with_consumer = set(conversation_ids[is_normal_message & (sent_by == 'consumer')].unique())
     print(f"    👤 Conversations with consumer messages: {len(conversations_with_consumer)}")
     
     # Filter 2: Conversations with agent normal messages from department
-    agent_normal_messages = df[
-        (df['MESSAGE_TYPE'].str.lower() == 'normal message') &
-        (df['SENT_BY'].str.lower() == 'agent') &
-        (df['TARGET_SKILL_PER_MESSAGE'].isin(agent_skills))
-    ]
-    conversations_with_agents = set(agent_normal_messages['CONVERSATION_ID'].unique())
+    conversations_with_agents = set(conversation_ids[
+        is_normal_message & (sent_by == 'agent') & df['TARGET_SKILL_PER_MESSAGE'].isin(agent_skills)
+    ].unique())
     print(f"    👨‍💼 Conversations with department agent messages: {len(conversations_with_agents)}")
     
-    # Remove N8N_TEST from conversations_with_agents using TARGET_SKILL_PER_MESSAGE
-    conversations_with_agents = conversations_with_agents - set(df[df['TARGET_SKILL_PER_MESSAGE'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
+    # Remove N8N_TEST from conversations_with_agents using TARGET_SKILL_PER_MESSAGE and THROUGH_SKILL
+    conversations_with_agents = conversations_with_agents - n8n_conversations
     print(f"    👨‍💼 Conversations with department agents after removing N8N_TEST: {len(conversations_with_agents)}")
-    # Remove N8N_TEST from conversations_with_agents using THROUGH_SKILL
-    conversations_with_agents = conversations_with_agents - set(df[df['THROUGH_SKILL'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
-    print(f"    👨‍💼 Conversations with department agents after removing N8N_TEST through_skill: {len(conversations_with_agents)}")
     
     # Filter 3: Conversations with bot normal messages from department
-    bot_normal_messages = df[
-        (df['MESSAGE_TYPE'].str.lower() == 'normal message') &
-        (df['SENT_BY'].str.lower() == 'bot') &
-        (df['TARGET_SKILL_PER_MESSAGE'].isin(bot_skills))
-    ]
-    conversations_with_bots = set(bot_normal_messages['CONVERSATION_ID'].unique())
+    conversations_with_bots = set(conversation_ids[
+        is_normal_message & (sent_by == 'bot') & df['TARGET_SKILL_PER_MESSAGE'].isin(bot_skills)
+    ].unique())
     print(f"    🤖 Conversations with department bot messages: {len(conversations_with_bots)}")
     
     # Combine agent and bot conversations
     conversations_with_service = conversations_with_agents.union(conversations_with_bots)
     print(f"    🏢 Conversations with department service: {len(conversations_with_service)}")
 
-    # Remove N8N_TEST from conversations_with_service using both TARGET_SKILL_PER_MESSAGE and THROUGH_SKILL
-    conversations_with_service = conversations_with_service - set(df[df['TARGET_SKILL_PER_MESSAGE'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
-    conversations_with_service = conversations_with_service - set(df[df['THROUGH_SKILL'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
+    # Remove N8N_TEST from conversations_with_service and conversations_with_bots
+    conversations_with_service = conversations_with_service - n8n_conversations
     print(f"    🏢 Conversations with department service after removing N8N_TEST: {len(conversations_with_service)}")
-
-    # also do the same for conversations_with_bots
-    conversations_with_bots = conversations_with_bots - set(df[df['TARGET_SKILL_PER_MESSAGE'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
+    conversations_with_bots = conversations_with_bots - n8n_conversations
     print(f"    🏢 Conversations with department bots after removing N8N_TEST: {len(conversations_with_bots)}")
-    # also the same for conversations_with_bots but using 'through_skill' instead of 'TARGET_SKILL_PER_MESSAGE'
-    conversations_with_bots = conversations_with_bots - set(df[df['THROUGH_SKILL'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
-    print(f"    🏢 Conversations with department bots after removing N8N_TEST through_skill: {len(conversations_with_bots)}")
     
-    
-    # Filter 4: Engagement filter - Conversations that meet both criteria
-    engagement_valid_conversations = conversations_with_consumer.intersection(conversations_with_service)
+    # Filter 4: Engagement filter - Conversations that meet both criteria (N8N_TEST already excluded)
+    engagement_valid_conversations = conversations_with_consumer.intersection(conversations_with_service) - n8n_conversations
     print(f"    ✅ Engagement-valid conversations: {len(engagement_valid_conversations)}")
     
-    # Remove N8N_TEST from engagement_valid_conversations using both TARGET_SKILL_PER_MESSAGE and THROUGH_SKILL
-    engagement_valid_conversations = engagement_valid_conversations - set(df[df['TARGET_SKILL_PER_MESSAGE'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
-    engagement_valid_conversations = engagement_valid_conversations - set(df[df['THROUGH_SKILL'].str.contains('N8N_TEST', na=False, case=False)]['CONVERSATION_ID'].unique())
-    print(f"    ✅ Engagement-valid conversations after removing N8N_TEST: {len(engagement_valid_conversations)}")
-    
-    if True:
-        # Filter 5: Bot skill filter - Check THROUGH_SKILL contains any bot_skills
-        conversations_with_bot_skills = set()
-        for conv_id in engagement_valid_conversations:
-            # Get first row of conversation
-            first_row = df[df['CONVERSATION_ID'] == conv_id].iloc[0]
-            through_skill = str(first_row.get('THROUGH_SKILL', ''))
-            
-            # Check if any bot_skill is contained in THROUGH_SKILL
-            matching_bot_skills = [bot_skill for bot_skill in bot_skills if bot_skill in through_skill]
-            
-            # Exclude if the only matching bot skill is GPT_MAIDSAT
-            if len(matching_bot_skills) > 0:
-                conversations_with_bot_skills.add(conv_id)
-                # if len(matching_bot_skills) == 1 and (matching_bot_skills[0] == 'GPT_MAIDSAT' or (matching_bot_skills[0] == 'Filipina_Pending_Country_of_Residence' and department_name != 'AT_Filipina')):
-                #     # Skip this conversation - only GPT_MAIDSAT found
-                #     continue
-                # else:
-                #     # Has other bot skills, include this conversation
-                #     conversations_with_bot_skills.add(conv_id)
-        
-        print(f"    🤖 Conversations with bot skills: {len(conversations_with_bot_skills)}")
-        
-        # Filter the dataframe to only include conversations with bot skills
-        filtered_df = df[df['CONVERSATION_ID'].isin(conversations_with_bot_skills)]
+    # Filter 5: Bot skill filter - Check THROUGH_SKILL of the first row of each conversation contains any bot_skills
+    first_rows = df.drop_duplicates(subset='CONVERSATION_ID', keep='first')
+    first_rows = first_rows[first_rows['CONVERSATION_ID'].isin(engagement_valid_conversations)]
+    if bot_skills and not first_rows.empty:
+        first_through_skill = (
+            first_rows['THROUGH_SKILL'].astype(str) if 'THROUGH_SKILL' in first_rows.columns
+            else pd.Series('', index=first_rows.index)
+        )
+        bot_skill_pattern = '|'.join(re.escape(bot_skill) for bot_skill in bot_skills)
+        has_bot_skill = first_through_skill.str.contains(bot_skill_pattern, regex=True, na=False)
+        conversations_with_bot_skills = set(first_rows.loc[has_bot_skill, 'CONVERSATION_ID'])
     else:
-        filtered_df = df[df['CONVERSATION_ID'].isin(engagement_valid_conversations)]
+        conversations_with_bot_skills = set()
+    
+    print(f"    🤖 Conversations with bot skills: {len(conversations_with_bot_skills)}")
+    
+    # Filter the dataframe to only include conversations with bot skills
+    filtered_df = df[conversation_ids.isin(conversations_with_bot_skills)]
     
     # Calculate filtering statistics
     filtering_stats = {
@@ -432,22 +606,21 @@ def filter_conversations_snowflake_date(df, department_name, target_date=None):
     
     print(f"    📅 Day 1: {day1_date}, Day 2: {day2_date}")
     
-    # Convert message timestamps to dates
-    df['MESSAGE_DATE'] = pd.to_datetime(df['MESSAGE_SENT_TIME']).dt.date
-    
-    # Get conversations before date filtering
-    conversations_before_date_filter = set(df['CONVERSATION_ID'].unique())
+    # MESSAGE_SENT_TIME is already parsed during preprocessing; only parse here if it was not
+    message_times = df['MESSAGE_SENT_TIME']
+    if not pd.api.types.is_datetime64_any_dtype(message_times):
+        message_times = pd.to_datetime(message_times)
     
-    # For each conversation, check if it has at least one message from day 2
-    conversations_with_day2_messages = set()
+    # Local day column (not added to the shared frame), compared against day 2 in one pass
+    day2_start = pd.Timestamp(day2_date)
+    if message_times.dt.tz is not None:
+        day2_start = day2_start.tz_localize(message_times.dt.tz)
+    is_day2_message = message_times.dt.normalize() == day2_start
     
-    for conv_id in conversations_before_date_filter:
-        conv_messages = df[df['CONVERSATION_ID'] == conv_id]
-        message_dates = conv_messages['MESSAGE_DATE'].unique()
-        
-        # Keep conversation if it has at least one message from day 2
-        if day2_date in message_dates:
-            conversations_with_day2_messages.add(conv_id)
+    # Keep conversations with at least one message from day 2
+    conversations_before_date_filter = set(df['CONVERSATION_ID'].unique())
+    conversation_has_day2 = is_day2_message.groupby(df['CONVERSATION_ID'], sort=False).any()
+    conversations_with_day2_messages = set(conversation_has_day2.index[conversation_has_day2.values])
     
     print(f"    📊 Conversations before date filter: {len(conversations_before_date_filter)}")
     print(f"    📊 Conversations with day 2 messages: {len(conversations_with_day2_messages)}")
@@ -455,10 +628,6 @@ def filter_conversations_snowflake_date(df, department_name, target_date=None):
     # Filter the dataframe to only include conversations with day 2 messages
     filtered_df = df[df['CONVERSATION_ID'].isin(conversations_with_day2_messages)]
     
-    # Remove the temporary MESSAGE_DATE column
-    if 'MESSAGE_DATE' in filtered_df.columns:
-        filtered_df = filtered_df.drop('MESSAGE_DATE', axis=1)
-    
     # Calculate filtering statistics
     filtering_stats = {
         'conversations_before_date_filter': len(conversations_before_date_filter),
@@ -526,7 +695,204 @@ def filter_conversations_snowflake_combined(df, department_name, target_date=Non
     return final_filtered_df, combined_stats
 
 
-def process_department_phase1(session: snowpark.Session, department_name, target_date=None, apply_filter_5=True):
+def _sql_string_list(values):
+    """
+    Render a list of Python strings as a comma-separated list of SQL string literals.
+    """
+    return ", ".join("'" + str(value).replace("'", "''") + "'" for value in values)
+
+
+def build_phase1_pushdown_query(department_name, target_date, departments_config=None, columns=None, shard=None,
+                                with_window_counts=False):
+    """
+    Build a Phase 1 load query that applies the engagement, N8N_TEST, bot-skill (filter 5)
+    and day-2 filters inside Snowflake, so only rows of qualifying conversations are returned.
+    Mirrors filter_conversations_snowflake_engagement + filter_conversations_snowflake_date.
+
+    Args:
+        department_name: Department to build the query for
+        target_date: Target date for analysis (YYYY-MM-DD)
+        departments_config: Optional department configuration (defaults to get_snowflake_departments_config())
+        columns: Optional list of columns to return (defaults to all columns)
+        shard: Optional (shard_index, shard_count) tuple restricting the load to one
+               CONVERSATION_ID hash shard (see build_hash_shard_predicate)
+        with_window_counts: Also return PHASE1_WINDOW_ROWS / PHASE1_WINDOW_CONVERSATIONS on every row,
+                            the size of the date window before the filters (see PHASE1_WINDOW_COUNT_COLUMNS)
+
+    Returns:
+        SQL query string
+    """
+    if departments_config is None:
+        departments_config = get_snowflake_departments_config()
+
+    if department_name not in departments_config:
+        raise ValueError(f"Department '{department_name}' not configured")
+
+    dept_config = departments_config[department_name]
+    table_name = dept_config['table_name']
+    agent_skills = dept_config['agent_skills']
+    bot_skills = dept_config['bot_skills']
+
+    # Same dates as the pandas path: rows updated on target_date + 1, day 2 = target_date
+    filter_date = (datetime.strptime(target_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    day2_date = create_snowflake_date_range(target_date)['day2_date'].strftime('%Y-%m-%d')
+
+    agent_skill_predicate = f"TRIM(TARGET_SKILL_PER_MESSAGE) IN ({_sql_string_list(agent_skills)})" if agent_skills else "FALSE"
+    bot_skill_predicate = f"TRIM(TARGET_SKILL_PER_MESSAGE) IN ({_sql_string_list(bot_skills)})" if bot_skills else "FALSE"
+    select_list = ", ".join(f"d.{column}" for column in columns) if columns else "d.*"
+    first_through_skill_predicate = " OR ".join(
+        f"CONTAINS(r.THROUGH_SKILL::STRING, '{str(bot_skill).replace(chr(39), chr(39) * 2)}')" for bot_skill in bot_skills
+    ) if bot_skills else "FALSE"
+    shard_predicate = f" AND {build_hash_shard_predicate('CONVERSATION_ID', *shard)}" if shard else ""
+    window_counts_cte = f"""
+    window_counts AS (
+        SELECT COUNT(*) AS PHASE1_WINDOW_ROWS, COUNT(DISTINCT CONVERSATION_ID) AS PHASE1_WINDOW_CONVERSATIONS
+        FROM day_rows
+    ),""" if with_window_counts else ""
+    window_counts_select = ", w.PHASE1_WINDOW_ROWS, w.PHASE1_WINDOW_CONVERSATIONS" if with_window_counts else ""
+    window_counts_join = "\n    CROSS JOIN window_counts w" if with_window_counts else ""
+
+    return f"""
+    WITH day_rows AS (
+        SELECT *
+        FROM {table_name}
+        WHERE {build_date_range_predicate('UPDATED_AT', filter_date)}{shard_predicate}
+    ),{window_counts_cte}
+    conversation_flags AS (
+        SELECT
+            CONVERSATION_ID,
+            BOOLOR_AGG(LOWER(TRIM(MESSAGE_TYPE)) = 'normal message' AND LOWER(TRIM(SENT_BY)) = 'consumer') AS HAS_CONSUMER,
+            BOOLOR_AGG(LOWER(TRIM(MESSAGE_TYPE)) = 'normal message' AND LOWER(TRIM(SENT_BY)) = 'agent' AND {agent_skill_predicate}) AS HAS_AGENT,
+            BOOLOR_AGG(LOWER(TRIM(MESSAGE_TYPE)) = 'normal message' AND LOWER(TRIM(SENT_BY)) = 'bot' AND {bot_skill_predicate}) AS HAS_BOT,
+            BOOLOR_AGG(TARGET_SKILL_PER_MESSAGE ILIKE '%N8N_TEST%' OR THROUGH_SKILL ILIKE '%N8N_TEST%') AS HAS_N8N_TEST,
+            BOOLOR_AGG(DATE(MESSAGE_SENT_TIME) = DATE('{day2_date}')) AS HAS_DAY2
+        FROM day_rows
+        GROUP BY CONVERSATION_ID
+    ),
+    first_rows AS (
+        SELECT CONVERSATION_ID, THROUGH_SKILL
+        FROM day_rows
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY CONVERSATION_ID ORDER BY MESSAGE_SENT_TIME) = 1
+    ),
+    qualifying_conversations AS (
+        SELECT f.CONVERSATION_ID
+        FROM conversation_flags f
+        JOIN first_rows r ON r.CONVERSATION_ID = f.CONVERSATION_ID
+        WHERE f.HAS_CONSUMER
+          AND (f.HAS_AGENT OR f.HAS_BOT)
+          AND NOT COALESCE(f.HAS_N8N_TEST, FALSE)
+          AND f.HAS_DAY2
+          AND ({first_through_skill_predicate})
+    )
+    SELECT {select_list}{window_counts_select}
+    FROM day_rows d{window_counts_join}
+    WHERE EXISTS (
+        SELECT 1 FROM qualifying_conversations q WHERE q.CONVERSATION_ID = d.CONVERSATION_ID
+    )
+    """
+
+
+# Pre-filter window size returned by build_phase1_pushdown_query(with_window_counts=True)
+PHASE1_WINDOW_COUNT_COLUMNS = ['PHASE1_WINDOW_ROWS', 'PHASE1_WINDOW_CONVERSATIONS']
+
+
+def rebase_pushdown_filtering_stats(filtering_stats, window_conversations, window_rows):
+    """
+    Report pushdown filtering against the unfiltered date window instead of the rows loaded.
+    
+    With the filters pushed down, the pandas filters only see qualifying conversations, so their
+    totals and retention rates describe the loaded rows (~100% retention). The totals are replaced by
+    the window counts from the query; the per-filter counts stay post-pushdown (filter_counts_scope).
+    
+    Args:
+        filtering_stats: filter_conversations_snowflake_combined() statistics of the loaded rows
+        window_conversations: Conversations in the date window before filtering
+        window_rows: Rows in the date window before filtering
+    
+    Returns:
+        Updated statistics dictionary
+    """
+    stats = {
+        **filtering_stats,
+        'filter_counts_scope': 'post_pushdown',
+        'pushdown_loaded_conversations': filtering_stats.get('total_original_conversations', 0),
+        'total_original_conversations': window_conversations,
+        'window_rows': window_rows
+    }
+    stats['engagement_retention_rate'] = (
+        stats.get('engagement_valid_conversations', 0) / window_conversations * 100 if window_conversations else 0
+    )
+    stats['overall_retention_rate'] = (
+        stats.get('final_valid_conversations', 0) / window_conversations * 100 if window_conversations else 0
+    )
+    return stats
+
+
+def get_phase1_cache_config_hash(department_name, dept_config, projected_columns, apply_filter_5, load_mode):
+    """
+    Hash of everything that shapes a Phase 1 output besides the table and date
+    (skills, projected columns, filter flags), used as part of the Phase 1 cache key.
+    """
+    return hash_phase1_config({
+        'department': department_name,
+        'bot_skills': dept_config['bot_skills'],
+        'agent_skills': dept_config['agent_skills'],
+        'columns': projected_columns,
+        'apply_filter_5': apply_filter_5,
+        'load_mode': load_mode
+    })
+
+
+# Rough in-memory footprint of one loaded chat row across the streaming pipeline
+# (pandas object columns + converted content + insert frame); message text is counted separately
+PHASE1_ROW_OVERHEAD_BYTES = 1024
+PHASE1_TEXT_EXPANSION_FACTOR = 4
+
+
+def get_phase1_memory_budget_mb(memory_budget_mb=None):
+    """
+    Memory budget for one department's load (explicit value, else LLM_JUDGE_MEMORY_BUDGET_MB).
+    Returns None when no budget is configured, i.e. the whole day is processed in memory.
+    """
+    if memory_budget_mb is None:
+        memory_budget_mb = os.environ.get('LLM_JUDGE_MEMORY_BUDGET_MB')
+    return float(memory_budget_mb) if memory_budget_mb else None
+
+
+def estimate_phase1_shard_count(session: snowpark.Session, department_name, target_date, memory_budget_mb):
+    """
+    Pick the number of CONVERSATION_ID hash shards needed to keep one shard under the memory budget.
+    Sizes the day with a COUNT/SUM(LENGTH(TEXT)) query instead of loading it.
+    
+    Args:
+        session: Snowflake session
+        department_name: Department to size
+        target_date: Target date for analysis
+        memory_budget_mb: Peak memory allowed for one shard (MB)
+    
+    Returns:
+        Tuple: (shard_count, estimated_bytes)
+    """
+    dept_config = get_snowflake_departments_config()[department_name]
+    filter_date = (datetime.strptime(target_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    
+    size_query = f"""
+    SELECT COUNT(*) AS ROW_COUNT, COALESCE(SUM(LENGTH(TEXT)), 0) AS TEXT_BYTES
+    FROM {dept_config['table_name']}
+    WHERE {build_date_range_predicate('UPDATED_AT', filter_date)}
+    """
+    size_row = session.sql(size_query).collect()[0]
+    estimated_bytes = (int(size_row['ROW_COUNT']) * PHASE1_ROW_OVERHEAD_BYTES
+                       + int(size_row['TEXT_BYTES']) * PHASE1_TEXT_EXPANSION_FACTOR)
+    
+    shard_count = max(1, math.ceil(estimated_bytes / (memory_budget_mb * 1024 * 1024)))
+    print(f"    📐 {department_name}: ~{estimated_bytes / 1024 / 1024:.1f} MB estimated for {size_row['ROW_COUNT']:,} rows → {shard_count} shard(s) at {memory_budget_mb:.0f} MB budget")
+    
+    return shard_count, estimated_bytes
+
+
+def process_department_phase1(session: snowpark.Session, department_name, target_date=None, apply_filter_5=True, use_sql_pushdown=False,
+                              conversion_types=None, use_cache=True, shard=None):
     """
     Process a single department through Phase 1 foundation layer.
     
@@ -540,11 +906,20 @@ def process_department_phase1(session: snowpark.Session, department_name, target
         session: Snowflake session
         department_name: Department to process
         target_date: Target date for analysis
+        use_sql_pushdown: If True, the Phase 1 filters run in Snowflake (build_phase1_pushdown_query)
+                          and only rows of qualifying conversations are loaded; the pandas filters
+                          still run on the result
+        conversion_types: Conversion types the output feeds; only their registered columns are
+                          loaded (see get_phase1_column_registry). None loads every registered column
+        use_cache: Read/write the local Phase 1 cache (snowflake_llm_phase1_cache) for closed days
+        shard: Optional (shard_index, shard_count) tuple; only conversations in that CONVERSATION_ID
+               hash shard are loaded. Every Phase 1 filter is per-conversation, so the shards of a
+               day concatenate to the unsharded result
     
     Returns:
         Tuple: (filtered_df, processing_stats, success)
     """
-    print(f"\n🏢 PROCESSING DEPARTMENT: {department_name}")
+    print(f"\n🏢 PROCESSING DEPARTMENT: {department_name}" + (f" (shard {shard[0] + 1}/{shard[1]})" if shard else ""))
     print("=" * 50)
     
     try:
@@ -565,16 +940,49 @@ def process_department_phase1(session: snowpark.Session, department_name, target
             filter_date = (datetime.strptime(target_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
             print(f"    📅 Filtering for UPDATE_DATE = {filter_date}")
             
-            # Build SQL query with date filtering to minimize data loading
-            sql_query = f"""
-            SELECT * 
-            FROM {table_name} 
-            WHERE DATE(UPDATED_AT) = DATE('{filter_date}')
-            """
+            # Project only the columns the filters and converters read
+            projected_columns = get_phase1_projected_columns(conversion_types)
+            
+            # Closed days never change: serve them from the local cache when possible
+            cache_key = None
+            if use_cache and is_phase1_cache_enabled() and is_closed_update_date(filter_date):
+                load_mode = 'sql_pushdown' if use_sql_pushdown else 'full'
+                if shard:
+                    load_mode = f"{load_mode}:shard_{shard[0]}_of_{shard[1]}"
+                config_hash = get_phase1_cache_config_hash(department_name, dept_config, projected_columns, apply_filter_5, load_mode)
+                cache_key = build_phase1_cache_key(table_name, target_date, config_hash)
+                cached_result = read_phase1_cache(cache_key)
+                if cached_result is not None:
+                    cached_df, cached_stats = cached_result
+                    print(f"    ⚡ Phase 1 cache hit: {len(cached_df)} rows, {cached_df['CONVERSATION_ID'].nunique()} conversations")
+                    return cached_df, {**cached_stats, 'cache_hit': True}, True
+            
+            validate_phase1_columns(session, table_name, projected_columns)
+            print(f"    📋 Projecting {len(projected_columns)} columns")
+            
+            if use_sql_pushdown:
+                # Engagement, N8N_TEST, bot-skill and day-2 filters evaluated in Snowflake
+                sql_query = build_phase1_pushdown_query(department_name, target_date, departments_config, projected_columns, shard,
+                                                        with_window_counts=True)
+                print(f"    🔍 Executing SQL query with Phase 1 filters pushed down...")
+            else:
+                # Build SQL query with date filtering to minimize data loading
+                shard_predicate = f" AND {build_hash_shard_predicate('CONVERSATION_ID', *shard)}" if shard else ""
+                sql_query = f"""
+                SELECT {", ".join(projected_columns)} 
+                FROM {table_name} 
+                WHERE {build_date_range_predicate('UPDATED_AT', filter_date)}{shard_predicate}
+                """
+                print(f"    🔍 Executing SQL query with date filter...")
             
-            print(f"    🔍 Executing SQL query with date filter...")
             raw_data_df = session.sql(sql_query).to_pandas()
-            print(f"    ✅ Loaded {len(raw_data_df)} rows from Snowflake (date-filtered)")
+            window_counts = None
+            if use_sql_pushdown and not raw_data_df.empty and set(PHASE1_WINDOW_COUNT_COLUMNS) <= set(raw_data_df.columns):
+                window_counts = {column: int(raw_data_df[column].iloc[0]) for column in PHASE1_WINDOW_COUNT_COLUMNS}
+            raw_data_df = raw_data_df.drop(columns=PHASE1_WINDOW_COUNT_COLUMNS, errors='ignore')
+            # In-memory size of the loaded frame (not the bytes sent over the wire)
+            client_memory_bytes = int(raw_data_df.memory_usage(deep=True).sum())
+            print(f"    ✅ Loaded {len(raw_data_df)} rows ({client_memory_bytes / 1024 / 1024:.2f} MB in memory) from Snowflake ({'pushdown' if use_sql_pushdown else 'date-filtered'})")
             
         except Exception as table_error:
             table_error_details = traceback.format_exc()
@@ -600,6 +1008,10 @@ def process_department_phase1(session: snowpark.Session, department_name, target
         filtered_df, filtering_stats = filter_conversations_snowflake_combined(
             processed_df, department_name, target_date, apply_filter_5
         )
+        if window_counts is not None:
+            filtering_stats = rebase_pushdown_filtering_stats(
+                filtering_stats, window_counts['PHASE1_WINDOW_CONVERSATIONS'], window_counts['PHASE1_WINDOW_ROWS']
+            )
         
         if filtered_df.empty:
             print(f"    ❌ No conversations passed filtering")
@@ -610,6 +1022,9 @@ def process_department_phase1(session: snowpark.Session, department_name, target
             'department': department_name,
             'table_name': table_name,
             'raw_rows': len(raw_data_df),
+            'client_memory_bytes': client_memory_bytes,
+            'load_mode': 'sql_pushdown' if use_sql_pushdown else 'full',
+            'shard': list(shard) if shard else None,
             'processed_rows': len(processed_df),
             'filtered_rows': len(filtered_df),
             'final_conversations': filtering_stats['final_valid_conversations'],
@@ -623,6 +1038,11 @@ def process_department_phase1(session: snowpark.Session, department_name, target
         print(f"   🎯 Final conversations: {final_stats['final_conversations']:,}")
         print(f"   📈 Overall retention: {final_stats['overall_retention_rate']:.1f}%")
         
+        if cache_key is not None:
+            write_phase1_cache(cache_key, filtered_df, final_stats, {
+                'table_name': table_name, 'date': target_date, 'department': department_name
+            })
+        
         return filtered_df, final_stats, True
         
     except Exception as e:
@@ -633,15 +1053,236 @@ def process_department_phase1(session: snowpark.Session, department_name, target
         return pd.DataFrame(), {'error': error_msg, 'traceback': error_details}, False
 
 
-def process_department_phase1_multi_day(session: snowpark.Session, department_name, target_date=None, apply_filter_5=True):
+def compare_phase1_pushdown_parity(session: snowpark.Session, department_name, target_date):
+    """
+    Run process_department_phase1 in both load modes (full pandas and SQL pushdown) and
+    check that they return the same conversations and rows.
+
+    Args:
+        session: Snowflake session
+        department_name: Department to check
+        target_date: Target date for analysis
+
+    Returns:
+        Dictionary with parity flags, row/conversation counts and in-memory size of the loaded frame per mode
+    """
+    print(f"\n🔬 PHASE 1 PUSHDOWN PARITY CHECK: {department_name} ({target_date})")
+    print("=" * 50)
+
+    full_df, full_stats, full_success = process_department_phase1(
+        session, department_name, target_date, use_sql_pushdown=False, use_cache=False
+    )
+    pushdown_df, pushdown_stats, pushdown_success = process_department_phase1(
+        session, department_name, target_date, use_sql_pushdown=True, use_cache=False
+    )
+
+    full_conversations = set(full_df['CONVERSATION_ID'].unique()) if not full_df.empty else set()
+    pushdown_conversations = set(pushdown_df['CONVERSATION_ID'].unique()) if not pushdown_df.empty else set()
+
+    full_bytes = full_stats.get('client_memory_bytes', 0)
+    pushdown_bytes = pushdown_stats.get('client_memory_bytes', 0)
+
+    parity_results = {
+        'department': department_name,
+        'target_date': target_date,
+        'full_success': full_success,
+        'pushdown_success': pushdown_success,
+        'conversations_match': full_conversations == pushdown_conversations,
+        'rows_match': len(full_df) == len(pushdown_df),
+        'only_in_full': sorted(full_conversations - pushdown_conversations),
+        'only_in_pushdown': sorted(pushdown_conversations - full_conversations),
+        'full_conversations': len(full_conversations),
+        'pushdown_conversations': len(pushdown_conversations),
+        'full_rows': len(full_df),
+        'pushdown_rows': len(pushdown_df),
+        'full_raw_rows': full_stats.get('raw_rows', 0),
+        'pushdown_raw_rows': pushdown_stats.get('raw_rows', 0),
+        'full_client_memory_bytes': full_bytes,
+        'pushdown_client_memory_bytes': pushdown_bytes,
+        'client_memory_saved_pct': (1 - pushdown_bytes / full_bytes) * 100 if full_bytes else 0
+    }
+    parity_results['parity'] = (
+        full_success == pushdown_success and parity_results['conversations_match'] and parity_results['rows_match']
+    )
+
+    print(f"\n{'✅' if parity_results['parity'] else '❌'} Parity: {parity_results['parity']}")
+    print(f"   🎯 Conversations: full={parity_results['full_conversations']:,} | pushdown={parity_results['pushdown_conversations']:,}")
+    print(f"   🔍 Filtered rows: full={parity_results['full_rows']:,} | pushdown={parity_results['pushdown_rows']:,}")
+    print(f"   📥 Rows loaded: full={parity_results['full_raw_rows']:,} | pushdown={parity_results['pushdown_raw_rows']:,}")
+    print(f"   💾 Loaded frame in memory: full={full_bytes / 1024 / 1024:.2f} MB | pushdown={pushdown_bytes / 1024 / 1024:.2f} MB ({parity_results['client_memory_saved_pct']:.1f}% saved)")
+
+    return parity_results
+
+
+def get_shared_source_tables(department_names=None, departments_config=None):
+    """
+    Group departments by source table, keeping only tables read by more than one department
+    (e.g. APPLICANTS_CHATS for AT_Filipina, AT_African and AT_Ethiopian).
+
+    Args:
+        department_names: Departments to consider (defaults to every configured department)
+        departments_config: Optional department configuration (defaults to get_snowflake_departments_config())
+
+    Returns:
+        Dictionary: {table_name: [department_name, ...]}
+    """
+    if departments_config is None:
+        departments_config = get_snowflake_departments_config()
+    if department_names is None:
+        department_names = list(departments_config.keys())
+
+    table_departments = {}
+    for department_name in department_names:
+        if department_name in departments_config:
+            table_departments.setdefault(departments_config[department_name]['table_name'], []).append(department_name)
+
+    return {table_name: names for table_name, names in table_departments.items() if len(names) > 1}
+
+
+def process_shared_table_phase1(session: snowpark.Session, department_names, target_date=None, apply_filter_5=True,
+                                conversion_types=None, use_cache=True):
+    """
+    Process several departments that read the same source table through Phase 1 with a single scan.
+    The table is loaded and preprocessed once; each department's bot/agent skills then select its
+    conversations with the usual combined filtering.
+
+    Args:
+        session: Snowflake session
+        department_names: Departments sharing one table_name
+        target_date: Target date for analysis (defaults to yesterday)
+        apply_filter_5: Whether to apply filter 5 in processing
+        conversion_types: Conversion types the outputs feed (limits the loaded columns)
+        use_cache: Read/write the local Phase 1 cache; entries are shared with process_department_phase1
+
+    Returns:
+        Dictionary: {department_name: (filtered_df, processing_stats, success)}, same tuples as process_department_phase1
+    """
+    print(f"\n🏢🔗 PROCESSING SHARED TABLE: {', '.join(department_names)}")
+    print("=" * 50)
+
+    departments_config = get_snowflake_departments_config()
+    missing_departments = [name for name in department_names if name not in departments_config]
+    if missing_departments:
+        print(f"❌ Departments not configured: {missing_departments}")
+        return {name: (pd.DataFrame(), {'error': 'Department not configured'}, False) for name in department_names}
+
+    table_names = {departments_config[name]['table_name'] for name in department_names}
+    if len(table_names) != 1:
+        error_msg = f"Departments do not share one table: {sorted(table_names)}"
+        print(f"❌ {error_msg}")
+        return {name: (pd.DataFrame(), {'error': error_msg}, False) for name in department_names}
+    table_name = table_names.pop()
+    if target_date is None:
+        target_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    filter_date = (datetime.strptime(target_date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+    projected_columns = get_phase1_projected_columns(conversion_types)
+
+    # Departments already in the local Phase 1 cache skip the scan entirely
+    department_results = {}
+    cache_keys = {}
+    if use_cache and is_phase1_cache_enabled() and is_closed_update_date(filter_date):
+        for department_name in department_names:
+            config_hash = get_phase1_cache_config_hash(
+                department_name, departments_config[department_name], projected_columns, apply_filter_5, 'full'
+            )
+            cache_keys[department_name] = build_phase1_cache_key(table_name, target_date, config_hash)
+            cached_result = read_phase1_cache(cache_keys[department_name])
+            if cached_result is not None:
+                print(f"    ⚡ Phase 1 cache hit: {department_name}")
+                department_results[department_name] = (cached_result[0], {**cached_result[1], 'cache_hit': True}, True)
+
+    remaining_departments = [name for name in department_names if name not in department_results]
+    if not remaining_departments:
+        return department_results
+
+    # Step 1: Load the shared table once
+    print(f"📊 Step 1: Loading data from {table_name} once for {len(remaining_departments)} departments...")
+    try:
+        print(f"    📅 Filtering for UPDATE_DATE = {filter_date}")
+
+        validate_phase1_columns(session, table_name, projected_columns)
+
+        sql_query = f"""
+        SELECT {", ".join(projected_columns)}
+        FROM {table_name}
+        WHERE {build_date_range_predicate('UPDATED_AT', filter_date)}
+        """
+        raw_data_df = session.sql(sql_query).to_pandas()
+        client_memory_bytes = int(raw_data_df.memory_usage(deep=True).sum())
+        print(f"    ✅ Loaded {len(raw_data_df)} rows ({client_memory_bytes / 1024 / 1024:.2f} MB in memory) from Snowflake (shared)")
+    except Exception as table_error:
+        table_error_details = traceback.format_exc()
+        table_error_msg = f"TABLE_LOAD_ERROR: {type(table_error).__name__}: {str(table_error)}"
+        print(f"    ❌ Failed to load table {table_name} with date filter: {table_error_msg}")
+        print(f"    Full traceback: {table_error_details}")
+        return {**department_results, **{name: (pd.DataFrame(), {'error': table_error_msg, 'traceback': table_error_details}, False) for name in remaining_departments}}
+
+    if raw_data_df.empty:
+        print(f"    ⚠️  No data found in {table_name} for date {filter_date}")
+        return {**department_results, **{name: (pd.DataFrame(), {'error': f'No data found for date {filter_date}'}, False) for name in remaining_departments}}
+
+    # Step 2: Preprocess once (preprocessing does not depend on the department)
+    print(f"🧹 Step 2: Preprocessing shared data...")
+    processed_df = preprocess_data_snowflake_phase1(raw_data_df, ', '.join(remaining_departments), target_date)
+
+    if processed_df.empty:
+        print(f"    ❌ No data after preprocessing")
+        return {**department_results, **{name: (pd.DataFrame(), {'error': 'No data after preprocessing'}, False) for name in remaining_departments}}
+
+    # Step 3: Split into per-department frames using each department's skills
+    for department_name in remaining_departments:
+        print(f"\n🔍 Step 3: Applying combined filtering for {department_name}...")
+        try:
+            filtered_df, filtering_stats = filter_conversations_snowflake_combined(
+                processed_df, department_name, target_date, apply_filter_5
+            )
+
+            if filtered_df.empty:
+                print(f"    ❌ No conversations passed filtering")
+                department_results[department_name] = (
+                    pd.DataFrame(), {**filtering_stats, 'error': 'No conversations passed filtering'}, False
+                )
+                continue
+
+            final_stats = {
+                'department': department_name,
+                'table_name': table_name,
+                'raw_rows': len(raw_data_df),
+                'client_memory_bytes': client_memory_bytes,
+                'load_mode': 'shared_table',
+                'shared_departments': list(department_names),
+                'processed_rows': len(processed_df),
+                'filtered_rows': len(filtered_df),
+                'final_conversations': filtering_stats['final_valid_conversations'],
+                **filtering_stats
+            }
+            department_results[department_name] = (filtered_df, final_stats, True)
+            if department_name in cache_keys:
+                write_phase1_cache(cache_keys[department_name], filtered_df, final_stats, {
+                    'table_name': table_name, 'date': target_date, 'department': department_name
+                })
+            print(f"✅ SUCCESS: {department_name} - {final_stats['final_conversations']:,} conversations, {final_stats['filtered_rows']:,} rows")
+
+        except Exception as e:
+            error_details = traceback.format_exc()
+            error_msg = f"EXCEPTION: {type(e).__name__}: {str(e)}"
+            print(f"❌ FAILED: {department_name} - {error_msg}")
+            print(f"   Full traceback: {error_details}")
+            department_results[department_name] = (pd.DataFrame(), {'error': error_msg, 'traceback': error_details}, False)
+
+    return department_results
+
+
+def process_department_phase1_multi_day(session: snowpark.Session, department_name, target_date=None, apply_filter_5=True,
+                                        conversion_types=None, use_cache=True):
     """
     Process a single department through Phase 1 foundation layer for multiple days.
     Fetches data for target date, target date - 1, and target date - 2, then merges them.
     
     Steps:
     1. Calculate the three dates to fetch
-    2. Run process_department_phase1 for each date
-    3. Merge all successful results into a single DataFrame
+    2. Load the three UPDATED_AT windows in one query and preprocess them in one pass
+    3. Apply the engagement + date filters per day and merge the successful days
     4. Return combined data and comprehensive statistics
     
     Args:
@@ -649,6 +1290,8 @@ def process_department_phase1_multi_day(session: snowpark.Session, department_na
         department_name: Department to process
         target_date: Target date for analysis (will also fetch previous 2 days)
         apply_filter_5: Whether to apply filter 5 in processing
+        conversion_types: Conversion types the output feeds (limits the loaded columns)
+        use_cache: Read/write per-day entries of the local Phase 1 cache for closed days
     
     Returns:
         Tuple: (combined_df, combined_stats, success)
@@ -675,23 +1318,116 @@ def process_department_phase1_multi_day(session: snowpark.Session, department_na
         successful_dates = []
         failed_dates = []
         
-        # Process each date
+        departments_config = get_snowflake_departments_config()
+        if department_name not in departments_config:
+            raise ValueError(f"Department '{department_name}' not configured")
+        dept_config = departments_config[department_name]
+        table_name = dept_config['table_name']
+        projected_columns = get_phase1_projected_columns(conversion_types)
+        
+        # Closed days come from the local Phase 1 cache; only the remaining windows are queried
+        day_cache_keys = {}
+        cached_days = {}
+        if use_cache and is_phase1_cache_enabled():
+            config_hash = get_phase1_cache_config_hash(department_name, dept_config, projected_columns, apply_filter_5, 'multi_day')
+            for date in dates_to_process:
+                update_date = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
+                if is_closed_update_date(update_date):
+                    day_cache_keys[date] = build_phase1_cache_key(table_name, date, config_hash, namespace='multi_day')
+                    cached_result = read_phase1_cache(day_cache_keys[date])
+                    if cached_result is not None:
+                        cached_days[date] = cached_result
+        dates_to_load = [date for date in dates_to_process if date not in cached_days]
+        if cached_days:
+            print(f"⚡ Phase 1 cache hit for: {', '.join(cached_days.keys())}")
+        
+        # Step 1: One query over the UPDATED_AT windows still needed (each date D is loaded from UPDATED_AT = D + 1)
+        if dates_to_load:
+            validate_phase1_columns(session, table_name, projected_columns + ['UPDATED_AT'])
+            window_predicates = " OR ".join(
+                f"({build_date_range_predicate('UPDATED_AT', (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))})"
+                for date in dates_to_load
+            )
+            sql_query = f"""
+            SELECT {", ".join(projected_columns)}, UPDATED_AT
+            FROM {table_name}
+            WHERE {window_predicates}
+            """
+            print(f"\n📊 Loading {len(dates_to_load)} days from {table_name} in one query...")
+            raw_data_df = session.sql(sql_query).to_pandas()
+            print(f"    ✅ Loaded {len(raw_data_df)} rows from Snowflake ({len(dates_to_load)}-day window)")
+        else:
+            raw_data_df = pd.DataFrame(columns=projected_columns + ['UPDATED_AT'])
+        
+        # Tag each row with the processing date its UPDATED_AT window belongs to
+        update_days = pd.to_datetime(raw_data_df['UPDATED_AT']).dt.normalize()
+        if update_days.dt.tz is not None:
+            update_days = update_days.dt.tz_localize(None)
+        processing_dates = (update_days - pd.Timedelta(days=1)).dt.strftime('%Y-%m-%d')
+        raw_data_df = raw_data_df.drop(columns=['UPDATED_AT'])
+        raw_data_df['PROCESSING_DATE'] = processing_dates.values
+        day_offsets = raw_data_df['PROCESSING_DATE'].map({date: offset for offset, date in enumerate(dates_to_process)})
+        # Rows with a NaT UPDATED_AT or outside the requested windows belong to no day
+        unmapped_rows = day_offsets.isna()
+        if unmapped_rows.any():
+            print(f"    ⚠️  Dropping {int(unmapped_rows.sum())} rows outside the requested UPDATED_AT windows")
+            raw_data_df = raw_data_df[~unmapped_rows].reset_index(drop=True)
+            day_offsets = day_offsets[~unmapped_rows].reset_index(drop=True)
+        raw_data_df['DAY_OFFSET'] = day_offsets.astype('int64')
+        
+        # Step 2: Preprocess once, keeping each day's rows apart for sorting and de-duplication
+        processed_df = pd.DataFrame()
+        if not raw_data_df.empty:
+            processed_df = preprocess_data_snowflake_phase1(
+                raw_data_df, department_name, target_date, partition_columns=['DAY_OFFSET']
+            )
+        raw_rows_by_day = raw_data_df.groupby('DAY_OFFSET').size() if not raw_data_df.empty else pd.Series(dtype='int64')
+        processed_by_day = dict(tuple(processed_df.groupby('DAY_OFFSET', sort=True))) if not processed_df.empty else {}
+        
+        # Step 3: Per-day engagement + date filtering on the preprocessed slices
         for i, date in enumerate(dates_to_process, 1):
             print(f"\n📊 Processing Day {i}: {date}")
             print("-" * 40)
             
+            filter_date = (datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d')
             try:
-                # Run process_department_phase1 for this date
-                day_df, day_stats, success = process_department_phase1(
-                    session, department_name, date, apply_filter_5
-                )
+                day_raw_rows = int(raw_rows_by_day.get(i - 1, 0))
+                if date in cached_days:
+                    day_df, day_stats = cached_days[date]
+                    day_df['DAY_OFFSET'] = i - 1
+                    day_stats, success = {**day_stats, 'cache_hit': True}, True
+                elif day_raw_rows == 0:
+                    day_stats, success = {'error': f'No data found for date {filter_date}'}, False
+                    day_df = pd.DataFrame()
+                elif (i - 1) not in processed_by_day:
+                    day_stats, success = {'error': 'No data after preprocessing'}, False
+                    day_df = pd.DataFrame()
+                else:
+                    day_processed_df = processed_by_day[i - 1]
+                    day_df, filtering_stats = filter_conversations_snowflake_combined(
+                        day_processed_df, department_name, date, apply_filter_5
+                    )
+                    if day_df.empty:
+                        day_stats, success = {**filtering_stats, 'error': 'No conversations passed filtering'}, False
+                    else:
+                        day_stats = {
+                            'department': department_name,
+                            'table_name': table_name,
+                            'raw_rows': day_raw_rows,
+                            'load_mode': 'multi_day',
+                            'processed_rows': len(day_processed_df),
+                            'filtered_rows': len(day_df),
+                            'final_conversations': filtering_stats['final_valid_conversations'],
+                            **filtering_stats
+                        }
+                        success = True
+                        day_df = day_df.copy()
+                        if date in day_cache_keys:
+                            write_phase1_cache(day_cache_keys[date], day_df.drop(columns=['DAY_OFFSET']), day_stats, {
+                                'table_name': table_name, 'date': date, 'department': department_name
+                            })
                 
                 if success and not day_df.empty:
-                    # Add date identifier to the dataframe
-                    day_df = day_df.copy()
-                    day_df['PROCESSING_DATE'] = date
-                    day_df['DAY_OFFSET'] = i - 1  # 0 for target date, 1 for -1 day, 2 for -2 days
-                    
                     successful_dataframes.append(day_df)
                     all_stats[f'day_{i}_{date}'] = day_stats
                     successful_dates.append(date)
@@ -707,7 +1443,6 @@ def process_department_phase1_multi_day(session: snowpark.Session, department_na
                 print(f"    ❌ {error_msg}")
                 failed_dates.append(date)
                 all_stats[f'day_{i}_{date}'] = {'error': error_msg}
-            continue
         
         # Check if we have any successful results
         if not successful_dataframes:
@@ -0,0 +1,44 @@
+"""
+pytest configuration: the worksheet modules import each other flat (snowflake_llm_config) and
+through the package (LLM_JUDGE.clean_chats_phase2_core_analytics), so both directories go on sys.path
+"""
+
+import os
+import sys
+
+LLM_JUDGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+for path in (LLM_JUDGE_DIR, os.path.dirname(LLM_JUDGE_DIR)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import pytest
+import pandas as pd
+
+
+class RecordingResult:
+    """
+    Empty query result: collect() gives no rows and to_pandas() an empty frame.
+    """
+    def collect(self):
+        return []
+
+    def to_pandas(self):
+        return pd.DataFrame()
+
+
+class RecordingSession:
+    """
+    Session stand-in that records the SQL text of every session.sql() call.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def sql(self, query):
+        self.queries.append(query)
+        return RecordingResult()
+
+
+@pytest.fixture
+def recording_session():
+    return RecordingSession()
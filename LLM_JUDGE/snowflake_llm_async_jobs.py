@@ -0,0 +1,85 @@
+"""
+Async Jobs Module for Snowflake LLM Analysis
+Runs independent Snowflake queries as async jobs (collect_nowait) with a bounded number in flight
+Results are handed back as each job finishes, so the client commits finished LLM batches while
+the warehouse is still running the others
+"""
+
+import os
+import time
+
+DEFAULT_LLM_CONCURRENCY = 1
+DEFAULT_POLL_SECONDS = 1.0
+
+
+def get_llm_concurrency(llm_concurrency=None):
+    """
+    LLM batch queries in flight at once. An explicit llm_concurrency wins, then LLM_JUDGE_LLM_CONCURRENCY;
+    the default of 1 runs prompts one after another, so concurrent jobs are opt-in.
+    """
+    if llm_concurrency is None:
+        llm_concurrency = os.environ.get('LLM_JUDGE_LLM_CONCURRENCY', DEFAULT_LLM_CONCURRENCY)
+    return max(1, int(llm_concurrency))
+
+
+def get_poll_seconds():
+    """
+    Seconds between status checks of running async jobs (LLM_JUDGE_ASYNC_POLL_SECONDS overrides the default).
+    """
+    return max(0.0, float(os.environ.get('LLM_JUDGE_ASYNC_POLL_SECONDS', DEFAULT_POLL_SECONDS)))
+
+
+def iter_async_query_results(session, jobs, max_concurrency=None, poll_seconds=None):
+    """
+    Submit queries as Snowpark async jobs, at most max_concurrency at a time, and yield each
+    job as soon as its query finishes (completion order, not submission order).
+
+    Jobs are submitted in list order; a new one is submitted whenever a running one is handed back.
+    Each job dictionary gets 'submitted_at' (time.time() of submission). If the caller stops
+    iterating early, queries still running are cancelled.
+
+    Args:
+        session: Snowflake session
+        jobs: List of dictionaries with a 'query' (SQL text) plus any caller fields
+        max_concurrency: Queries in flight at once (default get_llm_concurrency())
+        poll_seconds: Seconds between status checks (default get_poll_seconds())
+
+    Yields:
+        Tuple (job, rows, error): rows of the finished query, or error (the exception raised
+        submitting or fetching it) with rows None
+    """
+    max_concurrency = max(1, max_concurrency if max_concurrency is not None else get_llm_concurrency())
+    poll_seconds = poll_seconds if poll_seconds is not None else get_poll_seconds()
+    queued = list(reversed(jobs))
+    running = []
+
+    try:
+        while queued or running:
+            while queued and len(running) < max_concurrency:
+                job = queued.pop()
+                job['submitted_at'] = time.time()
+                try:
+                    running.append((job, session.sql(job['query']).collect_nowait()))
+                except Exception as e:
+                    yield job, None, e
+
+            finished = [entry for entry in running if entry[1].is_done()]
+            if not finished:
+                time.sleep(poll_seconds)
+                continue
+
+            for entry in finished:
+                running.remove(entry)
+                job, async_job = entry
+                try:
+                    rows = async_job.result()
+                except Exception as e:
+                    yield job, None, e
+                    continue
+                yield job, rows, None
+    finally:
+        for job, async_job in running:
+            try:
+                async_job.cancel()
+            except Exception:
+                pass
@@ -0,0 +1,144 @@
+"""
+LLM Batch Planner Module for Snowflake LLM Analysis
+Splits the PENDING rows of a prompt's output table into LLM batches of similar estimated size
+Rows are sized by content length in Snowflake (no content is downloaded) and bin-packed longest
+first, so every batch gives the warehouse a similar amount of LLM work; each batch is committed
+on its own by run_batch_llm_update, so a failure late in a run only repeats that batch
+"""
+
+import os
+import math
+import uuid
+from snowflake_llm_helpers import plan_conversion_shards
+
+DEFAULT_LLM_BATCH_TOKENS = 1000000
+DEFAULT_LLM_BATCH_MAX_ROWS = 1000
+
+# Length-only token estimate: chat transcripts in the conversion formats average about
+# 3 characters per token (see snowflake_llm_token_estimator for per-text counts)
+CHARS_PER_TOKEN = 3
+
+
+def get_llm_batch_tokens():
+    """
+    Estimated input tokens per LLM batch (LLM_JUDGE_LLM_BATCH_TOKENS overrides the default).
+    """
+    return max(1, int(os.environ.get('LLM_JUDGE_LLM_BATCH_TOKENS', DEFAULT_LLM_BATCH_TOKENS)))
+
+
+def get_llm_batch_max_rows():
+    """
+    Rows per LLM batch the plan aims to stay under (LLM_JUDGE_LLM_BATCH_MAX_ROWS overrides the default).
+    """
+    return max(1, int(os.environ.get('LLM_JUDGE_LLM_BATCH_MAX_ROWS', DEFAULT_LLM_BATCH_MAX_ROWS)))
+
+
+def estimate_tokens_from_length(characters):
+    """
+    Input tokens of a text of the given length (CHARS_PER_TOKEN characters per token).
+    """
+    return math.ceil(max(0, characters or 0) / CHARS_PER_TOKEN)
+
+
+def fetch_pending_llm_sizes(session, table_name, pending_filter, system_prompt_length=0):
+    """
+    Estimated LLM input of each pending conversation, computed in Snowflake from content lengths.
+
+    Rows are grouped by CONVERSATION_ID (segment rows of one conversation share it), so all rows
+    of a conversation land in the same batch.
+
+    Args:
+        session: Snowflake session
+        table_name: Prompt output table
+        pending_filter: WHERE condition selecting the pending rows of the run
+        system_prompt_length: Characters of the system prompt sent with every row
+
+    Returns:
+        Dictionary: {conversation_id: {'tokens': estimated input tokens, 'rows': row count}}
+    """
+    size_query = f"""
+    SELECT
+        CONVERSATION_ID,
+        SUM(COALESCE(LENGTH(CONVERSATION_CONTENT), 0)) AS CONTENT_LENGTH,
+        COUNT(*) AS ROW_COUNT
+    FROM {table_name}
+    WHERE {pending_filter}
+    GROUP BY CONVERSATION_ID
+    """
+    sizes = {}
+    for row in session.sql(size_query).collect():
+        row_count = int(row['ROW_COUNT'])
+        characters = int(row['CONTENT_LENGTH'] or 0) + row_count * system_prompt_length
+        sizes[row['CONVERSATION_ID']] = {'tokens': estimate_tokens_from_length(characters), 'rows': row_count}
+    return sizes
+
+
+def plan_llm_batches(conversation_sizes, batch_tokens=None, batch_max_rows=None):
+    """
+    Bin-pack pending conversations into LLM batches.
+
+    The batch count is the smallest that keeps the average batch within both the token budget
+    and the row limit; conversations are then assigned longest first to the lightest batch
+    (plan_conversion_shards), so batches carry similar token totals. A conversation larger than
+    the budget gets a batch of its own.
+
+    Args:
+        conversation_sizes: fetch_pending_llm_sizes() result
+        batch_tokens: Estimated tokens per batch (default get_llm_batch_tokens())
+        batch_max_rows: Rows per batch (default get_llm_batch_max_rows())
+
+    Returns:
+        List of batches ({'batch_index', 'conversation_ids', 'estimated_tokens', 'rows'}),
+        heaviest batch first; empty when nothing is pending
+    """
+    if not conversation_sizes:
+        return []
+
+    batch_tokens = batch_tokens if batch_tokens is not None else get_llm_batch_tokens()
+    batch_max_rows = batch_max_rows if batch_max_rows is not None else get_llm_batch_max_rows()
+
+    total_tokens = sum(size['tokens'] for size in conversation_sizes.values())
+    total_rows = sum(size['rows'] for size in conversation_sizes.values())
+    batch_count = max(1, math.ceil(total_tokens / batch_tokens), math.ceil(total_rows / batch_max_rows))
+
+    # Every row costs at least one token, so empty conversations are still spread across batches
+    shards = plan_conversion_shards(
+        {conv_id: max(size['tokens'], size['rows']) for conv_id, size in conversation_sizes.items()},
+        batch_count
+    )
+    return [
+        {
+            'batch_index': batch_index,
+            'conversation_ids': shard['conversation_ids'],
+            'estimated_tokens': sum(conversation_sizes[conv_id]['tokens'] for conv_id in shard['conversation_ids']),
+            'rows': sum(conversation_sizes[conv_id]['rows'] for conv_id in shard['conversation_ids'])
+        }
+        for batch_index, shard in enumerate(shards)
+    ]
+
+
+def get_temp_table_name(prefix):
+    """
+    Table name for one job's intermediate results: prefix plus a random suffix, so batches started
+    in the same second (e.g. concurrent prompts) never share a table.
+    """
+    return f"{prefix}_{uuid.uuid4().hex[:16].upper()}"
+
+
+def write_llm_batch_plan(session, plan_table, batches):
+    """
+    Save the batch assignment of each conversation (CONVERSATION_ID, BATCH_INDEX) to a table
+    that build_batch_filter() reads.
+    """
+    plan_rows = [
+        {'CONVERSATION_ID': conv_id, 'BATCH_INDEX': batch['batch_index']}
+        for batch in batches for conv_id in batch['conversation_ids']
+    ]
+    session.create_dataframe(plan_rows).write.mode("overwrite").save_as_table(plan_table)
+
+
+def build_batch_filter(plan_table, batch_index):
+    """
+    WHERE condition (to AND with the pending filter) restricting a query to one planned batch.
+    """
+    return f"CONVERSATION_ID IN (SELECT CONVERSATION_ID FROM {plan_table} WHERE BATCH_INDEX = {int(batch_index)})"
@@ -0,0 +1,331 @@
+"""
+Benchmark Module for Snowflake LLM Analysis
+Synthetic-data timing helpers for the Phase 1 filters and conversion steps
+Runs entirely in pandas - no Snowflake tables are read or written
+"""
+
+import time
+import json
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from LLM_JUDGE.clean_chats_phase2_core_analytics import (
+    get_snowflake_departments_config,
+    preprocess_data_snowflake_phase1,
+    filter_conversations_snowflake_engagement,
+    compact_chat_frame
+)
+from snowflake_llm_helpers import build_tool_call_index, resolve_tool_call, get_tool_name_and_response
+from snowflake_llm_config import get_department_config
+from snowflake_llm_conversation_model import build_conversation_model
+from snowflake_llm_xml_converter import render_xml_conversation_contents, convert_conversations_to_xml_dataframe
+from snowflake_llm_json_converter import render_json_conversations, convert_conversations_to_json_dataframe
+from snowflake_llm_xml3d import convert_conversations_to_xml3d
+
+
+def build_synthetic_chat_frame(total_rows, department_name='MV_Resolvers', target_date='2025-08-04',
+                               messages_per_conversation=20, seed=42):
+    """
+    Build a synthetic raw chat DataFrame shaped like the LLM_EVAL.RAW_DATA chat tables.
+
+    Args:
+        total_rows: Number of message rows to generate
+        department_name: Department whose bot/agent skills are used for the skill columns
+        target_date: Target date; messages are spread over target_date - 1 and target_date
+        messages_per_conversation: Average number of messages per conversation
+        seed: Random seed for reproducible frames
+
+    Returns:
+        DataFrame with Snowflake column names
+    """
+    rng = np.random.default_rng(seed)
+    dept_config = get_snowflake_departments_config()[department_name]
+    bot_skills = dept_config['bot_skills']
+    agent_skills = dept_config['agent_skills']
+
+    n_conversations = max(1, total_rows // messages_per_conversation)
+    conversation_index = np.sort(rng.integers(0, n_conversations, total_rows))
+    conversation_ids = np.array([f"CONV_{i:08d}" for i in range(n_conversations)])
+
+    day1_start = datetime.strptime(target_date, '%Y-%m-%d') - timedelta(days=1)
+    seconds = rng.integers(0, 2 * 24 * 3600, total_rows)
+
+    skill_pool = np.array(bot_skills + agent_skills + ['OTHER_SKILL', 'N8N_TEST'], dtype=object)
+    through_pool = np.array([';'.join(bot_skills), 'OTHER_SKILL', 'N8N_TEST'], dtype=object)
+
+    return pd.DataFrame({
+        'CONVERSATION_ID': conversation_ids[conversation_index],
+        'MESSAGE_SENT_TIME': pd.Timestamp(day1_start) + pd.to_timedelta(seconds, unit='s'),
+        'SENT_BY': rng.choice(np.array(['Consumer', 'Bot', 'Agent', 'System'], dtype=object), total_rows, p=[0.45, 0.35, 0.15, 0.05]),
+        'MESSAGE_TYPE': rng.choice(np.array(['Normal Message', 'Private Message', 'Transfer', 'Tool'], dtype=object), total_rows, p=[0.85, 0.05, 0.05, 0.05]),
+        'TEXT': rng.choice(np.array(['Hello', 'How can I help you?', 'Thank you', 'Please share your passport'], dtype=object), total_rows),
+        'TARGET_SKILL_PER_MESSAGE': rng.choice(skill_pool, total_rows, p=[0.6 / len(bot_skills)] * len(bot_skills) + [0.3 / len(agent_skills)] * len(agent_skills) + [0.08, 0.02]),
+        'THROUGH_SKILL': through_pool[rng.choice(3, n_conversations, p=[0.8, 0.15, 0.05])][conversation_index],
+        'SKILL': rng.choice(skill_pool, total_rows),
+        'AGENT_NAME': rng.choice(np.array(['Agent A', 'Agent B', None], dtype=object), total_rows),
+        'CUSTOMER_NAME': np.array([f"Customer {i % 5000}" for i in range(n_conversations)], dtype=object)[conversation_index],
+        'SHADOWED_BY': None,
+        'EXECUTION_ID': None,
+    })
+
+
+def benchmark_engagement_filter(row_counts=(10000, 100000, 1000000), department_name='MV_Resolvers', target_date='2025-08-04'):
+    """
+    Time filter_conversations_snowflake_engagement over growing synthetic frames.
+    Linear scaling shows up as a roughly constant microseconds-per-row figure.
+
+    Returns:
+        List of dictionaries: rows, conversations, seconds, us_per_row
+    """
+    print(f"⏱️  Benchmarking engagement filter for {department_name}...")
+    departments_config = get_snowflake_departments_config()
+    results = []
+
+    for total_rows in row_counts:
+        raw_df = build_synthetic_chat_frame(total_rows, department_name, target_date)
+        processed_df = preprocess_data_snowflake_phase1(raw_df, department_name, target_date)
+
+        start_time = time.perf_counter()
+        filter_conversations_snowflake_engagement(processed_df, department_name, departments_config)
+        elapsed = time.perf_counter() - start_time
+
+        results.append({
+            'rows': len(processed_df),
+            'conversations': processed_df['CONVERSATION_ID'].nunique(),
+            'seconds': elapsed,
+            'us_per_row': elapsed / len(processed_df) * 1e6 if len(processed_df) else 0
+        })
+
+    print("\n📊 Engagement filter scaling:")
+    for result in results:
+        print(f"   {result['rows']:>10,} rows | {result['conversations']:>8,} conversations | {result['seconds']:.3f}s | {result['us_per_row']:.2f} µs/row")
+
+    return results
+
+
+def benchmark_frame_compaction(total_rows=1000000, department_name='MV_Resolvers', target_date='2025-08-04'):
+    """
+    Measure per-column memory of a synthetic raw frame before and after compact_chat_frame
+    (categorical low-cardinality columns, interned TEXT).
+
+    Returns:
+        Dictionary: {column: {'before_bytes', 'after_bytes'}} plus 'seconds'
+    """
+    print(f"⏱️  Benchmarking frame compaction for {department_name} ({total_rows:,} rows)...")
+    raw_df = build_synthetic_chat_frame(total_rows, department_name, target_date)
+
+    start_time = time.perf_counter()
+    _, memory_report = compact_chat_frame(raw_df)
+    elapsed = time.perf_counter() - start_time
+
+    print(f"   ⏱️  Compaction + reporting took {elapsed:.3f}s")
+    return {**memory_report, 'seconds': elapsed}
+
+
+def build_tool_heavy_chat_frame(total_rows, department_name='MV_Resolvers', target_date='2025-08-04',
+                                messages_per_conversation=60, tool_ratio=0.3, seed=42):
+    """
+    Synthetic chat frame where about tool_ratio of the messages are tool calls, each answered
+    by a 'tool response' a few messages later (MV_Resolvers / Doctors style tool usage).
+
+    Returns:
+        DataFrame with Snowflake column names, rows grouped by conversation
+    """
+    rng = np.random.default_rng(seed)
+    chat_df = build_synthetic_chat_frame(total_rows, department_name, target_date,
+                                         messages_per_conversation=messages_per_conversation, seed=seed)
+    chat_df = chat_df.sort_values(['CONVERSATION_ID', 'MESSAGE_SENT_TIME'], kind='stable').reset_index(drop=True)
+
+    message_types = chat_df['MESSAGE_TYPE'].to_numpy(dtype=object).copy()
+    texts = chat_df['TEXT'].to_numpy(dtype=object).copy()
+    conversation_ids = chat_df['CONVERSATION_ID'].to_numpy(dtype=object)
+    is_tool_call = rng.random(len(chat_df)) < tool_ratio
+
+    for position in np.flatnonzero(is_tool_call):
+        response_position = position + int(rng.integers(1, 4))
+        if response_position >= len(chat_df) or conversation_ids[response_position] != conversation_ids[position]:
+            continue
+        if message_types[position] == 'tool response':
+            continue
+        call_id = f"call_{position}"
+        message_types[position] = 'tool'
+        texts[position] = json.dumps({'content': '', 'tool_calls': [{'id': call_id, 'name': f"tool_{position % 7}", 'arguments': {'contract_id': int(position)}}]})
+        message_types[response_position] = 'tool response'
+        texts[response_position] = json.dumps({'tool_call_id': call_id, 'content': {'status': 'ok', 'rows': int(position % 11)}})
+
+    chat_df['MESSAGE_TYPE'] = message_types
+    chat_df['TEXT'] = texts
+    return chat_df
+
+
+def benchmark_tool_call_index(department_names=('MV_Resolvers', 'Doctors'), total_rows=60000,
+                              messages_per_conversation=(20, 60, 200), target_date='2025-08-04'):
+    """
+    Compare per-tool-message lookups (the conversation is rescanned for every tool call,
+    O(tool calls x messages)) with one build_tool_call_index pass per conversation.
+    Both paths must resolve identical (tool_name, tool_response) pairs.
+
+    Returns:
+        List of dictionaries: department, messages_per_conversation, tool_calls, scan_seconds, index_seconds, speedup
+    """
+    print(f"⏱️  Benchmarking tool-call index for {', '.join(department_names)}...")
+    results = []
+
+    for department_name in department_names:
+        for conversation_length in messages_per_conversation:
+            chat_df = build_tool_heavy_chat_frame(total_rows, department_name, target_date,
+                                                  messages_per_conversation=conversation_length)
+            conversations = [conv_df for _, conv_df in chat_df.groupby('CONVERSATION_ID', sort=False)]
+            tool_calls = int((chat_df['MESSAGE_TYPE'] == 'tool').sum())
+
+            start_time = time.perf_counter()
+            scan_resolved = []
+            for conv_df in conversations:
+                for text_value in conv_df.loc[conv_df['MESSAGE_TYPE'] == 'tool', 'TEXT']:
+                    scan_resolved.append(get_tool_name_and_response(conv_df, text_value))
+            scan_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            index_resolved = []
+            for conv_df in conversations:
+                message_types = conv_df['MESSAGE_TYPE'].to_numpy(dtype=object)
+                tool_call_index = build_tool_call_index(conv_df['TEXT'].to_numpy(dtype=object), message_types)
+                for position in np.flatnonzero(message_types == 'tool'):
+                    index_resolved.append(resolve_tool_call(tool_call_index['payloads'][position], tool_call_index))
+            index_seconds = time.perf_counter() - start_time
+
+            if scan_resolved != index_resolved:
+                print(f"   ❌ Tool-call index disagrees with the per-message lookup for {department_name}")
+
+            results.append({
+                'department': department_name,
+                'messages_per_conversation': conversation_length,
+                'tool_calls': tool_calls,
+                'scan_seconds': scan_seconds,
+                'index_seconds': index_seconds,
+                'speedup': scan_seconds / index_seconds if index_seconds else 0
+            })
+
+    print("\n📊 Tool-call resolution:")
+    for result in results:
+        print(f"   {result['department']:<14} | {result['messages_per_conversation']:>4} msgs/conv | {result['tool_calls']:>7,} tool calls | "
+              f"scan {result['scan_seconds']:.3f}s | index {result['index_seconds']:.3f}s | {result['speedup']:.1f}x")
+
+    return results
+
+
+def benchmark_conversation_rendering(message_counts=(100000, 1000000), department_name='MV_Resolvers',
+                                     target_date='2025-08-04', messages_per_conversation=20):
+    """
+    Time XML and JSON rendering of a tool-heavy frame at each message count: the model build,
+    the vectorized renderers on their own and the full *_dataframe converters (model + checks + metadata).
+
+    Returns:
+        List of dictionaries: messages, conversations, model_seconds, xml_render_seconds, json_render_seconds,
+        xml_dataframe_seconds, json_dataframe_seconds and us_per_message for the renderers
+    """
+    print(f"⏱️  Benchmarking XML / JSON rendering for {department_name}...")
+    dept_config = get_department_config(department_name)
+    results = []
+
+    for total_rows in message_counts:
+        chat_df = build_tool_heavy_chat_frame(total_rows, department_name, target_date,
+                                              messages_per_conversation=messages_per_conversation, tool_ratio=0.1)
+
+        start_time = time.perf_counter()
+        conversation_model = build_conversation_model(chat_df, department_name)
+        model_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        render_xml_conversation_contents(conversation_model, dept_config['bot_skill_set'])
+        xml_render_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        render_json_conversations(conversation_model, dept_config['target_skill_set'])
+        json_render_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        convert_conversations_to_xml_dataframe(chat_df, department_name, conversation_model=conversation_model)
+        xml_dataframe_seconds = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        convert_conversations_to_json_dataframe(chat_df, department_name, conversation_model=conversation_model)
+        json_dataframe_seconds = time.perf_counter() - start_time
+
+        results.append({
+            'messages': total_rows,
+            'conversations': len(conversation_model['conversations']),
+            'model_seconds': model_seconds,
+            'xml_render_seconds': xml_render_seconds,
+            'json_render_seconds': json_render_seconds,
+            'xml_dataframe_seconds': xml_dataframe_seconds,
+            'json_dataframe_seconds': json_dataframe_seconds,
+            'xml_us_per_message': xml_render_seconds / total_rows * 1e6,
+            'json_us_per_message': json_render_seconds / total_rows * 1e6
+        })
+
+    print("\n📊 Conversation rendering:")
+    for result in results:
+        print(f"   {result['messages']:>10,} msgs | {result['conversations']:>8,} convs | model {result['model_seconds']:.2f}s | "
+              f"XML {result['xml_render_seconds']:.2f}s ({result['xml_us_per_message']:.1f} µs/msg) | "
+              f"JSON {result['json_render_seconds']:.2f}s ({result['json_us_per_message']:.1f} µs/msg) | "
+              f"XML df {result['xml_dataframe_seconds']:.2f}s | JSON df {result['json_dataframe_seconds']:.2f}s")
+
+    return results
+
+
+def build_three_day_chat_frame(total_rows, department_name='MV_Resolvers', target_date='2025-08-04',
+                               messages_per_conversation=20, chats_per_customer=3, seed=42):
+    """
+    Synthetic XML3D input: a tool-heavy chat frame spread over the three days ending on target_date,
+    where each customer has about chats_per_customer conversations on different days.
+
+    Returns:
+        DataFrame with Snowflake column names, rows in random order
+    """
+    rng = np.random.default_rng(seed)
+    chat_df = build_tool_heavy_chat_frame(total_rows, department_name, target_date,
+                                          messages_per_conversation=messages_per_conversation, tool_ratio=0.1, seed=seed)
+
+    conversation_codes = pd.factorize(chat_df['CONVERSATION_ID'])[0]
+    day_offsets = rng.integers(0, 3, conversation_codes.max() + 1)[conversation_codes]
+    chat_df['MESSAGE_SENT_TIME'] = chat_df['MESSAGE_SENT_TIME'] - pd.to_timedelta(day_offsets, unit='D') + pd.Timedelta(days=1)
+    chat_df['CUSTOMER_NAME'] = np.array([f"Customer {code // chats_per_customer}" for code in conversation_codes], dtype=object)
+    chat_df['EXECUTION_ID'] = np.array([f"EXEC_{code}" for code in conversation_codes], dtype=object)
+
+    return chat_df.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def benchmark_xml3d_scaling(message_counts=(30000, 100000, 300000, 1000000), department_name='MV_Resolvers',
+                            target_date='2025-08-04'):
+    """
+    Time convert_conversations_to_xml3d (model build included) on three-day frames of growing size.
+    Per-message cost should stay flat as the window grows.
+
+    Returns:
+        List of dictionaries: messages, conversations, customers, seconds, us_per_message
+    """
+    print(f"⏱️  Benchmarking XML3D scaling for {department_name}...")
+    results = []
+
+    for total_rows in message_counts:
+        chat_df = build_three_day_chat_frame(total_rows, department_name, target_date)
+
+        start_time = time.perf_counter()
+        xml3d_df = convert_conversations_to_xml3d(chat_df, department_name)
+        seconds = time.perf_counter() - start_time
+
+        results.append({
+            'messages': total_rows,
+            'conversations': chat_df['CONVERSATION_ID'].nunique(),
+            'customers': len(xml3d_df),
+            'seconds': seconds,
+            'us_per_message': seconds / total_rows * 1e6
+        })
+
+    print("\n📊 XML3D scaling:")
+    for result in results:
+        print(f"   {result['messages']:>10,} msgs | {result['conversations']:>8,} convs | {result['customers']:>7,} customers | "
+              f"{result['seconds']:.2f}s | {result['us_per_message']:.1f} µs/msg")
+
+    return results
@@ -3,9 +3,39 @@ LLM Configuration Module for Snowflake Chat Analysis
 Defines department configurations, prompts, and model preferences
 """
 
+import json
+import hashlib
+from collections.abc import Mapping
+from types import MappingProxyType
 from prompts import *
 from snowflake_llm_metrics_calc import *
 
+# Token-lean serialization a prompt can opt into with its 'serialization' setting:
+#   minified       - JSON without whitespace; XML tool blocks on one line, no blank lines
+#   relative_time  - JSON message times / XML tool times as seconds since the conversation's first message
+#   collapse_tools - consecutive tool calls merged into one tool entry
+# JSON rendered with any of them uses short keys (customer, id, start, msgs; t, from, type, text, tool).
+SERIALIZATION_OPTIONS = ('minified', 'relative_time', 'collapse_tools')
+SERIALIZATION_MODES = {
+    'default': (),
+    'compact': SERIALIZATION_OPTIONS,
+}
+
+# Defaults the processor applies to prompt settings that a prompt config leaves out
+PROMPT_SETTING_DEFAULTS = {
+    'conversion_type': 'xml',
+    'model_type': 'openai',
+    'model': 'gpt-4o-mini',
+    'temperature': 0.2,
+    'max_tokens': 2048,
+    'serialization': 'default',
+    'response_format': 'json',
+    'json_repair': False,
+}
+
+# Compiled registry, built once per process by get_compiled_departments_config()
+_COMPILED_DEPARTMENTS_CONFIG = None
+
 def get_snowflake_base_departments_config():
     """
     Base department configuration from existing snowflake_phase2_core_analytics.py
@@ -125,6 +155,11 @@ def get_llm_prompts_config():
     LLM prompts configuration for each department.
     All departments use SA_PROMPT for sentiment analysis with NPS scoring.
     MV_Resolvers additionally keeps existing client_suspecting_ai prompts in JSON format.
+    A prompt can opt into token-lean input with 'serialization': 'compact' (or a list of
+    SERIALIZATION_OPTIONS); prompts without it get the default XML / JSON layout.
+    Responses are expected to be JSON ('response_format': 'json'); unparseable ones are retried,
+    through a JSON repair prompt when the prompt sets 'json_repair': True. Prompts answering in
+    plain text set 'response_format': 'text' so only failed LLM calls are retried.
     """
     # Common SA_prompt configuration for all departments
     sa_prompt_config = {
@@ -494,27 +529,183 @@ def get_snowflake_llm_departments_config():
     return llm_config
 
 
+def _thaw_config_value(value):
+    """
+    Plain JSON-serializable copy of a configuration value: mappings (MappingProxyType included)
+    become dicts, tuples and lists become lists and sets become sorted lists.
+    """
+    if isinstance(value, Mapping):
+        return {key: _thaw_config_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_thaw_config_value(item) for item in value]
+    if isinstance(value, (set, frozenset)):
+        return sorted(_thaw_config_value(item) for item in value)
+    return value
+
+
+def compute_config_hash(config):
+    """
+    Content hash of a configuration (sha256 of its canonical JSON), stable across processes.
+    Frozen (compiled) and plain configurations with the same content hash the same.
+    """
+    canonical = json.dumps(_thaw_config_value(config), sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _freeze_config_value(value):
+    """
+    Read-only copy of a configuration value: dicts become MappingProxyType, lists become tuples.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze_config_value(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_config_value(item) for item in value)
+    return value
+
+
+def resolve_serialization_options(serialization):
+    """
+    Serialization options of a prompt's 'serialization' setting: a SERIALIZATION_MODES name,
+    one SERIALIZATION_OPTIONS entry or a list of them.
+
+    Returns:
+        Tuple of options in SERIALIZATION_OPTIONS order (empty for the default layout)
+    """
+    if serialization is None:
+        return ()
+    if isinstance(serialization, str):
+        requested = SERIALIZATION_MODES.get(serialization, (serialization,))
+    else:
+        requested = tuple(serialization)
+    unknown = [option for option in requested if option not in SERIALIZATION_OPTIONS]
+    if unknown:
+        raise ValueError(f"Unknown serialization options {unknown} (modes: {list(SERIALIZATION_MODES)}, options: {list(SERIALIZATION_OPTIONS)})")
+    return tuple(option for option in SERIALIZATION_OPTIONS if option in requested)
+
+
+def compile_prompt_config(prompt_config):
+    """
+    Compile one prompt configuration: defaults filled in, the per-skill system prompt flag and
+    serialization options precomputed and a content hash of the prompt settings.
+
+    Args:
+        prompt_config: Prompt configuration from get_llm_prompts_config()
+
+    Returns:
+        Read-only mapping with the prompt settings plus:
+            per_skill_system_prompt: system_prompt is a {LAST_SKILL: prompt} mapping (loss_interest)
+            serialization_options: resolve_serialization_options() of the serialization setting
+            prompt_hash: compute_config_hash() of the prompt settings
+    """
+    compiled = {**PROMPT_SETTING_DEFAULTS, **prompt_config}
+    compiled['model_type'] = str(compiled['model_type']).lower()
+    compiled['per_skill_system_prompt'] = isinstance(prompt_config.get('system_prompt'), Mapping)
+    compiled['serialization_options'] = resolve_serialization_options(compiled['serialization'])
+    compiled['prompt_hash'] = compute_config_hash(prompt_config)
+    return _freeze_config_value(compiled)
+
+
+def is_per_skill_prompt(prompt_config):
+    """
+    True when the prompt's system_prompt is a {LAST_SKILL: prompt} mapping (loss_interest):
+    the compiled per_skill_system_prompt flag, or the system_prompt itself for an uncompiled config.
+    """
+    if 'per_skill_system_prompt' in prompt_config:
+        return bool(prompt_config['per_skill_system_prompt'])
+    return isinstance(prompt_config.get('system_prompt'), Mapping)
+
+
+def compile_department_config(department_name, base_dept_config, dept_prompts):
+    """
+    Compile one department: skill lists as tuples (ordered, for SQL and np.isin) and frozensets
+    (membership checks), prompts compiled with compile_prompt_config().
+
+    Returns:
+        Read-only mapping with the base department fields plus bot_skill_set, agent_skill_set,
+        target_skills / target_skill_set (bot + agent skills), llm_prompts and config_hash
+    """
+    bot_skills = tuple(base_dept_config.get('bot_skills', ()))
+    agent_skills = tuple(base_dept_config.get('agent_skills', ()))
+    compiled = {
+        **base_dept_config,
+        'department_name': department_name,
+        'bot_skills': bot_skills,
+        'agent_skills': agent_skills,
+        'target_skills': bot_skills + agent_skills,
+        'bot_skill_set': frozenset(bot_skills),
+        'agent_skill_set': frozenset(agent_skills),
+        'target_skill_set': frozenset(bot_skills + agent_skills),
+        'llm_prompts': MappingProxyType({
+            prompt_type: compile_prompt_config(prompt_config) for prompt_type, prompt_config in dept_prompts.items()
+        }),
+        'config_hash': compute_config_hash({**base_dept_config, 'llm_prompts': dept_prompts}),
+    }
+    return MappingProxyType({
+        key: value if key == 'llm_prompts' else _freeze_config_value(value) for key, value in compiled.items()
+    })
+
+
+def get_compiled_departments_config():
+    """
+    Compiled, read-only department registry, built once per process.
+
+    Same shape as get_snowflake_llm_departments_config() (department -> base fields + llm_prompts),
+    with the additions of compile_department_config(). Callers share the one instance, so the large
+    prompt strings are referenced once and skill checks are frozenset lookups.
+
+    Returns:
+        MappingProxyType {department_name: compiled department config}
+    """
+    global _COMPILED_DEPARTMENTS_CONFIG
+    if _COMPILED_DEPARTMENTS_CONFIG is None:
+        base_config = get_snowflake_base_departments_config()
+        llm_prompts = get_llm_prompts_config()
+        _COMPILED_DEPARTMENTS_CONFIG = MappingProxyType({
+            dept_name: compile_department_config(dept_name, base_dept_config, llm_prompts.get(dept_name, {}))
+            for dept_name, base_dept_config in base_config.items()
+        })
+    return _COMPILED_DEPARTMENTS_CONFIG
+
+
+def get_department_config(department_name):
+    """
+    Compiled configuration of one department, or None when the department is not configured.
+    """
+    return get_compiled_departments_config().get(department_name)
+
+
+def get_config_hash(department_name=None):
+    """
+    Content hash of one department's configuration (base fields + prompts), or of all departments
+    when department_name is None. Changes whenever a skill, table or prompt setting changes,
+    so it can be part of cache keys.
+    """
+    compiled_config = get_compiled_departments_config()
+    if department_name is not None:
+        dept_config = compiled_config.get(department_name)
+        return dept_config['config_hash'] if dept_config is not None else None
+    return compute_config_hash({dept_name: dept_config['config_hash'] for dept_name, dept_config in compiled_config.items()})
+
+
 def get_department_prompt_types(department_name):
     """
     Get all available prompt types for a specific department
     """
-    config = get_llm_prompts_config()
-    return list(config.get(department_name, {}).keys())
+    return list(get_compiled_departments_config().get(department_name, {}).get('llm_prompts', {}).keys())
 
 
 def get_prompt_config(department_name, prompt_type):
     """
     Get specific prompt configuration
     """
-    config = get_llm_prompts_config()
-    return config.get(department_name, {}).get(prompt_type, None)
+    return get_compiled_departments_config().get(department_name, {}).get('llm_prompts', {}).get(prompt_type, None)
 
 
 def list_all_departments():
     """
     Get list of all configured departments
     """
-    return list(get_snowflake_base_departments_config().keys())
+    return list(get_compiled_departments_config().keys())
 
 
 def list_all_output_tables():
@@ -0,0 +1,285 @@
+"""
+Conversation Model Module for Snowflake LLM Analysis
+Canonical parsed form of a Phase 1 frame, built once per department run
+The XML, segment, JSON and XML3D renderers read messages, roles, skills, tool calls,
+execution_id and customer fields from this model instead of re-grouping and re-sorting the frame
+"""
+
+import numpy as np
+import pandas as pd
+from snowflake_llm_helpers import get_execution_id_map, build_tool_call_index, resolve_tool_call
+from snowflake_llm_time_format import format_message_times
+
+REQUIRED_MODEL_COLUMNS = ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'SENT_BY', 'TEXT']
+
+# Per-conversation columns kept in original frame order (first/last-row metadata)
+METADATA_COLUMNS = ['SKILL', 'SHADOWED_BY', 'CUSTOMER_NAME', 'AGENT_NAME', 'SENT_BY', 'TARGET_SKILL_PER_MESSAGE']
+
+
+def _str_or_empty(value):
+    """
+    str(value), or "" for null values (the converters' per-cell normalization).
+    """
+    return str(value) if pd.notna(value) else ""
+
+
+def _str_or_empty_array(values):
+    """
+    _str_or_empty over an object array (strings are passed through without a str() call).
+    """
+    null_mask = pd.isna(values)
+    return np.array(
+        ["" if is_null else (value if type(value) is str else str(value)) for value, is_null in zip(values, null_mask)],
+        dtype=object
+    )
+
+
+def _lower_array(values):
+    """
+    Lowercase an object array of strings.
+    """
+    return np.array([value.lower() for value in values], dtype=object)
+
+
+def _column_values(df, column, default):
+    """
+    Object array of a column, or an array filled with default when the column is missing.
+    """
+    if column in df.columns:
+        return df[column].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+
+# Per-message arrays of the model (frame sorted by CONVERSATION_ID, MESSAGE_SENT_TIME).
+# *_raw hold the cell values; the others are normalized like _str_or_empty (message_type and
+# sender_lower are also lowercased). Raw values are kept next to their normalized forms because
+# the renderers differ in how they treat nulls (e.g. str(NaT) in tool blocks vs "" in message lines).
+# time_str / time_iso are formatted once per frame (format_message_times).
+MESSAGE_FIELDS = ['time', 'time_str', 'time_iso', 'text_raw', 'text', 'sender_raw', 'sender', 'sender_lower',
+                  'skill_raw', 'skill', 'message_type_raw', 'message_type', 'agent_name',
+                  'tool_name', 'tool_output']
+
+
+def build_conversation_model(filtered_df, department_name):
+    """
+    Build the canonical conversation model for a Phase 1 frame.
+
+    The frame is sorted once (CONVERSATION_ID, MESSAGE_SENT_TIME; stable) into per-message
+    NumPy arrays, and every conversation becomes a contiguous [start, stop) block of them.
+    Tool calls are resolved once per tool message and execution_ids are mapped once per frame.
+
+    Args:
+        filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
+        department_name: Department name (execution_id bot skills)
+
+    Returns:
+        Dictionary with:
+            department: Department name
+            columns: Columns present in the frame
+            missing_columns: Required columns absent from the frame (no conversations when non-empty)
+            arrays: {field: object array} for every MESSAGE_FIELDS entry, in sorted message order
+            conversations: {conversation_id: conversation} in CONVERSATION_ID order (groupby order)
+            appearance_order: Conversation IDs in order of first appearance in the frame
+            execution_id_map: get_execution_id_map() of the frame
+        Each conversation holds conversation_id, start / stop (its block in arrays), message_count,
+        senders / skills (null-filled with ''), first_message_customer (CUSTOMER_NAME of the
+        earliest message), execution_id, tool_call_count, tool_calls (call_id -> name, arguments,
+        response; see build_tool_call_index) and metadata (METADATA_COLUMNS values in original frame order)
+    """
+    conversation_model = {
+        'department': department_name,
+        'columns': set(filtered_df.columns),
+        'missing_columns': [col for col in REQUIRED_MODEL_COLUMNS if col not in filtered_df.columns],
+        'arrays': {field: np.empty(0, dtype=object) for field in MESSAGE_FIELDS},
+        'conversations': {},
+        'appearance_order': [],
+        'execution_id_map': {}
+    }
+
+    if filtered_df.empty or conversation_model['missing_columns']:
+        return conversation_model
+
+    conversation_model['execution_id_map'] = get_execution_id_map(filtered_df, department_name)
+    conversation_model['appearance_order'] = [
+        conv_id for conv_id in filtered_df['CONVERSATION_ID'].unique() if pd.notna(conv_id)
+    ]
+
+    # Original-order positions per conversation (first/last-row metadata)
+    original_positions = filtered_df.groupby('CONVERSATION_ID', sort=True).indices
+    metadata_values = {col: _column_values(filtered_df, col, np.nan) for col in METADATA_COLUMNS}
+
+    # One stable sort for the whole frame: each conversation is a contiguous, time-ordered block
+    sorted_df = filtered_df.sort_values(['CONVERSATION_ID', 'MESSAGE_SENT_TIME'], kind='stable')
+    sorted_positions = sorted_df.groupby('CONVERSATION_ID', sort=True).indices
+
+    arrays = conversation_model['arrays']
+    arrays['time'] = sorted_df['MESSAGE_SENT_TIME'].to_numpy(dtype=object)
+    arrays.update(format_message_times(sorted_df['MESSAGE_SENT_TIME']))
+    arrays['text_raw'] = sorted_df['TEXT'].to_numpy(dtype=object)
+    arrays['text'] = _str_or_empty_array(arrays['text_raw'])
+    arrays['sender_raw'] = sorted_df['SENT_BY'].to_numpy(dtype=object)
+    arrays['sender'] = _str_or_empty_array(arrays['sender_raw'])
+    arrays['sender_lower'] = _lower_array(arrays['sender'])
+    arrays['skill_raw'] = _column_values(sorted_df, 'TARGET_SKILL_PER_MESSAGE', '')
+    arrays['skill'] = _str_or_empty_array(arrays['skill_raw'])
+    arrays['message_type_raw'] = _column_values(sorted_df, 'MESSAGE_TYPE', '')
+    arrays['message_type'] = _lower_array(_str_or_empty_array(arrays['message_type_raw']))
+    arrays['agent_name'] = _column_values(sorted_df, 'AGENT_NAME', '')
+    arrays['tool_name'] = np.full(len(sorted_df), None, dtype=object)
+    arrays['tool_output'] = np.full(len(sorted_df), None, dtype=object)
+    customer_names = _column_values(sorted_df, 'CUSTOMER_NAME', np.nan)
+    is_tool = arrays['message_type'] == 'tool'
+
+    for conv_id, positions in sorted_positions.items():
+        start, stop = int(positions[0]), int(positions[-1]) + 1
+
+        # Resolve each tool message once (name + matching tool response) from a single-pass index
+        tool_call_index = None
+        tool_positions = np.flatnonzero(is_tool[start:stop])
+        if len(tool_positions):
+            tool_call_index = build_tool_call_index(arrays['text_raw'][start:stop], arrays['message_type_raw'][start:stop])
+            for position in tool_positions:
+                arrays['tool_name'][start + position], arrays['tool_output'][start + position] = resolve_tool_call(
+                    tool_call_index['payloads'][position], tool_call_index
+                )
+
+        original = original_positions[conv_id]
+        conversation_model['conversations'][conv_id] = {
+            'conversation_id': conv_id,
+            'start': start,
+            'stop': stop,
+            'message_count': stop - start,
+            'senders': ["" if pd.isna(value) else value for value in arrays['sender_raw'][start:stop]],
+            'skills': set("" if pd.isna(value) else value for value in arrays['skill_raw'][start:stop]),
+            'first_message_customer': customer_names[start],
+            'execution_id': conversation_model['execution_id_map'].get(conv_id, ''),
+            'tool_call_count': len(tool_positions),
+            'metadata': {col: metadata_values[col][original].tolist() for col in METADATA_COLUMNS},
+            'tool_calls': tool_call_index['calls'] if tool_call_index is not None else {}
+        }
+
+    print(f"    🧱 Conversation model: {len(conversation_model['conversations'])} conversations, {len(filtered_df)} messages")
+
+    return conversation_model
+
+
+def get_conversation_messages(conversation_model, conversation):
+    """
+    Time-ordered message records ({field: value} for MESSAGE_FIELDS) of one conversation,
+    for renderers that walk messages one by one.
+    """
+    arrays = conversation_model['arrays']
+    columns = [arrays[field][conversation['start']:conversation['stop']] for field in MESSAGE_FIELDS]
+    return [dict(zip(MESSAGE_FIELDS, values)) for values in zip(*columns)]
+
+
+def get_model_arrays(conversation_model, fields):
+    """
+    Message arrays of the model's conversations, in conversation order.
+    A full model returns its arrays as they are; a select_conversations() subset gathers
+    only the messages of the selected conversations.
+
+    Args:
+        conversation_model: Model from build_conversation_model (or a subset of one)
+        fields: MESSAGE_FIELDS entries to return
+
+    Returns:
+        Tuple (arrays, offsets): conversation k spans arrays[field][offsets[k]:offsets[k + 1]]
+    """
+    conversations = list(conversation_model['conversations'].values())
+    starts = np.array([conversation['start'] for conversation in conversations], dtype=np.int64)
+    lengths = np.array([conversation['message_count'] for conversation in conversations], dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+    model_arrays = conversation_model['arrays']
+    total_messages = len(model_arrays['time'])
+    if offsets[-1] == total_messages and np.array_equal(starts, offsets[:-1]):
+        return {field: model_arrays[field] for field in fields}, offsets
+
+    positions = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1], dtype=np.int64)
+    return {field: model_arrays[field][positions] for field in fields}, offsets
+
+
+def select_conversations(conversation_model, conversation_ids):
+    """
+    Restrict a conversation model to the given conversation IDs (e.g. a category-filtered subset),
+    keeping the model's ordering.
+
+    Args:
+        conversation_model: Model from build_conversation_model
+        conversation_ids: Iterable of conversation IDs to keep
+
+    Returns:
+        New model dictionary sharing the conversation records
+    """
+    keep_ids = set(conversation_ids)
+    return {
+        **conversation_model,
+        'conversations': {
+            conv_id: conversation for conv_id, conversation in conversation_model['conversations'].items()
+            if conv_id in keep_ids
+        },
+        'appearance_order': [conv_id for conv_id in conversation_model['appearance_order'] if conv_id in keep_ids]
+    }
+
+
+def get_first_value(values):
+    """
+    First value of a metadata column (iloc[0]); None for an empty list.
+    """
+    return values[0] if values else None
+
+
+def get_first_non_null(values):
+    """
+    First non-null value of a metadata column (dropna().iloc[0]); None when all are null.
+    """
+    for value in values:
+        if pd.notna(value):
+            return value
+    return None
+
+
+def get_last_non_null(values):
+    """
+    Last non-null value of a metadata column (dropna().iloc[-1]); None when all are null.
+    """
+    for value in reversed(values):
+        if pd.notna(value):
+            return value
+    return None
+
+
+def summarize_tool_run(tool_names):
+    """
+    One label for a run of consecutive tool calls (collapse_tools serialization):
+    names in call order, repeats of the same tool counted, e.g. "get_visa_status (x3), send_document".
+    """
+    parts = []
+    previous, repeats = None, 0
+    for tool_name in tool_names:
+        tool_name = str(tool_name) if tool_name is not None else "Unknown_Tool"
+        if tool_name == previous:
+            repeats += 1
+            continue
+        if previous is not None:
+            parts.append(previous if repeats == 1 else f"{previous} (x{repeats})")
+        previous, repeats = tool_name, 1
+    if previous is not None:
+        parts.append(previous if repeats == 1 else f"{previous} (x{repeats})")
+    return ", ".join(parts)
+
+
+def get_tool_run_continuations(is_tool_line, line_conversation):
+    """
+    Mask of tool lines that directly follow another tool line of the same conversation
+    (the lines collapse_tools serialization merges into the line that starts their run).
+
+    Args:
+        is_tool_line: Boolean array over a conversation-ordered list of rendered lines
+        line_conversation: Conversation index of each line
+    """
+    continues = np.zeros(len(is_tool_line), dtype=bool)
+    if len(is_tool_line) > 1:
+        continues[1:] = is_tool_line[1:] & is_tool_line[:-1] & (line_conversation[1:] == line_conversation[:-1])
+    return continues
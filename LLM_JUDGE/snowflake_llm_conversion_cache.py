@@ -0,0 +1,380 @@
+"""
+Conversion Cache Module for Snowflake LLM Analysis
+On-disk Parquet cache of rendered XML / JSON / segment / XML3D output, one store per department
+and conversion type
+Entries are keyed by conversation (XML3D: customer) and a fingerprint of its message rows, the
+converter version and the department configuration, so conversations that span several days and
+unchanged three-day customer windows are served from the cache instead of being converted again
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Cache is disabled without pyarrow
+    pa = None
+    pq = None
+
+from snowflake_llm_config import get_snowflake_base_departments_config, compute_config_hash
+from snowflake_llm_xml3d import build_customer_index
+from snowflake_llm_conversation_model import REQUIRED_MODEL_COLUMNS, METADATA_COLUMNS
+
+# Bump when a converter's output changes so old entries stop matching
+CONVERSION_CACHE_VERSION = 1
+
+CONVERSION_CACHE_TYPES = ('xml', 'json', 'segment', 'xml3d')
+
+DEFAULT_CONVERSION_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'llm_judge_conversion_cache')
+DEFAULT_CONVERSION_CACHE_RETENTION_DAYS = 7
+
+CONVERSION_CACHE_SCHEMA_COLUMNS = ['unit_id', 'fingerprint', 'records', 'convert_seconds', 'last_used']
+
+# Columns the converters read; per-run / per-day bookkeeping columns (e.g. DAY_OFFSET and
+# PROCESSING_DATE of the multi-day frame) are left out so they do not change fingerprints
+FINGERPRINT_COLUMNS = sorted(set(REQUIRED_MODEL_COLUMNS + METADATA_COLUMNS + ['MESSAGE_TYPE', 'EXECUTION_ID']))
+
+
+def get_conversion_cache_dir():
+    """
+    Cache directory (LLM_JUDGE_CONVERSION_CACHE_DIR overrides the temp-dir default).
+    """
+    return os.environ.get('LLM_JUDGE_CONVERSION_CACHE_DIR', DEFAULT_CONVERSION_CACHE_DIR)
+
+
+def get_conversion_cache_retention_days():
+    """
+    Entries not used for this many days are dropped on the next write (LLM_JUDGE_CONVERSION_CACHE_RETENTION_DAYS).
+    """
+    return float(os.environ.get('LLM_JUDGE_CONVERSION_CACHE_RETENTION_DAYS', DEFAULT_CONVERSION_CACHE_RETENTION_DAYS))
+
+
+def is_conversion_cache_enabled():
+    """
+    The cache needs pyarrow and can be switched off with LLM_JUDGE_CONVERSION_CACHE=0.
+    """
+    return pq is not None and os.environ.get('LLM_JUDGE_CONVERSION_CACHE', '1') != '0'
+
+
+def get_converter_version(department_name, conversion_type, serialization_options=()):
+    """
+    Version part of every fingerprint: cache version, conversion type, serialization options and a
+    hash of the department's base configuration (skills decide which conversations are kept and how
+    bot messages are labelled). Other prompt edits do not change it.
+    """
+    base_config = get_snowflake_base_departments_config().get(department_name, {})
+    version = f"{CONVERSION_CACHE_VERSION}:{conversion_type}:{compute_config_hash(base_config)[:16]}"
+    if serialization_options:
+        version += ":" + "+".join(serialization_options)
+    return version
+
+
+def compute_conversation_fingerprints(filtered_df, converter_version=''):
+    """
+    Fingerprint of each conversation's message rows: sha256 of the converter version, the names of
+    the frame's FINGERPRINT_COLUMNS and the sorted 64-bit hashes of the conversation's rows over them.
+
+    The fingerprint does not depend on row order. Rows of one conversation can come back from
+    Snowflake in any order, and a cached output is the converter's output for the same rows.
+
+    Args:
+        filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
+        converter_version: get_converter_version() of the conversion
+
+    Returns:
+        Dictionary {conversation_id: fingerprint} in CONVERSATION_ID order
+    """
+    columns = [column for column in FINGERPRINT_COLUMNS if column in filtered_df.columns]
+    row_hashes = pd.util.hash_pandas_object(filtered_df[columns], index=False).to_numpy()
+    codes, conversation_ids = pd.factorize(filtered_df['CONVERSATION_ID'], sort=True)
+
+    valid = codes >= 0
+    codes, row_hashes = codes[valid], row_hashes[valid]
+    order = np.lexsort((row_hashes, codes))
+    sorted_hashes = row_hashes[order]
+    offsets = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(conversation_ids)))])
+
+    header = json.dumps({'version': converter_version, 'columns': columns}, default=str).encode('utf-8')
+    fingerprints = {}
+    for k, conv_id in enumerate(conversation_ids):
+        digest = hashlib.sha256(header)
+        digest.update(sorted_hashes[offsets[k]:offsets[k + 1]].tobytes())
+        fingerprints[conv_id] = digest.hexdigest()
+    return fingerprints
+
+
+def build_cache_units(filtered_df, conversion_type, fingerprints):
+    """
+    Cache units of a frame: one per conversation, or one per customer for XML3D (a customer's
+    document changes whenever any of their conversations changes).
+
+    Returns:
+        Dictionary {unit_id: {'conversation_ids': [...], 'fingerprint': str}} in converter output order
+        for XML / JSON / segment (CONVERSATION_ID order); XML3D output is re-ordered by merge_cached_records
+    """
+    if conversion_type != 'xml3d':
+        return {
+            str(conv_id): {'conversation_ids': [conv_id], 'fingerprint': fingerprint}
+            for conv_id, fingerprint in fingerprints.items()
+        }
+
+    customer_conversations = {}
+    for conv_id, customer_name in build_customer_index(filtered_df).items():
+        if conv_id in fingerprints:
+            customer_conversations.setdefault(customer_name, []).append(conv_id)
+
+    units = {}
+    for customer_name, conversation_ids in customer_conversations.items():
+        digest = hashlib.sha256()
+        for conv_id in sorted(conversation_ids, key=str):
+            digest.update(f"{conv_id}\x00{fingerprints[conv_id]}\x00".encode('utf-8'))
+        units[customer_name] = {'conversation_ids': conversation_ids, 'fingerprint': digest.hexdigest()}
+    return units
+
+
+def get_unit_id(record, conversion_type):
+    """
+    Cache unit of a converted record: its customer for XML3D, its conversation otherwise.
+    """
+    if conversion_type == 'xml3d':
+        return record['customer_name']
+    return str(record['conversation_id'])
+
+
+def _store_path(department_name, conversion_type):
+    return os.path.join(get_conversion_cache_dir(), f"{department_name}__{conversion_type}.parquet")
+
+
+def read_conversion_cache(department_name, conversion_type):
+    """
+    Read the cache store of a department and conversion type.
+
+    Returns:
+        Dictionary {(unit_id, fingerprint): {'records' (JSON text), 'convert_seconds', 'last_used'}},
+        empty on a missing or unreadable store
+    """
+    store_path = _store_path(department_name, conversion_type)
+    if not os.path.exists(store_path):
+        return {}
+
+    try:
+        columns = pq.read_table(store_path, memory_map=True).to_pydict()
+    except Exception as e:
+        print(f"    ⚠️  Ignoring unreadable conversion cache {store_path}: {str(e)}")
+        return {}
+
+    return {
+        (unit_id, fingerprint): {'records': records, 'convert_seconds': convert_seconds, 'last_used': last_used}
+        for unit_id, fingerprint, records, convert_seconds, last_used in zip(
+            *(columns[col] for col in CONVERSION_CACHE_SCHEMA_COLUMNS)
+        )
+    }
+
+
+def write_conversion_cache(department_name, conversion_type, entries):
+    """
+    Write the cache store of a department and conversion type, dropping entries that were not used
+    within the retention period. Writes go to a temporary file first so a crash never leaves a
+    half-written store.
+
+    Args:
+        department_name: Department name
+        conversion_type: 'xml', 'json', 'segment' or 'xml3d'
+        entries: Dictionary {(unit_id, fingerprint): entry} as returned by read_conversion_cache
+
+    Returns:
+        True if the store was written
+    """
+    store_path = _store_path(department_name, conversion_type)
+    oldest_last_used = time.time() - get_conversion_cache_retention_days() * 86400
+    kept = {key: entry for key, entry in entries.items() if entry['last_used'] >= oldest_last_used}
+
+    try:
+        os.makedirs(get_conversion_cache_dir(), exist_ok=True)
+        table = pa.table({
+            'unit_id': pa.array([unit_id for unit_id, _ in kept], type=pa.string()),
+            'fingerprint': pa.array([fingerprint for _, fingerprint in kept], type=pa.string()),
+            'records': pa.array([entry['records'] for entry in kept.values()], type=pa.large_string()),
+            'convert_seconds': pa.array([entry['convert_seconds'] for entry in kept.values()], type=pa.float64()),
+            'last_used': pa.array([entry['last_used'] for entry in kept.values()], type=pa.float64()),
+        })
+        pq.write_table(table, store_path + '.tmp')
+        os.replace(store_path + '.tmp', store_path)
+    except Exception as e:
+        print(f"    ⚠️  Could not write conversion cache {store_path}: {str(e)}")
+        if os.path.exists(store_path + '.tmp'):
+            os.remove(store_path + '.tmp')
+        return False
+
+    if len(kept) < len(entries):
+        print(f"    🧹 Dropped {len(entries) - len(kept)} conversion cache entries unused for {get_conversion_cache_retention_days():g} days")
+    return True
+
+
+def merge_cached_records(filtered_df, conversion_type, units, unit_records):
+    """
+    Output records of all units, in the order the converter produces them.
+    XML / JSON / segment follow the unit order (CONVERSATION_ID order); XML3D customers are ordered
+    by the first appearance of their first converted conversation in the frame.
+    """
+    if conversion_type != 'xml3d':
+        return [record for unit_id in units for record in unit_records.get(unit_id, [])]
+
+    appearance_rank = {
+        str(conv_id): rank for rank, conv_id in enumerate(filtered_df['CONVERSATION_ID'].dropna().unique())
+    }
+    records = [record for unit_id in units for record in unit_records.get(unit_id, [])]
+    return sorted(records, key=lambda record: min(
+        appearance_rank.get(conv_id, len(appearance_rank)) for conv_id in str(record['conversation_id']).split(', ')
+    ))
+
+
+def convert_with_conversion_cache(filtered_df, department_name, conversion_type, convert, cache_stats=None,
+                                  serialization_options=()):
+    """
+    Convert a frame, serving unchanged conversations (XML3D: customers) from the conversion cache.
+
+    Only the rows of changed or new units are passed to convert; their output, including units that
+    produce no rows (dropped conversations), is written back to the cache. Hit rate and the conversion
+    time saved (the recorded conversion time of the cached units) are printed.
+
+    Args:
+        filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
+        department_name: Department name
+        conversion_type: 'xml', 'json', 'segment' or 'xml3d'
+        convert: Function(frame) -> converted DataFrame, the converter of this conversion type
+        cache_stats: Optional list receiving this conversion's statistics dictionary
+        serialization_options: Serialization options convert renders with (part of the fingerprint)
+
+    Returns:
+        Converted DataFrame, as convert(filtered_df) would return it
+    """
+    if (not is_conversion_cache_enabled() or conversion_type not in CONVERSION_CACHE_TYPES
+            or filtered_df.empty or 'CONVERSATION_ID' not in filtered_df.columns):
+        return convert(filtered_df)
+
+    lookup_start_time = time.time()
+    fingerprints = compute_conversation_fingerprints(filtered_df, get_converter_version(department_name, conversion_type, serialization_options))
+    units = build_cache_units(filtered_df, conversion_type, fingerprints)
+    entries = read_conversion_cache(department_name, conversion_type)
+
+    hit_ids = [unit_id for unit_id, unit in units.items() if (unit_id, unit['fingerprint']) in entries]
+    hit_set = set(hit_ids)
+    missed_ids = [unit_id for unit_id in units if unit_id not in hit_set]
+    lookup_seconds = time.time() - lookup_start_time
+
+    if not hit_ids:
+        # Nothing to reuse: convert the frame as it is
+        missed_df = filtered_df
+    else:
+        missed_conversation_ids = [conv_id for unit_id in missed_ids for conv_id in units[unit_id]['conversation_ids']]
+        missed_df = filtered_df[filtered_df['CONVERSATION_ID'].isin(missed_conversation_ids)]
+
+    unit_records = {unit_id: [] for unit_id in missed_ids}
+    convert_seconds = 0.0
+    converted_df = None
+    if missed_ids or not hit_ids:
+        convert_start_time = time.time()
+        converted_df = convert(missed_df)
+        convert_seconds = time.time() - convert_start_time
+        if not isinstance(converted_df, pd.DataFrame):
+            return converted_df
+
+        for record in converted_df.to_dict('records'):
+            unit_records.setdefault(get_unit_id(record, conversion_type), []).append(record)
+
+    now = time.time()
+    seconds_per_unit = convert_seconds / len(missed_ids) if missed_ids else 0.0
+    for unit_id in missed_ids:
+        entries[(unit_id, units[unit_id]['fingerprint'])] = {
+            'records': json.dumps(unit_records[unit_id], default=str),
+            'convert_seconds': seconds_per_unit,
+            'last_used': now
+        }
+    for unit_id in hit_ids:
+        entry = entries[(unit_id, units[unit_id]['fingerprint'])]
+        unit_records[unit_id] = json.loads(entry['records'])
+        entry['last_used'] = now
+
+    write_start_time = time.time()
+    write_conversion_cache(department_name, conversion_type, entries)
+    overhead_seconds = lookup_seconds + time.time() - write_start_time
+
+    stats = {
+        'conversion_type': conversion_type,
+        'units': len(units),
+        'hits': len(hit_ids),
+        'misses': len(missed_ids),
+        'hit_rate': len(hit_ids) / len(units) * 100 if units else 0.0,
+        'convert_seconds': convert_seconds,
+        'saved_seconds': sum(entries[(unit_id, units[unit_id]['fingerprint'])]['convert_seconds'] for unit_id in hit_ids),
+        'overhead_seconds': overhead_seconds
+    }
+    if cache_stats is not None:
+        cache_stats.append(stats)
+    unit_label = 'customers' if conversion_type == 'xml3d' else 'conversations'
+    print(f"    ♻️  Conversion cache ({conversion_type}): {stats['hits']}/{stats['units']} {unit_label} from cache ({stats['hit_rate']:.1f}%), "
+          f"~{stats['saved_seconds']:.2f}s conversion saved, {stats['overhead_seconds']:.2f}s cache overhead")
+
+    if not hit_ids:
+        return converted_df
+
+    records = merge_cached_records(filtered_df, conversion_type, units, unit_records)
+    if not records and converted_df is not None:
+        return converted_df
+    return pd.DataFrame(records)
+
+
+def summarize_conversion_cache_stats(cache_stats):
+    """
+    Totals of the statistics collected by convert_with_conversion_cache over a run.
+
+    Returns:
+        Dictionary with units, hits, hit_rate, saved_seconds and overhead_seconds
+    """
+    units = sum(stats['units'] for stats in cache_stats)
+    hits = sum(stats['hits'] for stats in cache_stats)
+    return {
+        'units': units,
+        'hits': hits,
+        'hit_rate': hits / units * 100 if units else 0.0,
+        'saved_seconds': sum(stats['saved_seconds'] for stats in cache_stats),
+        'overhead_seconds': sum(stats['overhead_seconds'] for stats in cache_stats)
+    }
+
+
+def invalidate_conversion_cache(department=None, conversion_type=None):
+    """
+    Explicitly drop cache stores. With no arguments the whole cache is cleared.
+
+    Args:
+        department: Only drop stores of this department
+        conversion_type: Only drop stores of this conversion type
+
+    Returns:
+        Number of stores removed
+    """
+    cache_dir = get_conversion_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return 0
+
+    removed = 0
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith('.parquet'):
+            continue
+        store_department, _, store_type = file_name[:-len('.parquet')].rpartition('__')
+        if department is not None and store_department != department:
+            continue
+        if conversion_type is not None and store_type != conversion_type:
+            continue
+        os.remove(os.path.join(cache_dir, file_name))
+        removed += 1
+
+    print(f"🧹 Invalidated {removed} conversion cache stores")
+    return removed
@@ -1,7 +1,8 @@
 import pandas as pd
 import json
 import re
-from snowflake_llm_config import get_snowflake_llm_departments_config
+import heapq
+from snowflake_llm_config import get_department_config
 
 def get_execution_id_map(conversations_df, department_name):
     """
@@ -11,8 +12,8 @@ def get_execution_id_map(conversations_df, department_name):
     # Compute EXECUTION_ID per conversation: first non-null EXECUTION_ID where TARGET_SKILL_PER_MESSAGE is a bot skill, sorted by MESSAGE_SENT_TIME
     execution_id_map = {}
     try:
-        dept_cfg_all = get_snowflake_llm_departments_config()
-        bot_skills = dept_cfg_all.get(department_name, {}).get('bot_skills', [])
+        dept_config = get_department_config(department_name)
+        bot_skills = list(dept_config['bot_skills']) if dept_config is not None else []
 
         # Debug: show available columns
         try:
@@ -81,36 +82,147 @@ def safe_json_loads(json_str):
         return "INVALID_JSON"
 
 
-def get_tool_name_and_response(conv_df, text_value):
+def parse_tool_payload(text_value):
+    """
+    Parse a tool / tool response TEXT payload (dicts pass through unchanged).
+    """
+    return text_value if isinstance(text_value, dict) else safe_json_loads(text_value)
+
+
+def classify_tool_payload(parsed):
+    """
+    Classify a parsed TEXT payload as 'tool', 'tool response' or None.
+    - 'tool_calls' (top-level or inside a 'content' dict) -> 'tool'
+    - 'tool_call_id' (top-level or inside a 'content' dict) -> 'tool response'
+    - {"name": <str>, "arguments": {...}} -> 'tool'
+    """
+    if not isinstance(parsed, dict):
+        return None
+
+    # General detection first (top-level)
+    if parsed.get('tool_calls'):
+        return 'tool'
+    if parsed.get('tool_call_id'):
+        return 'tool response'
+
+    # Also check inside content if it's a dict
+    content_obj = parsed.get('content')
+    if isinstance(content_obj, dict):
+        if content_obj.get('tool_calls'):
+            return 'tool'
+        if content_obj.get('tool_call_id'):
+            return 'tool response'
+
+    # Fallback: detect messages shaped like {"name": <str>, "arguments": { ... }}
+    name_exists = 'name' in parsed and isinstance(parsed.get('name'), str) and parsed.get('name')
+    if name_exists and isinstance(parsed.get('arguments'), dict):
+        return 'tool'
+
+    return None
+
+
+def build_tool_call_index(text_values, message_types):
+    """
+    Build a conversation's tool-call index in a single pass, parsing each tool and
+    tool response TEXT payload exactly once.
+
+    Args:
+      text_values: TEXT values of one conversation, in message order
+      message_types: MESSAGE_TYPE values aligned with text_values
+
+    Returns:
+      Dictionary with:
+        payloads: {position: parsed payload} for 'tool' and 'tool response' messages
+        responses: {str(tool_call_id): content} of the first matching 'tool response'
+        calls: {str(tool_call_id): {'tool_name', 'arguments', 'response'}} for 'tool' messages
+    """
+    tool_call_index = {'payloads': {}, 'responses': {}, 'calls': {}}
+    tool_positions = []
+
+    for position, (text_value, message_type) in enumerate(zip(text_values, message_types)):
+        msg_type = str(message_type).lower()
+        if msg_type == 'tool':
+            tool_call_index['payloads'][position] = parse_tool_payload(text_value)
+            tool_positions.append(position)
+        elif msg_type == 'tool response':
+            parsed = parse_tool_payload(text_value)
+            tool_call_index['payloads'][position] = parsed
+            if isinstance(parsed, dict):
+                match_id = parsed.get('tool_call_id')
+                if match_id:
+                    # First response wins, like the row-by-row scan
+                    tool_call_index['responses'].setdefault(str(match_id), parsed.get('content'))
+
+    for position in tool_positions:
+        parsed = tool_call_index['payloads'][position]
+        tool_name, tool_call_id = extract_tool_name_and_call_id(parsed)
+        if tool_name and tool_call_id:
+            _, arguments_obj = extract_tool_name_and_arguments(parsed)
+            tool_call_index['calls'].setdefault(str(tool_call_id), {
+                'tool_name': tool_name,
+                'arguments': arguments_obj,
+                'response': tool_call_index['responses'].get(str(tool_call_id))
+            })
+
+    return tool_call_index
+
+
+def resolve_tool_call(parsed, tool_call_index):
+    """
+    Return (tool_name, tool_response) for a parsed 'tool' payload using a tool-call index.
+    Same strategy as get_tool_name_and_response, without rescanning the conversation.
+    """
+    try:
+        if not isinstance(parsed, dict):
+            return None, None
+
+        tool_name, tool_call_id = extract_tool_name_and_call_id(parsed)
+        if tool_name and tool_call_id:
+            response_content = tool_call_index['responses'].get(str(tool_call_id))
+            if response_content is not None:
+                return tool_name, response_content
+
+        # Fallback to arguments-as-response
+        tool_name_alt, arguments_obj = extract_tool_name_and_arguments(parsed)
+        if tool_name_alt and isinstance(arguments_obj, dict):
+            return tool_name_alt, arguments_obj
+        return None, None
+    except Exception:
+        return None, None
+
+
+def _conversation_tool_call_index(conv_df):
+    """
+    Tool-call index of a conversation DataFrame (MESSAGE_TYPE/TEXT columns).
+    """
+    message_types = conv_df['MESSAGE_TYPE'].to_numpy(dtype=object) if 'MESSAGE_TYPE' in conv_df.columns else [''] * len(conv_df)
+    text_values = conv_df['TEXT'].to_numpy(dtype=object) if 'TEXT' in conv_df.columns else [None] * len(conv_df)
+    return build_tool_call_index(text_values, message_types)
+
+
+def get_tool_name_and_response(conv_df, text_value, tool_call_index=None):
     """
     Return (tool_name, tool_response) from a tool-related TEXT payload.
 
     Strategy:
       1) Try extracting (tool_name, tool_call_id) via extract_tool_name_and_call_id();
-         if found, look up the matching tool response content in conv_df.
+         if found, look up the matching tool response content in the conversation's tool-call index.
       2) If not found or response unavailable, fall back to extract_tool_name_and_arguments();
          treat the arguments object as the response.
 
     Args:
       conv_df: pandas.DataFrame of the conversation (must include MESSAGE_TYPE/TEXT for lookup)
       text_value: dict or JSON string for the 'tool' message
+      tool_call_index: Optional prebuilt build_tool_call_index() of the conversation; built from conv_df when omitted
 
     Returns:
       (tool_name, tool_response) where tool_response is either the tool response content or
       the arguments dict. Returns (None, None) if not determinable.
     """
     try:
-        tool_name, tool_call_id = extract_tool_name_and_call_id(text_value)
-        if tool_name and tool_call_id:
-            response_content = find_tool_response_content_in_conv(conv_df, tool_call_id)
-            if response_content is not None:
-                return tool_name, response_content
-
-        # Fallback to arguments-as-response
-        tool_name_alt, arguments_obj = extract_tool_name_and_arguments(text_value)
-        if tool_name_alt and isinstance(arguments_obj, dict):
-            return tool_name_alt, arguments_obj
-        return None, None
+        if tool_call_index is None:
+            tool_call_index = _conversation_tool_call_index(conv_df)
+        return resolve_tool_call(parse_tool_payload(text_value), tool_call_index)
     except Exception:
         return None, None
 
@@ -144,18 +256,7 @@ def find_tool_response_content_in_conv(conv_df, tool_call_id):
     if not tool_call_id:
         return None
     try:
-        for _, r in conv_df.iterrows():
-            msg_type = str(r.get('MESSAGE_TYPE', '')).lower()
-            if msg_type != 'tool response':
-                continue
-            text_val = r.get('TEXT')
-            parsed = text_val if isinstance(text_val, dict) else safe_json_loads(text_val)
-            if not isinstance(parsed, dict):
-                continue
-            match_id = parsed.get('tool_call_id')
-            if match_id and str(match_id) == str(tool_call_id):
-                return parsed.get('content')
-        return None
+        return _conversation_tool_call_index(conv_df)['responses'].get(str(tool_call_id))
     except Exception:
         return None
 
@@ -179,3 +280,32 @@ def extract_tool_name_and_arguments(text_value):
     except Exception:
         return None, None
 
+
+def plan_conversion_shards(conversation_sizes, shard_count):
+    """
+    Longest-processing-time-first shard plan: conversations are taken longest first and each one
+    goes to the currently lightest shard, so shards end up with balanced message counts.
+
+    Args:
+        conversation_sizes: {conversation_id: message count}
+        shard_count: Number of shards
+
+    Returns:
+        List of shards ({'conversation_ids', 'messages', 'longest'}), ordered so the shard holding
+        the longest conversations is scheduled first; empty shards are dropped
+    """
+    shard_count = max(1, min(shard_count, len(conversation_sizes)))
+    shards = [{'conversation_ids': [], 'messages': 0, 'longest': 0} for _ in range(shard_count)]
+    heap = [(0, shard_index) for shard_index in range(shard_count)]
+
+    for conv_id, size in sorted(conversation_sizes.items(), key=lambda item: -item[1]):
+        load, shard_index = heapq.heappop(heap)
+        shard = shards[shard_index]
+        shard['conversation_ids'].append(conv_id)
+        shard['messages'] += size
+        shard['longest'] = max(shard['longest'], size)
+        heapq.heappush(heap, (load + size, shard_index))
+
+    shards = [shard for shard in shards if shard['conversation_ids']]
+    shards.sort(key=lambda shard: (-shard['longest'], -shard['messages']))
+    return shards
@@ -4,216 +4,303 @@ Converts conversation DataFrames to JSON format for LLM processing
 Adapted from local JSON converter to work with Snowflake DataFrames directly
 """
 
+import numpy as np
 import pandas as pd
 import json
-import re
-from datetime import datetime
-from snowflake_llm_config import get_snowflake_llm_departments_config
-from snowflake_llm_helpers import get_execution_id_map, get_tool_name_and_response
+from snowflake_llm_config import get_department_config
+from snowflake_llm_time_format import compute_relative_seconds
+from snowflake_llm_conversation_model import (
+    build_conversation_model,
+    select_conversations,
+    get_model_arrays,
+    get_first_value,
+    get_last_non_null,
+    summarize_tool_run,
+    get_tool_run_continuations
+)
 
 
-def clean_datetime_format_snowflake(datetime_str):
+def is_json_convertible(conversation, target_skills):
     """
-    Clean datetime format by handling various malformed datetime strings - Snowflake version.
-    Converts '7/10/2025 3:50:36â¯PM' to '7/10/2025 3:50:36 PM'
-    Converts '7/10/2025 3:50:â¯PM' to '7/10/2025 3:50 PM' 
+    Conversation-level checks of the JSON conversion: bot and consumer participants and a target skill.
     """
-    if not datetime_str or pd.isna(datetime_str):
-        return datetime_str
+    if not conversation['message_count']:
+        return False
     
-    # Convert to string if not already
-    datetime_str = str(datetime_str)
+    # Check if conversation has required participants (bot and consumer)
+    participants = set(sender.lower() for sender in conversation['senders'])
+    if not any(p == "bot" for p in participants) or not any(p == "consumer" for p in participants):
+        return False
     
+    # Check if conversation has target skills
+    return any(skill in target_skills for skill in conversation['skills'])
+
+
+def get_json_customer_name(conversation):
+    """
+    Customer name written into the JSON (CUSTOMER_NAME of the earliest message, "Unknown" when missing).
+    """
+    first_customer = conversation['first_message_customer']
+    if pd.notna(first_customer) and first_customer is not None:
+        return str(first_customer)
+    return "Unknown"
+
+
+def dump_conversation_json(customer_name, conversation_id, messages):
+    """
+    json.dumps(indent=2) of one conversation, with the simplified fallback on serialization errors.
+    """
+    conversation_json = {
+        "customer_name": customer_name,
+        "chat_id": conversation_id,
+        "conversation": messages
+    }
     try:
-        # Try to parse the datetime as-is
-        pd.to_datetime(datetime_str, errors='coerce', format='mixed')
-        return datetime_str  # If successful, return as-is
-    except:
-        # If it fails, apply cleaning
-        pass
-    
-    # Only apply cleaning if the original datetime couldn't be parsed
-    # Handle case where we have colon followed by space and AM/PM (missing seconds)
-    if ':' in datetime_str and (' PM' in datetime_str or ' AM' in datetime_str):
-        # Find the last colon and check if it's followed by space and AM/PM
-        last_colon_idx = datetime_str.rfind(':')
-        after_colon = datetime_str[last_colon_idx + 1:]
-        if after_colon.strip() in ['PM', 'AM']:
-            # Remove the colon and everything between it and AM/PM
-            cleaned = datetime_str[:last_colon_idx] + ' ' + after_colon.strip()
-            return cleaned
-    
-    # Handle original case with invisible characters
-    if len(datetime_str) >= 5:
-        # Delete the third, fourth, and fifth to last characters and add space
-        # Remove characters at positions -5, -4, -3 (third, fourth, fifth to last)
-        cleaned = datetime_str[:-5] + datetime_str[-2:]
-        # Add space between time and AM/PM
-        cleaned = cleaned[:-2] + ' ' + cleaned[-2:]
-        return cleaned
-    
-    return datetime_str
+        return json.dumps(conversation_json, indent=2, ensure_ascii=False)
+    except Exception as e:
+        # Return a simplified version if JSON serialization fails
+        simplified_conversation = {
+            "customer_name": customer_name,
+            "chat_id": conversation_id,
+            "conversation": f"JSON_SERIALIZATION_ERROR: {str(e)}"
+        }
+        return json.dumps(simplified_conversation, indent=2, ensure_ascii=False)
+
+
+def dump_compact_conversation_json(document, serialization_options):
+    """
+    json.dumps of one compact conversation document (no whitespace when minified),
+    with the simplified fallback on serialization errors.
+    """
+    dump_options = {'separators': (',', ':')} if 'minified' in serialization_options else {'indent': 2}
+    try:
+        return json.dumps(document, ensure_ascii=False, **dump_options)
+    except Exception as e:
+        simplified_document = {key: document[key] for key in ('customer', 'id')}
+        simplified_document['msgs'] = f"JSON_SERIALIZATION_ERROR: {str(e)}"
+        return json.dumps(simplified_document, ensure_ascii=False, **dump_options)
 
 
-def preprocess_conversation_dataframe_json(conv_df):
+def render_compact_json_conversations(conversation_model, arrays, offsets, entry_positions, is_tool,
+                                      sender, text, serialization_options):
+    """
+    Compact JSON documents of the conversations (render_json_conversations with serialization options).
+    
+    Layout: {"customer", "id", "start" (relative_time), "msgs": [{"t", "from", "type", "text"} or
+    {"t", "from": "Bot", "tool"}]}; "type" is left out for normal messages, "t" is whole seconds
+    since "start" under relative_time and collapse_tools merges consecutive tool entries.
+    
+    Args:
+        conversation_model: Model (or subset) the arrays were taken from
+        arrays, offsets: get_model_arrays() of the model
+        entry_positions: Sorted positions of the kept messages and tool entries
+        is_tool, sender, text: Per-message arrays prepared by render_json_conversations
+        serialization_options: SERIALIZATION_OPTIONS of the prompt
+    
+    Returns:
+        Dictionary: {conversation_id: JSON string}
     """
-    Preprocess a single conversation DataFrame for JSON conversion
-    Sort by message timestamp - works directly with Snowflake column names
+    message_type = arrays['message_type']
+    conversation_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    
+    timestamps = arrays['time_iso']
+    start_iso = None
+    if 'relative_time' in serialization_options:
+        relative_seconds, start_iso = compute_relative_seconds(arrays['time_iso'], offsets)
+        timestamps = np.where(pd.isna(relative_seconds), timestamps, relative_seconds)
+    
+    continues = np.zeros(len(entry_positions), dtype=bool)
+    if 'collapse_tools' in serialization_options:
+        continues = get_tool_run_continuations(is_tool[entry_positions], conversation_index[entry_positions])
+    
+    # Entries per conversation; a collapsed tool entry lists the names of its run
+    messages_by_conversation = [[] for _ in range(len(offsets) - 1)]
+    run_tool_names = []
+    for i, continues_run in zip(entry_positions, continues):
+        if continues_run:
+            run_tool_names.append(arrays['tool_name'][i])
+            messages_by_conversation[conversation_index[i]][-1]['tool'] = summarize_tool_run(run_tool_names)
+            continue
+        if is_tool[i]:
+            run_tool_names = [arrays['tool_name'][i]]
+            message = {"t": timestamps[i], "from": "Bot", "tool": arrays['tool_name'][i]}
+        else:
+            message = {"t": timestamps[i], "from": sender[i]}
+            if message_type[i] != 'normal message':
+                message["type"] = message_type[i]
+            message["text"] = text[i]
+        messages_by_conversation[conversation_index[i]].append(message)
+    
+    rendered = {}
+    for k, (conv_id, conversation) in enumerate(conversation_model['conversations'].items()):
+        document = {"customer": get_json_customer_name(conversation), "id": str(conv_id)}
+        if start_iso is not None:
+            document["start"] = start_iso[k]
+        document["msgs"] = messages_by_conversation[k]
+        rendered[conv_id] = dump_compact_conversation_json(document, serialization_options)
+    
+    return rendered
+
+
+def render_json_conversations(conversation_model, target_skills, include_tool_messages=True, serialization_options=()):
     """
-    # Sort by MESSAGE_SENT_TIME (Snowflake column name)
-    if 'MESSAGE_SENT_TIME' in conv_df.columns:
-        conv_df = conv_df.sort_values('MESSAGE_SENT_TIME')
+    Render every conversation in the model to its JSON string in one pass over the model's
+    message arrays. The text is assembled from json-encoded strings and is byte-identical to
+    json.dumps(indent=2, ensure_ascii=False) of the conversation object.
+    
+    Rules (same as local convert_conversation_to_json()):
+    - transfer, private message and tool response messages are skipped
+    - Bot messages from non-target skills (bot + agent skills) are shown as Agent_1
+    - Empty normal messages become [Doc/Image]
+    - A message identical (timestamp, text, sender, type) to the previous kept message is dropped;
+      comparing each candidate with the previous candidate is equivalent
+    - Tool messages become {"timestamp", "sender": "Bot", "type": "tool", "tool"} entries
+    With serialization options the same entries are written in the compact layout
+    (render_compact_json_conversations).
     
-    return conv_df
+    Args:
+        conversation_model: Model from build_conversation_model (or a select_conversations subset)
+        target_skills: Department bot + agent skills (target_skill_set of the compiled department config)
+        include_tool_messages: Write tool entries
+        serialization_options: SERIALIZATION_OPTIONS of the prompt (default: none, the standard JSON)
+    
+    Returns:
+        Dictionary: {conversation_id: JSON string}
+    """
+    arrays, offsets = get_model_arrays(
+        conversation_model, ['time_iso', 'text', 'sender', 'sender_lower', 'skill', 'message_type', 'tool_name']
+    )
+    message_type = arrays['message_type']
+    conversation_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    
+    skipped = np.isin(message_type, ['transfer', 'private message', 'tool response'])
+    is_tool = ~skipped & (message_type == 'tool')
+    
+    # Bot messages from non-target skills are shown as Agent_1
+    sender = np.where(
+        (arrays['sender_lower'] == 'bot') & ~np.isin(arrays['skill'], list(target_skills)), 'Agent_1', arrays['sender']
+    ).astype(object)
+    
+    # Empty normal messages become [Doc/Image]
+    text = np.where((arrays['text'] == "") & (message_type == 'normal message'), '[Doc/Image]', arrays['text']).astype(object)
+    
+    candidate = np.flatnonzero(~skipped & ~is_tool & (text != ""))
+    tool_positions = np.flatnonzero(is_tool) if include_tool_messages else np.empty(0, dtype=np.int64)
+    
+    # ISO timestamps are formatted once per frame by the model
+    timestamps = arrays['time_iso']
+    
+    # Consecutive-duplicate removal within each conversation
+    duplicate = np.zeros(len(candidate), dtype=bool)
+    if len(candidate) > 1:
+        current, previous = candidate[1:], candidate[:-1]
+        duplicate[1:] = (
+            (conversation_index[current] == conversation_index[previous])
+            & (timestamps[current] == timestamps[previous])
+            & (text[current] == text[previous])
+            & (sender[current] == sender[previous])
+            & (message_type[current] == message_type[previous])
+        )
+    message_positions = candidate[~duplicate]
+    
+    if serialization_options:
+        entry_positions = np.sort(np.concatenate([message_positions, tool_positions]), kind='stable')
+        return render_compact_json_conversations(
+            conversation_model, arrays, offsets, entry_positions, is_tool, sender, text, serialization_options
+        )
+    
+    encode = json.encoder.encode_basestring
+    entry_positions = [message_positions, tool_positions]
+    entries = [
+        '    {\n      "timestamp": ' + encode(timestamps[i])
+        + ',\n      "sender": ' + encode(sender[i])
+        + ',\n      "type": ' + encode(message_type[i])
+        + ',\n      "content": ' + encode(text[i]) + '\n    }'
+        for i in message_positions
+    ]
+    
+    # Tool names that are not strings (or null) go through json.dumps for their conversation
+    fallback_conversations = set()
+    for i in tool_positions:
+        tool_name = arrays['tool_name'][i]
+        if tool_name is None:
+            tool_value = 'null'
+        elif isinstance(tool_name, str):
+            tool_value = encode(tool_name)
+        else:
+            tool_value = 'null'
+            fallback_conversations.add(conversation_index[i])
+        entries.append(
+            '    {\n      "timestamp": ' + encode(timestamps[i])
+            + ',\n      "sender": "Bot",\n      "type": "tool",\n      "tool": ' + tool_value + '\n    }'
+        )
+    
+    # Back to message order, then cut per conversation
+    entry_positions = np.concatenate(entry_positions)
+    order = np.argsort(entry_positions, kind='stable')
+    entry_positions = entry_positions[order]
+    entries = [entries[i] for i in order]
+    bounds = np.searchsorted(entry_positions, offsets)
+    
+    rendered = {}
+    for k, (conv_id, conversation) in enumerate(conversation_model['conversations'].items()):
+        customer_name = get_json_customer_name(conversation)
+        conversation_id = str(conv_id)
+        
+        if k in fallback_conversations:
+            positions = entry_positions[bounds[k]:bounds[k + 1]]
+            messages = [
+                {"timestamp": timestamps[i], "sender": "Bot", "type": "tool", "tool": arrays['tool_name'][i]}
+                if is_tool[i] else
+                {"timestamp": timestamps[i], "sender": sender[i], "type": message_type[i], "content": text[i]}
+                for i in positions
+            ]
+            rendered[conv_id] = dump_conversation_json(customer_name, conversation_id, messages)
+            continue
+        
+        conversation_entries = entries[bounds[k]:bounds[k + 1]]
+        messages_json = ('[\n' + ',\n'.join(conversation_entries) + '\n  ]') if conversation_entries else '[]'
+        rendered[conv_id] = (
+            '{\n  "customer_name": ' + encode(customer_name)
+            + ',\n  "chat_id": ' + encode(conversation_id)
+            + ',\n  "conversation": ' + messages_json + '\n}'
+        )
+    
+    return rendered
 
 
-def convert_single_conversation_to_json(conv_df, department_name, include_tool_messages=True):
+def convert_single_conversation_to_json(conversation_model, conv_id, department_name, include_tool_messages=True,
+                                        serialization_options=()):
     """
-    Convert a single conversation DataFrame to JSON format - Snowflake version
-    Adapted from local convert_conversation_to_json() to work with DataFrames
+    Convert a single conversation to JSON format - Snowflake version
+    Adapted from local convert_conversation_to_json() to work with the conversation model
     
     Args:
-        conv_df: DataFrame containing messages for one conversation (using Snowflake column names)
+        conversation_model: Model from build_conversation_model containing the conversation
+        conv_id: Conversation ID to convert
         department_name: Department name for skill filtering
+        serialization_options: Compact serialization options of the prompt (default: none)
     
     Returns:
         JSON string representation of the conversation
     """
     # Get department configuration
-    departments_config = get_snowflake_llm_departments_config()
-    if department_name not in departments_config:
+    dept_config = get_department_config(department_name)
+    if dept_config is None:
         return None
     
-    dept_config = departments_config[department_name]
-    target_skills = dept_config['bot_skills'] + dept_config['agent_skills']
-    
-    # Preprocess the conversation
-    conv_df = preprocess_conversation_dataframe_json(conv_df)
+    target_skills = dept_config['target_skill_set']
     
-    if conv_df.empty:
+    if not is_json_convertible(conversation_model['conversations'][conv_id], target_skills):
         return None
     
-    # Check if conversation has required participants (bot and consumer)
-    participants = conv_df['SENT_BY'].str.lower().unique()
-    if not any(p == "bot" for p in participants) or not any(p == "consumer" for p in participants):
-        return None
-    
-    # Check if conversation has target skills
-    skills = conv_df['TARGET_SKILL_PER_MESSAGE'].unique()
-    if not any(skill in target_skills for skill in skills):
-        return None
-    
-    # Get conversation metadata
-    conversation_id = str(conv_df['CONVERSATION_ID'].iloc[0])
-    
-    # Handle customer name safely
-    customer_name = "Unknown"
-    if 'CUSTOMER_NAME' in conv_df.columns:
-        try:
-            first_customer = conv_df['CUSTOMER_NAME'].iloc[0]
-            if pd.notna(first_customer) and first_customer is not None:
-                customer_name = str(first_customer)
-        except (IndexError, KeyError):
-            pass
-    
-    # Create conversation object
-    conversation = {
-        "customer_name": customer_name,
-        "chat_id": conversation_id,
-        "conversation": []
-    }
-    
-    # Track last message details for duplicate detection
-    last_message_time = None
-    last_message_text = None
-    last_message_sender = None
-    last_message_type = None
-    
-    # Process each message
-    for _, row in conv_df.iterrows():
-        # Use Snowflake column names
-        current_time_raw = row['MESSAGE_SENT_TIME']
-        current_text = str(row['TEXT']) if pd.notna(row['TEXT']) else ""
-        current_sender = str(row['SENT_BY']) if pd.notna(row['SENT_BY']) else ""
-        current_skill = str(row['TARGET_SKILL_PER_MESSAGE']) if pd.notna(row['TARGET_SKILL_PER_MESSAGE']) else ""
-        current_type = str(row['MESSAGE_TYPE']).lower() if pd.notna(row['MESSAGE_TYPE']) else ""
-        
-        # Clean and convert timestamp
-        cleaned_time = clean_datetime_format_snowflake(current_time_raw)
-        try:
-            current_time = pd.to_datetime(cleaned_time, errors='coerce').isoformat()
-        except:
-            current_time = str(cleaned_time)
-        
-        # Skip certain message types
-        if current_type in ["transfer", "private message", "tool response"]:
-            continue
-        
-        # Handle bot messages not from target skills
-        if current_sender.lower() == "bot" and current_skill not in target_skills:
-            current_sender = "Agent_1"
-        
-        # Handle empty messages
-        if (current_text == "" or pd.isna(row['TEXT'])) and current_type == "normal message":
-            current_text = "[Doc/Image]"
-        
-        # Check for duplicate messages
-        is_duplicate = (current_time == last_message_time and 
-                       current_text == last_message_text and 
-                       current_sender == last_message_sender and 
-                       current_type == last_message_type)
-        
-        # Add tool message if it exists (check for Tools columns)
-        if current_type == "tool":
-            if include_tool_messages:
-                tool_creation_date = row.get('MESSAGE_SENT_TIME', current_time_raw)
-                try:
-                    tool_timestamp = pd.to_datetime(clean_datetime_format_snowflake(tool_creation_date), errors='coerce').isoformat()
-                except:
-                    tool_timestamp = str(tool_creation_date)
-
-                tool_name, tool_output = get_tool_name_and_response(conv_df, current_text)
-                
-                tool_message = {
-                    "timestamp": tool_timestamp,
-                    "sender": "Bot",
-                    "type": "tool",
-                    "tool": tool_name,
-                    # "result": tool_output
-                }
-                conversation["conversation"].append(tool_message)
-            continue
-        
-        # Add regular message if not duplicate and has content
-        if current_text and not is_duplicate:
-            message = {
-                "timestamp": current_time,
-                "sender": current_sender,
-                "type": current_type,
-                "content": current_text
-            }
-            conversation["conversation"].append(message)
-            
-            # Update last message details
-            last_message_time = current_time
-            last_message_text = current_text
-            last_message_sender = current_sender
-            last_message_type = current_type
-    
-    # Return JSON string
-    try:
-        return json.dumps(conversation, indent=2, ensure_ascii=False)
-    except Exception as e:
-        # Return a simplified version if JSON serialization fails
-        simplified_conversation = {
-            "customer_name": customer_name,
-            "chat_id": conversation_id,
-            "conversation": f"JSON_SERIALIZATION_ERROR: {str(e)}"
-        }
-        return json.dumps(simplified_conversation, indent=2, ensure_ascii=False)
+    return render_json_conversations(
+        select_conversations(conversation_model, [conv_id]), target_skills, include_tool_messages, serialization_options
+    )[conv_id]
 
 
-def convert_conversations_to_json_dataframe(filtered_df, department_name, include_tool_messages=True):
+def convert_conversations_to_json_dataframe(filtered_df, department_name, include_tool_messages=True, conversation_model=None,
+                                            serialization_options=()):
     """
     Convert filtered conversations DataFrame to JSON format for LLM analysis
     Following the same pattern as convert_conversations_to_xml_dataframe()
@@ -221,6 +308,10 @@ def convert_conversations_to_json_dataframe(filtered_df, department_name, includ
     Args:
         filtered_df: Filtered DataFrame from Phase 1 (using Snowflake column names)
         department_name: Department name for configuration
+        conversation_model: Optional prebuilt model of filtered_df (build_conversation_model);
+                            built here when not given
+        serialization_options: Compact serialization options of the prompt (resolve_serialization_options;
+                               default: none, the standard JSON)
     
     Returns:
         DataFrame with conversation JSON data ready for LLM processing
@@ -231,53 +322,58 @@ def convert_conversations_to_json_dataframe(filtered_df, department_name, includ
         print(f"    ⚠️  No filtered data for JSON conversion")
         return pd.DataFrame()
     
-    # Group by conversation ID
-    conversations = filtered_df.groupby('CONVERSATION_ID')
+    if conversation_model is None:
+        conversation_model = build_conversation_model(filtered_df, department_name)
     
     json_data = []
     successful_conversions = 0
     failed_conversions = 0
-
-    execution_id_map = get_execution_id_map(filtered_df, department_name)
     
-    for conv_id, conv_df in conversations:
-        # Convert single conversation to JSON
-        json_content = convert_single_conversation_to_json(conv_df, department_name, include_tool_messages)
+    # Conversation-level checks first, then render every kept conversation in one pass
+    dept_config = get_department_config(department_name)
+    rendered = {}
+    if dept_config is not None:
+        target_skills = dept_config['target_skill_set']
+        kept_ids = [
+            conv_id for conv_id, conversation in conversation_model['conversations'].items()
+            if is_json_convertible(conversation, target_skills)
+        ]
+        if kept_ids:
+            rendered = render_json_conversations(
+                select_conversations(conversation_model, kept_ids), target_skills, include_tool_messages, serialization_options
+            )
+    
+    for conv_id, conversation in conversation_model['conversations'].items():
+        json_content = rendered.get(conv_id)
         
         if json_content:
+            metadata = conversation['metadata']
+            
             # Extract metadata for the result DataFrame - with safe handling for optional columns
             customer_name = "Unknown"
-            if 'CUSTOMER_NAME' in conv_df.columns:
-                try:
-                    first_customer = conv_df['CUSTOMER_NAME'].iloc[0]
-                    if pd.notna(first_customer) and first_customer is not None:
-                        customer_name = str(first_customer)
-                except (IndexError, KeyError):
-                    pass
+            if 'CUSTOMER_NAME' in conversation_model['columns']:
+                first_customer = get_first_value(metadata['CUSTOMER_NAME'])
+                if pd.notna(first_customer) and first_customer is not None:
+                    customer_name = str(first_customer)
             
             # Handle agent names safely - column might not exist or contain None values
             agent_names = ""
-            if 'AGENT_NAME' in conv_df.columns:
-                try:
-                    agent_rows = conv_df[conv_df['SENT_BY'].str.upper() == 'AGENT']
-                    if not agent_rows.empty:
-                        agent_names_list = agent_rows['AGENT_NAME'].unique()
-                        # Filter out None/NaN values and convert to strings
-                        agent_names_list = [str(name) for name in agent_names_list 
-                                          if pd.notna(name) and name is not None and str(name).strip() != 'nan']
-                        agent_names = ", ".join(agent_names_list)
-                except (KeyError, AttributeError):
-                    pass
+            if 'AGENT_NAME' in conversation_model['columns']:
+                agent_names_list = list(dict.fromkeys(
+                    name for sender, name in zip(metadata['SENT_BY'], metadata['AGENT_NAME'])
+                    if str(sender).upper() == 'AGENT'
+                ))
+                # Filter out None/NaN values and convert to strings
+                agent_names_list = [str(name) for name in agent_names_list 
+                                  if pd.notna(name) and name is not None and str(name).strip() != 'nan']
+                agent_names = ", ".join(agent_names_list)
             
             # Handle last skill safely
             last_skill = ""
-            if 'TARGET_SKILL_PER_MESSAGE' in conv_df.columns and not conv_df.empty:
-                try:
-                    skills = conv_df['TARGET_SKILL_PER_MESSAGE'].dropna()
-                    if not skills.empty:
-                        last_skill = str(skills.iloc[-1])
-                except (IndexError, KeyError):
-                    pass
+            if 'TARGET_SKILL_PER_MESSAGE' in conversation_model['columns']:
+                last_target_skill = get_last_non_null(metadata['TARGET_SKILL_PER_MESSAGE'])
+                if last_target_skill is not None:
+                    last_skill = str(last_target_skill)
             
             json_record = {
                 'conversation_id': conv_id,
@@ -285,10 +381,10 @@ def convert_conversations_to_json_dataframe(filtered_df, department_name, includ
                 'agent_names': agent_names,
                 'last_skill': last_skill,
                 'content_json_view': json_content,  # The JSON string for LLM processing
-                'message_count': len(conv_df),
+                'message_count': conversation['message_count'],
                 'conversion_status': 'SUCCESS',
-                'execution_id': execution_id_map.get(conv_id, ''),
-                'shadowed_by': conv_df['SHADOWED_BY'].iloc[0],
+                'execution_id': conversation['execution_id'],
+                'shadowed_by': get_first_value(metadata['SHADOWED_BY']),
             }
             
             json_data.append(json_record)
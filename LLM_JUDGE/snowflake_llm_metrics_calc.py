@@ -6,6 +6,7 @@ from datetime import datetime
 import json
 import re
 import pandas as pd
+from snowflake_query_builder import build_date_range_predicate
  
 
 def get_tools_called(conversation_content):
@@ -110,7 +111,7 @@ def generate_mv_resolvers_wrong_tool_summary_report(session: snowpark.Session, d
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.WRONG_TOOL_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'mv_resolvers_wrong_tool'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -295,7 +296,7 @@ def generate_mv_resolvers_missing_tool_summary_report(session: snowpark.Session,
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.MISSING_TOOL_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'mv_resolvers_missing_tool'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -565,7 +566,7 @@ def generate_tool_summary_report(session: snowpark.Session, department_name: str
             PROCESSING_STATUS,
             CONVERSATION_CONTENT
         FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROCESSING_STATUS = 'COMPLETED'
           AND LLM_RESPONSE IS NOT NULL
@@ -736,7 +737,7 @@ def generate_at_filipina_tool_summary_report(session: snowpark.Session, departme
             PROCESSING_STATUS,
             CONVERSATION_CONTENT
         FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROCESSING_STATUS = 'COMPLETED'
           AND LLM_RESPONSE IS NOT NULL
@@ -1064,7 +1065,7 @@ def calculate_weighted_nps_per_department(session: snowpark.Session, department_
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.SA_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'SA_prompt'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1170,7 +1171,7 @@ def calculate_call_request_metrics(session: snowpark.Session, department_name: s
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.CALL_REQUEST_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'call_request'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1310,7 +1311,7 @@ def calculate_legal_metrics(session: snowpark.Session, department_name: str, tar
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.LEGAL_ALIGNMENT_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'legal_alignment'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1433,7 +1434,7 @@ def calculate_client_suspecting_ai_percentage(session: snowpark.Session, departm
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.CLIENT_SUSPECTING_AI_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'client_suspecting_ai'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1643,7 +1644,7 @@ def calculate_false_promises_percentage(session: snowpark.Session, department_na
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.FALSE_PROMISES_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'false_promises'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1765,7 +1766,7 @@ def analyze_categorizing_data_snowflake(session: snowpark.Session, department_na
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.CATEGORIZING_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND (PROMPT_TYPE = 'categorizing' OR PROMPT_TYPE = 'intervention')
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1872,7 +1873,7 @@ def calculate_ftr_percentage(session: snowpark.Session, department_name: str, ta
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.FTR_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'ftr'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -1997,7 +1998,7 @@ def calculate_misprescription_percentage(session: snowpark.Session, department_n
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.DOCTORS_MISPRESCRIPTION_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'misprescription'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -2102,7 +2103,7 @@ def calculate_unnecessary_clinic_percentage(session: snowpark.Session, departmen
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.DOCTORS_UNNECESSARY_CLINIC_RAW_DATA
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'unnecessary_clinic'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -2207,7 +2208,7 @@ def calculate_clarity_score_percentage(session: snowpark.Session, department_nam
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.CLARITY_SCORE_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'clarity_score'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -2327,7 +2328,7 @@ def calculate_threatening_percentage(session: snowpark.Session, department_name:
             PROCESSING_STATUS,
             CONVERSATION_ID
         FROM LLM_EVAL.PUBLIC.THREATENING_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'threatening'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -2439,7 +2440,7 @@ def calculate_policy_escalation_percentage(session: snowpark.Session, department
             PROCESSING_STATUS,
             CONVERSATION_ID
         FROM LLM_EVAL.PUBLIC.POLICY_ESCALATION_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'policy_escalation'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -2560,7 +2561,7 @@ def calculate_transer_escalation_percentage(session: snowpark.Session, departmen
             PROCESSING_STATUS,
             CONVERSATION_ID
         FROM LLM_EVAL.PUBLIC.TRANSFER_ESCALATION_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'sales_transfer_escalation'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -2672,7 +2673,7 @@ def calculate_transer_known_flow_percentage(session: snowpark.Session, departmen
             PROCESSING_STATUS,
             CONVERSATION_ID
         FROM LLM_EVAL.PUBLIC.TRANSFER_KNOWN_FLOW_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'sales_transfer_known_flow'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -2796,7 +2797,7 @@ def calculate_cc_sales_policy_violation_metrics(session: snowpark.Session, depar
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'policy_violation'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -2893,7 +2894,7 @@ def calculate_unclear_policy_metrics(session: snowpark.Session, department_name:
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.UNCLEAR_POLICY_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'unclear_policy'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -2986,7 +2987,7 @@ def analyze_doctors_categorizing_data_snowflake(session: snowpark.Session, depar
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.DOCTORS_CATEGORIZING_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'doctors_categorizing'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -3360,8 +3361,8 @@ def create_system_prompt_token_summary_report(session: snowpark.Session, departm
     print(f"📊 Creating system prompt token summary report for {department_name} on {target_date}...")
     try:
         # Fetch department's GPT agent name to disambiguate prompt mapping
-        from snowflake_llm_config import get_snowflake_llm_departments_config
-        departments_config = get_snowflake_llm_departments_config()
+        from snowflake_llm_config import get_compiled_departments_config
+        departments_config = get_compiled_departments_config()
         llm_prompts = departments_config.get(department_name, {}).get('llm_prompts', {})
         if 'policy_escalation' in llm_prompts:
             table_name = llm_prompts['policy_escalation'].get('table_name', 'POLICY_ESCALATION_RAW_DATA')
@@ -3379,7 +3380,7 @@ def create_system_prompt_token_summary_report(session: snowpark.Session, departm
         WITH candidates AS (
             SELECT DISTINCT CONVERSATION_ID, EXECUTION_ID
             FROM LLM_EVAL.PUBLIC.{table_name}
-            WHERE DATE(DATE) = DATE('{target_date}')
+            WHERE {build_date_range_predicate('DATE', target_date)}
               AND DEPARTMENT = '{department_name}'
               AND PROMPT_TYPE = '{prompt_type}'
               AND PROCESSING_STATUS = 'COMPLETED'
@@ -3474,7 +3475,7 @@ def create_loss_interest_summary_report(session: snowpark.Session, department_na
             PROCESSING_STATUS,
             LAST_SKILL
         FROM LLM_EVAL.PUBLIC.LOSS_INTEREST_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'loss_interest'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -3608,7 +3609,7 @@ def create_clinic_reasons_summary_report(session: snowpark.Session, department_n
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.CLINIC_RECOMMENDATION_REASON_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         AND DEPARTMENT = '{department_name}'
         AND PROMPT_TYPE = 'clinic_recommendation_reason'
         AND PROCESSING_STATUS = 'COMPLETED'
@@ -3909,8 +3910,8 @@ def calculate_policy_violation_metrics(session: snowpark.Session, department_nam
 
     try:
         # Resolve table from departments config if available
-        from snowflake_llm_config import get_snowflake_llm_departments_config
-        departments_config = get_snowflake_llm_departments_config()
+        from snowflake_llm_config import get_compiled_departments_config
+        departments_config = get_compiled_departments_config()
         llm_prompts = departments_config.get(department_name, {}).get('llm_prompts', {})
         if 'policy_violation' in llm_prompts:
             table_name = llm_prompts['policy_violation'].get('table_name', 'POLICY_VIOLATION_RAW_DATA')
@@ -3924,7 +3925,7 @@ def calculate_policy_violation_metrics(session: snowpark.Session, department_nam
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.{table_name}
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'policy_violation'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -4104,7 +4105,7 @@ def calculate_missing_policy_metrics(session: snowpark.Session, department_name:
             LLM_RESPONSE,
             PROCESSING_STATUS
         FROM LLM_EVAL.PUBLIC.MISSING_POLICY_RAW_DATA 
-        WHERE DATE(DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
           AND DEPARTMENT = '{department_name}'
           AND PROMPT_TYPE = 'missing_policy'
           AND PROCESSING_STATUS = 'COMPLETED'
@@ -4191,8 +4192,8 @@ def create_shadowing_automation_summary_report(session: snowpark.Session, depart
     """
     print(f"📊 Creating SHADOWING_AUTOMATION_SUMMARY for {department_name} on {target_date}...")
     try:
-        from snowflake_llm_config import get_snowflake_llm_departments_config
-        departments_config = get_snowflake_llm_departments_config()
+        from snowflake_llm_config import get_compiled_departments_config
+        departments_config = get_compiled_departments_config()
         agent_names = get_department_agent_names_snowflake(session, department_name, departments_config)
         if not agent_names:
             print(f"   ⚠️  No agents found for {department_name}; skipping")
@@ -4213,7 +4214,7 @@ def create_shadowing_automation_summary_report(session: snowpark.Session, depart
             CREATION_DATE,
             "What happened and what should have been done ?" AS ISSUE_DESCRIPTION,
         FROM LLM_EVAL.RAW_DATA.CHATCC_REPORTED_ISSUES
-        WHERE DATE(CREATION_DATE) = DATE('{target_date}')
+        WHERE {build_date_range_predicate('CREATION_DATE', target_date)}
           AND UPPER(TRIM(REPORTER)) IN ({agent_list})
         ORDER BY CREATION_DATE ASC, ISSUE_ID ASC
         """
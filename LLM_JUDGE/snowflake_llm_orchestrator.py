@@ -8,20 +8,23 @@ import snowflake.snowpark as snowpark
 from datetime import datetime, timedelta
 import traceback
 from snowflake_llm_config import (
-    get_snowflake_llm_departments_config, 
+    get_compiled_departments_config, 
     list_all_departments, 
     get_department_prompt_types,
     list_all_output_tables
 )
 from snowflake_llm_processor import (
     process_department_llm_analysis,
+    load_shared_phase1_results,
     update_llm_master_summary,
     test_llm_single_prompt,
     format_error_details
 )
+from LLM_JUDGE.clean_chats_phase2_core_analytics import get_phase1_memory_budget_mb
 
 
-def analyze_llm_conversations_all_departments(session: snowpark.Session, target_date=None, department_filter=None):
+def analyze_llm_conversations_all_departments(session: snowpark.Session, target_date=None, department_filter=None, memory_budget_mb=None,
+                                              llm_concurrency=None):
     """
     Analyze LLM conversations for all departments - main orchestrator function
     
@@ -29,6 +32,10 @@ def analyze_llm_conversations_all_departments(session: snowpark.Session, target_
         session: Snowflake session
         target_date: Target date for analysis (defaults to yesterday)
         department_filter: Optional specific department to process (for testing)
+        memory_budget_mb: Optional per-department memory budget (MB); departments over it are
+                          processed in CONVERSATION_ID shards (LLM_JUDGE_MEMORY_BUDGET_MB is the default)
+        llm_concurrency: Optional LLM batch queries in flight per department; >1 opts in to concurrent
+                         prompt jobs (LLM_JUDGE_LLM_CONCURRENCY is the default, otherwise 1)
     
     Returns:
         Analysis results dictionary
@@ -47,7 +54,7 @@ def analyze_llm_conversations_all_departments(session: snowpark.Session, target_
     
     print("=" * 60)
     
-    departments_config = get_snowflake_llm_departments_config()
+    departments_config = get_compiled_departments_config()
     department_results = {}
     
     # Get list of departments to process
@@ -57,6 +64,19 @@ def analyze_llm_conversations_all_departments(session: snowpark.Session, target_
     processed_departments = 0
     successful_departments = 0
     
+    # Departments reading the same source table (AT_* → APPLICANTS_CHATS) share one Phase 1 scan.
+    # Skipped under a memory budget: the shared load holds the whole table's day in memory
+    memory_budget_mb = get_phase1_memory_budget_mb(memory_budget_mb)
+    try:
+        if memory_budget_mb is None:
+            shared_phase1_results = load_shared_phase1_results(session, departments_to_process, target_date)
+        else:
+            print(f"💾 Memory budget {memory_budget_mb:.0f} MB: loading departments individually")
+            shared_phase1_results = {}
+    except Exception as e:
+        print(f"⚠️  Shared-table Phase 1 load failed, falling back to per-department loads: {str(e)}")
+        shared_phase1_results = {}
+    
     for department_name in departments_to_process:
         if department_name not in departments_config:
             print(f"⚠️  Department {department_name} not found in configuration")
@@ -65,7 +85,8 @@ def analyze_llm_conversations_all_departments(session: snowpark.Session, target_
         try:
             # Process department (includes all its prompts)
             dept_results, success = process_department_llm_analysis(
-                session, department_name, target_date
+                session, department_name, target_date, phase1_result=shared_phase1_results.get(department_name),
+                memory_budget_mb=memory_budget_mb, llm_concurrency=llm_concurrency
             )
             
             department_results[department_name] = dept_results
@@ -144,7 +165,8 @@ def analyze_llm_conversations_all_departments(session: snowpark.Session, target_
     }
 
 
-def analyze_llm_single_department(session: snowpark.Session, department_name, target_date=None, prompts=['*'], metrics=['*']):
+def analyze_llm_single_department(session: snowpark.Session, department_name, target_date=None, prompts=['*'], metrics=['*'],
+                                  memory_budget_mb=None, llm_concurrency=None):
     """
     Analyze LLM conversations for a single department
     
@@ -152,6 +174,8 @@ def analyze_llm_single_department(session: snowpark.Session, department_name, ta
         session: Snowflake session
         department_name: Department name to process
         target_date: Target date for analysis
+        memory_budget_mb: Optional memory budget (MB) for sharded processing (see process_department_llm_analysis)
+        llm_concurrency: Optional LLM batch queries in flight (see process_department_llm_analysis)
     
     Returns:
         Single department analysis results
@@ -168,7 +192,9 @@ def analyze_llm_single_department(session: snowpark.Session, department_name, ta
     
     try:
         # Process the department
-        dept_results, success = process_department_llm_analysis(session, department_name, target_date, selected_prompts=prompts)
+        dept_results, success = process_department_llm_analysis(session, department_name, target_date, selected_prompts=prompts,
+                                                               memory_budget_mb=memory_budget_mb,
+                                                               llm_concurrency=llm_concurrency)
         
         if success:
             # Update master summary for this department only
@@ -262,7 +288,7 @@ def run_llm_test_suite(session: snowpark.Session, target_date=None):
     try:
         # Test 1: Configuration validation
         print("\n🔧 Testing Configuration...")
-        departments_config = get_snowflake_llm_departments_config()
+        departments_config = get_compiled_departments_config()
         departments = list_all_departments()
         output_tables = list_all_output_tables()
         
@@ -389,7 +415,7 @@ def validate_llm_dependencies(session: snowpark.Session):
         # Test 2: Configuration validation
         print("\n📋 Testing configuration...")
         try:
-            config = get_snowflake_llm_departments_config()
+            config = get_compiled_departments_config()
             departments = list_all_departments()
             validation_results['configuration'] = {
                 'valid': True,
@@ -0,0 +1,183 @@
+"""
+Parallel Conversion Module for Snowflake LLM Analysis
+Runs XML / JSON / segment conversion of a Phase 1 frame in a process pool
+Conversations are split into size-balanced shards (longest conversations scheduled first),
+shards travel to the workers as Arrow IPC buffers and results are merged back in the
+order the single-process converters produce
+"""
+
+import io
+import os
+import contextlib
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa
+except ImportError:  # Parallel conversion falls back to a single process without pyarrow
+    pa = None
+
+from snowflake_llm_conversation_model import REQUIRED_MODEL_COLUMNS
+from snowflake_llm_helpers import plan_conversion_shards
+
+# Conversion types that are independent per conversation (XML3D groups conversations by customer)
+PARALLEL_CONVERSION_TYPES = ('xml', 'json', 'segment')
+
+DEFAULT_CONVERSION_WORKERS = 1
+DEFAULT_PARALLEL_MIN_ROWS = 200000
+
+# Shards per worker: more shards than workers lets the pool even out the remaining skew
+SHARDS_PER_WORKER = 4
+
+
+def get_conversion_workers():
+    """
+    Worker processes for conversion (LLM_JUDGE_CONVERSION_WORKERS; 1 keeps conversion in-process).
+    """
+    return max(1, int(os.environ.get('LLM_JUDGE_CONVERSION_WORKERS', DEFAULT_CONVERSION_WORKERS)))
+
+
+def get_parallel_min_rows():
+    """
+    Smallest frame worth the process pool overhead (LLM_JUDGE_PARALLEL_MIN_ROWS overrides the default).
+    """
+    return int(os.environ.get('LLM_JUDGE_PARALLEL_MIN_ROWS', DEFAULT_PARALLEL_MIN_ROWS))
+
+
+def should_convert_in_parallel(filtered_df, conversion_type, max_workers=None):
+    """
+    Parallel conversion needs pyarrow, more than one worker, a per-conversation format,
+    the model's required columns and a frame of at least get_parallel_min_rows() rows.
+    """
+    workers = max_workers if max_workers is not None else get_conversion_workers()
+    return (
+        pa is not None
+        and workers > 1
+        and conversion_type in PARALLEL_CONVERSION_TYPES
+        and all(col in filtered_df.columns for col in REQUIRED_MODEL_COLUMNS)
+        and len(filtered_df) >= get_parallel_min_rows()
+    )
+
+
+def frame_to_arrow_buffer(dataframe):
+    """
+    Serialize a frame to an Arrow IPC stream buffer (pandas metadata keeps index and categoricals).
+    """
+    table = pa.Table.from_pandas(dataframe, preserve_index=True)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def arrow_buffer_to_frame(buffer):
+    """
+    Read a frame written by frame_to_arrow_buffer.
+    """
+    return pa.ipc.open_stream(pa.py_buffer(buffer)).read_all().to_pandas()
+
+
+def run_conversion(filtered_df, department_name, conversion_type, conversation_model=None, serialization_options=()):
+    """
+    Run the single-process converter of one conversion type
+    (serialization_options apply to XML and JSON; segments have a single layout).
+    """
+    if conversion_type == 'xml':
+        from snowflake_llm_xml_converter import convert_conversations_to_xml_dataframe
+        return convert_conversations_to_xml_dataframe(filtered_df, department_name, conversation_model=conversation_model,
+                                                      serialization_options=serialization_options)
+    if conversion_type == 'json':
+        from snowflake_llm_json_converter import convert_conversations_to_json_dataframe
+        return convert_conversations_to_json_dataframe(filtered_df, department_name, conversation_model=conversation_model,
+                                                       serialization_options=serialization_options)
+    if conversion_type == 'segment':
+        from snowflake_llm_segment_converter import convert_conversations_to_segment_dataframe
+        return convert_conversations_to_segment_dataframe(filtered_df, department_name, conversation_model=conversation_model)
+    raise ValueError(f"Conversion type {conversion_type} cannot run in parallel")
+
+
+def convert_shard(buffer, department_name, conversion_type, serialization_options=()):
+    """
+    Worker entry point: convert one Arrow-encoded shard.
+
+    Returns:
+        Tuple (converted DataFrame, captured log text)
+    """
+    log = io.StringIO()
+    with contextlib.redirect_stdout(log):
+        shard_df = arrow_buffer_to_frame(buffer)
+        converted_df = run_conversion(shard_df, department_name, conversion_type, serialization_options=serialization_options)
+    return converted_df, log.getvalue()
+
+
+def convert_conversations_parallel(filtered_df, department_name, conversion_type, max_workers=None, shard_count=None,
+                                   serialization_options=()):
+    """
+    Convert a Phase 1 frame to XML, JSON or segment records in a process pool.
+
+    Rows of each shard keep their frame order, so per-conversation results match the
+    single-process converters. String nulls come back from Arrow as None, as on Phase 1 cache hits.
+    Falls back to the single-process converter when the frame cannot be encoded or the pool fails.
+
+    Args:
+        filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
+        department_name: Department name
+        conversion_type: 'xml', 'json' or 'segment'
+        max_workers: Worker processes (default get_conversion_workers())
+        shard_count: Number of shards (default SHARDS_PER_WORKER per worker)
+        serialization_options: Compact serialization options of the prompt (default: none)
+
+    Returns:
+        Converted DataFrame, rows in CONVERSATION_ID order as produced by the single-process converter
+    """
+    workers = max_workers if max_workers is not None else get_conversion_workers()
+    if shard_count is None:
+        shard_count = workers * SHARDS_PER_WORKER
+
+    conversation_positions = {
+        conv_id: positions for conv_id, positions in filtered_df.groupby('CONVERSATION_ID', sort=True).indices.items()
+        if len(positions)
+    }
+    if not conversation_positions:
+        return run_conversion(filtered_df, department_name, conversion_type, serialization_options=serialization_options)
+
+    shards = plan_conversion_shards(
+        {conv_id: len(positions) for conv_id, positions in conversation_positions.items()}, shard_count
+    )
+    print(f"    ⚡ Parallel {conversion_type} conversion: {len(conversation_positions)} conversations in {len(shards)} shards on {workers} workers")
+
+    try:
+        buffers = []
+        for shard in shards:
+            positions = np.sort(np.concatenate([conversation_positions[conv_id] for conv_id in shard['conversation_ids']]))
+            buffers.append(frame_to_arrow_buffer(filtered_df.iloc[positions]))
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        print(f"    ⚠️  Could not encode shards for parallel conversion ({str(e)}), converting in-process")
+        return run_conversion(filtered_df, department_name, conversion_type, serialization_options=serialization_options)
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(convert_shard, buffer, department_name, conversion_type, serialization_options) for buffer in buffers]
+            results = [future.result() for future in futures]
+    except Exception as e:
+        print(f"    ⚠️  Parallel conversion failed ({str(e)}), converting in-process")
+        return run_conversion(filtered_df, department_name, conversion_type, serialization_options=serialization_options)
+
+    for shard_index, (_, log) in enumerate(results):
+        print(f"    ── Shard {shard_index + 1}/{len(shards)} ({shards[shard_index]['messages']} messages) ──")
+        print(log, end='')
+
+    converted_frames = [converted_df for converted_df, _ in results if not converted_df.empty]
+    if not converted_frames:
+        return results[0][0]
+
+    # Deterministic merge: conversation order of the single-process converter (sorted CONVERSATION_ID),
+    # rows of one conversation (e.g. its BOT segments) keep their shard order
+    conversation_rank = {str(conv_id): rank for rank, conv_id in enumerate(conversation_positions)}
+    merged_df = pd.concat(converted_frames, ignore_index=True)
+    order = merged_df['conversation_id'].map(conversation_rank).to_numpy()
+    merged_df = merged_df.iloc[order.argsort(kind='stable')].reset_index(drop=True)
+
+    print(f"    ✅ Parallel {conversion_type} conversion merged {len(merged_df)} rows from {len(shards)} shards")
+    return merged_df
@@ -0,0 +1,249 @@
+"""
+Phase 1 Cache Module for Snowflake LLM Analysis
+On-disk Parquet cache of preprocessed, filtered Phase 1 frames
+Entries are keyed by source table, date and a hash of the filter configuration, read back
+with memory-mapped Arrow reads and evicted least-recently-used once the cache grows too big
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Cache is disabled without pyarrow
+    pa = None
+    pq = None
+
+# Bump when the Phase 1 preprocessing/filtering logic changes so old entries stop matching
+PHASE1_CACHE_VERSION = 2
+
+DEFAULT_PHASE1_CACHE_DIR = os.path.join(tempfile.gettempdir(), 'llm_judge_phase1_cache')
+DEFAULT_PHASE1_CACHE_MAX_BYTES = 2 * 1024 ** 3
+
+
+def get_phase1_cache_dir():
+    """
+    Cache directory (LLM_JUDGE_PHASE1_CACHE_DIR overrides the temp-dir default).
+    """
+    return os.environ.get('LLM_JUDGE_PHASE1_CACHE_DIR', DEFAULT_PHASE1_CACHE_DIR)
+
+
+def get_phase1_cache_max_bytes():
+    """
+    Size limit used for LRU eviction (LLM_JUDGE_PHASE1_CACHE_MAX_BYTES overrides the 2 GB default).
+    """
+    return int(os.environ.get('LLM_JUDGE_PHASE1_CACHE_MAX_BYTES', DEFAULT_PHASE1_CACHE_MAX_BYTES))
+
+
+def is_phase1_cache_enabled():
+    """
+    The cache needs pyarrow and can be switched off with LLM_JUDGE_PHASE1_CACHE=0.
+    """
+    return pq is not None and os.environ.get('LLM_JUDGE_PHASE1_CACHE', '1') != '0'
+
+
+def is_closed_update_date(update_date):
+    """
+    Only days that have fully closed (UPDATED_AT date before today) are safe to cache.
+    """
+    return datetime.strptime(update_date, '%Y-%m-%d').date() < datetime.now().date()
+
+
+def hash_phase1_config(config):
+    """
+    Stable sha256 of a JSON-serializable filter configuration.
+    """
+    payload = json.dumps({'version': PHASE1_CACHE_VERSION, 'config': config}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def build_phase1_cache_key(table_name, date, config_hash, namespace='single'):
+    """
+    Build the cache entry name for one (table, date, filter config) combination.
+
+    Args:
+        table_name: Source table, e.g. LLM_EVAL.RAW_DATA.MV_CLIENT_CHATS
+        date: Processing date (YYYY-MM-DD)
+        config_hash: hash_phase1_config() of the department/filter settings
+        namespace: Kind of entry ('single' for process_department_phase1, 'multi_day' for per-day XML3D frames)
+
+    Returns:
+        File-name-safe cache key
+    """
+    table_part = table_name.replace('.', '_').upper()
+    return f"{namespace}__{table_part}__{date}__{config_hash[:16]}"
+
+
+def _entry_paths(cache_key):
+    cache_dir = get_phase1_cache_dir()
+    return os.path.join(cache_dir, f"{cache_key}.parquet"), os.path.join(cache_dir, f"{cache_key}.json")
+
+
+def read_phase1_cache(cache_key):
+    """
+    Read a cached Phase 1 frame and its statistics.
+
+    Returns:
+        Tuple (DataFrame, stats) on a hit, None on a miss or unreadable entry
+    """
+    if not is_phase1_cache_enabled():
+        return None
+
+    data_path, meta_path = _entry_paths(cache_key)
+    if not (os.path.exists(data_path) and os.path.exists(meta_path)):
+        return None
+
+    try:
+        with open(meta_path, 'r') as meta_file:
+            meta = json.load(meta_file)
+        cached_df = pq.read_table(data_path, memory_map=True).to_pandas()
+
+        # Touch both files so LRU eviction sees the entry as recently used
+        now = time.time()
+        os.utime(data_path, (now, now))
+        os.utime(meta_path, (now, now))
+
+        return cached_df, meta.get('stats', {})
+    except Exception as e:
+        print(f"    ⚠️  Ignoring unreadable Phase 1 cache entry {cache_key}: {str(e)}")
+        return None
+
+
+def write_phase1_cache(cache_key, dataframe, stats, meta=None):
+    """
+    Write a Phase 1 frame and its statistics, then apply LRU eviction.
+    Writes go to temporary files first so a crash never leaves a half-written entry.
+
+    Args:
+        cache_key: Key from build_phase1_cache_key
+        dataframe: Preprocessed, filtered frame
+        stats: JSON-serializable statistics returned alongside the frame
+        meta: Extra lookup fields (table_name, date, department) used by invalidate_phase1_cache
+
+    Returns:
+        True if the entry was written
+    """
+    if not is_phase1_cache_enabled():
+        return False
+
+    data_path, meta_path = _entry_paths(cache_key)
+    try:
+        os.makedirs(get_phase1_cache_dir(), exist_ok=True)
+
+        table = pa.Table.from_pandas(dataframe, preserve_index=True)
+        pq.write_table(table, data_path + '.tmp')
+        with open(meta_path + '.tmp', 'w') as meta_file:
+            json.dump({**(meta or {}), 'cache_key': cache_key, 'stats': stats}, meta_file, default=str)
+
+        os.replace(data_path + '.tmp', data_path)
+        os.replace(meta_path + '.tmp', meta_path)
+    except Exception as e:
+        print(f"    ⚠️  Could not write Phase 1 cache entry {cache_key}: {str(e)}")
+        for path in (data_path + '.tmp', meta_path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+        return False
+
+    evict_phase1_cache()
+    return True
+
+
+def _list_entries():
+    """
+    List cache entries as dicts with key, paths, size and last-used time.
+    """
+    cache_dir = get_phase1_cache_dir()
+    if not os.path.isdir(cache_dir):
+        return []
+
+    entries = []
+    for file_name in os.listdir(cache_dir):
+        if not file_name.endswith('.parquet'):
+            continue
+        cache_key = file_name[:-len('.parquet')]
+        data_path, meta_path = _entry_paths(cache_key)
+        try:
+            size = os.path.getsize(data_path) + (os.path.getsize(meta_path) if os.path.exists(meta_path) else 0)
+            entries.append({
+                'cache_key': cache_key,
+                'data_path': data_path,
+                'meta_path': meta_path,
+                'size': size,
+                'last_used': os.path.getmtime(data_path)
+            })
+        except OSError:
+            continue
+    return entries
+
+
+def _remove_entry(entry):
+    for path in (entry['data_path'], entry['meta_path']):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def evict_phase1_cache(max_bytes=None):
+    """
+    Remove least-recently-used entries until the cache fits in max_bytes.
+
+    Returns:
+        Number of entries removed
+    """
+    if max_bytes is None:
+        max_bytes = get_phase1_cache_max_bytes()
+
+    entries = sorted(_list_entries(), key=lambda entry: entry['last_used'])
+    total_size = sum(entry['size'] for entry in entries)
+
+    removed = 0
+    for entry in entries:
+        if total_size <= max_bytes:
+            break
+        _remove_entry(entry)
+        total_size -= entry['size']
+        removed += 1
+
+    if removed:
+        print(f"    🧹 Evicted {removed} Phase 1 cache entries (LRU)")
+    return removed
+
+
+def invalidate_phase1_cache(table_name=None, date=None, department=None):
+    """
+    Explicitly drop cache entries. With no arguments the whole cache is cleared.
+
+    Args:
+        table_name: Only drop entries for this source table
+        date: Only drop entries for this processing date (YYYY-MM-DD)
+        department: Only drop entries for this department
+
+    Returns:
+        Number of entries removed
+    """
+    removed = 0
+    for entry in _list_entries():
+        meta = {}
+        if os.path.exists(entry['meta_path']):
+            try:
+                with open(entry['meta_path'], 'r') as meta_file:
+                    meta = json.load(meta_file)
+            except Exception:
+                meta = {}
+
+        if table_name is not None and meta.get('table_name') != table_name:
+            continue
+        if date is not None and meta.get('date') != date:
+            continue
+        if department is not None and meta.get('department') != department:
+            continue
+
+        _remove_entry(entry)
+        removed += 1
+
+    print(f"🧹 Invalidated {removed} Phase 1 cache entries")
+    return removed
@@ -8,10 +8,42 @@ import pandas as pd
 from datetime import datetime
 import json
 import traceback
-from snowflake_llm_config import get_snowflake_llm_departments_config, get_prompt_config, get_metrics_configuration, get_department_summary_schema, get_snowflake_base_departments_config
+from snowflake_llm_config import get_compiled_departments_config, get_department_config, get_prompt_config, get_metrics_configuration, get_department_summary_schema, compute_config_hash, is_per_skill_prompt
 from snowflake_llm_xml_converter import convert_conversations_to_xml_dataframe, validate_xml_conversion
-from LLM_JUDGE.clean_chats_phase2_core_analytics import process_department_phase1, process_department_phase1_multi_day
+from snowflake_llm_conversation_model import build_conversation_model, select_conversations
+from snowflake_llm_parallel import should_convert_in_parallel, convert_conversations_parallel, run_conversion
+from snowflake_llm_conversion_cache import convert_with_conversion_cache, summarize_conversion_cache_stats
+from snowflake_llm_batch_planner import (
+    fetch_pending_llm_sizes,
+    plan_llm_batches,
+    get_temp_table_name,
+    write_llm_batch_plan,
+    build_batch_filter
+)
+from snowflake_llm_async_jobs import get_llm_concurrency, iter_async_query_results
+from snowflake_llm_retry import get_llm_max_attempts, run_llm_retries
+from snowflake_llm_response_cache import (
+    is_response_cache_enabled,
+    get_prompt_version,
+    ensure_response_cache_table,
+    build_cached_batch_query,
+    store_llm_responses,
+    summarize_batch_cache_results,
+    summarize_response_cache_stats
+)
+from LLM_JUDGE.clean_chats_phase2_core_analytics import (
+    process_department_phase1,
+    process_department_phase1_multi_day,
+    process_shared_table_phase1,
+    get_shared_source_tables,
+    get_phase1_memory_budget_mb,
+    estimate_phase1_shard_count
+)
 from snowflake_llm_metrics_calc import *
+from snowflake_query_builder import build_date_range_predicate
+
+# Identity of a prompt output row for idempotent writes (merge_llm_raw_data)
+LLM_RAW_KEY_COLUMNS = ['CONVERSATION_ID', 'SEGMENT_ID', 'DATE', 'DEPARTMENT', 'PROMPT_TYPE']
 
 
 def get_table_columns(session: snowpark.Session, table_name: str) -> list:
@@ -34,7 +66,7 @@ def should_use_full_insert(session: snowpark.Session, table_name: str, dynamic_c
 
 def summary_row_exists(session: snowpark.Session, table_name: str, department: str, target_date: str) -> bool:
     try:
-        q = f"SELECT 1 FROM {table_name} WHERE DATE='{target_date}' AND DEPARTMENT='{department}' LIMIT 1"
+        q = f"SELECT 1 FROM {table_name} WHERE {build_date_range_predicate('DATE', target_date)} AND DEPARTMENT='{department}' LIMIT 1"
         return len(session.sql(q).collect()) > 0
     except Exception:
         return False
@@ -84,7 +116,7 @@ def insert_raw_data_partial(session: snowpark.Session, table_name: str, departme
                 else:
                     set_parts.append(f"{k} = {v}")
         set_clause = ", ".join(set_parts)
-        sql = f"UPDATE {table_name} SET {set_clause} WHERE DATE='{target_date}' AND DEPARTMENT='{department}'"
+        sql = f"UPDATE {table_name} SET {set_clause} WHERE {build_date_range_predicate('DATE', target_date)} AND DEPARTMENT='{department}'"
         session.sql(sql).collect()
         return True
     else:
@@ -227,7 +259,48 @@ def clean_dataframe_for_snowflake(df):
     return df_clean
 
 
-def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, department: str, target_date, dataframe: pd.DataFrame, columns: list):
+def create_raw_table_if_missing(session: snowpark.Session, table_name: str, columns: list) -> bool:
+    """
+    Create a raw data table (DATE, DEPARTMENT, TIMESTAMP, then the dynamic columns as VARCHAR)
+    unless it already exists.
+    
+    Returns:
+        bool: True when the table already existed
+    """
+    # Check if table exists
+    try:
+        check_query = f"""
+        SELECT COUNT(*) AS count
+        FROM INFORMATION_SCHEMA.TABLES
+        WHERE TABLE_NAME = UPPER('{table_name}')
+        AND TABLE_SCHEMA = CURRENT_SCHEMA()
+        """
+        exists = session.sql(check_query).collect()[0]['COUNT'] > 0
+    except:
+        exists = False
+    
+    if exists:
+        return True
+    
+    essential_cols = {
+        'DATE': 'DATE',
+        'DEPARTMENT': 'VARCHAR(100)',
+        'TIMESTAMP': 'TIMESTAMP'
+    }
+    
+    # Use VARCHAR as default for dynamic columns (customize if needed)
+    dynamic_cols = {col_name: 'VARCHAR(16777216)' for col_name in columns}  # Max VARCHAR length in Snowflake
+    
+    full_schema = {**essential_cols, **dynamic_cols}
+    create_cols_str = ",\n    ".join([f"{col} {dtype}" for col, dtype in full_schema.items()])
+    create_query = f"CREATE TABLE {table_name} (\n    {create_cols_str}\n)"
+    session.sql(create_query).collect()
+    print(f"✅ Created table {table_name} with {len(full_schema)} columns")
+    return False
+
+
+def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, department: str, target_date, dataframe: pd.DataFrame, columns: list,
+                                 cleanup=True):
     """
     Dynamically insert raw data into a table with date-based cleanup.
     
@@ -237,6 +310,8 @@ def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, dep
         department: Department value to add to all rows
         dataframe: Pandas dataframe containing the data to insert
         columns: List of column names that should match dataframe columns
+        cleanup: Delete the existing rows for this date/department first. Streaming runs pass
+                 False for every shard after the first so earlier shards are not wiped
         
     Returns:
         dict: Summary of the operation
@@ -247,34 +322,8 @@ def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, dep
         if len(dataframe.columns) != len(columns):
             raise ValueError(f"Dataframe has {len(dataframe.columns)} columns but expected {len(columns)} columns")
         
-        # Step 1: Check if table exists
-        try:
-            check_query = f"""
-            SELECT COUNT(*) AS count
-            FROM INFORMATION_SCHEMA.TABLES
-            WHERE TABLE_NAME = UPPER('{table_name}')
-            AND TABLE_SCHEMA = CURRENT_SCHEMA()
-            """
-            exists = session.sql(check_query).collect()[0]['COUNT'] > 0
-        except:
-            exists = False
-
-        # Step 2: Create table if it doesn't exist
-        if not exists:
-            essential_cols = {
-                'DATE': 'DATE',
-                'DEPARTMENT': 'VARCHAR(100)',
-                'TIMESTAMP': 'TIMESTAMP'
-            }
-
-            # Use VARCHAR as default for dynamic columns (customize if needed)
-            dynamic_cols = {col_name: 'VARCHAR(16777216)' for col_name in columns}  # Max VARCHAR length in Snowflake
-
-            full_schema = {**essential_cols, **dynamic_cols}
-            create_cols_str = ",\n    ".join([f"{col} {dtype}" for col, dtype in full_schema.items()])
-            create_query = f"CREATE TABLE {table_name} (\n    {create_cols_str}\n)"
-            session.sql(create_query).collect()
-            print(f"✅ Created table {table_name} with {len(full_schema)} columns")
+        # Step 1-2: Create table if it doesn't exist
+        create_raw_table_if_missing(session, table_name, columns)
         
         # Step 3: Calculate current timestamp
         current_ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
@@ -285,13 +334,14 @@ def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, dep
         print(f"Dataframe shape: {dataframe.shape}")
         
         # Step 4: Remove existing rows for yesterday's date
-        delete_query = f"""
-        DELETE FROM {table_name} 
-        WHERE DATE = '{target_date}' AND DEPARTMENT = '{department}'
-        """
-        
-        delete_result = session.sql(delete_query).collect()
-        print(f"Cleaned existing data for {target_date} in department {department}")
+        if cleanup:
+            delete_query = f"""
+            DELETE FROM {table_name} 
+            WHERE {build_date_range_predicate('DATE', target_date)} AND DEPARTMENT = '{department}'
+            """
+            
+            delete_result = session.sql(delete_query).collect()
+            print(f"Cleaned existing data for {target_date} in department {department}")
         
         # Step 5: Prepare dataframe for insertion
         # Add the essential columns
@@ -318,7 +368,7 @@ def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, dep
         count_query = f"""
         SELECT COUNT(*) as row_count 
         FROM {table_name} 
-        WHERE DATE = '{target_date}' AND DEPARTMENT = '{department}'
+        WHERE {build_date_range_predicate('DATE', target_date)} AND DEPARTMENT = '{department}'
         """
         
         final_count = session.sql(count_query).collect()[0]['ROW_COUNT']
@@ -354,8 +404,221 @@ def insert_raw_data_with_cleanup(session: snowpark.Session, table_name: str, dep
         return error_summary
 
 
+def compute_llm_content_hash(conversation_content, last_skill, execution_id, prompt_version):
+    """
+    CONTENT_HASH of a prompt output row: everything its LLM call depends on - the conversation
+    content, the LAST_SKILL / EXECUTION_ID that resolve its system prompt, and the prompt version
+    (get_prompt_version, which covers the prompt text and model settings).
+    """
+    return compute_config_hash([conversation_content, last_skill, execution_id, prompt_version])
+
+
+def prune_llm_raw_data(session: snowpark.Session, table_name: str, department: str, target_date, prompt_types: list,
+                       written_since: str) -> int:
+    """
+    Delete the date/department rows of the given prompt types that were not written since a timestamp,
+    i.e. conversations that are no longer in the day's data.
+    
+    Args:
+        session: Snowflake session
+        table_name: Prompt output table
+        department: Department value of the rows
+        target_date: Date of the rows
+        prompt_types: PROMPT_TYPE values written by the run
+        written_since: Start of the run ('%Y-%m-%d %H:%M:%S'); every row it wrote has a later TIMESTAMP
+    
+    Returns:
+        int: Rows deleted
+    """
+    prompt_type_sql = ", ".join("'" + str(prompt_type).replace("'", "''") + "'" for prompt_type in prompt_types)
+    result = session.sql(f"""
+    DELETE FROM {table_name}
+    WHERE {build_date_range_predicate('DATE', target_date)} AND DEPARTMENT = '{department}'
+    AND PROMPT_TYPE IN ({prompt_type_sql})
+    AND (TIMESTAMP IS NULL OR TIMESTAMP < '{written_since}')
+    """).collect()
+    deleted_count = int(result[0][0]) if result else 0
+    if deleted_count:
+        print(f"Removed {deleted_count} rows of conversations no longer in {target_date}/{department}")
+    return deleted_count
+
+
+def normalize_llm_raw_keys(dataframe: pd.DataFrame) -> pd.DataFrame:
+    """
+    Give every row a non-null key, so reruns stage the same LLM_RAW_KEY_COLUMNS values.
+    
+    Missing keys (None / NaN / empty, or the 'None' / 'nan' text clean_dataframe_for_snowflake
+    leaves) become the conversation ID for SEGMENT_ID - as analyze_conversations_with_prompt
+    does for unsegmented rows - and '' for the other key columns.
+    
+    Args:
+        dataframe: Rows to write, with the LLM_RAW_KEY_COLUMNS
+    
+    Returns:
+        Copy of the dataframe with normalized key columns
+    """
+    dataframe = dataframe.copy()
+    for column in LLM_RAW_KEY_COLUMNS:
+        if column not in dataframe.columns or column == 'DATE':
+            continue
+        values = dataframe[column].astype(object)
+        missing = values.isna() | values.astype(str).str.strip().isin(['', 'None', 'nan', 'NaN'])
+        values = values.where(~missing, None).map(lambda value: value if value is None else str(value))
+        if column == 'SEGMENT_ID' and 'CONVERSATION_ID' in dataframe.columns:
+            values = values.fillna(dataframe['CONVERSATION_ID'].astype(str))
+        dataframe[column] = values.fillna('')
+    return dataframe
+
+
+def build_llm_raw_key_condition(target_alias: str, source_value) -> str:
+    """
+    NULL-safe join condition on LLM_RAW_KEY_COLUMNS (EQUAL_NULL, so rows written with a NULL
+    key by older runs still match instead of being inserted again).
+    
+    Args:
+        target_alias: Alias (or name) of the prompt output table
+        source_value: Function returning the SQL of a key column on the source side
+    
+    Returns:
+        SQL condition
+    """
+    return " AND ".join(
+        f"EQUAL_NULL({target_alias}.{column}, {source_value(column)})" for column in LLM_RAW_KEY_COLUMNS
+    )
+
+
+def merge_llm_raw_data(session: snowpark.Session, table_name: str, department: str, target_date, dataframe: pd.DataFrame, columns: list,
+                       prune=True):
+    """
+    Idempotent write of prompt output rows: a MERGE keyed on LLM_RAW_KEY_COLUMNS instead of
+    insert_raw_data_with_cleanup's delete and append.
+    
+    New rows, rows whose CONTENT_HASH changed, rows an earlier run left unfinished (PENDING / RETRY)
+    and rows that ended with an LLM error class are written as given (PENDING, empty response).
+    Completed rows with the same content keep their LLM response and only get the new TIMESTAMP, so a
+    rerun - or a restart after a crash - only sends the rows still missing a response.
+    
+    Args:
+        session: Snowflake session
+        table_name: Prompt output table
+        department: Department value to add to all rows
+        target_date: Date of the rows
+        dataframe: Rows to write (analyze_conversations_with_prompt records, CONTENT_HASH included)
+        columns: Column names of the dataframe
+        prune: Delete the date/department rows of the written prompt types that are not in this write
+               (prune_llm_raw_data). Streaming runs write shard by shard and prune once at the end
+    
+    Returns:
+        dict: Summary of the operation ('status' is 'success' or 'error')
+    """
+    staging_table = None
+    try:
+        if len(dataframe.columns) != len(columns):
+            raise ValueError(f"Dataframe has {len(dataframe.columns)} columns but expected {len(columns)} columns")
+        
+        # Step 1: Create the table, or add the record columns an older table lacks (MERGE writes by name)
+        if create_raw_table_if_missing(session, table_name, columns):
+            existing_columns = {column.upper() for column in get_table_columns(session, table_name)}
+            for column in columns:
+                if column.upper() not in existing_columns:
+                    session.sql(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column} VARCHAR(16777216)").collect()
+        
+        # Step 2: Stage the rows, one per (normalized) key
+        current_ts = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        dataframe_copy = dataframe.copy()
+        dataframe_copy['DATE'] = target_date
+        dataframe_copy['TIMESTAMP'] = current_ts
+        dataframe_copy['DEPARTMENT'] = department
+        final_column_order = ['DATE', 'DEPARTMENT', 'TIMESTAMP'] + columns
+        dataframe_copy = normalize_llm_raw_keys(dataframe_copy[final_column_order]).drop_duplicates(
+            subset=[column for column in LLM_RAW_KEY_COLUMNS if column not in ['DATE', 'DEPARTMENT']], keep='last'
+        )
+        
+        staging_table = get_temp_table_name("TEMP_RAW_MERGE")
+        session.create_dataframe(dataframe_copy).write.mode("overwrite").save_as_table(staging_table, table_type="temporary")
+        
+        # Step 3: MERGE on the row key; DATE / TIMESTAMP are staged as text
+        def source_value(column):
+            if column == 'DATE':
+                return "CAST(s.DATE AS DATE)"
+            if column == 'TIMESTAMP':
+                return "CAST(s.TIMESTAMP AS TIMESTAMP)"
+            return f"s.{column}"
+        
+        key_condition = build_llm_raw_key_condition("t", source_value)
+        update_sql = ",\n            ".join(f"{column} = {source_value(column)}" for column in final_column_order)
+        insert_columns_sql = ", ".join(final_column_order)
+        insert_values_sql = ", ".join(source_value(column) for column in final_column_order)
+        
+        session.sql(f"""
+        MERGE INTO {table_name} t
+        USING {staging_table} s
+        ON {key_condition}
+        WHEN MATCHED AND (
+            t.CONTENT_HASH IS DISTINCT FROM s.CONTENT_HASH
+            OR t.PROCESSING_STATUS IS DISTINCT FROM 'COMPLETED'
+            OR NULLIF(t.LLM_ERROR_CLASS, '') IS NOT NULL
+        ) THEN UPDATE SET
+            {update_sql}
+        WHEN MATCHED THEN UPDATE SET TIMESTAMP = {source_value('TIMESTAMP')}
+        WHEN NOT MATCHED THEN INSERT ({insert_columns_sql}) VALUES ({insert_values_sql})
+        """).collect()
+        
+        pending_result = session.sql(f"""
+        SELECT COUNT(*) AS PENDING_COUNT
+        FROM {table_name} t
+        JOIN {staging_table} s ON {key_condition}
+        WHERE t.PROCESSING_STATUS = 'PENDING'
+        """).collect()
+        pending_count = int(pending_result[0]['PENDING_COUNT']) if pending_result else 0
+        
+        # Step 4: Drop rows of conversations that are gone from the day's data
+        deleted_count = 0
+        if prune:
+            deleted_count = prune_llm_raw_data(session, table_name, department, target_date,
+                                               dataframe_copy['PROMPT_TYPE'].unique().tolist(), current_ts)
+        
+        summary = {
+            "status": "success",
+            "table_name": table_name,
+            "department": department,
+            "date_processed": target_date,
+            "timestamp": current_ts,
+            "rows_written": len(dataframe_copy),
+            "rows_pending": pending_count,
+            "rows_kept": len(dataframe_copy) - pending_count,
+            "rows_pruned": deleted_count,
+            "columns_processed": len(columns),
+            "total_columns": len(final_column_order)
+        }
+        
+        print(f"Merged {len(dataframe_copy)} rows into {table_name}: {pending_count} pending, "
+              f"{len(dataframe_copy) - pending_count} completed rows kept")
+        
+        return summary
+        
+    except Exception as e:
+        error_summary = {
+            "status": "error",
+            "table_name": table_name,
+            "department": department,
+            "error_message": str(e),
+            "timestamp": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        }
+        
+        print(f"Error merging data: {str(e)}")
+        return error_summary
+    
+    finally:
+        if staging_table:
+            try:
+                session.sql(f"DROP TABLE IF EXISTS {staging_table}").collect()
+            except Exception:
+                pass
+
+
 def analyze_conversations_with_prompt(session, conversations_df, department_name, 
-                                    prompt_type, prompt_config, target_date):
+                                    prompt_type, prompt_config, target_date, cleanup=True, run_llm_update=True):
     """
     Analyze conversations with a specific prompt and save results using batch processing
     
@@ -366,6 +629,10 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
         prompt_type: Type of prompt being used
         prompt_config: Prompt configuration dictionary
         target_date: Target date for analysis
+        cleanup: Delete the date/department rows of this prompt that are not in this write
+                 (rows are merged, so completed rows with unchanged content keep their response)
+        run_llm_update: Run the batch LLM UPDATE after inserting. Streaming runs insert every
+                        shard first and run the update once at the end
     
     Returns:
         Analysis results dictionary
@@ -375,7 +642,7 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
     conversion_type = prompt_config.get('conversion_type', 'xml')
     
     # Special handling: per-skill prompts (loss_interest for AT_Filipina)
-    if prompt_type == 'loss_interest' and isinstance(prompt_config.get('system_prompt'), dict):
+    if prompt_type == 'loss_interest' and is_per_skill_prompt(prompt_config):
         allowed_skills = list(prompt_config['system_prompt'].keys())
         # Filter incoming conversations by last_skill to only allowed skills
         pre_filter_len = len(conversations_df)
@@ -399,7 +666,7 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
     
     # Step 1: Prepare all records with empty LLM responses
     llm_results_data = []
-    
+    prompt_version = get_prompt_version(prompt_config)
     
     for _, row in conversations_df.iterrows():
         conversation_content = row.get('conversation_content', '')
@@ -422,7 +689,11 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
             'ANALYSIS_DATE': datetime.now().strftime('%Y-%m-%d'),
             'PROCESSING_STATUS': 'PENDING',  # Will be updated after LLM processing
             'SHADOWED_BY': row.get('shadowed_by', ''),
-            'EXECUTION_ID': row.get('execution_id', '')
+            'EXECUTION_ID': row.get('execution_id', ''),
+            'LLM_ATTEMPTS': 0,  # LLM calls made (snowflake_llm_retry)
+            'LLM_ERROR_CLASS': '',  # Set after the LLM update; NULL for a usable response
+            'CONTENT_HASH': compute_llm_content_hash(conversation_content, row.get('last_skill', ''),
+                                                     row.get('execution_id', ''), prompt_version)
         }
         llm_results_data.append(result_record)
     
@@ -447,16 +718,18 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
         
         dynamic_columns = [col for col in raw_df.columns if col not in ['DATE', 'DEPARTMENT', 'TIMESTAMP']]
         
-        insert_success = insert_raw_data_with_cleanup(
+        # Merge keeps the responses of completed rows whose content is unchanged
+        insert_success = merge_llm_raw_data(
             session=session,
             table_name=prompt_config['output_table'],
             department=department_name,
             target_date=target_date,
             dataframe=raw_df[dynamic_columns],
-            columns=dynamic_columns
+            columns=dynamic_columns,
+            prune=cleanup
         )
         
-        if not insert_success:
+        if not insert_success or insert_success.get('status') != 'success':
             print(f"    ❌ Failed to insert records to {prompt_config['output_table']}")
             return {
                 'total_conversations': len(conversations_df),
@@ -469,11 +742,25 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
                 'error': 'Failed to insert records'
             }
         
-        print(f"    💾 Inserted {len(llm_results_data)} records to {prompt_config['output_table']} for batch processing")
+        print(f"    💾 Wrote {len(llm_results_data)} records to {prompt_config['output_table']} for batch processing "
+              f"({insert_success['rows_pending']} pending, {insert_success['rows_kept']} already completed)")
+        
+        if not run_llm_update:
+            return {
+                'total_conversations': len(conversations_df),
+                'inserted_count': len(llm_results_data),
+                'processed_count': 0,
+                'prompt_type': prompt_type,
+                'conversion_type': conversion_type,
+                'model_type': model_type,
+                'model_name': model,
+                'success_rate': 0
+            }
         
         # Step 3: Run batch UPDATE query using LLM function
+        response_cache_stats = []
         batch_success, processed_count, failed_count = run_batch_llm_update(
-            session, prompt_config, department_name, target_date
+            session, prompt_config, department_name, target_date, prompt_type=prompt_type, cache_stats=response_cache_stats
         )
         
         if not batch_success:
@@ -491,6 +778,7 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
         
         success_rate = (processed_count / len(conversations_df) * 100) if len(conversations_df) > 0 else 0
         
+        response_cache_summary = summarize_response_cache_stats(response_cache_stats)
         results = {
             'total_conversations': len(conversations_df),
             'processed_count': processed_count,
@@ -499,7 +787,9 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
             'conversion_type': conversion_type,
             'model_type': model_type,
             'model_name': model,
-            'success_rate': success_rate
+            'success_rate': success_rate,
+            'llm_cache_hits': response_cache_summary['hits'],
+            'llm_cache_misses': response_cache_summary['misses']
         }
         
         print(f"    ✅ {prompt_type} batch processing: {processed_count}/{len(conversations_df)} success ({success_rate:.1f}%), {failed_count} failed")
@@ -520,400 +810,660 @@ def analyze_conversations_with_prompt(session, conversations_df, department_name
         }
 
 
-def run_batch_llm_update(session: snowpark.Session, prompt_config, department_name, target_date):
+def prepare_batch_llm_run(session: snowpark.Session, prompt_config, department_name, target_date, prompt_type=None):
     """
-    Run batch UPDATE query to fill LLM responses using Snowflake's LLM functions
+    Set up the batch LLM run of a prompt: LLM function, system prompt expression of each row,
+    pending row count and the batch plan of the pending rows (snowflake_llm_batch_planner).
     
     Args:
         session: Snowflake session
         prompt_config: Prompt configuration dictionary
         department_name: Department name
         target_date: Target date for analysis
+        prompt_type: Prompt type (recorded with cached responses)
     
     Returns:
-        Tuple: (success, processed_count, failed_count)
+        Run dictionary (settings, pending_filter, system_prompt_sql, pending_count, batches, plan_table,
+        progress and step timings) used by the other batch LLM steps; None for an unsupported model_type
     """
     import time
     
     # Start total timing
     total_start_time = time.time()
     
-    try:
-        # Step 1: Setup and validation timing
-        setup_start_time = time.time()
-        
-        table_name = prompt_config['output_table']
-        model_type = prompt_config.get('model_type', 'openai').lower()
-        departments_config = get_snowflake_base_departments_config()
-        gpt_agent_name = departments_config[department_name]['GPT_AGENT_NAME'].replace("'", "''")
-        
-        # Choose the appropriate LLM function
-        if model_type == 'openai':
-            llm_function = 'openai_chat_system'
-        elif model_type == 'gemini':
-            llm_function = 'gemini_chat_system'
-        else:
-            print(f"    ❌ Unsupported model_type: {model_type}")
-            return False, 0, 0
-        
-        # Use the original prompts - dollar-quoted strings handle all special characters safely
-        prompt_text = prompt_config['prompt']
-        system_text = prompt_config['system_prompt']
-        per_skill_mode = isinstance(system_text, dict)  # loss_interest per LAST_SKILL
-        
-        setup_time = time.time() - setup_start_time
-        print(f"    🔧 Setup completed in {setup_time:.2f}s")
-        
-        # Step 2: Check pending records count (performance insight)
-        count_start_time = time.time()
+    # Step 1: Setup and validation timing
+    setup_start_time = time.time()
+    
+    table_name = prompt_config['output_table']
+    model_type = prompt_config.get('model_type', 'openai').lower()
+    
+    # Choose the appropriate LLM function
+    if model_type == 'openai':
+        llm_function = 'openai_chat_system'
+    elif model_type == 'gemini':
+        llm_function = 'gemini_chat_system'
+    else:
+        print(f"    ❌ Unsupported model_type: {model_type}")
+        return None
+    
+    # Use the original prompts - dollar-quoted strings handle all special characters safely
+    system_text = prompt_config['system_prompt']
+    per_skill_mode = is_per_skill_prompt(prompt_config)  # loss_interest per LAST_SKILL
+    use_response_cache = is_response_cache_enabled()
+    
+    setup_time = time.time() - setup_start_time
+    print(f"    🔧 Setup completed in {setup_time:.2f}s")
+    
+    # Step 2: Check pending records count (performance insight)
+    count_start_time = time.time()
+    
+    date_predicate = build_date_range_predicate('DATE', target_date if target_date else datetime.now().strftime("%Y-%m-%d"))
+    # Rows of this run whatever their status (retries reuse it), and the pending ones among them
+    row_filter = f"""DEPARTMENT = '{department_name}'
+                    AND {date_predicate}"""
+    if per_skill_mode:
+        # Only the skills with a system prompt (keys) are analyzed
+        allowed_skills = list(system_text.keys())
+        skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
+        row_filter += f"\n                    AND LAST_SKILL IN ({skill_list_sql})"
+    pending_filter = f"""PROCESSING_STATUS = 'PENDING'
+                    AND {row_filter}"""
+    
+    count_query = f"""
+    SELECT COUNT(*) as pending_count
+    FROM {table_name}
+    WHERE {pending_filter}
+    """
+    
+    count_result = session.sql(count_query).collect()
+    pending_count = count_result[0]['PENDING_COUNT'] if count_result else 0
+    
+    count_time = time.time() - count_start_time
+    print(f"    📊 Found {pending_count} pending records to process (checked in {count_time:.2f}s)")
+    
+    run = {
+        'prompt_config': prompt_config,
+        'prompt_type': prompt_type,
+        'department_name': department_name,
+        'target_date': target_date,
+        'table_name': table_name,
+        'model_type': model_type,
+        'llm_function': llm_function,
+        'per_skill_mode': per_skill_mode,
+        'use_response_cache': use_response_cache,
+        'prompt_version': get_prompt_version(prompt_config),
+        'row_filter': row_filter,
+        'pending_filter': pending_filter,
+        'system_prompt_sql': None,
+        'pending_count': pending_count,
+        'batches': [],
+        'plan_table': None,
+        'failed_batches': [],
+        'committed_rows': 0,
+        'start_time': total_start_time,
+        'setup_time': setup_time,
+        'count_time': count_time,
+        'query_build_time': 0.0,
+        'execution_start_time': time.time()
+    }
+    
+    if pending_count == 0:
+        print(f"    ⚠️  No pending records found for {department_name}")
+        return run
+    
+    print(f"    🚀 Running batch {model_type.upper()} analysis on {pending_count} records...")
+    
+    # Step 3: Plan the LLM batches
+    query_build_start_time = time.time()
+    
+    # Check if system prompt contains @Prompt@ placeholder
+    needs_prompt_replacement = '@Prompt@' in (system_text if not per_skill_mode else "".join(system_text.values()))
+    
+    # System prompt expression of each pending row
+    if needs_prompt_replacement or per_skill_mode:
+        print(f"    🔄 System prompt contains @Prompt@ - fetching conversation-specific prompts...")
         
         if per_skill_mode:
-            allowed_skills = list(system_text.keys())
-            skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
-            count_query = f"""
-            SELECT COUNT(*) as pending_count
-            FROM {table_name}
-            WHERE PROCESSING_STATUS = 'PENDING'
-            AND DEPARTMENT = '{department_name}'
-            AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-            AND LAST_SKILL IN ({skill_list_sql})
-            """
+            # Build CASE expression selecting prompt by LAST_SKILL
+            case_branches = []
+            for skill, prompt in system_text.items():
+                safe_skill = skill.replace("'", "''")
+                safe_prompt = prompt  # will be dollar-quoted
+                case_branches.append(f"WHEN LAST_SKILL = '{safe_skill}' THEN $${safe_prompt}$$")
+            base_prompt_sql = "CASE " + " ".join(case_branches) + " END"
         else:
-            count_query = f"""
-            SELECT COUNT(*) as pending_count
-            FROM {table_name}
-            WHERE PROCESSING_STATUS = 'PENDING'
-            AND DEPARTMENT = '{department_name}'
-            AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-            """
-        
-        count_result = session.sql(count_query).collect()
-        pending_count = count_result[0]['PENDING_COUNT'] if count_result else 0
-        
-        count_time = time.time() - count_start_time
-        print(f"    📊 Found {pending_count} pending records to process (checked in {count_time:.2f}s)")
-        
-        if pending_count == 0:
-            print(f"    ⚠️  No pending records found for {department_name}")
-            return True, 0, 0
-        
-        print(f"    🚀 Running batch {model_type.upper()} analysis on {pending_count} records...")
-        
-        # Step 3: Build and execute the UPDATE query
-        query_build_start_time = time.time()
-        
-        # BATCH SQL APPROACH (5x faster than UPDATE)
-        query_build_time = time.time() - query_build_start_time
-        print(f"    📝 Batch SQL approach selected (5x faster)")
-        
-        execution_start_time = time.time()
-        print(f"    ⏳ Starting LLM batch execution... (estimated: {pending_count * 0.4}s+ for {pending_count} records)")
+            base_prompt_sql = f"$${system_text}$$"
         
+        run['system_prompt_sql'] = f"""REPLACE(
+                        REPLACE({base_prompt_sql}, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT(EXECUTION_ID), GET_ERP_SYSTEM_PROMPT(CONVERSATION_ID), '@Prompt@')),
+                        '<STEP-NAME>', COALESCE(LAST_SKILL, '<STEP-NAME>')
+                    )"""
+    else:
+        # Original batch processing without prompt replacement
+        run['system_prompt_sql'] = f"$${system_text}$$"
+    
+    if use_response_cache:
         try:
-            # Step 1: Check if system prompt contains @Prompt@ placeholder
-            needs_prompt_replacement = '@Prompt@' in (system_text if not per_skill_mode else "".join(system_text.values()))
-            
-            if needs_prompt_replacement or per_skill_mode:
-                print(f"    🔄 System prompt contains @Prompt@ - fetching conversation-specific prompts...")
-                
-                # Create batch processing query with dynamic system prompt replacement
-                if per_skill_mode:
-                    # Build CASE expression selecting prompt by LAST_SKILL
-                    departments_config_full = get_snowflake_llm_departments_config()
-                    # allowed skills based on keys
-                    allowed_skills = list(system_text.keys())
-                    skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
-
-                    case_branches = []
-                    for skill, prompt in system_text.items():
-                        safe_skill = skill.replace("'", "''")
-                        safe_prompt = prompt  # will be dollar-quoted
-                        case_branches.append(f"WHEN LAST_SKILL = '{safe_skill}' THEN $${safe_prompt}$$")
-                    case_expr = "CASE " + " ".join(case_branches) + " END"
-
-                    batch_query = f"""
-                    WITH batch_processing AS (
-                        SELECT 
-                            CONVERSATION_ID,
-                            {llm_function}(
-                                CONVERSATION_CONTENT,
-                                REPLACE(
-                                    REPLACE({case_expr}, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT(EXECUTION_ID), GET_ERP_SYSTEM_PROMPT(CONVERSATION_ID), '@Prompt@')),
-                                    '<STEP-NAME>', COALESCE(LAST_SKILL, '<STEP-NAME>')
-                                ),
-                                MODEL_NAME,
-                                TEMPERATURE,
-                                MAX_TOKENS
-                            ) AS llm_response
-                        FROM {table_name}
-                        WHERE PROCESSING_STATUS = 'PENDING'
-                        AND DEPARTMENT = '{department_name}'
-                        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-                        AND LAST_SKILL IN ({skill_list_sql})
-                    )
-                    SELECT CONVERSATION_ID, llm_response FROM batch_processing
-                    """
-                else:
-                    batch_query = f"""
-                WITH batch_processing AS (
-                    SELECT 
-                        CONVERSATION_ID,
-                        {llm_function}(
-                            CONVERSATION_CONTENT,
-                            REPLACE(
-                                REPLACE($${system_text}$$, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT(EXECUTION_ID), GET_ERP_SYSTEM_PROMPT(CONVERSATION_ID), '@Prompt@')),
-                                '<STEP-NAME>', COALESCE(LAST_SKILL, '<STEP-NAME>')
-                            ),
-                            MODEL_NAME,
-                            TEMPERATURE,
-                            MAX_TOKENS
-                        ) AS llm_response
-                    FROM {table_name}
-                    WHERE PROCESSING_STATUS = 'PENDING'
-                    AND DEPARTMENT = '{department_name}'
-                    AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-                )
-                SELECT CONVERSATION_ID, llm_response FROM batch_processing
-                """
-            else:
-                # Original batch processing without prompt replacement
-                if per_skill_mode:
-                    allowed_skills = list(system_text.keys())
-                    skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
-                    case_branches = []
-                    for skill, prompt in system_text.items():
-                        safe_skill = skill.replace("'", "''")
-                        safe_prompt = prompt
-                        case_branches.append(f"WHEN LAST_SKILL = '{safe_skill}' THEN $${safe_prompt}$$")
-                    case_expr = "CASE " + " ".join(case_branches) + " END"
-                    batch_query = f"""
-                    WITH batch_processing AS (
-                        SELECT 
-                            CONVERSATION_ID,
-                            {llm_function}(
-                                CONVERSATION_CONTENT,
-                                {case_expr},
-                                MODEL_NAME,
-                                TEMPERATURE,
-                                MAX_TOKENS
-                            ) AS llm_response
-                        FROM {table_name}
-                        WHERE PROCESSING_STATUS = 'PENDING'
-                        AND DEPARTMENT = '{department_name}'
-                        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-                        AND LAST_SKILL IN ({skill_list_sql})
-                    )
-                    SELECT CONVERSATION_ID, llm_response FROM batch_processing
-                    """
-                else:
-                    batch_query = f"""
-                WITH batch_processing AS (
-                    SELECT 
-                        CONVERSATION_ID,
-                        {llm_function}(
-                            CONVERSATION_CONTENT,
-                            $${system_text}$$,
-                            MODEL_NAME,
-                            TEMPERATURE,
-                            MAX_TOKENS
-                        ) AS llm_response
-                    FROM {table_name}
-                    WHERE PROCESSING_STATUS = 'PENDING'
-                    AND DEPARTMENT = '{department_name}'
-                    AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-                )
-                SELECT CONVERSATION_ID, llm_response FROM batch_processing
-                """
-            
-            # Execute batch processing
-            batch_results = session.sql(batch_query).collect()
-        
-            if not batch_results:
-                print(f"    ⚠️  No results from batch processing")
-                execution_time = time.time() - execution_start_time
-            else:
-                # Step 2: Update original table with batch results
-                print(f"    🔄 Updating {len(batch_results)} records with LLM responses...")
-                
-                # Create temp table with results for efficient UPDATE
-                temp_results_table = f"TEMP_BATCH_RESULTS_{int(time.time())}"
-                
-                # Convert results to DataFrame
-                results_data = [{'CONVERSATION_ID': row['CONVERSATION_ID'], 'LLM_RESPONSE': row['LLM_RESPONSE']} for row in batch_results]
-                results_df = session.create_dataframe(results_data)
-                results_df.write.mode("overwrite").save_as_table(temp_results_table)
-                
-                # Update original table using JOIN on CONVERSATION_ID
-                update_query = f"""
-                UPDATE {table_name}
-                SET 
-                    LLM_RESPONSE = temp.LLM_RESPONSE,
-                    PROCESSING_STATUS = 'COMPLETED'
-                FROM {temp_results_table} temp
-                WHERE {table_name}.CONVERSATION_ID = temp.CONVERSATION_ID
-                """
-                
-                session.sql(update_query).collect()
-                
-                # Clean up temp table
-                session.sql(f"DROP TABLE {temp_results_table}").collect()
-                
-                execution_time = time.time() - execution_start_time
-                print(f"    ✅ Batch SQL approach completed successfully")
-                
-        except Exception as batch_error:
-            print(f"    ⚠️  Batch SQL failed, falling back to UPDATE method: {str(batch_error)}")
-            
-            # Fallback to original UPDATE method with prompt replacement support
-            if needs_prompt_replacement or per_skill_mode:
-                print(f"    🔄 Using UPDATE method with @Prompt@ replacement...")
-                if per_skill_mode:
-                    allowed_skills = list(system_text.keys())
-                    skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
-                    case_branches = []
-                    for skill, prompt in system_text.items():
-                        safe_skill = skill.replace("'", "''")
-                        safe_prompt = prompt
-                        case_branches.append(
-                            f"WHEN LAST_SKILL = '{safe_skill}' THEN REPLACE($${safe_prompt}$$, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT({table_name}.EXECUTION_ID), '@Prompt@'))"
-                        )
-                    case_expr = "CASE " + " ".join(case_branches) + " END"
-                    update_query = f"""
-                    UPDATE {table_name}
-                    SET 
-                        LLM_RESPONSE = {llm_function}(
-                                        CONVERSATION_CONTENT,
-                                        REPLACE({case_expr}, '<STEP-NAME>', COALESCE({table_name}.LAST_SKILL, '<STEP-NAME>')),
-                                        MODEL_NAME,
-                                        TEMPERATURE,
-                                        MAX_TOKENS
-                                    ),
-                                    PROCESSING_STATUS = 'COMPLETED'
-                                WHERE PROCESSING_STATUS = 'PENDING'
-                                AND DEPARTMENT = '{department_name}'
-                                AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-                                AND LAST_SKILL IN ({skill_list_sql})
-                                """
-                else:
-                    update_query = f"""
-                    UPDATE {table_name}
-                    SET 
-                        LLM_RESPONSE = {llm_function}(
-                                CONVERSATION_CONTENT,
-                                REPLACE(
-                                    REPLACE($${system_text}$$, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT({table_name}.EXECUTION_ID), GET_ERP_SYSTEM_PROMPT({table_name}.CONVERSATION_ID), '@Prompt@')),
-                                    '<STEP-NAME>', COALESCE({table_name}.LAST_SKILL, '<STEP-NAME>')
-                                ),
-                            MODEL_NAME,
-                            TEMPERATURE,
-                            MAX_TOKENS
-                        ),
-                        PROCESSING_STATUS = 'COMPLETED'
-                    WHERE PROCESSING_STATUS = 'PENDING'
-                    AND DEPARTMENT = '{department_name}'
-                    AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-                    """
-            else:
-                # Original UPDATE method without prompt replacement
-                update_query = f"""
-                UPDATE {table_name}
-                SET 
-                    LLM_RESPONSE = {llm_function}(
-                        CONVERSATION_CONTENT,
-                        $${system_text}$$,
+            ensure_response_cache_table(session)
+        except Exception as cache_error:
+            print(f"    ⚠️  LLM response cache unavailable, calling the LLM for every row: {str(cache_error)}")
+            run['use_response_cache'] = False
+    
+    # Pending rows are bin-packed into batches of similar estimated tokens; each batch is
+    # committed on its own, so a failed batch never re-sends rows that already completed
+    system_prompt_length = max(len(prompt) for prompt in system_text.values()) if per_skill_mode else len(system_text)
+    run['batches'] = plan_llm_batches(fetch_pending_llm_sizes(session, table_name, pending_filter, system_prompt_length))
+    if len(run['batches']) > 1:
+        run['plan_table'] = get_temp_table_name("TEMP_LLM_BATCH_PLAN")
+        write_llm_batch_plan(session, run['plan_table'], run['batches'])
+    
+    run['query_build_time'] = time.time() - query_build_start_time
+    print(f"    📝 Batch SQL approach selected: {len(run['batches'])} LLM batch(es), "
+          f"~{sum(batch['estimated_tokens'] for batch in run['batches']):,} input tokens (planned in {run['query_build_time']:.2f}s)")
+    
+    run['execution_start_time'] = time.time()
+    print(f"    ⏳ Starting LLM batch execution... (estimated: {pending_count * 0.4}s+ for {pending_count} records)")
+    
+    return run
+
+
+def get_batch_label(run, batch):
+    """
+    Log label of one batch of a run, e.g. "Batch 2/5 (categorizing)".
+    """
+    label = f"Batch {batch['batch_index'] + 1}/{len(run['batches'])}"
+    return f"{label} ({run['prompt_type']})" if run['prompt_type'] else label
+
+
+def get_batch_row_filter(run, batch):
+    """
+    WHERE condition of one batch's pending rows (all pending rows when the run has a single batch).
+    """
+    if run['plan_table'] is None:
+        return run['pending_filter']
+    return f"{run['pending_filter']}\n                    AND {build_batch_filter(run['plan_table'], batch['batch_index'])}"
+
+
+def build_llm_batch_query(run, batch):
+    """
+    Query returning the LLM response of each row of one batch (LLM_RAW_KEY_COLUMNS, LLM_RESPONSE and,
+    with the response cache, CACHE_KEY / CACHE_HIT).
+    """
+    table_name = run['table_name']
+    batch_filter = get_batch_row_filter(run, batch)
+    key_columns_sql = ",\n                    ".join(LLM_RAW_KEY_COLUMNS)
+    
+    if run['use_response_cache']:
+        # Pending rows answered before (same content, resolved system prompt, model settings and
+        # prompt version) come from the response cache; the LLM function runs once per missed key
+        return build_cached_batch_query(
+            f"""SELECT
+                    {key_columns_sql},
+                    CONVERSATION_CONTENT,
+                    {run['system_prompt_sql']} AS SYSTEM_PROMPT,
+                    MODEL_NAME,
+                    TEMPERATURE,
+                    MAX_TOKENS
+                FROM {table_name}
+                WHERE {batch_filter}""",
+            run['llm_function'], run['prompt_version'], key_columns=LLM_RAW_KEY_COLUMNS
+        )
+    
+    return f"""
+    WITH batch_processing AS (
+        SELECT 
+            {", ".join(LLM_RAW_KEY_COLUMNS)},
+            {run['llm_function']}(
+                CONVERSATION_CONTENT,
+                {run['system_prompt_sql']},
                 MODEL_NAME,
                 TEMPERATURE,
                 MAX_TOKENS
-            ),
-            PROCESSING_STATUS = 'COMPLETED'
-        WHERE PROCESSING_STATUS = 'PENDING'
-        AND DEPARTMENT = '{department_name}'
-        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
-        """
-        
-        result = session.sql(update_query).collect()
-        execution_time = time.time() - execution_start_time
-        print(f"    ✅ Fallback UPDATE method completed")
-        records_per_second = pending_count / execution_time if execution_time > 0 else 0
-        
-        print(f"    ✅ Batch UPDATE executed in {execution_time:.2f}s")
-        print(f"    📈 Performance: {records_per_second:.2f} records/second")
-        print(f"    🔍 Average time per record: {execution_time/pending_count:.2f}s" if pending_count > 0 else "")
-        
-        # Step 4: Count successes and failures with timing
-        counting_start_time = time.time()
-        
-        # Narrow counting for per-skill mode to the allowed skill subset
-        if per_skill_mode:
-            allowed_skills = list(system_text.keys())
-            skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
-            processed_count, failed_count = count_llm_results_with_extra_filter(
-                session, table_name, department_name, target_date, f"AND LAST_SKILL IN ({skill_list_sql})"
-            )
-        else:
-            processed_count, failed_count = count_llm_results(session, table_name, department_name, target_date)
-        
-        counting_time = time.time() - counting_start_time
-        print(f"    📊 Results counted in {counting_time:.2f}s")
-        
-        # Total timing summary
-        total_time = time.time() - total_start_time
-        print(f"    🏁 TOTAL BATCH TIME: {total_time:.2f}s for {pending_count} records")
-        print(f"    📋 Time breakdown:")
-        print(f"       - Setup: {setup_time:.2f}s ({setup_time/total_time*100:.1f}%)")
-        print(f"       - Counting: {count_time:.2f}s ({count_time/total_time*100:.1f}%)")
-        print(f"       - Query Build: {query_build_time:.3f}s ({query_build_time/total_time*100:.1f}%)")
-        print(f"       - LLM Execution: {execution_time:.2f}s ({execution_time/total_time*100:.1f}%)")
-        print(f"       - Results: {counting_time:.2f}s ({counting_time/total_time*100:.1f}%)")
-        
-        # Performance insights
-        if execution_time > 30:
-            print(f"    ⚠️  SLOW EXECUTION DETECTED!")
-            print(f"       - Consider reducing batch size or checking Snowflake compute resources")
-            print(f"       - {model_type.upper()} may be rate-limited or overloaded")
-        
-        if records_per_second < 0.5:
-            print(f"    🐌 LOW THROUGHPUT WARNING: {records_per_second:.2f} records/second")
-            print(f"       - Expected: 1-5 records/second for typical LLM operations")
-        
-        return True, processed_count, failed_count
-        
-    except Exception as e:
-        total_time = time.time() - total_start_time
-        error_details = format_error_details(e, f"BATCH LLM UPDATE - {department_name}")
-        print(f"    ❌ Batch LLM update failed after {total_time:.2f}s: {str(e)}")
-        print(error_details)
-        return False, 0, 0
+            ) AS llm_response
+        FROM {table_name}
+        WHERE {batch_filter}
+    )
+    SELECT {", ".join(LLM_RAW_KEY_COLUMNS)}, llm_response FROM batch_processing
+    """
 
 
-def count_llm_results(session: snowpark.Session, table_name, department_name, target_date):
+def commit_llm_batch(session: snowpark.Session, run, batch_results, cache_stats=None):
     """
-    Count successful and failed LLM responses by checking for error patterns
+    Write the LLM responses of one batch to the output table right away (rows become COMPLETED,
+    so later batches and reruns skip them) and store new responses in the response cache.
     
     Args:
         session: Snowflake session
-        table_name: Full table name
-        department_name: Department name
-        target_date: Target date
+        run: prepare_batch_llm_run() result
+        batch_results: Rows of build_llm_batch_query()
+        cache_stats: Optional list receiving the response cache counters of this batch
     
     Returns:
-        Tuple: (processed_count, failed_count)
+        Number of LLM results written
     """
-    import time
+    if not batch_results:
+        print(f"    ⚠️  No results from batch processing")
+        return 0
     
+    table_name = run['table_name']
+    
+    # Temp table of this batch only - concurrent batches never share one
+    temp_results_table = get_temp_table_name("TEMP_BATCH_RESULTS")
+    
+    # Convert results to DataFrame, keyed like the output rows (one conversation can have several segments)
+    result_columns = LLM_RAW_KEY_COLUMNS + ['LLM_RESPONSE']
+    if run['use_response_cache']:
+        result_columns = result_columns + ['CACHE_KEY', 'CACHE_HIT']
+    results_data = [{column: row[column] for column in result_columns} for row in batch_results]
+    results_df = session.create_dataframe(results_data)
     try:
-        # Count total completed records with timing
-        total_start_time = time.time()
-        
-        total_query = f"""
-        SELECT COUNT(*) as total_count
-        FROM {table_name}
-        WHERE PROCESSING_STATUS = 'COMPLETED'
-        AND DEPARTMENT = '{department_name}'
-        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
+        results_df.write.mode("overwrite").save_as_table(temp_results_table, table_type="temporary")
+        
+        # Update the batch's pending rows using JOIN on the row key (the batch query already applied
+        # the run's filters; they are not repeated here since DATE / DEPARTMENT would be ambiguous)
+        key_condition = build_llm_raw_key_condition(table_name, lambda column: f"temp.{column}")
+        update_query = f"""
+        UPDATE {table_name}
+        SET 
+            LLM_RESPONSE = temp.LLM_RESPONSE,
+            PROCESSING_STATUS = 'COMPLETED'
+        FROM {temp_results_table} temp
+        WHERE {key_condition}
+        AND {table_name}.PROCESSING_STATUS = 'PENDING'
         """
         
-        total_result = session.sql(total_query).collect()
+        session.sql(update_query).collect()
+        
+        if run['use_response_cache']:
+            # New responses go to the cache (failures and unparseable JSON are left out and retried);
+            # the batch is already committed, so a cache write error only costs future hits
+            try:
+                store_llm_responses(session, temp_results_table, run['department_name'], run['prompt_type'] or '',
+                                    run['prompt_version'], run['prompt_config'].get('model', ''),
+                                    json_only=run['prompt_config'].get('response_format', 'json') == 'json')
+            except Exception as cache_error:
+                print(f"    ⚠️  Could not store LLM responses in the cache: {str(cache_error)}")
+            batch_cache_stats = summarize_batch_cache_results(batch_results, run['department_name'], run['prompt_type'])
+            print(f"    ♻️  LLM response cache: {batch_cache_stats['hits']} hits, {batch_cache_stats['misses']} misses "
+                  f"({batch_cache_stats['hit_rate']:.1f}% hit rate), {batch_cache_stats['llm_calls']} LLM calls")
+            if cache_stats is not None:
+                cache_stats.append(batch_cache_stats)
+    finally:
+        # Clean up temp table (also when the UPDATE fails)
+        session.sql(f"DROP TABLE IF EXISTS {temp_results_table}").collect()
+    
+    return len(batch_results)
+
+
+def recover_failed_llm_batch(session: snowpark.Session, run, batch, batch_error):
+    """
+    Retry a failed batch with the direct UPDATE fallback (its own rows only).
+    
+    Returns:
+        True when the fallback filled the batch; False when it failed too (the batch is recorded
+        in run['failed_batches'] and its rows stay PENDING for the next run)
+    """
+    batch_label = get_batch_label(run, batch)
+    print(f"    ⚠️  {batch_label} failed, falling back to UPDATE method for its {batch['rows']} rows: {str(batch_error)}")
+    try:
+        run_fallback_llm_update(session, run['prompt_config'], run['table_name'], run['llm_function'],
+                                get_batch_row_filter(run, batch))
+        print(f"    ✅ Fallback UPDATE method completed")
+        return True
+    except Exception as fallback_error:
+        print(f"    ❌ {batch_label} fallback failed, its rows stay PENDING for the next run: {str(fallback_error)}")
+        run['failed_batches'].append(batch)
+        return False
+
+
+def record_committed_llm_batch(run, batch, batch_start_time):
+    """
+    Count a committed batch towards the run's progress and log it.
+    """
+    import time
+    
+    run['committed_rows'] += batch['rows']
+    print(f"    📦 {get_batch_label(run, batch)}: {batch['rows']} rows, ~{batch['estimated_tokens']:,} tokens committed in "
+          f"{time.time() - batch_start_time:.2f}s ({run['committed_rows']}/{run['pending_count']} rows done)")
+
+
+def drop_llm_batch_plan(session: snowpark.Session, run):
+    """
+    Drop the batch plan table of a run (if it has one).
+    """
+    if run['plan_table'] is not None:
+        session.sql(f"DROP TABLE IF EXISTS {run['plan_table']}").collect()
+        run['plan_table'] = None
+
+
+def finish_batch_llm_run(session: snowpark.Session, run):
+    """
+    Count the LLM results of a run whose batches have all been executed and log its timings.
+    
+    Returns:
+        Tuple: (processed_count, failed_count)
+    
+    Raises:
+        RuntimeError: When every batch of the run failed
+    """
+    import time
+    
+    batches = run['batches']
+    failed_batches = run['failed_batches']
+    if failed_batches:
+        if len(failed_batches) == len(batches):
+            raise RuntimeError(f"All {len(batches)} LLM batches failed")
+        print(f"    ⚠️  {len(failed_batches)}/{len(batches)} LLM batches failed "
+              f"({sum(batch['rows'] for batch in failed_batches)} rows left PENDING)")
+    
+    # Rows whose LLM call failed or whose response does not parse are re-sent with backoff
+    if run['pending_count'] > 0 and get_llm_max_attempts() > 1:
+        prompt_config = run['prompt_config']
+        try:
+            run['retry_stats'] = run_llm_retries(
+                session, run['table_name'], run['row_filter'], run['llm_function'], run['system_prompt_sql'],
+                response_format=prompt_config.get('response_format', 'json'),
+                json_repair=bool(prompt_config.get('json_repair', False))
+            )
+        except Exception as retry_error:
+            print(f"    ⚠️  LLM retries skipped: {str(retry_error)}")
+    
+    pending_count = run['pending_count']
+    execution_time = time.time() - run['execution_start_time']
+    
+    records_per_second = pending_count / execution_time if execution_time > 0 else 0
+    
+    print(f"    ✅ Batch UPDATE executed in {execution_time:.2f}s")
+    print(f"    📈 Performance: {records_per_second:.2f} records/second")
+    print(f"    🔍 Average time per record: {execution_time/pending_count:.2f}s" if pending_count > 0 else "")
+    
+    # Step 4: Count successes and failures with timing
+    counting_start_time = time.time()
+    
+    table_name = run['table_name']
+    department_name = run['department_name']
+    target_date = run['target_date']
+    
+    # Narrow counting for per-skill mode to the allowed skill subset
+    if run['per_skill_mode']:
+        allowed_skills = list(run['prompt_config']['system_prompt'].keys())
+        skill_list_sql = ", ".join(["'" + s.replace("'", "''") + "'" for s in allowed_skills])
+        processed_count, failed_count = count_llm_results_with_extra_filter(
+            session, table_name, department_name, target_date, f"AND LAST_SKILL IN ({skill_list_sql})"
+        )
+    else:
+        processed_count, failed_count = count_llm_results(session, table_name, department_name, target_date)
+    
+    counting_time = time.time() - counting_start_time
+    print(f"    📊 Results counted in {counting_time:.2f}s")
+    
+    # Total timing summary
+    setup_time, count_time, query_build_time = run['setup_time'], run['count_time'], run['query_build_time']
+    total_time = time.time() - run['start_time']
+    print(f"    🏁 TOTAL BATCH TIME: {total_time:.2f}s for {pending_count} records")
+    print(f"    📋 Time breakdown:")
+    print(f"       - Setup: {setup_time:.2f}s ({setup_time/total_time*100:.1f}%)")
+    print(f"       - Counting: {count_time:.2f}s ({count_time/total_time*100:.1f}%)")
+    print(f"       - Query Build: {query_build_time:.3f}s ({query_build_time/total_time*100:.1f}%)")
+    print(f"       - LLM Execution: {execution_time:.2f}s ({execution_time/total_time*100:.1f}%)")
+    print(f"       - Results: {counting_time:.2f}s ({counting_time/total_time*100:.1f}%)")
+    
+    # Performance insights
+    if execution_time > 30:
+        print(f"    ⚠️  SLOW EXECUTION DETECTED!")
+        print(f"       - Consider reducing batch size or checking Snowflake compute resources")
+        print(f"       - {run['model_type'].upper()} may be rate-limited or overloaded")
+    
+    if records_per_second < 0.5:
+        print(f"    🐌 LOW THROUGHPUT WARNING: {records_per_second:.2f} records/second")
+        print(f"       - Expected: 1-5 records/second for typical LLM operations")
+    
+    return processed_count, failed_count
+
+
+def run_batch_llm_update(session: snowpark.Session, prompt_config, department_name, target_date, prompt_type=None,
+                         cache_stats=None):
+    """
+    Run batch UPDATE query to fill LLM responses using Snowflake's LLM functions
+    
+    Pending rows are split into batches of similar estimated input tokens (snowflake_llm_batch_planner)
+    and each batch commits its responses before the next one runs; a failed batch falls back to a
+    direct UPDATE of its own rows only. Rows of batches that fail both ways stay PENDING.
+    
+    Pending rows whose inputs were answered before are served from the LLM response cache
+    (snowflake_llm_response_cache); the LLM function is only called for misses.
+    
+    Args:
+        session: Snowflake session
+        prompt_config: Prompt configuration dictionary
+        department_name: Department name
+        target_date: Target date for analysis
+        prompt_type: Prompt type (recorded with cached responses)
+        cache_stats: Optional list receiving the response cache hit / miss counters of each batch
+    
+    Returns:
+        Tuple: (success, processed_count, failed_count)
+    """
+    import time
+    
+    # Start total timing
+    total_start_time = time.time()
+    
+    try:
+        run = prepare_batch_llm_run(session, prompt_config, department_name, target_date, prompt_type)
+        if run is None:
+            return False, 0, 0
+        
+        try:
+            if run['pending_count'] == 0:
+                return True, 0, 0
+            for batch in run['batches']:
+                batch_start_time = time.time()
+                try:
+                    batch_results = session.sql(build_llm_batch_query(run, batch)).collect()
+                    commit_llm_batch(session, run, batch_results, cache_stats)
+                except Exception as batch_error:
+                    if not recover_failed_llm_batch(session, run, batch, batch_error):
+                        continue
+                record_committed_llm_batch(run, batch, batch_start_time)
+        finally:
+            drop_llm_batch_plan(session, run)
+        
+        processed_count, failed_count = finish_batch_llm_run(session, run)
+        return True, processed_count, failed_count
+        
+    except Exception as e:
+        total_time = time.time() - total_start_time
+        error_details = format_error_details(e, f"BATCH LLM UPDATE - {department_name}")
+        print(f"    ❌ Batch LLM update failed after {total_time:.2f}s: {str(e)}")
+        print(error_details)
+        return False, 0, 0
+
+
+def run_concurrent_llm_updates(session: snowpark.Session, department_name, target_date, prompt_configs, max_concurrency=None):
+    """
+    Batch LLM updates of several independent prompts, with their batch queries running as concurrent
+    Snowpark async jobs (snowflake_llm_async_jobs) instead of one prompt after another.
+    
+    Every prompt is planned first; the batches of all prompts are then submitted heaviest first,
+    at most max_concurrency at a time, and each one is committed as soon as its query finishes.
+    A failed batch falls back to a direct UPDATE of its own rows, as in run_batch_llm_update.
+    
+    Args:
+        session: Snowflake session
+        department_name: Department name
+        target_date: Target date for analysis
+        prompt_configs: {prompt_type: prompt_config} of prompts whose rows are inserted (PENDING)
+        max_concurrency: Batch queries in flight at once (default get_llm_concurrency())
+    
+    Returns:
+        Dictionary: {prompt_type: {'success', 'processed_count', 'failed_count', 'cache_stats'}}
+    """
+    import time
+    
+    outcomes = {
+        prompt_type: {'success': False, 'processed_count': 0, 'failed_count': 0, 'cache_stats': []}
+        for prompt_type in prompt_configs
+    }
+    runs = {}
+    
+    # Plan tables are written while planning, so they are dropped whether or not the batches get to run
+    try:
+        for prompt_type, prompt_config in prompt_configs.items():
+            print(f"  🧮 Planning LLM batches: {prompt_type}")
+            try:
+                run = prepare_batch_llm_run(session, prompt_config, department_name, target_date, prompt_type)
+            except Exception as e:
+                print(f"    ❌ Batch LLM update failed for {prompt_type}: {str(e)}")
+                continue
+            if run is None:
+                continue
+            if run['pending_count'] == 0:
+                outcomes[prompt_type]['success'] = True
+                continue
+            runs[prompt_type] = run
+        
+        # Heaviest batches first across all prompts, so the longest queries start earliest
+        jobs = [
+            {'prompt_type': prompt_type, 'batch': batch, 'query': build_llm_batch_query(run, batch)}
+            for prompt_type, run in runs.items() for batch in run['batches']
+        ]
+        jobs.sort(key=lambda job: -job['batch']['estimated_tokens'])
+        
+        if jobs:
+            max_concurrency = max_concurrency if max_concurrency is not None else get_llm_concurrency()
+            print(f"  ⚡ Running {len(jobs)} LLM batches of {len(runs)} prompts, up to {max_concurrency} at a time")
+            execution_start_time = time.time()
+            for job, batch_results, batch_error in iter_async_query_results(session, jobs, max_concurrency):
+                run = runs[job['prompt_type']]
+                try:
+                    if batch_error is not None:
+                        raise batch_error
+                    commit_llm_batch(session, run, batch_results, outcomes[job['prompt_type']]['cache_stats'])
+                except Exception as commit_error:
+                    if not recover_failed_llm_batch(session, run, job['batch'], commit_error):
+                        continue
+                record_committed_llm_batch(run, job['batch'], job['submitted_at'])
+            print(f"  ⚡ All LLM batches finished in {time.time() - execution_start_time:.2f}s")
+    finally:
+        for run in runs.values():
+            drop_llm_batch_plan(session, run)
+    
+    for prompt_type, run in runs.items():
+        print(f"  📊 LLM results: {prompt_type}")
+        try:
+            processed_count, failed_count = finish_batch_llm_run(session, run)
+            outcomes[prompt_type].update({'success': True, 'processed_count': processed_count, 'failed_count': failed_count})
+        except Exception as e:
+            print(f"    ❌ Batch LLM update failed for {prompt_type}: {str(e)}")
+    
+    return outcomes
+
+
+def run_fallback_llm_update(session: snowpark.Session, prompt_config, table_name, llm_function, batch_filter):
+    """
+    Fill one batch with a direct UPDATE calling the LLM function per row (used when the batch query fails).
+    
+    Args:
+        session: Snowflake session
+        prompt_config: Prompt configuration dictionary
+        table_name: Prompt output table
+        llm_function: LLM UDF name
+        batch_filter: WHERE condition of the batch's pending rows
+    """
+    system_text = prompt_config['system_prompt']
+    per_skill_mode = is_per_skill_prompt(prompt_config)
+    needs_prompt_replacement = '@Prompt@' in (system_text if not per_skill_mode else "".join(system_text.values()))
+    
+    # Fallback to original UPDATE method with prompt replacement support
+    if needs_prompt_replacement or per_skill_mode:
+        print(f"    🔄 Using UPDATE method with @Prompt@ replacement...")
+        if per_skill_mode:
+            case_branches = []
+            for skill, prompt in system_text.items():
+                safe_skill = skill.replace("'", "''")
+                safe_prompt = prompt
+                case_branches.append(
+                    f"WHEN LAST_SKILL = '{safe_skill}' THEN REPLACE($${safe_prompt}$$, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT({table_name}.EXECUTION_ID), '@Prompt@'))"
+                )
+            case_expr = "CASE " + " ".join(case_branches) + " END"
+            update_query = f"""
+            UPDATE {table_name}
+            SET 
+                LLM_RESPONSE = {llm_function}(
+                                CONVERSATION_CONTENT,
+                                REPLACE({case_expr}, '<STEP-NAME>', COALESCE({table_name}.LAST_SKILL, '<STEP-NAME>')),
+                                MODEL_NAME,
+                                TEMPERATURE,
+                                MAX_TOKENS
+                            ),
+                            PROCESSING_STATUS = 'COMPLETED'
+                        WHERE {batch_filter}
+                        """
+        else:
+            update_query = f"""
+            UPDATE {table_name}
+            SET 
+                LLM_RESPONSE = {llm_function}(
+                        CONVERSATION_CONTENT,
+                        REPLACE(
+                            REPLACE($${system_text}$$, '@Prompt@', COALESCE(GET_N8N_SYSTEM_PROMPT({table_name}.EXECUTION_ID), GET_ERP_SYSTEM_PROMPT({table_name}.CONVERSATION_ID), '@Prompt@')),
+                            '<STEP-NAME>', COALESCE({table_name}.LAST_SKILL, '<STEP-NAME>')
+                        ),
+                    MODEL_NAME,
+                    TEMPERATURE,
+                    MAX_TOKENS
+                ),
+                PROCESSING_STATUS = 'COMPLETED'
+            WHERE {batch_filter}
+            """
+    else:
+        # Original UPDATE method without prompt replacement
+        update_query = f"""
+        UPDATE {table_name}
+        SET 
+            LLM_RESPONSE = {llm_function}(
+                CONVERSATION_CONTENT,
+                $${system_text}$$,
+                MODEL_NAME,
+                TEMPERATURE,
+                MAX_TOKENS
+            ),
+            PROCESSING_STATUS = 'COMPLETED'
+        WHERE {batch_filter}
+        """
+    
+    session.sql(update_query).collect()
+
+
+def count_llm_results(session: snowpark.Session, table_name, department_name, target_date):
+    """
+    Count successful and failed LLM responses by checking for error patterns
+    
+    Args:
+        session: Snowflake session
+        table_name: Full table name
+        department_name: Department name
+        target_date: Target date
+    
+    Returns:
+        Tuple: (processed_count, failed_count)
+    """
+    import time
+    
+    try:
+        # Count total completed records with timing
+        total_start_time = time.time()
+        
+        total_query = f"""
+        SELECT COUNT(*) as total_count
+        FROM {table_name}
+        WHERE PROCESSING_STATUS = 'COMPLETED'
+        AND DEPARTMENT = '{department_name}'
+        AND {build_date_range_predicate('DATE', target_date if target_date else datetime.now().strftime("%Y-%m-%d"))}
+        """
+        
+        total_result = session.sql(total_query).collect()
         total_count = total_result[0]['TOTAL_COUNT'] if total_result else 0
         
         total_time = time.time() - total_start_time
@@ -926,7 +1476,7 @@ def count_llm_results(session: snowpark.Session, table_name, department_name, ta
         FROM {table_name}
         WHERE PROCESSING_STATUS = 'COMPLETED'
         AND DEPARTMENT = '{department_name}'
-        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
+        AND {build_date_range_predicate('DATE', target_date if target_date else datetime.now().strftime("%Y-%m-%d"))}
         AND (
             LLM_RESPONSE LIKE '%[gemini_chat error]%'
             OR LLM_RESPONSE LIKE '%[openai_chat error]%'
@@ -973,7 +1523,7 @@ def count_llm_results_with_extra_filter(session: snowpark.Session, table_name, d
         FROM {table_name}
         WHERE PROCESSING_STATUS = 'COMPLETED'
         AND DEPARTMENT = '{department_name}'
-        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
+        AND {build_date_range_predicate('DATE', target_date if target_date else datetime.now().strftime("%Y-%m-%d"))}
         {extra_where_clause}
         """
         total_result = session.sql(total_query).collect()
@@ -985,7 +1535,7 @@ def count_llm_results_with_extra_filter(session: snowpark.Session, table_name, d
         FROM {table_name}
         WHERE PROCESSING_STATUS = 'COMPLETED'
         AND DEPARTMENT = '{department_name}'
-        AND DATE = '{target_date if target_date else datetime.now().strftime("%Y-%m-%d")}'
+        AND {build_date_range_predicate('DATE', target_date if target_date else datetime.now().strftime("%Y-%m-%d"))}
         {extra_where_clause}
         AND (
             LLM_RESPONSE LIKE '%[gemini_chat error]%'
@@ -1004,7 +1554,573 @@ def count_llm_results_with_extra_filter(session: snowpark.Session, table_name, d
         return 0, 0
 
 
-def process_department_llm_analysis(session: snowpark.Session, department_name, target_date=None, selected_prompts=None):
+def get_department_conversion_types(department_name):
+    """
+    Conversion types used by a department's configured prompts (drives the Phase 1 column projection).
+    """
+    dept_config = get_department_config(department_name)
+    if dept_config is None:
+        return []
+    return sorted({prompt_config['conversion_type'] for prompt_config in dept_config['llm_prompts'].values()})
+
+
+def load_shared_phase1_results(session: snowpark.Session, department_names, target_date):
+    """
+    Run Phase 1 once per source table shared by several of the given departments
+    (APPLICANTS_CHATS for the AT_* departments) instead of once per department.
+    
+    Args:
+        session: Snowflake session
+        department_names: Departments about to be processed
+        target_date: Target date for analysis
+    
+    Returns:
+        Dictionary: {department_name: (filtered_df, phase1_stats, success)} for departments on a shared table
+    """
+    shared_phase1_results = {}
+    
+    for table_name, shared_departments in get_shared_source_tables(department_names).items():
+        conversion_types = sorted({
+            conversion_type
+            for department_name in shared_departments
+            for conversion_type in get_department_conversion_types(department_name)
+        })
+        shared_phase1_results.update(
+            process_shared_table_phase1(session, shared_departments, target_date, conversion_types=conversion_types)
+        )
+    
+    return shared_phase1_results
+
+
+def get_prompt_category_filter(prompt_type):
+    """
+    Category a prompt's conversations are filtered by (filter_conversations_by_category), or None.
+    """
+    if prompt_type == 'misprescription':
+        return 'OTC Medication Advice'
+    if prompt_type == 'unnecessary_clinic' or prompt_type == 'clinic_recommendation_reason':
+        return 'Clinic Recommendation'
+    return None
+
+
+def get_render_conversation_model(render_cache, filtered_df, department_name):
+    """
+    Conversation model of filtered_df, built on first use and kept in render_cache for the rest of the run.
+    """
+    if render_cache is None:
+        return None
+    if 'conversation_model' not in render_cache:
+        render_cache['conversation_model'] = build_conversation_model(filtered_df, department_name)
+    return render_cache['conversation_model']
+
+
+def convert_prompt_frame(render_cache, filtered_df, frame, department_name, conversion_type, serialization_options=()):
+    """
+    Convert frame (filtered_df, a category-filtered subset or the conversion cache misses of either) to
+    XML, JSON or segment records: in a process pool for large frames, otherwise from the run's shared
+    conversation model restricted to the conversations of frame.
+    """
+    if should_convert_in_parallel(frame, conversion_type):
+        return convert_conversations_parallel(frame, department_name, conversion_type, serialization_options=serialization_options)
+    
+    conversation_model = get_render_conversation_model(render_cache, filtered_df, department_name)
+    if conversation_model is not None and frame is not filtered_df:
+        conversation_model = select_conversations(conversation_model, frame['CONVERSATION_ID'].unique())
+    return run_conversion(frame, department_name, conversion_type, conversation_model=conversation_model,
+                          serialization_options=serialization_options)
+
+
+def get_conversion_cache_stats(render_cache):
+    """
+    Conversion cache statistics collected over the run (kept in render_cache), or None without a render_cache.
+    """
+    if render_cache is None:
+        return None
+    return render_cache.setdefault('conversion_cache_stats', [])
+
+
+def convert_conversations_for_prompt(session: snowpark.Session, filtered_df, department_name, prompt_type, prompt_config, target_date,
+                                     render_cache=None):
+    """
+    Apply the prompt's category filter (if any) and convert Phase 1 rows to the prompt's conversion format.
+    With a render_cache, each (conversion_type, category filter, serialization options) output is
+    rendered once per run and reused by every prompt that needs it.
+    
+    Args:
+        session: Snowflake session
+        filtered_df: Phase 1 filtered DataFrame (or one CONVERSATION_ID shard of it)
+        department_name: Department name
+        prompt_type: Type of prompt being used
+        prompt_config: Prompt configuration dictionary
+        target_date: Target date for analysis
+        render_cache: Optional dict shared by the prompts of one run over the same filtered_df
+    
+    Returns:
+        Tuple: (conversations_df with a conversation_content column, None) or (None, error result dict)
+    """
+    # Step 2a: Choose conversion method based on prompt config
+    conversion_type = prompt_config.get('conversion_type', 'xml')  # Default to XML
+    category_name = get_prompt_category_filter(prompt_type)
+    # Compact serialization (opt-in per prompt) applies to XML, JSON and XML3D; segments have one layout
+    serialization_options = prompt_config.get('serialization_options', ()) if conversion_type != 'segment' else ()
+    render_key = (conversion_type, category_name, serialization_options)
+    
+    if render_cache is not None and render_key in render_cache:
+        cached_df, error_result = render_cache[render_key]
+        serialization_label = f" [{'+'.join(serialization_options)}]" if serialization_options else ''
+        print(f"    ♻️  Reusing {conversion_type} conversion{f' ({category_name})' if category_name else ''}{serialization_label} for {prompt_type}")
+        conversations_df = cached_df.copy() if cached_df is not None else None
+    else:
+        conversations_df, error_result = render_conversations_for_prompt(
+            session, filtered_df, department_name, prompt_type, conversion_type, category_name, target_date, render_cache,
+            serialization_options
+        )
+        if render_cache is not None:
+            render_cache[render_key] = (conversations_df.copy() if conversations_df is not None else None, error_result)
+    
+    if error_result:
+        return None, error_result
+    
+    # If this is the loss_interest prompt with per-skill system prompts, pre-filter rows
+    if conversion_type == 'json' and prompt_type == 'loss_interest' and is_per_skill_prompt(prompt_config):
+        allowed_skills = list(prompt_config['system_prompt'].keys())
+        before_len = len(conversations_df)
+        conversations_df = conversations_df[conversations_df['last_skill'].isin(allowed_skills)].copy()
+        print(f"    🎛️ loss_interest: filtered JSON conversations {before_len}→{len(conversations_df)} by LAST_SKILL")
+    
+    return conversations_df, None
+
+
+def render_conversations_for_prompt(session: snowpark.Session, filtered_df, department_name, prompt_type, conversion_type,
+                                    category_name, target_date, render_cache=None, serialization_options=()):
+    """
+    Filter by category and render one conversion format (the uncached part of convert_conversations_for_prompt),
+    in the compact layout given by serialization_options (XML, JSON and XML3D).
+    
+    Returns:
+        Tuple: (conversations_df with a conversation_content column, None) or (None, error result dict)
+    """
+    if category_name is not None:
+        if prompt_type == 'misprescription':
+            print(f"    🔄 Filtering for misprescription...")
+        else:
+            print(f"    🔄 Filtering for unnecessary clinic...")
+        filtered_df_2 = filter_conversations_by_category(session, filtered_df, category_name, department_name, target_date)
+    else:
+        filtered_df_2 = filtered_df
+    
+    # Unchanged conversations come from the conversion cache; the rest are converted in a process pool
+    # (large frames) or rendered from the shared model (XML3D loads its own three-day frame)
+    cache_stats = get_conversion_cache_stats(render_cache)
+    
+    if conversion_type == 'xml':
+        print(f"    🔄 Converting to XML format for {prompt_type}...")
+        from snowflake_llm_xml_converter import validate_xml_conversion
+    
+        conversations_df = convert_with_conversion_cache(
+            filtered_df_2, department_name, 'xml',
+            lambda frame: convert_prompt_frame(render_cache, filtered_df, frame, department_name, 'xml', serialization_options),
+            cache_stats=cache_stats, serialization_options=serialization_options
+        )
+        if conversations_df.empty:
+            print(f"    ❌ No conversations converted to XML for {prompt_type}")
+            return None, {'error': 'No XML conversations', 'conversion_type': 'xml'}
+    
+        # Validate conversion
+        validation_results = validate_xml_conversion(conversations_df, department_name)
+        print(f"    ✅ XML conversion: {validation_results['valid_xml_count']}/{validation_results['total_conversations']} valid ({validation_results['success_rate']:.1f}%)")
+    
+        # Rename column for consistency
+        conversations_df['conversation_content'] = conversations_df['content_xml_view']
+    
+    elif conversion_type == 'segment':
+        print(f"    🔄 Converting to segment format for {prompt_type}...")
+        from snowflake_llm_segment_converter import validate_segment_conversion
+    
+        conversations_df = convert_with_conversion_cache(
+            filtered_df_2, department_name, 'segment',
+            lambda frame: convert_prompt_frame(render_cache, filtered_df, frame, department_name, 'segment'),
+            cache_stats=cache_stats
+        )
+        if conversations_df.empty:
+            print(f"    ❌ No conversations converted to segment for {prompt_type}")
+            return None, {'error': 'No segment conversations', 'conversion_type': 'segment'}
+    
+        # Validate conversion
+        validation_results = validate_segment_conversion(conversations_df, department_name)
+        print(f"    ✅ Segment conversion: {validation_results['valid_segment_count']}/{validation_results['total_bot_segments']} valid BOT segments ({validation_results['success_rate']:.1f}%) from {validation_results['unique_conversations']} conversations")
+    
+        # Rename column for consistency
+        conversations_df['conversation_content'] = conversations_df['messages']
+    
+    elif conversion_type == 'json':
+        print(f"    🔄 Converting to JSON format for {prompt_type}...")
+        from snowflake_llm_json_converter import validate_json_conversion
+    
+        conversations_df = convert_with_conversion_cache(
+            filtered_df_2, department_name, 'json',
+            lambda frame: convert_prompt_frame(render_cache, filtered_df, frame, department_name, 'json', serialization_options),
+            cache_stats=cache_stats, serialization_options=serialization_options
+        )
+        if conversations_df.empty:
+            print(f"    ❌ No conversations converted to JSON for {prompt_type}")
+            return None, {'error': 'No JSON conversations', 'conversion_type': 'json'}
+    
+        # Validate conversion
+        validation_results = validate_json_conversion(conversations_df, department_name)
+        print(f"    ✅ JSON conversion: {validation_results['valid_json_count']}/{validation_results['total_conversations']} valid JSON conversations ({validation_results['success_rate']:.1f}%)")
+    
+        # Rename column for consistency
+        conversations_df['conversation_content'] = conversations_df['content_json_view']
+    
+    elif conversion_type == 'xml3d':
+        print(f"    🔄 Converting to XML3D format for {prompt_type}...")
+        from snowflake_llm_xml3d import convert_conversations_to_xml3d, validate_xml3d_conversion
+    
+        filtered_df_3d, phase1_stats_3d, success = process_department_phase1_multi_day(
+            session, department_name, target_date, conversion_types=['xml3d']
+        )
+    
+        conversations_df = convert_with_conversion_cache(
+            filtered_df_3d, department_name, 'xml3d',
+            lambda frame: convert_conversations_to_xml3d(frame, department_name, serialization_options=serialization_options),
+            cache_stats=cache_stats, serialization_options=serialization_options
+        )
+        if conversations_df.empty:
+            print(f"    ❌ No conversations converted to XML3D for {prompt_type}")
+            return None, {'error': 'No XML3D conversations', 'conversion_type': 'xml3d'}
+    
+        # Validate conversion
+        validation_results = validate_xml3d_conversion(conversations_df, department_name)
+        print(f"    ✅ XML3D conversion: {validation_results['valid_xml3d_count']}/{validation_results['total_conversations']} valid XML3D conversations ({validation_results['success_rate']:.1f}%)")
+    
+        # Rename column for consistency
+        conversations_df['conversation_content'] = conversations_df['content_xml_view']
+    
+    else:
+        print(f"    ❌ Unknown conversion type: {conversion_type}")
+        return None, {'error': f'Unknown conversion type: {conversion_type}'}
+    
+    return conversations_df, None
+
+
+def print_response_cache_summary(department_results):
+    """
+    Print the LLM response cache hit / miss counters of each prompt of a department run.
+    """
+    cached_prompts = {
+        prompt_type: result for prompt_type, result in department_results.items()
+        if isinstance(result, dict) and result.get('llm_cache_hits', 0) + result.get('llm_cache_misses', 0) > 0
+    }
+    if not cached_prompts:
+        return
+    
+    total_hits = sum(result['llm_cache_hits'] for result in cached_prompts.values())
+    total_rows = total_hits + sum(result['llm_cache_misses'] for result in cached_prompts.values())
+    print(f"   ♻️  LLM response cache: {total_hits / total_rows * 100:.1f}% hits ({total_hits}/{total_rows})")
+    for prompt_type, result in cached_prompts.items():
+        print(f"      • {prompt_type}: {result['llm_cache_hits']} hits, {result['llm_cache_misses']} misses")
+
+
+def get_prompts_to_run(dept_config, department_name, selected_prompts=None):
+    """
+    Department prompts to run, optionally restricted to selected_prompts (None or ['*'] runs all).
+    """
+    all_prompts = dept_config['llm_prompts']
+    if selected_prompts is None or selected_prompts == ['*']:
+        return all_prompts
+    
+    selected_set = set(selected_prompts)
+    prompts_to_run = {k: v for k, v in all_prompts.items() if (k in selected_set)}
+    missing = [p for p in selected_prompts if p not in all_prompts]
+    if missing:
+        print(f"    ⚠️  Skipping unknown prompts for {department_name}: {missing}")
+    return prompts_to_run
+
+
+# Prompts that filter on another prompt's LLM output (filter_conversations_by_category)
+CATEGORY_FILTERED_PROMPTS = ('misprescription', 'unnecessary_clinic', 'clinic_recommendation_reason')
+
+
+def get_prompt_passes(prompts_to_run):
+    """
+    Split prompts into passes whose LLM updates are independent: prompts that filter on another
+    prompt's LLM output (CATEGORY_FILTERED_PROMPTS) run after the first pass.
+    
+    Returns:
+        List of {prompt_type: prompt_config} dictionaries (empty passes dropped)
+    """
+    prompt_passes = [
+        {k: v for k, v in prompts_to_run.items() if k not in CATEGORY_FILTERED_PROMPTS},
+        {k: v for k, v in prompts_to_run.items() if k in CATEGORY_FILTERED_PROMPTS}
+    ]
+    return [pass_prompts for pass_prompts in prompt_passes if pass_prompts]
+
+
+def run_streamed_prompt_update(session: snowpark.Session, department_name, prompt_type, prompt_config, target_date, shard_results,
+                               llm_update=None):
+    """
+    Run the batch LLM UPDATE once for a prompt whose rows were inserted shard by shard
+    (or in one piece, ahead of a concurrent LLM update).
+    
+    Args:
+        session: Snowflake session
+        department_name: Department name
+        prompt_type: Type of prompt being used
+        prompt_config: Prompt configuration dictionary
+        target_date: Target date for analysis
+        shard_results: analyze_conversations_with_prompt results (run_llm_update=False) or
+                       conversion error results, one per shard
+        llm_update: Outcome of the prompt from run_concurrent_llm_updates; run_batch_llm_update
+                    runs here when not given
+    
+    Returns:
+        Analysis results dictionary, same shape as analyze_conversations_with_prompt
+    """
+    model_type = prompt_config.get('model_type', 'openai')
+    model = prompt_config.get('model', 'gpt-4o-mini')
+    conversion_type = prompt_config.get('conversion_type', 'xml')
+    
+    inserted_results = [result for result in shard_results if 'error' not in result]
+    if not inserted_results:
+        # Nothing inserted in any shard: report the error the in-memory run would have reported
+        return shard_results[-1] if shard_results else {'error': 'No filtered data from Phase 1'}
+    
+    total_conversations = sum(result['total_conversations'] for result in inserted_results)
+    
+    if llm_update is not None:
+        batch_success, processed_count, failed_count = llm_update['success'], llm_update['processed_count'], llm_update['failed_count']
+        response_cache_stats = llm_update['cache_stats']
+    else:
+        response_cache_stats = []
+        batch_success, processed_count, failed_count = run_batch_llm_update(
+            session, prompt_config, department_name, target_date, prompt_type=prompt_type, cache_stats=response_cache_stats
+        )
+    
+    if not batch_success:
+        print(f"    ❌ Batch LLM update failed for {prompt_type}")
+        return {
+            'total_conversations': total_conversations,
+            'processed_count': 0,
+            'prompt_type': prompt_type,
+            'conversion_type': conversion_type,
+            'model_type': model_type,
+            'model_name': model,
+            'success_rate': 0,
+            'error': 'Batch LLM update failed'
+        }
+    
+    success_rate = (processed_count / total_conversations * 100) if total_conversations > 0 else 0
+    shard_note = f" ({len(inserted_results)} shards)" if len(shard_results) > 1 else ""
+    print(f"    ✅ {prompt_type} batch processing{shard_note}: {processed_count}/{total_conversations} success ({success_rate:.1f}%), {failed_count} failed")
+    
+    response_cache_summary = summarize_response_cache_stats(response_cache_stats)
+    return {
+        'total_conversations': total_conversations,
+        'processed_count': processed_count,
+        'failed_count': failed_count,
+        'prompt_type': prompt_type,
+        'conversion_type': conversion_type,
+        'model_type': model_type,
+        'model_name': model,
+        'success_rate': success_rate,
+        'shard_count': len(shard_results),
+        'llm_cache_hits': response_cache_summary['hits'],
+        'llm_cache_misses': response_cache_summary['misses']
+    }
+
+
+def process_department_llm_analysis_streaming(session: snowpark.Session, department_name, target_date, prompts_to_run, shard_count,
+                                              llm_concurrency=None):
+    """
+    Bounded-memory variant of process_department_llm_analysis.
+    
+    The day is split into shard_count CONVERSATION_ID hash shards. Each shard is loaded, filtered,
+    converted and merged (merge_llm_raw_data) before the next one is loaded, so only one shard is held
+    in memory. Rows of conversations no longer in the day's data are pruned once all shards are written
+    (skipped when a shard failed, so its earlier rows are kept).
+    The batch LLM UPDATE then runs once per prompt, leaving the output tables as an in-memory run would
+    (with llm_concurrency > 1 the updates of a pass run as concurrent async jobs).
+    
+    Prompts that filter on another prompt's LLM output (CATEGORY_FILTERED_PROMPTS) run in a second
+    pass over the shards, after the first pass's LLM updates. XML3D prompts group conversations by
+    customer across three days, so they cannot be split by CONVERSATION_ID and run unsharded.
+    
+    Args:
+        session: Snowflake session
+        department_name: Department name to process
+        target_date: Target date for analysis
+        prompts_to_run: {prompt_type: prompt_config} to run
+        shard_count: Number of CONVERSATION_ID hash shards
+        llm_concurrency: Optional LLM batch queries in flight (falls back to LLM_JUDGE_LLM_CONCURRENCY, default 1)
+    
+    Returns:
+        Dictionary: {prompt_type: analysis results}
+    """
+    print(f"    🧩 Streaming {department_name} in {shard_count} CONVERSATION_ID shards")
+    
+    conversion_types = [conversion_type for conversion_type in get_department_conversion_types(department_name)
+                        if conversion_type != 'xml3d']
+    xml3d_prompts = {k: v for k, v in prompts_to_run.items() if v.get('conversion_type', 'xml') == 'xml3d'}
+    sharded_prompts = {k: v for k, v in prompts_to_run.items() if k not in xml3d_prompts}
+    llm_concurrency = get_llm_concurrency(llm_concurrency)
+    
+    pass_results = {}
+    for pass_prompts in get_prompt_passes(sharded_prompts):
+        shard_results = {prompt_type: [] for prompt_type in pass_prompts}
+        written_prompts = set()
+        incomplete_prompts = set()  # Prompts with a shard that did not write its rows
+        failed_shards = []
+        pass_started_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        for shard_index in range(shard_count):
+            filtered_df, phase1_stats, success = process_department_phase1(
+                session, department_name, target_date, conversion_types=conversion_types,
+                shard=(shard_index, shard_count)
+            )
+            if not success:
+                print(f"    ❌ Shard {shard_index + 1}/{shard_count}: loading failed, skipping")
+                failed_shards.append(shard_index)
+                continue
+            if filtered_df.empty:
+                print(f"    ⚠️  Shard {shard_index + 1}/{shard_count}: no filtered data, skipping")
+                continue
+            
+            # Renders are shared by the prompts of this shard only
+            render_cache = {}
+            
+            for prompt_type, prompt_config in pass_prompts.items():
+                print(f"  🎯 Processing prompt: {prompt_type} (shard {shard_index + 1}/{shard_count})")
+                
+                conversations_df, error_result = convert_conversations_for_prompt(
+                    session, filtered_df, department_name, prompt_type, prompt_config, target_date,
+                    render_cache=render_cache
+                )
+                if error_result is not None:
+                    shard_results[prompt_type].append(error_result)
+                    incomplete_prompts.add(prompt_type)
+                    continue
+                
+                prompt_results = analyze_conversations_with_prompt(
+                    session, conversations_df, department_name, prompt_type,
+                    prompt_config, target_date,
+                    cleanup=False, run_llm_update=False
+                )
+                if 'error' not in prompt_results:
+                    written_prompts.add(prompt_type)
+                else:
+                    incomplete_prompts.add(prompt_type)
+                shard_results[prompt_type].append(prompt_results)
+                del conversations_df
+            
+            # Release the shard (and its renders) before loading the next one
+            del filtered_df, render_cache
+        
+        # Every shard touched the rows it wrote; rows left older than the pass are gone from the data.
+        # A shard that failed to load or write left its rows untouched, so pruning would delete them
+        if failed_shards:
+            print(f"    ⚠️  Shards {[shard_index + 1 for shard_index in failed_shards]} failed to load, "
+                  f"keeping existing rows (no pruning)")
+        for prompt_type in (written_prompts - incomplete_prompts if not failed_shards else set()):
+            try:
+                prune_llm_raw_data(session, pass_prompts[prompt_type]['output_table'], department_name, target_date,
+                                   [prompt_type], pass_started_at)
+            except Exception as e:
+                print(f"    ⚠️  Could not prune stale {prompt_type} rows: {str(e)}")
+        
+        # The pass's prompts are independent: their LLM batches can run as concurrent jobs
+        llm_updates = {}
+        if llm_concurrency > 1:
+            llm_updates = run_concurrent_llm_updates(
+                session, department_name, target_date,
+                {prompt_type: prompt_config for prompt_type, prompt_config in pass_prompts.items()
+                 if any('error' not in result for result in shard_results[prompt_type])},
+                max_concurrency=llm_concurrency
+            )
+        
+        for prompt_type, prompt_config in pass_prompts.items():
+            pass_results[prompt_type] = run_streamed_prompt_update(
+                session, department_name, prompt_type, prompt_config, target_date, shard_results[prompt_type],
+                llm_update=llm_updates.get(prompt_type)
+            )
+    
+    xml3d_render_cache = {}
+    for prompt_type, prompt_config in xml3d_prompts.items():
+        print(f"  🎯 Processing prompt: {prompt_type} (unsharded)")
+        conversations_df, error_result = convert_conversations_for_prompt(
+            session, pd.DataFrame(), department_name, prompt_type, prompt_config, target_date,
+            render_cache=xml3d_render_cache
+        )
+        if error_result is not None:
+            pass_results[prompt_type] = error_result
+            continue
+        pass_results[prompt_type] = analyze_conversations_with_prompt(
+            session, conversations_df, department_name, prompt_type, prompt_config, target_date
+        )
+    
+    # Report in configuration order, like the in-memory run
+    return {prompt_type: pass_results[prompt_type] for prompt_type in prompts_to_run}
+
+
+def run_department_prompts_concurrently(session: snowpark.Session, filtered_df, department_name, target_date, prompts_to_run,
+                                         render_cache, max_concurrency):
+    """
+    In-memory prompt processing with concurrent LLM updates: in each pass of independent prompts
+    (get_prompt_passes) every prompt is converted and inserted first, then the LLM batches of all of
+    them run as concurrent async jobs (run_concurrent_llm_updates).
+    
+    Args:
+        session: Snowflake session
+        filtered_df: Phase 1 frame of the department
+        department_name: Department name
+        target_date: Target date for analysis
+        prompts_to_run: {prompt_type: prompt_config} to run
+        render_cache: Conversation model and rendered formats shared by the prompts
+        max_concurrency: Batch queries in flight at once
+    
+    Returns:
+        Dictionary: {prompt_type: analysis results}, in configuration order
+    """
+    prompt_results = {}
+    for pass_prompts in get_prompt_passes(prompts_to_run):
+        inserted_results = {}
+        for prompt_type, prompt_config in pass_prompts.items():
+            print(f"  🎯 Processing prompt: {prompt_type}")
+            
+            conversations_df, error_result = convert_conversations_for_prompt(
+                session, filtered_df, department_name, prompt_type, prompt_config, target_date,
+                render_cache=render_cache
+            )
+            if error_result is not None:
+                prompt_results[prompt_type] = error_result
+                continue
+            
+            insert_result = analyze_conversations_with_prompt(
+                session, conversations_df, department_name, prompt_type,
+                prompt_config, target_date, run_llm_update=False
+            )
+            if 'error' in insert_result:
+                prompt_results[prompt_type] = insert_result
+                continue
+            inserted_results[prompt_type] = insert_result
+        
+        llm_updates = run_concurrent_llm_updates(
+            session, department_name, target_date,
+            {prompt_type: pass_prompts[prompt_type] for prompt_type in inserted_results},
+            max_concurrency=max_concurrency
+        )
+        for prompt_type, insert_result in inserted_results.items():
+            prompt_results[prompt_type] = run_streamed_prompt_update(
+                session, department_name, prompt_type, pass_prompts[prompt_type], target_date, [insert_result],
+                llm_update=llm_updates[prompt_type]
+            )
+    
+    # Report in configuration order, like the sequential run
+    return {prompt_type: prompt_results[prompt_type] for prompt_type in prompts_to_run if prompt_type in prompt_results}
+
+
+def process_department_llm_analysis(session: snowpark.Session, department_name, target_date=None, selected_prompts=None,
+                                    phase1_result=None, memory_budget_mb=None, llm_concurrency=None):
     """
     Process LLM analysis for a single department - follows the same pattern as existing code
     
@@ -1012,6 +2128,13 @@ def process_department_llm_analysis(session: snowpark.Session, department_name,
         session: Snowflake session
         department_name: Department name to process
         target_date: Target date for analysis
+        phase1_result: Optional preloaded (filtered_df, phase1_stats, success) tuple, e.g. from
+                       load_shared_phase1_results; Phase 1 is run here when not given
+        memory_budget_mb: Optional memory budget (MB, falls back to LLM_JUDGE_MEMORY_BUDGET_MB). When the
+                          day is estimated to exceed it, the department is processed in CONVERSATION_ID
+                          shards (process_department_llm_analysis_streaming)
+        llm_concurrency: Optional number of prompts whose LLM batches run as concurrent async jobs
+                         (falls back to LLM_JUDGE_LLM_CONCURRENCY; the default 1 runs prompts sequentially)
     
     Returns:
         Tuple: (department_results, success)
@@ -1020,11 +2143,43 @@ def process_department_llm_analysis(session: snowpark.Session, department_name,
     print("=" * 50)
     
     try:
+        departments_config = get_compiled_departments_config()
+        
+        # Stream the day in hash shards when it would not fit in the memory budget
+        memory_budget_mb = get_phase1_memory_budget_mb(memory_budget_mb)
+        if phase1_result is None and memory_budget_mb is not None:
+            dept_config = departments_config[department_name]
+            if 'llm_prompts' not in dept_config or not dept_config['llm_prompts']:
+                print(f"    ⚠️  No LLM prompts configured for {department_name}")
+                return {'error': 'No LLM prompts configured'}, False
+            
+            shard_count, _ = estimate_phase1_shard_count(session, department_name, target_date, memory_budget_mb)
+            if shard_count > 1:
+                department_results = process_department_llm_analysis_streaming(
+                    session, department_name, target_date,
+                    get_prompts_to_run(dept_config, department_name, selected_prompts), shard_count,
+                    llm_concurrency=llm_concurrency
+                )
+                successful_prompts = sum(1 for result in department_results.values()
+                                         if result.get('processed_count', 0) > 0)
+                total_conversations = sum(result.get('total_conversations', 0) for result in department_results.values())
+                
+                print(f"\n✅ {department_name} COMPLETED ({shard_count} shards):")
+                print(f"   🎯 Prompts processed: {successful_prompts}/{len(department_results)}")
+                print(f"   💬 Conversations analyzed: {total_conversations}")
+                print_response_cache_summary(department_results)
+                
+                return department_results, True
+        
         # Step 1: Get filtered data using existing Phase 1 foundation
         print(f"📊 Step 1: Loading filtered data...")
-        filtered_df, phase1_stats, success = process_department_phase1(
-            session, department_name, target_date
-        )
+        if phase1_result is not None:
+            print(f"    🔗 Using shared-table Phase 1 result")
+            filtered_df, phase1_stats, success = phase1_result
+        else:
+            filtered_df, phase1_stats, success = process_department_phase1(
+                session, department_name, target_date, conversion_types=get_department_conversion_types(department_name)
+            )
         
         if not success or filtered_df.empty:
             print(f"    ❌ No filtered data from Phase 1")
@@ -1033,7 +2188,6 @@ def process_department_llm_analysis(session: snowpark.Session, department_name,
         print(f"    ✅ Loaded {len(filtered_df)} rows, {filtered_df['CONVERSATION_ID'].nunique()} conversations")
         
         # Step 2: Get department configuration for prompt processing
-        departments_config = get_snowflake_llm_departments_config()
         dept_config = departments_config[department_name]
         
         if 'llm_prompts' not in dept_config or not dept_config['llm_prompts']:
@@ -1044,122 +2198,36 @@ def process_department_llm_analysis(session: snowpark.Session, department_name,
         department_results = {}
         
         # Filter prompts if a subset was requested
-        all_prompts = dept_config['llm_prompts']
-        if selected_prompts is None or selected_prompts == ['*']:
-            prompts_to_run = all_prompts
+        prompts_to_run = get_prompts_to_run(dept_config, department_name, selected_prompts)
+        
+        # Conversation model and rendered formats shared by all prompts of this run
+        render_cache = {}
+        
+        # Independent prompts run their LLM batches as concurrent async jobs
+        llm_concurrency = get_llm_concurrency(llm_concurrency)
+        if llm_concurrency > 1 and len(prompts_to_run) > 1:
+            department_results = run_department_prompts_concurrently(
+                session, filtered_df, department_name, target_date, prompts_to_run, render_cache, llm_concurrency
+            )
         else:
-            selected_set = set(selected_prompts)
-            prompts_to_run = {k: v for k, v in all_prompts.items() if (k in selected_set)}
-            missing = [p for p in selected_prompts if p not in all_prompts]
-            if missing:
-                print(f"    ⚠️  Skipping unknown prompts for {department_name}: {missing}")
-
-        for prompt_type, prompt_config in prompts_to_run.items():
-            print(f"  🎯 Processing prompt: {prompt_type}")
-            
-            # Step 2a: Choose conversion method based on prompt config
-            conversion_type = prompt_config.get('conversion_type', 'xml')  # Default to XML
-            
-            if prompt_type == 'misprescription':
-                print(f"    🔄 Filtering for misprescription...")
-                filtered_df_2 = filter_conversations_by_category(session, filtered_df, 'OTC Medication Advice', department_name, target_date)
-            elif prompt_type == 'unnecessary_clinic' or prompt_type == 'clinic_recommendation_reason':
-                print(f"    🔄 Filtering for unnecessary clinic...")
-                filtered_df_2 = filter_conversations_by_category(session, filtered_df, 'Clinic Recommendation', department_name, target_date)
-            else:
-                filtered_df_2 = filtered_df
-            
-            if conversion_type == 'xml':
-                print(f"    🔄 Converting to XML format for {prompt_type}...")
-                from snowflake_llm_xml_converter import convert_conversations_to_xml_dataframe, validate_xml_conversion
-                
-                conversations_df = convert_conversations_to_xml_dataframe(filtered_df_2, department_name)
-                if conversations_df.empty:
-                    print(f"    ❌ No conversations converted to XML for {prompt_type}")
-                    department_results[prompt_type] = {'error': 'No XML conversations', 'conversion_type': 'xml'}
-                    continue
-                
-                # Validate conversion
-                validation_results = validate_xml_conversion(conversations_df, department_name)
-                print(f"    ✅ XML conversion: {validation_results['valid_xml_count']}/{validation_results['total_conversations']} valid ({validation_results['success_rate']:.1f}%)")
-                
-                # Rename column for consistency
-                conversations_df['conversation_content'] = conversations_df['content_xml_view']
-                
-            elif conversion_type == 'segment':
-                print(f"    🔄 Converting to segment format for {prompt_type}...")
-                from snowflake_llm_segment_converter import convert_conversations_to_segment_dataframe, validate_segment_conversion
-                
-                conversations_df = convert_conversations_to_segment_dataframe(filtered_df_2, department_name)
-                if conversations_df.empty:
-                    print(f"    ❌ No conversations converted to segment for {prompt_type}")
-                    department_results[prompt_type] = {'error': 'No segment conversations', 'conversion_type': 'segment'}
-                    continue
-                
-                # Validate conversion
-                validation_results = validate_segment_conversion(conversations_df, department_name)
-                print(f"    ✅ Segment conversion: {validation_results['valid_segment_count']}/{validation_results['total_bot_segments']} valid BOT segments ({validation_results['success_rate']:.1f}%) from {validation_results['unique_conversations']} conversations")
-                
-                # Rename column for consistency
-                conversations_df['conversation_content'] = conversations_df['messages']
-                
-            elif conversion_type == 'json':
-                print(f"    🔄 Converting to JSON format for {prompt_type}...")
-                from snowflake_llm_json_converter import convert_conversations_to_json_dataframe, validate_json_conversion
-                
-                conversations_df = convert_conversations_to_json_dataframe(filtered_df_2, department_name)
-                if conversations_df.empty:
-                    print(f"    ❌ No conversations converted to JSON for {prompt_type}")
-                    department_results[prompt_type] = {'error': 'No JSON conversations', 'conversion_type': 'json'}
-                    continue
-                
-                # Validate conversion
-                validation_results = validate_json_conversion(conversations_df, department_name)
-                print(f"    ✅ JSON conversion: {validation_results['valid_json_count']}/{validation_results['total_conversations']} valid JSON conversations ({validation_results['success_rate']:.1f}%)")
-                
-                # Rename column for consistency
-                conversations_df['conversation_content'] = conversations_df['content_json_view']
+            for prompt_type, prompt_config in prompts_to_run.items():
+                print(f"  🎯 Processing prompt: {prompt_type}")
                 
-                # If this is the loss_interest prompt with per-skill system prompts, pre-filter rows
-                if prompt_type == 'loss_interest' and isinstance(prompt_config.get('system_prompt'), dict):
-                    allowed_skills = list(prompt_config['system_prompt'].keys())
-                    before_len = len(conversations_df)
-                    conversations_df = conversations_df[conversations_df['last_skill'].isin(allowed_skills)].copy()
-                    print(f"    🎛️ loss_interest: filtered JSON conversations {before_len}→{len(conversations_df)} by LAST_SKILL")
-                
-            elif conversion_type == 'xml3d':
-                print(f"    🔄 Converting to XML3D format for {prompt_type}...")
-                from snowflake_llm_xml3d import convert_conversations_to_xml3d, validate_xml3d_conversion
-
-                filtered_df_3d, phase1_stats_3d, success = process_department_phase1_multi_day(
-                    session, department_name, target_date
+                conversations_df, error_result = convert_conversations_for_prompt(
+                    session, filtered_df, department_name, prompt_type, prompt_config, target_date,
+                    render_cache=render_cache
                 )
-                
-                conversations_df = convert_conversations_to_xml3d(filtered_df_3d, department_name)
-                if conversations_df.empty:
-                    print(f"    ❌ No conversations converted to XML3D for {prompt_type}")
-                    department_results[prompt_type] = {'error': 'No XML3D conversations', 'conversion_type': 'xml3d'}
+                if error_result is not None:
+                    department_results[prompt_type] = error_result
                     continue
                 
-                # Validate conversion
-                validation_results = validate_xml3d_conversion(conversations_df, department_name)
-                print(f"    ✅ XML3D conversion: {validation_results['valid_xml3d_count']}/{validation_results['total_conversations']} valid XML3D conversations ({validation_results['success_rate']:.1f}%)")
-                
-                # Rename column for consistency
-                conversations_df['conversation_content'] = conversations_df['content_xml_view']
+                # Process conversations with this prompt
+                prompt_results = analyze_conversations_with_prompt(
+                    session, conversations_df, department_name, prompt_type, 
+                    prompt_config, target_date
+                )
                 
-            else:
-                print(f"    ❌ Unknown conversion type: {conversion_type}")
-                department_results[prompt_type] = {'error': f'Unknown conversion type: {conversion_type}'}
-                continue
-            
-            # Process conversations with this prompt
-            prompt_results = analyze_conversations_with_prompt(
-                session, conversations_df, department_name, prompt_type, 
-                prompt_config, target_date
-            )
-            
-            department_results[prompt_type] = prompt_results
+                department_results[prompt_type] = prompt_results
         
         # Calculate overall department statistics
         total_prompts = len(department_results)
@@ -1171,7 +2239,11 @@ def process_department_llm_analysis(session: snowpark.Session, department_name,
         print(f"\n✅ {department_name} COMPLETED:")
         print(f"   🎯 Prompts processed: {successful_prompts}/{total_prompts}")
         print(f"   💬 Conversations analyzed: {total_conversations}")
-        
+        if render_cache.get('conversion_cache_stats'):
+            cache_summary = summarize_conversion_cache_stats(render_cache['conversion_cache_stats'])
+            print(f"   ♻️  Conversion cache: {cache_summary['hit_rate']:.1f}% hits ({cache_summary['hits']}/{cache_summary['units']}), ~{cache_summary['saved_seconds']:.2f}s conversion saved")
+        print_response_cache_summary(department_results)
+
         return department_results, True
         
     except Exception as e:
@@ -1218,8 +2290,7 @@ def update_department_master_summary(session: snowpark.Session, department_name,
         print(f"   🎯 Processing {len(dept_metrics)} metrics for {department_name}")
         
         # Get department's configured prompts to check dependencies
-        departments_config = get_snowflake_llm_departments_config()
-        configured_prompts = list(departments_config.get(department_name, {}).get('llm_prompts', {}).keys())
+        configured_prompts = list(get_compiled_departments_config().get(department_name, {}).get('llm_prompts', {}).keys())
         
         # Calculate metrics in order
         metric_results = {}
@@ -1436,7 +2507,7 @@ def filter_conversations_by_category(session: snowpark.Session, filtered_df, cat
             LLM_RESPONSE
         FROM LLM_EVAL.PUBLIC.DOCTORS_CATEGORIZING_RAW_DATA
         WHERE DEPARTMENT = '{department_name}'
-        AND DATE = '{target_date}'
+        AND {build_date_range_predicate('DATE', target_date)}
         AND PROCESSING_STATUS = 'COMPLETED'
         AND LLM_RESPONSE IS NOT NULL
         AND LLM_RESPONSE != ''
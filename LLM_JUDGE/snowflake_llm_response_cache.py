@@ -0,0 +1,289 @@
+"""
+LLM Response Cache Module for Snowflake LLM Analysis
+Snowflake table of LLM responses keyed by a SHA-256 of everything the LLM call sees:
+conversation content, resolved system prompt, model, temperature, max_tokens and the prompt version
+run_batch_llm_update LEFT JOINs its pending rows against the cache and calls the LLM function only
+for misses, so reruns, conversations that span days and repeated three-day XML3D windows are not re-sent
+"""
+
+import os
+from snowflake_llm_config import compute_config_hash
+from snowflake_query_builder import build_json_parse_expression
+
+DEFAULT_RESPONSE_CACHE_TABLE = 'LLM_EVAL.PUBLIC.LLM_RESPONSE_CACHE'
+DEFAULT_RESPONSE_CACHE_TTL_DAYS = 30
+
+# Responses matching these are failures (see count_llm_results) and are never cached
+LLM_ERROR_RESPONSE_PATTERNS = ('%[gemini_chat error]%', '%[openai_chat error]%')
+
+RESPONSE_CACHE_SCHEMA = {
+    'CACHE_KEY': 'VARCHAR(64)',
+    'DEPARTMENT': 'VARCHAR',
+    'PROMPT_TYPE': 'VARCHAR',
+    'PROMPT_VERSION': 'VARCHAR',
+    'MODEL_NAME': 'VARCHAR',
+    'LLM_RESPONSE': 'VARCHAR',
+    'CREATED_AT': 'TIMESTAMP_NTZ',
+    'LAST_HIT_AT': 'TIMESTAMP_NTZ',
+    'HIT_COUNT': 'NUMBER',
+}
+
+
+def _sql_literal(value):
+    """
+    Single-quoted SQL string literal of a value.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def get_response_cache_table():
+    """
+    Cache table (LLM_JUDGE_RESPONSE_CACHE_TABLE overrides LLM_EVAL.PUBLIC.LLM_RESPONSE_CACHE).
+    """
+    return os.environ.get('LLM_JUDGE_RESPONSE_CACHE_TABLE', DEFAULT_RESPONSE_CACHE_TABLE)
+
+
+def get_response_cache_ttl_days():
+    """
+    Cached responses older than this many days are not served and are pruned (LLM_JUDGE_RESPONSE_CACHE_TTL_DAYS).
+    """
+    return int(os.environ.get('LLM_JUDGE_RESPONSE_CACHE_TTL_DAYS', DEFAULT_RESPONSE_CACHE_TTL_DAYS))
+
+
+def is_response_cache_enabled():
+    """
+    The cache can be switched off with LLM_JUDGE_RESPONSE_CACHE=0.
+    """
+    return os.environ.get('LLM_JUDGE_RESPONSE_CACHE', '1') != '0'
+
+
+def get_prompt_version(prompt_config):
+    """
+    Version of a prompt in cache keys: its content hash (prompt_hash of the compiled config), prefixed
+    by an explicit 'prompt_version' setting when the prompt has one. Editing the prompt or bumping
+    prompt_version makes its old responses stop matching.
+    """
+    prompt_hash = prompt_config.get('prompt_hash') or compute_config_hash(dict(prompt_config))
+    explicit_version = prompt_config.get('prompt_version')
+    return f"{explicit_version}:{prompt_hash[:16]}" if explicit_version else prompt_hash[:16]
+
+
+def ensure_response_cache_table(session):
+    """
+    Create the cache table if it does not exist.
+    """
+    columns_sql = ",\n        ".join(f"{column} {data_type}" for column, data_type in RESPONSE_CACHE_SCHEMA.items())
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {get_response_cache_table()} (
+        {columns_sql}
+    )
+    """).collect()
+
+
+def build_cache_key_sql(prompt_version):
+    """
+    SHA-256 cache key expression over the columns of a pending-row SELECT
+    (CONVERSATION_CONTENT, SYSTEM_PROMPT, MODEL_NAME, TEMPERATURE, MAX_TOKENS).
+    """
+    return f"""SHA2(CONCAT_WS('|',
+            {_sql_literal(prompt_version)},
+            COALESCE(MODEL_NAME, ''),
+            COALESCE(TO_VARCHAR(TEMPERATURE), ''),
+            COALESCE(TO_VARCHAR(MAX_TOKENS), ''),
+            SHA2(COALESCE(SYSTEM_PROMPT, ''), 256),
+            SHA2(COALESCE(CONVERSATION_CONTENT, ''), 256)
+        ), 256)"""
+
+
+def build_cached_batch_query(pending_select_sql, llm_function, prompt_version, ttl_days=None, key_columns=('CONVERSATION_ID',)):
+    """
+    Batch query that serves pending rows from the response cache and calls the LLM function
+    once per distinct cache key that misses.
+
+    Args:
+        pending_select_sql: SELECT of the pending rows with the key_columns, CONVERSATION_CONTENT,
+                            SYSTEM_PROMPT (resolved), MODEL_NAME, TEMPERATURE, MAX_TOKENS
+        llm_function: openai_chat_system or gemini_chat_system
+        prompt_version: get_prompt_version() of the prompt
+        ttl_days: Maximum age of served responses (default get_response_cache_ttl_days())
+        key_columns: Columns identifying a pending row, returned with its response
+
+    Returns:
+        SQL returning the key_columns, LLM_RESPONSE, CACHE_KEY, CACHE_HIT per pending row
+    """
+    ttl_days = ttl_days if ttl_days is not None else get_response_cache_ttl_days()
+    return f"""
+    WITH pending AS (
+        {pending_select_sql}
+    ),
+    keyed AS (
+        SELECT pending.*, {build_cache_key_sql(prompt_version)} AS CACHE_KEY
+        FROM pending
+    ),
+    cached AS (
+        SELECT cache.CACHE_KEY, cache.LLM_RESPONSE
+        FROM {get_response_cache_table()} cache
+        WHERE cache.CACHE_KEY IN (SELECT CACHE_KEY FROM keyed)
+        AND cache.CREATED_AT >= DATEADD(day, -{int(ttl_days)}, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+    ),
+    misses AS (
+        SELECT
+            keyed.CACHE_KEY,
+            ANY_VALUE(keyed.CONVERSATION_CONTENT) AS CONVERSATION_CONTENT,
+            ANY_VALUE(keyed.SYSTEM_PROMPT) AS SYSTEM_PROMPT,
+            ANY_VALUE(keyed.MODEL_NAME) AS MODEL_NAME,
+            ANY_VALUE(keyed.TEMPERATURE) AS TEMPERATURE,
+            ANY_VALUE(keyed.MAX_TOKENS) AS MAX_TOKENS
+        FROM keyed
+        LEFT JOIN cached ON cached.CACHE_KEY = keyed.CACHE_KEY
+        WHERE cached.CACHE_KEY IS NULL
+        GROUP BY keyed.CACHE_KEY
+    ),
+    answered AS (
+        SELECT CACHE_KEY, LLM_RESPONSE, TRUE AS CACHE_HIT FROM cached
+        UNION ALL
+        SELECT
+            CACHE_KEY,
+            {llm_function}(
+                CONVERSATION_CONTENT,
+                SYSTEM_PROMPT,
+                MODEL_NAME,
+                TEMPERATURE,
+                MAX_TOKENS
+            ) AS LLM_RESPONSE,
+            FALSE AS CACHE_HIT
+        FROM misses
+    )
+    SELECT {", ".join(f"keyed.{column}" for column in key_columns)}, answered.LLM_RESPONSE, keyed.CACHE_KEY, answered.CACHE_HIT
+    FROM keyed
+    JOIN answered ON answered.CACHE_KEY = keyed.CACHE_KEY
+    """
+
+
+def store_llm_responses(session, results_table, department_name, prompt_type, prompt_version, model_name, json_only=False):
+    """
+    Write the new responses of a batch to the cache and count hits of the served ones.
+
+    Failed responses (LLM_ERROR_RESPONSE_PATTERNS, empty) are not stored, so they are retried on the next run;
+    with json_only, neither are responses that do not parse as JSON. An expired entry for the same key is replaced.
+
+    Args:
+        session: Snowflake session
+        results_table: Table of batch results (row key columns, LLM_RESPONSE, CACHE_KEY, CACHE_HIT)
+        department_name: Department name
+        prompt_type: Prompt type
+        prompt_version: get_prompt_version() of the prompt
+        model_name: Model of the prompt
+        json_only: Store only responses that parse as JSON (prompts with 'response_format': 'json')
+    """
+    error_filter_sql = " AND ".join(f"LLM_RESPONSE NOT LIKE '{pattern}'" for pattern in LLM_ERROR_RESPONSE_PATTERNS)
+    if json_only:
+        error_filter_sql += f" AND {build_json_parse_expression('LLM_RESPONSE')} IS NOT NULL"
+    session.sql(f"""
+    MERGE INTO {get_response_cache_table()} cache
+    USING (
+        SELECT CACHE_KEY, ANY_VALUE(LLM_RESPONSE) AS LLM_RESPONSE, BOOLOR_AGG(CACHE_HIT) AS CACHE_HIT, COUNT(*) AS ROW_COUNT
+        FROM {results_table}
+        WHERE CACHE_KEY IS NOT NULL
+        AND LLM_RESPONSE IS NOT NULL AND LLM_RESPONSE <> ''
+        AND {error_filter_sql}
+        GROUP BY CACHE_KEY
+    ) results
+    ON cache.CACHE_KEY = results.CACHE_KEY
+    WHEN MATCHED AND results.CACHE_HIT THEN UPDATE SET
+        LAST_HIT_AT = CURRENT_TIMESTAMP()::TIMESTAMP_NTZ,
+        HIT_COUNT = cache.HIT_COUNT + results.ROW_COUNT
+    WHEN MATCHED THEN UPDATE SET
+        LLM_RESPONSE = results.LLM_RESPONSE,
+        CREATED_AT = CURRENT_TIMESTAMP()::TIMESTAMP_NTZ,
+        LAST_HIT_AT = NULL,
+        HIT_COUNT = 0
+    WHEN NOT MATCHED THEN INSERT
+        (CACHE_KEY, DEPARTMENT, PROMPT_TYPE, PROMPT_VERSION, MODEL_NAME, LLM_RESPONSE, CREATED_AT, LAST_HIT_AT, HIT_COUNT)
+    VALUES
+        (results.CACHE_KEY, {_sql_literal(department_name)}, {_sql_literal(prompt_type)}, {_sql_literal(prompt_version)},
+         {_sql_literal(model_name)}, results.LLM_RESPONSE,
+         CURRENT_TIMESTAMP()::TIMESTAMP_NTZ, NULL, 0)
+    """).collect()
+
+
+def summarize_batch_cache_results(batch_results, department_name, prompt_type):
+    """
+    Hit / miss counters of one batch (rows of build_cached_batch_query).
+
+    Returns:
+        Dictionary with department, prompt_type, rows, hits, misses, llm_calls (distinct missed keys), hit_rate
+    """
+    hits = sum(1 for row in batch_results if row['CACHE_HIT'])
+    missed_keys = set(row['CACHE_KEY'] for row in batch_results if not row['CACHE_HIT'])
+    rows = len(batch_results)
+    return {
+        'department': department_name,
+        'prompt_type': prompt_type,
+        'rows': rows,
+        'hits': hits,
+        'misses': rows - hits,
+        'llm_calls': len(missed_keys),
+        'hit_rate': hits / rows * 100 if rows else 0.0
+    }
+
+
+def summarize_response_cache_stats(cache_stats):
+    """
+    Totals of per-prompt response cache statistics (summarize_batch_cache_results) over a run.
+
+    Returns:
+        Dictionary with rows, hits, misses, llm_calls and hit_rate
+    """
+    rows = sum(stats['rows'] for stats in cache_stats)
+    hits = sum(stats['hits'] for stats in cache_stats)
+    return {
+        'rows': rows,
+        'hits': hits,
+        'misses': rows - hits,
+        'llm_calls': sum(stats['llm_calls'] for stats in cache_stats),
+        'hit_rate': hits / rows * 100 if rows else 0.0
+    }
+
+
+def prune_response_cache(session, ttl_days=None):
+    """
+    Delete cached responses older than the TTL.
+
+    Returns:
+        Number of deleted entries
+    """
+    ttl_days = ttl_days if ttl_days is not None else get_response_cache_ttl_days()
+    result = session.sql(f"""
+    DELETE FROM {get_response_cache_table()}
+    WHERE CREATED_AT < DATEADD(day, -{int(ttl_days)}, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)
+    """).collect()
+    return result[0][0] if result else 0
+
+
+def invalidate_llm_response_cache(session, department_name=None, prompt_type=None, keep_prompt_version=None):
+    """
+    Explicitly drop cached responses. With no arguments the whole cache is cleared.
+
+    Args:
+        session: Snowflake session
+        department_name: Only drop responses of this department
+        prompt_type: Only drop responses of this prompt type
+        keep_prompt_version: Keep responses of this prompt version (drop only older versions)
+
+    Returns:
+        Number of deleted entries
+    """
+    conditions = []
+    if department_name is not None:
+        conditions.append(f"DEPARTMENT = {_sql_literal(department_name)}")
+    if prompt_type is not None:
+        conditions.append(f"PROMPT_TYPE = {_sql_literal(prompt_type)}")
+    if keep_prompt_version is not None:
+        conditions.append(f"PROMPT_VERSION <> {_sql_literal(keep_prompt_version)}")
+    where_sql = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    result = session.sql(f"DELETE FROM {get_response_cache_table()} {where_sql}").collect()
+    deleted = result[0][0] if result else 0
+    print(f"🗑️  Removed {deleted} cached LLM responses from {get_response_cache_table()}")
+    return deleted
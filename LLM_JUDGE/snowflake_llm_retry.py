@@ -0,0 +1,254 @@
+"""
+LLM Retry Module for Snowflake LLM Analysis
+Re-runs only the rows of a prompt whose LLM call failed or whose response does not parse as JSON
+Such rows are set to RETRY and re-sent in rounds with exponential backoff and jitter, up to a maximum
+number of attempts; unparseable responses can go through a JSON repair prompt instead of a new analysis
+Attempts and the final error class of each row are kept in LLM_ATTEMPTS / LLM_ERROR_CLASS
+"""
+
+import os
+import time
+import random
+from snowflake_llm_response_cache import LLM_ERROR_RESPONSE_PATTERNS
+from snowflake_query_builder import build_json_parse_expression
+
+RETRY_STATUS = 'RETRY'
+
+DEFAULT_LLM_MAX_ATTEMPTS = 3
+DEFAULT_RETRY_BASE_SECONDS = 10.0
+DEFAULT_RETRY_MAX_SECONDS = 120.0
+
+# Columns added to prompt output tables
+RETRY_COLUMNS = {
+    'LLM_ATTEMPTS': 'NUMBER',
+    'LLM_ERROR_CLASS': 'VARCHAR',
+}
+
+# LLM_ERROR_CLASS values (NULL for a usable response)
+ERROR_CLASS_LLM_ERROR = 'llm_error'
+ERROR_CLASS_EMPTY_RESPONSE = 'empty_response'
+ERROR_CLASS_UNPARSEABLE_JSON = 'unparseable_json'
+
+# LLM calls made for a row; output tables created from a DataFrame hold it as VARCHAR
+ATTEMPTS_SQL = "COALESCE(TRY_TO_NUMBER(TO_VARCHAR(LLM_ATTEMPTS)), 0)"
+
+JSON_REPAIR_SYSTEM_PROMPT = """The user message is a response that should be a single JSON value but cannot be parsed.
+Return the same content as valid JSON and nothing else: fix the syntax (quotes, commas, brackets, escaping)
+and drop any text or markdown around the JSON. Do not add, remove or change any keys or values."""
+
+
+def get_llm_max_attempts():
+    """
+    LLM calls per row, first call included (LLM_JUDGE_LLM_MAX_ATTEMPTS; 1 disables retries).
+    """
+    return max(1, int(os.environ.get('LLM_JUDGE_LLM_MAX_ATTEMPTS', DEFAULT_LLM_MAX_ATTEMPTS)))
+
+
+def get_retry_base_seconds():
+    """
+    Backoff before the first retry round (LLM_JUDGE_LLM_RETRY_BASE_SECONDS overrides the default).
+    """
+    return max(0.0, float(os.environ.get('LLM_JUDGE_LLM_RETRY_BASE_SECONDS', DEFAULT_RETRY_BASE_SECONDS)))
+
+
+def get_retry_max_seconds():
+    """
+    Longest backoff between retry rounds (LLM_JUDGE_LLM_RETRY_MAX_SECONDS overrides the default).
+    """
+    return max(0.0, float(os.environ.get('LLM_JUDGE_LLM_RETRY_MAX_SECONDS', DEFAULT_RETRY_MAX_SECONDS)))
+
+
+def compute_retry_delay(retry_round, base_seconds=None, max_seconds=None):
+    """
+    Backoff before a retry round: base * 2^(round - 1), capped at max_seconds, with "equal jitter"
+    (a random point in the upper half), so rounds of concurrent prompts do not retry in lockstep.
+
+    Args:
+        retry_round: Retry round (1 for the first retry)
+        base_seconds: Backoff of the first round (default get_retry_base_seconds())
+        max_seconds: Backoff cap (default get_retry_max_seconds())
+    """
+    base_seconds = base_seconds if base_seconds is not None else get_retry_base_seconds()
+    max_seconds = max_seconds if max_seconds is not None else get_retry_max_seconds()
+    delay = min(max_seconds, base_seconds * 2 ** (retry_round - 1))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def ensure_retry_columns(session, table_name):
+    """
+    Add LLM_ATTEMPTS / LLM_ERROR_CLASS to an existing prompt output table.
+    """
+    for column, column_type in RETRY_COLUMNS.items():
+        session.sql(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {column} {column_type}").collect()
+
+
+def build_error_class_sql(response_format='json'):
+    """
+    SQL expression classifying LLM_RESPONSE: an ERROR_CLASS_* value, or NULL for a usable response.
+    Responses of 'json' prompts must also parse as JSON (build_json_parse_expression).
+    """
+    error_match_sql = " OR ".join(f"LLM_RESPONSE LIKE '{pattern}'" for pattern in LLM_ERROR_RESPONSE_PATTERNS)
+    branches = [
+        f"WHEN LLM_RESPONSE IS NULL OR TRIM(LLM_RESPONSE) = '' THEN '{ERROR_CLASS_EMPTY_RESPONSE}'",
+        f"WHEN {error_match_sql} THEN '{ERROR_CLASS_LLM_ERROR}'",
+    ]
+    if response_format == 'json':
+        branches.append(f"WHEN {build_json_parse_expression('LLM_RESPONSE')} IS NULL THEN '{ERROR_CLASS_UNPARSEABLE_JSON}'")
+    return "CASE " + " ".join(branches) + " END"
+
+
+def classify_llm_results(session, table_name, row_filter, response_format='json', max_attempts=None):
+    """
+    Record the error class of every COMPLETED row and move failed rows with attempts left to RETRY.
+
+    Args:
+        session: Snowflake session
+        table_name: Prompt output table
+        row_filter: WHERE condition of the prompt run's rows (department, date, skills) without a status
+        response_format: 'json' or 'text' (prompt setting)
+        max_attempts: LLM calls per row (default get_llm_max_attempts())
+
+    Returns:
+        Dictionary with:
+            retry: Rows set to RETRY
+            retry_classes: {error class: rows} of the RETRY rows
+            failed: Rows left COMPLETED with an error class (attempts used up)
+    """
+    max_attempts = max_attempts if max_attempts is not None else get_llm_max_attempts()
+    error_class_sql = build_error_class_sql(response_format)
+
+    session.sql(f"""
+    UPDATE {table_name}
+    SET
+        LLM_ERROR_CLASS = {error_class_sql},
+        LLM_ATTEMPTS = GREATEST({ATTEMPTS_SQL}, 1),
+        PROCESSING_STATUS = CASE
+            WHEN ({error_class_sql}) IS NOT NULL AND GREATEST({ATTEMPTS_SQL}, 1) < {int(max_attempts)} THEN '{RETRY_STATUS}'
+            ELSE 'COMPLETED'
+        END
+    WHERE PROCESSING_STATUS = 'COMPLETED'
+    AND {row_filter}
+    """).collect()
+
+    counts = session.sql(f"""
+    SELECT PROCESSING_STATUS, LLM_ERROR_CLASS, COUNT(*) AS ROW_COUNT
+    FROM {table_name}
+    WHERE PROCESSING_STATUS IN ('COMPLETED', '{RETRY_STATUS}')
+    AND LLM_ERROR_CLASS IS NOT NULL
+    AND {row_filter}
+    GROUP BY PROCESSING_STATUS, LLM_ERROR_CLASS
+    """).collect()
+
+    classified = {'retry': 0, 'retry_classes': {}, 'failed': 0}
+    for row in counts:
+        row_count = int(row['ROW_COUNT'])
+        if row['PROCESSING_STATUS'] == RETRY_STATUS:
+            classified['retry'] += row_count
+            classified['retry_classes'][row['LLM_ERROR_CLASS']] = row_count
+        else:
+            classified['failed'] += row_count
+    return classified
+
+
+def run_llm_retry_round(session, table_name, row_filter, llm_function, system_prompt_sql, json_repair=False):
+    """
+    Re-send the RETRY rows of a prompt run in one UPDATE and set them back to COMPLETED.
+
+    Args:
+        session: Snowflake session
+        table_name: Prompt output table
+        row_filter: WHERE condition of the prompt run's rows without a status
+        llm_function: LLM UDF name
+        system_prompt_sql: System prompt expression of each row (as in the batch query)
+        json_repair: Send unparseable responses through JSON_REPAIR_SYSTEM_PROMPT instead of a new analysis
+    """
+    analysis_sql = f"{llm_function}(CONVERSATION_CONTENT, {system_prompt_sql}, MODEL_NAME, TEMPERATURE, MAX_TOKENS)"
+    if json_repair:
+        response_sql = f"""CASE
+            WHEN LLM_ERROR_CLASS = '{ERROR_CLASS_UNPARSEABLE_JSON}'
+                THEN {llm_function}(LLM_RESPONSE, $${JSON_REPAIR_SYSTEM_PROMPT}$$, MODEL_NAME, TEMPERATURE, MAX_TOKENS)
+            ELSE {analysis_sql}
+        END"""
+    else:
+        response_sql = analysis_sql
+
+    session.sql(f"""
+    UPDATE {table_name}
+    SET
+        LLM_RESPONSE = {response_sql},
+        LLM_ATTEMPTS = {ATTEMPTS_SQL} + 1,
+        PROCESSING_STATUS = 'COMPLETED'
+    WHERE PROCESSING_STATUS = '{RETRY_STATUS}'
+    AND {row_filter}
+    """).collect()
+
+
+def release_retry_rows(session, table_name, row_filter):
+    """
+    Set RETRY rows back to COMPLETED (keeping their error class) when retrying stops early.
+    """
+    session.sql(f"""
+    UPDATE {table_name}
+    SET PROCESSING_STATUS = 'COMPLETED'
+    WHERE PROCESSING_STATUS = '{RETRY_STATUS}'
+    AND {row_filter}
+    """).collect()
+
+
+def run_llm_retries(session, table_name, row_filter, llm_function, system_prompt_sql, response_format='json',
+                    json_repair=False, max_attempts=None):
+    """
+    Classify the completed rows of a prompt run and retry the failed ones until they succeed or
+    use up max_attempts LLM calls, backing off (compute_retry_delay) before each round.
+
+    Args:
+        session: Snowflake session
+        table_name: Prompt output table
+        row_filter: WHERE condition of the prompt run's rows without a status
+        llm_function: LLM UDF name
+        system_prompt_sql: System prompt expression of each row
+        response_format: 'json' or 'text' (prompt setting)
+        json_repair: Repair unparseable JSON with JSON_REPAIR_SYSTEM_PROMPT (prompt setting)
+        max_attempts: LLM calls per row (default get_llm_max_attempts())
+
+    Returns:
+        Dictionary with rounds, retried_rows (row retries sent), first_failures ({error class: rows}
+        before retrying) and failed (rows still failing once attempts were used up)
+    """
+    max_attempts = max_attempts if max_attempts is not None else get_llm_max_attempts()
+    ensure_retry_columns(session, table_name)
+
+    classified = classify_llm_results(session, table_name, row_filter, response_format, max_attempts)
+    stats = {'rounds': 0, 'retried_rows': 0, 'first_failures': dict(classified['retry_classes']), 'failed': classified['failed']}
+
+    for retry_round in range(1, max_attempts):
+        if classified['retry'] == 0:
+            break
+
+        delay = compute_retry_delay(retry_round)
+        class_summary = ", ".join(f"{count} {error_class}" for error_class, count in sorted(classified['retry_classes'].items()))
+        print(f"    🔁 Retry round {retry_round}: {classified['retry']} rows ({class_summary}) after {delay:.1f}s backoff")
+        time.sleep(delay)
+
+        try:
+            run_llm_retry_round(session, table_name, row_filter, llm_function, system_prompt_sql,
+                                json_repair=json_repair and response_format == 'json')
+        except Exception as e:
+            print(f"    ⚠️  Retry round {retry_round} failed, keeping the previous responses: {str(e)}")
+            release_retry_rows(session, table_name, row_filter)
+            classified = classify_llm_results(session, table_name, row_filter, response_format, max_attempts=1)
+            break
+
+        stats['rounds'] += 1
+        stats['retried_rows'] += classified['retry']
+        classified = classify_llm_results(session, table_name, row_filter, response_format, max_attempts)
+
+    if classified['retry']:
+        release_retry_rows(session, table_name, row_filter)
+    stats['failed'] = classified['failed'] + classified['retry']
+
+    if stats['rounds']:
+        first_failed = sum(stats['first_failures'].values())
+        print(f"    🔁 Retries: {first_failed - stats['failed']}/{first_failed} failed rows recovered in {stats['rounds']} round(s), "
+              f"{stats['failed']} still failing")
+    return stats
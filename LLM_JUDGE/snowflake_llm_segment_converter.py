@@ -4,177 +4,237 @@ Converts conversation DataFrames to segment format for LLM processing
 Adapted from segment.py to work with DataFrames directly using Snowflake column names
 """
 
+import numpy as np
 import pandas as pd
 import logging
-from snowflake_llm_config import get_snowflake_llm_departments_config
-from snowflake_llm_helpers import get_execution_id_map
+from snowflake_llm_config import get_department_config
+from snowflake_llm_conversation_model import build_conversation_model, select_conversations, get_model_arrays
 
-def preprocess_conversation_dataframe_segment(conv_df):
-    """
-    Preprocess a single conversation DataFrame for segment conversion
-    Sort by message timestamp - works directly with Snowflake column names
-    """
-    # Sort by MESSAGE_SENT_TIME (Snowflake column name)
-    if 'MESSAGE_SENT_TIME' in conv_df.columns:
-        conv_df = conv_df.sort_values('MESSAGE_SENT_TIME')
-    
-    return conv_df
+SEGMENT_COLUMNS = ['conversation_id', 'segment_id', 'customer_name', 'last_skill', 'agent_names', 'messages', 'department', 'segment_index']
+
+SKILL_NAME_LENGTH_LIMIT = 23
 
 
-def segment_single_conversation(conv_data, department_name):
+def get_segment_message_mask(message_types, offsets):
     """
-    Segments a single conversation into parts based on agent or bot changes.
-    Adapted from segment.py to use Snowflake column names
+    Messages that take part in segmentation: normal messages only, or every message of a
+    conversation that has no normal message (MESSAGE_TYPE not available).
     
     Args:
-        conv_data: DataFrame containing one conversation's messages
-        department_name: Department name for configuration
+        message_types: Raw MESSAGE_TYPE values in model order
+        offsets: Conversation offsets from get_model_arrays
     
     Returns:
-        List of segments: [(agent_name, last_skill, segment_messages), ...]
+        Boolean mask over the messages
     """
-    segments = []
-    current_segment = []
-    current_agent = None
-    first_agent_or_bot_encountered = False
-    last_skill = None
-    marking = False
-    skill_name_length_limit = 23
-
-    for index, row in conv_data.iterrows():
-        # Use Snowflake column names
-        sender = str(row["SENT_BY"]).strip().lower()
-        message = row["TEXT"]
-        skill = row.get("TARGET_SKILL_PER_MESSAGE", "")
-        agent_name = row.get("AGENT_NAME", "")  # Assuming this column exists
-
-        # Check marking condition (department-specific logic can be added here)
-        if last_skill is None and str(skill).startswith("GPT_DOCTOR"):
-            marking = True
-        elif marking and (len(str(skill)) > skill_name_length_limit):
-            marking = False
-
-        # Identify if it's from agent or bot
-        if sender in ["agent", "bot"]:
-            if not first_agent_or_bot_encountered:
-                current_agent = agent_name if sender == "agent" else "BOT"
-                first_agent_or_bot_encountered = True
-            else:
-                next_agent = agent_name if sender == "agent" else "BOT"
-                if next_agent != current_agent:
-                    if current_segment:
-                        segments.append((current_agent, last_skill, current_segment))
-                        current_segment = []
-                    current_agent = next_agent
+    is_null = pd.isna(message_types)
+    is_normal = np.array(
+        [not null and str(value).upper() == 'NORMAL MESSAGE' for value, null in zip(message_types, is_null)], dtype=bool
+    )
+    if len(is_normal) == 0:
+        return is_normal
+    
+    lengths = np.diff(offsets)
+    normal_counts = np.add.reduceat(is_normal.astype(np.int64), offsets[:-1])
+    return is_normal | np.repeat(normal_counts == 0, lengths)
 
-            last_skill = skill  # Always update skill on agent/bot message
 
-        # Add [IDENTIFIER] if marking is True and sender is agent or bot
-        if marking and sender in ["agent", "bot"]:
-            current_segment.append(f"[IDENTIFIER] {sender.capitalize()}: {message}")
-        else:
-            current_segment.append(f"{sender.capitalize()}: {message}")
+def segment_conversations(conversation_model):
+    """
+    Segment every conversation of the model into parts based on agent or bot changes,
+    in one vectorized pass (adapted from segment.py).
+    
+    - Each message gets a role code: agent / bot messages carry their actor
+      (AGENT_NAME for agents, "BOT" for the bot); other senders carry none
+    - A new segment starts at every agent / bot message whose actor differs from the previous
+      agent / bot message of the conversation (shift compare + cumsum gives the segment ids)
+    - A segment's agent is its first actor (None before any agent / bot), its last_skill the
+      skill of its last agent / bot message
+    - GPT_DOCTOR [IDENTIFIER] marking starts on a GPT_DOCTOR skill while no agent / bot skill
+      has been seen and stops on a skill longer than SKILL_NAME_LENGTH_LIMIT
+    
+    Args:
+        conversation_model: Model from build_conversation_model (or a select_conversations subset)
+    
+    Returns:
+        Dictionary with:
+            lines: Formatted message lines ("Sender: message"), segments are contiguous slices
+            conversation: Position of each segment's conversation in conversation_model['conversations']
+            segment_index: Index of each segment within its conversation
+            start / stop: Each segment's slice of lines
+            agent / last_skill: Object arrays per segment
+    """
+    arrays, offsets = get_model_arrays(conversation_model, ['sender_raw', 'text_raw', 'skill_raw', 'message_type_raw', 'agent_name'])
+    conversation_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    
+    positions = np.flatnonzero(get_segment_message_mask(arrays['message_type_raw'], offsets))
+    message_count = len(positions)
+    conversation = conversation_index[positions]
+    conversation_starts = np.searchsorted(positions, offsets)
+    
+    # Role codes (raw cell values, as segment.py read them from the rows)
+    sender = np.array([str(value).strip().lower() for value in arrays['sender_raw'][positions]], dtype=object)
+    skill = arrays['skill_raw'][positions]
+    is_actor = (sender == 'agent') | (sender == 'bot')
+    actor = np.where(sender == 'agent', arrays['agent_name'][positions], 'BOT')
+    actor_positions = np.flatnonzero(is_actor)
+    
+    # Segment ids: a conversation start or an actor change between consecutive agent / bot messages
+    new_segment = np.zeros(message_count, dtype=bool)
+    new_segment[conversation_starts[:-1][conversation_starts[:-1] < message_count]] = True
+    if len(actor_positions) > 1:
+        current, previous = actor_positions[1:], actor_positions[:-1]
+        changed = (conversation[current] == conversation[previous]) & (actor[current] != actor[previous])
+        new_segment[current[changed]] = True
+    segment_id = np.cumsum(new_segment) - 1
+    
+    segment_starts = np.flatnonzero(new_segment)
+    segment_stops = np.append(segment_starts[1:], message_count).astype(np.int64)
+    segment_conversation = conversation[segment_starts]
+    first_segment = np.searchsorted(segment_starts, conversation_starts[:-1])
+    
+    # First and last agent / bot message of each segment, grouped by segment id
+    segments = np.arange(len(segment_starts))
+    actor_segment = segment_id[actor_positions]
+    first_actor = np.searchsorted(actor_segment, segments)
+    last_actor = np.searchsorted(actor_segment, segments, side='right') - 1
+    has_actor = first_actor <= last_actor
+    segment_agent = np.full(len(segment_starts), None, dtype=object)
+    segment_skill = np.full(len(segment_starts), None, dtype=object)
+    segment_agent[has_actor] = actor[actor_positions[first_actor[has_actor]]]
+    segment_skill[has_actor] = skill[actor_positions[last_actor[has_actor]]]
+    
+    # Marking: "last event wins" between start (GPT_DOCTOR skill while last_skill is None) and stop (long skill)
+    skill_text = [str(value) for value in skill]
+    previous_actor = np.searchsorted(actor_positions, np.arange(message_count)) - 1
+    previous_actor_position = actor_positions[np.maximum(previous_actor, 0)] if len(actor_positions) else previous_actor
+    has_previous_actor = (previous_actor >= 0)
+    has_previous_actor[has_previous_actor] = conversation[previous_actor_position[has_previous_actor]] == conversation[has_previous_actor]
+    last_skill_is_none = np.array(
+        [not has_previous or skill[previous_position] is None
+         for has_previous, previous_position in zip(has_previous_actor, previous_actor_position)],
+        dtype=bool
+    )
+    marking_start = last_skill_is_none & np.array([text.startswith("GPT_DOCTOR") for text in skill_text], dtype=bool)
+    marking_stop = np.array([len(text) > SKILL_NAME_LENGTH_LIMIT for text in skill_text], dtype=bool)
+    last_event = np.maximum.accumulate(np.where(marking_start | marking_stop, np.arange(message_count), -1)) if message_count else np.empty(0, dtype=np.int64)
+    marking = last_event >= 0
+    marking[marking] = (conversation[last_event[marking]] == conversation[marking]) & marking_start[last_event[marking]]
+    
+    # Add [IDENTIFIER] if marking is True and sender is agent or bot
+    lines = [
+        f"[IDENTIFIER] {sender_name.capitalize()}: {message}" if marked else f"{sender_name.capitalize()}: {message}"
+        for sender_name, message, marked in zip(sender, arrays['text_raw'][positions], marking & is_actor)
+    ]
+    
+    return {
+        'lines': lines,
+        'conversation': segment_conversation,
+        'segment_index': np.arange(len(segment_starts)) - first_segment[segment_conversation],
+        'start': segment_starts,
+        'stop': segment_stops,
+        'agent': segment_agent,
+        'last_skill': segment_skill
+    }
 
-    # Add final segment
-    if current_segment:
-        segments.append((current_agent, last_skill, current_segment))
 
-    return segments
+def is_segment_convertible(conversation, target_skills, check_target_skills=True):
+    """
+    Conversation-level checks of the segment conversion: a target bot skill and a bot participant.
+    """
+    # Check if conversation contains target skills
+    if check_target_skills:
+        if not any(skill in target_skills for skill in conversation['skills']):
+            return False
+    
+    # Check if conversation has bot messages
+    return any('bot' in sender.lower() for sender in conversation['senders'])
 
 
-def convert_single_conversation_to_segment(conv_df, department_name, execution_id):
+def build_bot_segment_records(conversation_model, department_name):
     """
-    Convert a single conversation DataFrame to segment format
-    Returns only BOT segments, each as a separate record for individual analysis
+    BOT segment records for every conversation of the model
+    Returns only BOT segments that include consumer messages, each as a separate record for individual analysis
     
     Args:
-        conv_df: DataFrame containing messages for one conversation
-        department_name: Department name for configuration
+        conversation_model: Model from build_conversation_model (or a select_conversations subset)
+        department_name: Department name
     
     Returns:
-        List of dictionaries with BOT segment data, or empty list if no BOT segments
+        List of dictionaries with BOT segment data, in conversation then segment order
     """
-    # Get department configuration
-    departments_config = get_snowflake_llm_departments_config()
-    if department_name not in departments_config:
+    if not conversation_model['conversations']:
         return []
-        
-    dept_config = departments_config[department_name]
-    target_skills = dept_config['bot_skills']
-    
-    # Preprocess the conversation
-    conv_df = preprocess_conversation_dataframe_segment(conv_df.copy())
-    
-    # Check required columns exist (using Snowflake column names)
-    required_columns = ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'SENT_BY', 'TEXT']
-    missing_columns = [col for col in required_columns if col not in conv_df.columns]
-    if missing_columns:
-        print(f"    ⚠️  Missing columns for segment conversion: {missing_columns}")
-        return None
-    
-    # Check if conversation contains target skills
-    if 'TARGET_SKILL_PER_MESSAGE' in conv_df.columns:
-        skills_series = conv_df['TARGET_SKILL_PER_MESSAGE'].fillna('')
-        skills = list(set(skills_series.tolist()))
-        if not any(skill in target_skills for skill in skills):
-            return None
-    
-    # Check if conversation has bot messages
-    has_bot = conv_df['SENT_BY'].str.lower().str.contains('bot', na=False).any()
-    if not has_bot:
-        return None
     
-    # Get conversation ID
-    conv_id = conv_df['CONVERSATION_ID'].iloc[0] if len(conv_df) > 0 else "unknown"
+    conversations = list(conversation_model['conversations'].values())
+    segments = segment_conversations(conversation_model)
+    lines = segments['lines']
     
-    # Get customer name if available
-    if 'CUSTOMER_NAME' in conv_df.columns and len(conv_df) > 0:
-        customer_name = conv_df['CUSTOMER_NAME'].iloc[0]
+    bot_segments = []
+    for k in range(len(segments['start'])):
+        # Only process BOT segments
+        if str(segments['agent'][k]).upper() != "BOT":
+            continue
+        
+        # Join messages for this BOT segment
+        bot_segment_messages = "\n".join(lines[segments['start'][k]:segments['stop'][k]])
+        
+        # Filter: keep only if includes consumer messages
+        if "Consumer:" not in bot_segment_messages and "consumer:" not in bot_segment_messages:
+            continue
+        
+        conversation = conversations[segments['conversation'][k]]
+        conv_id = conversation['conversation_id']
+        segment_index = int(segments['segment_index'][k])
+        skill = segments['last_skill'][k]
+        
+        # Customer name of the earliest message
+        customer_name = conversation['first_message_customer']
         if pd.isna(customer_name):
             customer_name = ""
-    else:
-        customer_name = ""
+        
+        bot_segments.append({
+            'conversation_id': str(conv_id),
+            'segment_id': f"{conv_id}_BOT_{segment_index}",  # Unique segment identifier
+            'customer_name': str(customer_name),
+            'last_skill': str(skill) if skill else "",
+            'agent_names': "BOT",  # Only BOT for this segment
+            'messages': bot_segment_messages,
+            'department': department_name,
+            'segment_index': segment_index,
+            'execution_id': conversation['execution_id']
+        })
     
-    # Filter for normal messages only
-    normal_messages = conv_df[conv_df.get('MESSAGE_TYPE', '').str.upper() == 'NORMAL MESSAGE']
-    if normal_messages.empty:
-        normal_messages = conv_df  # Fallback to all messages if MESSAGE_TYPE not available
+    return bot_segments
+
+
+def convert_single_conversation_to_segment(conversation_model, conv_id, department_name, check_target_skills=True):
+    """
+    Convert a single conversation to segment format
+    Returns only BOT segments, each as a separate record for individual analysis
     
-    # Segment the conversation
-    segments = segment_single_conversation(normal_messages, department_name)
+    Args:
+        conversation_model: Model from build_conversation_model containing the conversation
+        conv_id: Conversation ID to convert
+        department_name: Department name for configuration
+        check_target_skills: Apply the bot-skill check (only when TARGET_SKILL_PER_MESSAGE exists)
     
-    if not segments:
+    Returns:
+        List of dictionaries with BOT segment data, or empty list if no BOT segments
+    """
+    # Get department configuration
+    dept_config = get_department_config(department_name)
+    if dept_config is None:
         return []
     
-    # Filter to only BOT segments and create separate records
-    bot_segments = []
-    
-    for segment_index, (agent, skill, segment_messages) in enumerate(segments):
-        # Only process BOT segments
-        if str(agent).upper() == "BOT":
-            # Join messages for this BOT segment
-            bot_segment_messages = "\n".join(segment_messages)
-            
-            # Filter: keep only if includes consumer messages
-            if "Consumer:" in bot_segment_messages or "consumer:" in bot_segment_messages:
-                # Prepare individual BOT segment data
-                bot_segment_data = {
-                    'conversation_id': str(conv_id),
-                    'segment_id': f"{conv_id}_BOT_{segment_index}",  # Unique segment identifier
-                    'customer_name': str(customer_name),
-                    'last_skill': str(skill) if skill else "",
-                    'agent_names': "BOT",  # Only BOT for this segment
-                    'messages': bot_segment_messages,
-                    'department': department_name,
-                    'segment_index': segment_index,
-                    'execution_id': execution_id
-                }
-                bot_segments.append(bot_segment_data)
+    target_skills = dept_config['bot_skill_set']
+    if not is_segment_convertible(conversation_model['conversations'][conv_id], target_skills, check_target_skills):
+        return []
     
-    return bot_segments
+    return build_bot_segment_records(select_conversations(conversation_model, [conv_id]), department_name)
 
 
-def convert_conversations_to_segment_dataframe(filtered_df, department_name):
+def convert_conversations_to_segment_dataframe(filtered_df, department_name, conversation_model=None):
     """
     Convert filtered DataFrame conversations to segment format without saving files.
     Now returns separate rows for each BOT segment.
@@ -182,6 +242,8 @@ def convert_conversations_to_segment_dataframe(filtered_df, department_name):
     Args:
         filtered_df: Filtered DataFrame from Phase 1 processing
         department_name: Department name for configuration
+        conversation_model: Optional prebuilt model of filtered_df (build_conversation_model);
+                            built here when not given
     
     Returns:
         DataFrame with columns: conversation_id, segment_id, customer_name, last_skill, agent_names, messages, department, segment_index
@@ -190,7 +252,7 @@ def convert_conversations_to_segment_dataframe(filtered_df, department_name):
     
     if filtered_df.empty:
         print(f"    ⚠️  No conversations to convert")
-        return pd.DataFrame(columns=['conversation_id', 'segment_id', 'customer_name', 'last_skill', 'agent_names', 'messages', 'department', 'segment_index'])
+        return pd.DataFrame(columns=SEGMENT_COLUMNS)
     
     all_bot_segments = []
     processed_conversations = 0
@@ -199,18 +261,27 @@ def convert_conversations_to_segment_dataframe(filtered_df, department_name):
     # Group by conversation ID and process each conversation (using Snowflake column name)
     if 'CONVERSATION_ID' not in filtered_df.columns:
         print(f"    ❌ CONVERSATION_ID column not found in DataFrame")
-        return pd.DataFrame(columns=['conversation_id', 'segment_id', 'customer_name', 'last_skill', 'agent_names', 'messages', 'department', 'segment_index'])
-    
-    execution_id_map = get_execution_id_map(filtered_df, department_name)
-    
-    for conv_id, conv_df in filtered_df.groupby('CONVERSATION_ID'):
-        # Convert conversation to BOT segments (returns list)
-        bot_segments = convert_single_conversation_to_segment(conv_df, department_name, execution_id_map.get(conv_id, ''))
-        
-        if bot_segments:  # If any BOT segments found
-            all_bot_segments.extend(bot_segments)  # Add all BOT segments to list
-            processed_conversations += 1
-            total_bot_segments += len(bot_segments)
+        return pd.DataFrame(columns=SEGMENT_COLUMNS)
+    
+    if conversation_model is None:
+        conversation_model = build_conversation_model(filtered_df, department_name)
+    
+    if conversation_model['missing_columns']:
+        print(f"    ⚠️  Missing columns for segment conversion: {conversation_model['missing_columns']}")
+    
+    check_target_skills = 'TARGET_SKILL_PER_MESSAGE' in conversation_model['columns']
+    
+    # Conversation-level checks first, then segment the whole department frame at once
+    dept_config = get_department_config(department_name)
+    if dept_config is not None:
+        target_skills = dept_config['bot_skill_set']
+        kept_ids = [
+            conv_id for conv_id, conversation in conversation_model['conversations'].items()
+            if is_segment_convertible(conversation, target_skills, check_target_skills)
+        ]
+        all_bot_segments = build_bot_segment_records(select_conversations(conversation_model, kept_ids), department_name)
+        processed_conversations = len(set(segment['conversation_id'] for segment in all_bot_segments))
+        total_bot_segments = len(all_bot_segments)
     
     print(f"    ✅ Processed {processed_conversations} conversations → {total_bot_segments} BOT segments")
     
@@ -0,0 +1,196 @@
+"""
+Timestamp Formatting Module for Snowflake LLM Analysis
+MESSAGE_SENT_TIME text for the converters, formatted once per department frame
+Datetime columns are formatted with vectorized NumPy string operations; other values go
+through the per-value logic the converters always used (memoized per distinct value)
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def clean_datetime_format_snowflake(datetime_str):
+    """
+    Clean datetime format by handling various malformed datetime strings - Snowflake version.
+    Converts '7/10/2025 3:50:36â¯PM' to '7/10/2025 3:50:36 PM'
+    Converts '7/10/2025 3:50:â¯PM' to '7/10/2025 3:50 PM'
+    """
+    if not datetime_str or pd.isna(datetime_str):
+        return datetime_str
+
+    # Convert to string if not already
+    datetime_str = str(datetime_str)
+
+    try:
+        # Try to parse the datetime as-is
+        pd.to_datetime(datetime_str, errors='coerce', format='mixed')
+        return datetime_str  # If successful, return as-is
+    except:
+        # If it fails, apply cleaning
+        pass
+
+    # Only apply cleaning if the original datetime couldn't be parsed
+    # Handle case where we have colon followed by space and AM/PM (missing seconds)
+    if ':' in datetime_str and (' PM' in datetime_str or ' AM' in datetime_str):
+        # Find the last colon and check if it's followed by space and AM/PM
+        last_colon_idx = datetime_str.rfind(':')
+        after_colon = datetime_str[last_colon_idx + 1:]
+        if after_colon.strip() in ['PM', 'AM']:
+            # Remove the colon and everything between it and AM/PM
+            cleaned = datetime_str[:last_colon_idx] + ' ' + after_colon.strip()
+            return cleaned
+
+    # Handle original case with invisible characters
+    if len(datetime_str) >= 5:
+        # Delete the third, fourth, and fifth to last characters and add space
+        # Remove characters at positions -5, -4, -3 (third, fourth, fifth to last)
+        cleaned = datetime_str[:-5] + datetime_str[-2:]
+        # Add space between time and AM/PM
+        cleaned = cleaned[:-2] + ' ' + cleaned[-2:]
+        return cleaned
+
+    return datetime_str
+
+
+def format_json_timestamp(time_value):
+    """
+    ISO timestamp of a message time, as the JSON converter has always written it:
+    pd.to_datetime(clean_datetime_format_snowflake(value)).isoformat(), or str() of the cleaned value.
+    Timestamps take a direct .isoformat() (same string, no re-parse of str(value)).
+    """
+    if isinstance(time_value, pd.Timestamp):
+        return time_value.isoformat()
+
+    cleaned_time = clean_datetime_format_snowflake(time_value)
+    try:
+        return pd.to_datetime(cleaned_time, errors='coerce').isoformat()
+    except:
+        return str(cleaned_time)
+
+
+def _format_datetime_series(time_series):
+    """
+    Vectorized str() / isoformat() of a datetime64 Series (naive or tz-aware) without nulls.
+    Matches Timestamp.__str__ / Timestamp.isoformat(): the fraction has 6 digits when there are
+    microseconds and 9 when there are nanoseconds, tz-aware values end with a +HH:MM offset.
+
+    Returns:
+        Tuple (time_str, time_iso) of unicode arrays
+    """
+    if time_series.dt.tz is not None:
+        wall_time = time_series.dt.tz_localize(None)
+        utc_time = time_series.dt.tz_convert('UTC').dt.tz_localize(None)
+        offset_seconds = (wall_time - utc_time).to_numpy().astype('timedelta64[s]').astype(np.int64)
+        if (offset_seconds % 60 != 0).any():
+            raise ValueError("sub-minute UTC offsets")
+    else:
+        wall_time = time_series
+        offset_seconds = None
+
+    nanoseconds = wall_time.to_numpy().astype('datetime64[ns]')
+    time_iso = np.datetime_as_string(nanoseconds.astype('datetime64[s]'), unit='s')
+
+    fraction = nanoseconds.view(np.int64) % 1000000000
+    fraction_text = np.where(
+        fraction % 1000 != 0,
+        np.char.add('.', np.char.zfill(fraction.astype(str), 9)),
+        np.where(fraction != 0, np.char.add('.', np.char.zfill((fraction // 1000).astype(str), 6)), '')
+    )
+    time_iso = np.char.add(time_iso, fraction_text)
+
+    if offset_seconds is not None:
+        sign = np.where(offset_seconds < 0, '-', '+')
+        offset_minutes = np.abs(offset_seconds) // 60
+        offset_text = np.char.add(
+            np.char.add(sign, np.char.zfill((offset_minutes // 60).astype(str), 2)),
+            np.char.add(':', np.char.zfill((offset_minutes % 60).astype(str), 2))
+        )
+        time_iso = np.char.add(time_iso, offset_text)
+
+    return np.char.replace(time_iso, 'T', ' '), time_iso
+
+
+def format_message_times(time_series):
+    """
+    Format MESSAGE_SENT_TIME once for a whole frame.
+
+    Args:
+        time_series: MESSAGE_SENT_TIME Series (datetime64, or object values from the source table)
+
+    Returns:
+        Dictionary of object arrays aligned with time_series:
+            time_str: str(value), "" for nulls (XML / XML3D message times)
+            time_iso: format_json_timestamp(value) (JSON timestamps)
+    """
+    time_values = time_series.to_numpy(dtype=object)
+    time_str = np.empty(len(time_values), dtype=object)
+    time_iso = np.empty(len(time_values), dtype=object)
+    remaining = np.ones(len(time_values), dtype=bool)
+
+    if pd.api.types.is_datetime64_any_dtype(time_series.dtype):
+        valid = time_series.notna().to_numpy()
+        try:
+            valid_str, valid_iso = _format_datetime_series(time_series[valid])
+            time_str[valid] = valid_str.astype(object)
+            time_iso[valid] = valid_iso.astype(object)
+            remaining = ~valid
+        except (ValueError, OverflowError) as e:
+            print(f"    ⚠️  Formatting MESSAGE_SENT_TIME value by value ({str(e)})")
+
+    # Nulls, strings and mixed objects - formatted once per distinct value
+    formatted = {}
+    for position in np.flatnonzero(remaining):
+        value = time_values[position]
+        try:
+            key = (type(value), value)
+            cached = formatted.get(key)
+        except TypeError:
+            key, cached = None, None
+        if cached is None:
+            cached = (str(value) if pd.notna(value) else "", format_json_timestamp(value))
+            if key is not None:
+                formatted[key] = cached
+        time_str[position], time_iso[position] = cached
+
+    return {'time_str': time_str, 'time_iso': time_iso}
+
+
+def compute_relative_seconds(time_iso, offsets):
+    """
+    Seconds since each conversation's first message (relative_time serialization).
+
+    Args:
+        time_iso: ISO timestamps of the model's messages (arrays['time_iso'] from get_model_arrays)
+        offsets: Conversation offsets from get_model_arrays
+
+    Returns:
+        Tuple (seconds, start_iso):
+            seconds: Whole seconds since the conversation's earliest message, aligned with time_iso
+                     (None where the time is missing or cannot be parsed)
+            start_iso: ISO timestamp of each conversation's earliest message ("" when it has none)
+    """
+    parsed = pd.to_datetime(pd.Series(time_iso, dtype=object), errors='coerce', utc=True, format='ISO8601')
+    valid = parsed.notna().to_numpy()
+    epoch_seconds = np.full(len(time_iso), np.nan)
+    epoch_seconds[valid] = parsed[valid].dt.tz_localize(None).to_numpy().astype('datetime64[ns]').view(np.int64) / 1e9
+
+    counts = np.diff(offsets)
+    first_seconds = np.full(len(counts), np.nan)
+    nonempty = counts > 0
+    if nonempty.any():
+        first_seconds[nonempty] = np.fmin.reduceat(epoch_seconds, offsets[:-1][nonempty])
+    relative = epoch_seconds - np.repeat(first_seconds, counts)
+
+    seconds = np.full(len(time_iso), None, dtype=object)
+    seconds[valid] = np.rint(relative[valid]).astype(np.int64).astype(object)
+
+    # ISO text of the first message at the conversation's earliest time
+    earliest_positions = np.flatnonzero(valid & (relative == 0))
+    first_positions = np.searchsorted(earliest_positions, offsets[:-1])
+    start_iso = []
+    for k, position_index in enumerate(first_positions):
+        if position_index < len(earliest_positions) and earliest_positions[position_index] < offsets[k + 1]:
+            start_iso.append(time_iso[earliest_positions[position_index]])
+        else:
+            start_iso.append("")
+    return seconds, start_iso
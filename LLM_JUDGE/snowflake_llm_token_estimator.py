@@ -0,0 +1,216 @@
+"""
+Token Estimator Module for Snowflake LLM Analysis
+Offline input-token estimates of the conversion formats in each serialization mode
+Used to see what a prompt saves by opting into compact serialization - no LLM calls are made
+"""
+
+import io
+import re
+import math
+import contextlib
+import pandas as pd
+from snowflake_llm_config import SERIALIZATION_OPTIONS, SERIALIZATION_MODES, get_department_config
+from snowflake_llm_conversation_model import build_conversation_model
+from snowflake_llm_xml_converter import convert_conversations_to_xml_dataframe
+from snowflake_llm_json_converter import convert_conversations_to_json_dataframe
+from snowflake_llm_xml3d import convert_conversations_to_xml3d
+
+try:
+    import tiktoken
+except ImportError:  # Token counts fall back to the offline heuristic without tiktoken
+    tiktoken = None
+
+# Modes compared by the report: the default layout, each option on its own and all of them
+ESTIMATOR_MODES = {
+    'default': SERIALIZATION_MODES['default'],
+    **{option: (option,) for option in SERIALIZATION_OPTIONS},
+    'compact': SERIALIZATION_MODES['compact'],
+}
+
+# Conversion types that have a compact layout (segments are rendered one way only)
+ESTIMATOR_CONVERSION_TYPES = ('xml', 'json', 'xml3d')
+
+# Content column of each conversion type's DataFrame
+CONTENT_COLUMNS = {'xml': 'content_xml_view', 'json': 'content_json_view', 'xml3d': 'content_xml_view'}
+
+TIKTOKEN_ENCODING = 'o200k_base'
+
+# Pre-tokenizer of the heuristic: letter runs, digit runs, whitespace runs, punctuation runs
+_PRETOKEN_PATTERN = re.compile(r"[^\W\d_]+|\d+|\s+|[^\w\s]+|_+")
+
+_TOKEN_ENCODER = None
+_TOKEN_ENCODER_LOADED = False
+
+
+def get_token_encoder():
+    """
+    tiktoken encoder (TIKTOKEN_ENCODING), loaded once per process; None when tiktoken is not
+    installed or its encoding files cannot be loaded (no network access).
+    """
+    global _TOKEN_ENCODER, _TOKEN_ENCODER_LOADED
+    if not _TOKEN_ENCODER_LOADED:
+        _TOKEN_ENCODER_LOADED = True
+        if tiktoken is not None:
+            try:
+                _TOKEN_ENCODER = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+            except Exception as e:
+                print(f"    ⚠️  tiktoken encoding {TIKTOKEN_ENCODING} unavailable ({str(e)}), using the offline token heuristic")
+    return _TOKEN_ENCODER
+
+
+def estimate_tokens_heuristic(text):
+    """
+    Approximate BPE token count of a text without a tokenizer.
+
+    Rules (close to GPT-4o tokenization of chat transcripts, XML and JSON):
+    - ASCII words: one token per 6 letters; other scripts (e.g. Arabic): one token per 3 letters
+    - Digits: groups of 3
+    - Punctuation and markup: one token per 2 characters
+    - A single space is merged into the next word; other whitespace runs are one token
+    """
+    if not text:
+        return 0
+
+    tokens = 0
+    for piece in _PRETOKEN_PATTERN.findall(text):
+        first = piece[0]
+        if first.isspace():
+            tokens += 0 if piece == " " else 1
+        elif first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isalpha():
+            tokens += math.ceil(len(piece) / (6 if piece.isascii() else 3))
+        else:
+            tokens += math.ceil(len(piece) / 2)
+    return tokens
+
+
+def estimate_tokens(text):
+    """
+    Input tokens of a text: tiktoken when its encoding is available, otherwise estimate_tokens_heuristic.
+    """
+    if text is None or (not isinstance(text, str) and pd.isna(text)):
+        return 0
+    encoder = get_token_encoder()
+    if encoder is not None:
+        return len(encoder.encode(str(text), disallowed_special=()))
+    return estimate_tokens_heuristic(str(text))
+
+
+def render_serialization_mode(filtered_df, department_name, conversion_type, serialization_options, conversation_model=None):
+    """
+    Render a frame in one conversion type and serialization mode.
+
+    Returns:
+        DataFrame of the conversion type's converter (empty when nothing was converted)
+    """
+    if conversion_type == 'xml':
+        converted = convert_conversations_to_xml_dataframe(filtered_df, department_name, conversation_model=conversation_model,
+                                                           serialization_options=serialization_options)
+    elif conversion_type == 'json':
+        converted = convert_conversations_to_json_dataframe(filtered_df, department_name, conversation_model=conversation_model,
+                                                            serialization_options=serialization_options)
+    elif conversion_type == 'xml3d':
+        converted = convert_conversations_to_xml3d(filtered_df, department_name, conversation_model=conversation_model,
+                                                   serialization_options=serialization_options)
+    else:
+        raise ValueError(f"No compact serialization for conversion type {conversion_type}")
+    return converted if isinstance(converted, pd.DataFrame) else pd.DataFrame()
+
+
+def estimate_serialization_savings(filtered_df, department_name, conversion_types=ESTIMATOR_CONVERSION_TYPES, modes=None):
+    """
+    Estimate input tokens of a Phase 1 frame in every serialization mode.
+
+    The conversation model is built once and shared by all renders. Converter logs are kept quiet.
+
+    Args:
+        filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
+        department_name: Department name
+        conversion_types: Conversion types to compare (ESTIMATOR_CONVERSION_TYPES entries)
+        modes: {mode name: serialization options} (default ESTIMATOR_MODES)
+
+    Returns:
+        List of dictionaries: department, conversion_type, mode, documents, characters, tokens,
+        saved_pct (token saving against the default layout of the same conversion type)
+    """
+    modes = modes if modes is not None else ESTIMATOR_MODES
+    results = []
+    if filtered_df.empty:
+        return results
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        conversation_model = build_conversation_model(filtered_df, department_name)
+
+    for conversion_type in conversion_types:
+        default_tokens = None
+        for mode, serialization_options in modes.items():
+            with contextlib.redirect_stdout(io.StringIO()):
+                converted = render_serialization_mode(filtered_df, department_name, conversion_type, serialization_options,
+                                                      conversation_model=conversation_model)
+            contents = converted[CONTENT_COLUMNS[conversion_type]] if not converted.empty else pd.Series(dtype=object)
+            tokens = int(sum(estimate_tokens(content) for content in contents))
+            if not serialization_options:
+                default_tokens = tokens
+            results.append({
+                'department': department_name,
+                'conversion_type': conversion_type,
+                'mode': mode,
+                'documents': len(contents),
+                'characters': int(contents.str.len().sum()) if len(contents) else 0,
+                'tokens': tokens,
+                'saved_pct': (1 - tokens / default_tokens) * 100 if default_tokens else 0.0,
+            })
+
+    return results
+
+
+def print_serialization_savings(results):
+    """
+    Print estimate_serialization_savings() results, one block per department and conversion type.
+    """
+    counting = f"tiktoken {TIKTOKEN_ENCODING}" if get_token_encoder() is not None else "offline heuristic"
+    print(f"\n📊 Estimated input tokens per serialization mode ({counting}):")
+    current = None
+    for result in results:
+        if (result['department'], result['conversion_type']) != current:
+            current = (result['department'], result['conversion_type'])
+            print(f"   {result['department']} - {result['conversion_type']} ({result['documents']:,} documents)")
+        print(f"      {result['mode']:<15} {result['tokens']:>12,} tokens | {result['characters']:>12,} chars | "
+              f"saved {result['saved_pct']:5.1f}%")
+
+
+def report_serialization_savings(session, department_names, target_date=None, conversion_types=ESTIMATOR_CONVERSION_TYPES):
+    """
+    Per-department token savings of each serialization mode on the departments' Phase 1 frames.
+
+    Args:
+        session: Snowflake session
+        department_names: Departments to report
+        target_date: Target date for Phase 1 (default: the Phase 1 default date)
+        conversion_types: Conversion types to compare
+
+    Returns:
+        Dictionary: {department_name: estimate_serialization_savings() results or {'error': ...}}
+    """
+    from clean_chats_phase2_core_analytics import process_department_phase1
+
+    report = {}
+    for department_name in department_names:
+        if get_department_config(department_name) is None:
+            report[department_name] = {'error': f'Department {department_name} not found in configuration'}
+            continue
+
+        print(f"🔢 Estimating serialization savings for {department_name}...")
+        try:
+            filtered_df, _, success = process_department_phase1(session, department_name, target_date)
+            if not success or filtered_df.empty:
+                report[department_name] = {'error': 'No Phase 1 data'}
+                continue
+            report[department_name] = estimate_serialization_savings(filtered_df, department_name, conversion_types)
+            print_serialization_savings(report[department_name])
+        except Exception as e:
+            print(f"    ❌ Token estimate failed for {department_name}: {str(e)}")
+            report[department_name] = {'error': str(e)}
+
+    return report
@@ -4,11 +4,13 @@ Converts Snowflake conversation DataFrames to XML format grouped by customer nam
 Output: One row per customer with all their chats in XML format
 """
 
+import numpy as np
 import pandas as pd
 import json
 import xml.sax.saxutils as saxutils
-from snowflake_llm_config import get_snowflake_llm_departments_config
-from snowflake_llm_helpers import get_execution_id_map, get_tool_name_and_response
+from snowflake_llm_config import get_department_config
+from snowflake_llm_conversation_model import build_conversation_model, select_conversations, get_last_non_null
+from snowflake_llm_xml_converter import render_xml_conversation_contents
 
 
 def format_tool_with_name_as_xml(tool_name, tool_output, tool_time):
@@ -52,16 +54,80 @@ def format_tool_with_name_as_xml(tool_name, tool_output, tool_time):
         return f"<tool>\n  <n>{escaped_tool_name}</n>\n  <t>{escaped_tool_time}</t>\n  <o>{escaped_output}</o>\n</tool>"
 
 
-def convert_conversations_to_xml3d(filtered_df, department_name):
+# XML3D keeps tool responses in the chat content (only transfers and private messages are skipped)
+XML3D_SKIPPED_MESSAGE_TYPES = ('transfer', 'private message')
+
+
+def build_customer_index(filtered_df):
+    """
+    Customer index of a frame, built with one groupby: the customer of each conversation is the
+    first valid CUSTOMER_NAME (non-empty, not 'nan' / 'unknown') in frame order, stripped.
+    Conversations without a valid customer name are left out.
+    
+    Args:
+        filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
+    
+    Returns:
+        Dictionary: {conversation_id: customer_name}
+    """
+    if 'CUSTOMER_NAME' not in filtered_df.columns or 'CONVERSATION_ID' not in filtered_df.columns:
+        return {}
+    
+    customer_names = filtered_df['CUSTOMER_NAME'].to_numpy(dtype=object)
+    names = ['' if is_null else str(name) for name, is_null in zip(customer_names, pd.isna(customer_names))]
+    valid = np.array([bool(name and name.strip() and name != 'nan' and name.lower() != 'unknown') for name in names], dtype=bool)
+    
+    valid_names = pd.Series([name.strip() for name, is_valid in zip(names, valid) if is_valid], dtype=object)
+    conversation_ids = filtered_df['CONVERSATION_ID'].to_numpy(dtype=object)[valid]
+    return valid_names.groupby(conversation_ids, sort=False).first().to_dict()
+
+
+def parse_first_message_time(first_message_time, first_message_time_str):
+    """
+    Sort key of a chat inside its customer document (Timestamp.min when the time is missing).
+    Timestamps are used as they are; pd.to_datetime(str(ts)) is the same instant.
+    """
+    if not first_message_time_str:
+        return pd.Timestamp.min
+    if isinstance(first_message_time, pd.Timestamp):
+        return first_message_time
+    return pd.to_datetime(first_message_time_str)
+
+
+def wrap_chat_xml(conv_id, first_message_time_str, content_xml, serialization_options=()):
+    """
+    Wrap a rendered content body in the <chat> envelope of a customer document
+    (without the padding blank lines for the minified serialization).
+    """
+    if 'minified' in serialization_options:
+        return f"<chat><id>{saxutils.escape(str(conv_id))}</id><first_message_time>{saxutils.escape(first_message_time_str)}</first_message_time><content>\n{content_xml}\n</content></chat>"
+    return f"""<chat><id>{saxutils.escape(str(conv_id))}</id><first_message_time>{saxutils.escape(first_message_time_str)}</first_message_time><content>
+
+{content_xml}
+
+</content></chat>"""
+
+
+def convert_conversations_to_xml3d(filtered_df, department_name, conversation_model=None, serialization_options=()):
     """
     Convert Snowflake conversation DataFrame to XML3D format grouped by customer name
     
+    Conversations are mapped to customers with build_customer_index, every kept conversation is
+    rendered once (render_xml_conversation_contents over the whole frame) and customer documents
+    are assembled from the rendered chats. A customer's execution_id comes from their latest
+    conversation (latest first message time).
+    
     Args:
         filtered_df: Filtered DataFrame from Phase 1 processing (Snowflake column names)
         department_name: Department name for configuration
+        conversation_model: Optional prebuilt model of filtered_df (build_conversation_model);
+                            built here when not given
+        serialization_options: Compact serialization options of the prompt (resolve_serialization_options;
+                               relative tool times count from each chat's first_message_time)
     
     Returns:
-        List of dictionaries with customer_name, content_xml_view, chat_count, customer_names, agent_names
+        DataFrame with one row per customer: conversation_id, last_skill, customer_name, content_xml_view,
+        chat_count, customer_names, agent_names, execution_id
     """
     print(f"🔄 Converting conversations to XML3D format for {department_name}...")
     
@@ -70,97 +136,96 @@ def convert_conversations_to_xml3d(filtered_df, department_name):
         return []
     
     # Get department configuration
-    departments_config = get_snowflake_llm_departments_config()
-    if department_name not in departments_config:
+    dept_config = get_department_config(department_name)
+    if dept_config is None:
         print(f"    ❌ Department {department_name} not found in configuration")
         return []
         
-    dept_config = departments_config[department_name]
-    target_skills = dept_config['bot_skills']
+    target_skills = dept_config['bot_skill_set']
+    
+    if conversation_model is None:
+        conversation_model = build_conversation_model(filtered_df, department_name)
     
     # Check required columns exist (using Snowflake column names)
-    required_columns = ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'SENT_BY', 'TEXT']
-    missing_columns = [col for col in required_columns if col not in filtered_df.columns]
+    missing_columns = conversation_model['missing_columns']
     if missing_columns:
         print(f"    ❌ Missing required columns for XML3D conversion: {missing_columns}")
         return []
     
-    # Step 1: First group by Conversation ID to get complete conversations
-    conversation_ids = filtered_df['CONVERSATION_ID'].unique()
+    # Step 1: Conversations come pre-grouped from the conversation model, customers from one groupby
+    conversation_ids = conversation_model['appearance_order']
     print(f"    📋 Found {len(conversation_ids)} unique conversations")
+    customer_index = build_customer_index(filtered_df)
     
-    # Step 2: Process each conversation and extract customer name
-    complete_conversations = {}  # {customer_name: [conversation_data, ...]}
-
-    execution_id_map = get_execution_id_map(filtered_df, department_name)
+    check_target_skills = 'TARGET_SKILL_PER_MESSAGE' in conversation_model['columns']
     
-    processed_conversations = 0
+    kept_ids = []
     for conv_id in conversation_ids:
-        # Get all messages for this conversation
-        conv_messages = filtered_df[filtered_df['CONVERSATION_ID'] == conv_id]
+        conversation = conversation_model['conversations'][conv_id]
         
         # Check if conversation contains target skills
-        if 'TARGET_SKILL_PER_MESSAGE' in conv_messages.columns:
-            skills_series = conv_messages['TARGET_SKILL_PER_MESSAGE'].fillna('')
-            skills = list(set(skills_series.tolist()))
-            if not any(skill in target_skills for skill in skills):
+        if check_target_skills:
+            if not any(skill in target_skills for skill in conversation['skills']):
                 continue
         
-        # Get unique participants
-        sent_by_series = conv_messages['SENT_BY'].fillna('')
-        participants = sorted(list(set(sent_by_series.tolist())))
-        
         # Check if any participant is 'bot' or 'agent' (case-insensitive)
+        participants = set(conversation['senders'])
         has_bot_or_agent = any(p.lower() in ["bot", "agent"] for p in participants)
         has_consumer = any(p.lower() == "consumer" for p in participants)
         if not has_bot_or_agent or not has_consumer:
             continue
         
-        # Extract customer name from any message in this conversation that has it
-        customer_names_in_conv = conv_messages.get('CUSTOMER_NAME', pd.Series()).fillna('').astype(str)
-        valid_customer_names = [name for name in customer_names_in_conv if name and name.strip() and name != 'nan' and name.lower() != 'unknown']
+        # Skip conversations without valid customer names or with "Unknown" names
+        if conv_id not in customer_index:
+            continue
         
-        if valid_customer_names:
-            # Use the first valid customer name found
-            customer_name = valid_customer_names[0].strip()
-        else:
-            # Skip conversations without valid customer names or with "Unknown" names
+        kept_ids.append(conv_id)
+    
+    # Step 2: Render every kept conversation once
+    contents = render_xml_conversation_contents(
+        select_conversations(conversation_model, kept_ids), target_skills,
+        skipped_message_types=XML3D_SKIPPED_MESSAGE_TYPES, format_tool=format_tool_with_name_as_xml,
+        serialization_options=serialization_options, include_start_line=False
+    ) if kept_ids else {}
+    time_strings = conversation_model['arrays']['time_str']
+    times = conversation_model['arrays']['time']
+    
+    complete_conversations = {}  # {customer_name: [conversation_data, ...]}
+    processed_conversations = 0
+    for conv_id in kept_ids:
+        content_xml = contents[conv_id]
+        if content_xml is None:
             continue
         
-        # Get first message timestamp for this conversation
-        first_message_time = conv_messages['MESSAGE_SENT_TIME'].min()
-        first_message_time_str = str(first_message_time) if pd.notna(first_message_time) else ""
+        conversation = conversation_model['conversations'][conv_id]
+        
+        # First message timestamp (messages are time-sorted with nulls last, so the first one holds the minimum)
+        first_message_time_str = time_strings[conversation['start']]
         
         # Get agent names (non-consumer, non-bot participants)
+        participants = sorted(set(conversation['senders']))
         agent_names = [p for p in participants if p.lower() not in ['consumer', 'bot', 'system']]
-        agent_names_str = ', '.join(agent_names) if agent_names else ''
-
+        
         # Get last skill from conversation (using Snowflake column name)
         last_skill = ""
-        if 'TARGET_SKILL_PER_MESSAGE' in conv_messages.columns:
-            skills = conv_messages['TARGET_SKILL_PER_MESSAGE'].dropna()
-            if not skills.empty:
-                last_skill = str(skills.iloc[-1])
-        
-        # Process the conversation content
-        conversation_xml = process_single_conversation_snowflake(conv_messages, conv_id, first_message_time_str, target_skills, department_name)
+        if check_target_skills:
+            last_target_skill = get_last_non_null(conversation['metadata']['TARGET_SKILL_PER_MESSAGE'])
+            if last_target_skill is not None:
+                last_skill = str(last_target_skill)
         
-        if conversation_xml:
-            # Add to customer's conversation list
-            if customer_name not in complete_conversations:
-                complete_conversations[customer_name] = []
-            complete_conversations[customer_name].append({
-                'xml': conversation_xml,
-                'first_time': pd.to_datetime(first_message_time_str) if first_message_time_str else pd.Timestamp.min,
-                'agent_names': agent_names_str,
-                'conversation_id': conv_id,
-                'last_skill': last_skill,
-            })
-            processed_conversations += 1
+        complete_conversations.setdefault(customer_index[conv_id], []).append({
+            'xml': wrap_chat_xml(conv_id, first_message_time_str, content_xml, serialization_options),
+            'first_time': parse_first_message_time(times[conversation['start']], first_message_time_str),
+            'agent_names': ', '.join(agent_names) if agent_names else '',
+            'conversation_id': conv_id,
+            'last_skill': last_skill,
+            'execution_id': conversation['execution_id'],
+        })
+        processed_conversations += 1
     
     print(f"    ✅ Processed {processed_conversations} valid conversations for {len(complete_conversations)} customers")
     
-    # Step 3: Group conversations by customer name and create final XML
+    # Step 3: Assemble one document per customer from the rendered chats
     xml3d_conversations = []
     
     for customer_name, conversations in complete_conversations.items():
@@ -168,12 +233,12 @@ def convert_conversations_to_xml3d(filtered_df, department_name):
         conversations.sort(key=lambda x: x['first_time'])
         
         # Combine all conversations for this customer
-        customer_chats_xml = [conv['xml'] for conv in conversations]
-        all_chats_xml = "\n\n".join(customer_chats_xml)
-
+        chat_separator = "\n" if 'minified' in serialization_options else "\n\n"
+        all_chats_xml = chat_separator.join(conv['xml'] for conv in conversations)
+        
         # Collect Last Skill comma separated string for each conversation as they are
         last_skill_combined = ', '.join(str(conv['last_skill']) for conv in conversations)
-
+        
         # Collect Conversation ID for each conversation as they are
         conversation_id_combined = ', '.join(str(conv['conversation_id']) for conv in conversations)
         
@@ -185,7 +250,10 @@ def convert_conversations_to_xml3d(filtered_df, department_name):
         agent_names_combined = ', '.join(sorted(all_agent_names))
         
         # Build the full conversations XML structure
-        conversations_xml = f"""<conversations>
+        if 'minified' in serialization_options:
+            conversations_xml = f"<conversations><chat_count>{len(conversations)}</chat_count>\n{all_chats_xml}\n</conversations>"
+        else:
+            conversations_xml = f"""<conversations>
 <chat_count>{len(conversations)}</chat_count>
 
 {all_chats_xml}
@@ -201,7 +269,7 @@ def convert_conversations_to_xml3d(filtered_df, department_name):
             'chat_count': len(conversations),
             'customer_names': customer_name,  # For compatibility with existing schema
             'agent_names': agent_names_combined,
-            'execution_id': execution_id_map.get(conv_id, ''),
+            'execution_id': conversations[-1]['execution_id'],  # Latest conversation of the customer
         })
     
     print(f"    📊 Generated XML3D for {len(xml3d_conversations)} customers")
@@ -210,111 +278,6 @@ def convert_conversations_to_xml3d(filtered_df, department_name):
     return pd.DataFrame(xml3d_conversations)
 
 
-def process_single_conversation_snowflake(conv_messages, conv_id, first_message_time_str, target_skills, department_name):
-    """
-    Process a single conversation and return its XML representation
-    Updated to use Snowflake column names
-    """
-    # Start building XML content for this conversation
-    content_parts = []
-    
-    # Sort messages by timestamp to ensure chronological order (using Snowflake column name)
-    conv_messages_sorted = conv_messages.sort_values('MESSAGE_SENT_TIME')
-    
-    # Track last message details for duplicate detection
-    last_message_time = None
-    last_message_text = None
-    last_message_sender = None
-    last_message_type = None
-    
-    # Process each message in this conversation (now in chronological order)
-    for _, row in conv_messages_sorted.iterrows():
-        # Get message time (using Snowflake column name)
-        message_time = row['MESSAGE_SENT_TIME']
-        if pd.notna(message_time):
-            current_time = str(message_time)
-        else:
-            current_time = ""
-        
-        # Get message text (using Snowflake column name)
-        text_value = row['TEXT']
-        current_text = str(text_value) if pd.notna(text_value) else ""
-        
-        # Get sender (using Snowflake column name)
-        sent_by_value = row['SENT_BY']
-        current_sender = str(sent_by_value) if pd.notna(sent_by_value) else ""
-        
-        # Get skill (using Snowflake column name)
-        skill_value = row.get('TARGET_SKILL_PER_MESSAGE', '')
-        current_skill = str(skill_value) if pd.notna(skill_value) else ""
-        
-        # Get message type (using Snowflake column name)
-        message_type_value = row.get('MESSAGE_TYPE', '')
-        current_type = str(message_type_value).lower() if pd.notna(message_type_value) else ""
-        
-        # Skip transfer and private messages
-        if current_type == "transfer" or current_type == "private message":
-            continue
-        
-        # Handle bot messages from non-target skills
-        if current_sender.lower() == "bot" and current_skill not in target_skills:
-            current_sender = "Agent_1"
-        
-        # Handle empty messages
-        if (current_text == "" or pd.isna(text_value)) and current_type == "normal message":
-            current_text = "[Doc/Image]"
-        
-        # Check if this is a duplicate message
-        is_duplicate = (current_time == last_message_time and 
-                      current_text == last_message_text and 
-                      current_sender == last_message_sender and 
-                      current_type == last_message_type)
-        
-        # Add tool message by resolving tool name and matching tool response content
-        if current_type == "tool" and current_text:
-            tool_time = row.get('MESSAGE_SENT_TIME', '')
-            
-            tool_name, tool_output = get_tool_name_and_response(conv_messages, text_value)
-            tool_xml = format_tool_with_name_as_xml(tool_name or "Unknown_Tool", tool_output or "{}", tool_time)
-            content_parts.append(tool_xml)
-            continue
-        
-        # If there's a message and it's not a duplicate, add it
-        if current_text and not is_duplicate:
-            # Escape XML special characters in the message content
-            escaped_text = saxutils.escape(current_text)
-            
-            # Special formatting for system messages
-            if current_sender.lower() == "system":
-                message_line = f"[SYSTEM: {escaped_text}]"
-            else:
-                message_line = f"{current_sender}: {escaped_text}"
-            
-            content_parts.append(message_line)
-            
-            # Update last message details
-            last_message_time = current_time
-            last_message_text = current_text
-            last_message_sender = current_sender
-            last_message_type = current_type
-    
-    # Only return XML if we have content
-    if content_parts:
-        # Join all content parts with newlines
-        content_xml = "\n\n".join(content_parts)
-        
-        # Build the chat XML structure
-        chat_xml = f"""<chat><id>{saxutils.escape(str(conv_id))}</id><first_message_time>{saxutils.escape(first_message_time_str)}</first_message_time><content>
-
-{content_xml}
-
-</content></chat>"""
-        
-        return chat_xml
-    
-    return None
-
-
 def validate_xml3d_conversion(xml3d_conversations_df, department_name):
     """
     Validate the XML3D conversion results
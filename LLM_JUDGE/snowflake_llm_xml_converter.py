@@ -4,11 +4,21 @@ Converts conversation DataFrames to XML format for LLM processing
 Adapted from LLM_UTILITIES.py to work with DataFrames directly
 """
 
+import numpy as np
 import pandas as pd
 import json
 import xml.sax.saxutils as saxutils
-from snowflake_llm_config import get_snowflake_llm_departments_config
-from snowflake_llm_helpers import get_execution_id_map, get_tool_name_and_response
+from snowflake_llm_config import get_department_config
+from snowflake_llm_time_format import compute_relative_seconds
+from snowflake_llm_conversation_model import (
+    build_conversation_model,
+    select_conversations,
+    get_model_arrays,
+    get_first_value,
+    get_first_non_null,
+    summarize_tool_run,
+    get_tool_run_continuations
+)
 
 
 def format_tool_with_name_as_xml(tool_name, tool_output, tool_time):
@@ -52,181 +62,194 @@ def format_tool_with_name_as_xml(tool_name, tool_output, tool_time):
         return f"<tool>\n  <n>{escaped_tool_name}</n>\n  <t>{escaped_tool_time}</t>\n  <o>{escaped_output}</o>\n</tool>"
 
 
-def preprocess_conversation_dataframe(conv_df):
+def format_tool_compact_xml(tool_name, tool_output, tool_time):
     """
-    Preprocess a single conversation DataFrame
-    Sort by message timestamp - works directly with Snowflake column names
+    One-line <tool> block of the minified serialization (tool name and time, like format_tool_with_name_as_xml).
     """
-    # Sort by MESSAGE_SENT_TIME (Snowflake column name)
-    if 'MESSAGE_SENT_TIME' in conv_df.columns:
-        conv_df = conv_df.sort_values('MESSAGE_SENT_TIME')
-    
-    return conv_df
+    return f"<tool><n>{saxutils.escape(str(tool_name))}</n><t>{saxutils.escape(str(tool_time))}</t></tool>"
 
 
-def convert_single_conversation_to_xml(conv_df, department_name, include_tool_messages=True, debug_info=None):
+def get_xml_drop_reason(conversation, target_bot_skills, check_target_skills=True, debug_info=None):
     """
-    Convert a single conversation DataFrame to XML format
-    Adapted from LLM_UTILITIES.py convert_conversation_to_xml()
+    Conversation-level checks of the XML conversion (target bot skill, participants).
     
     Args:
-        conv_df: DataFrame containing messages for one conversation
-        department_name: Department name for skill filtering
+        conversation: Conversation record from build_conversation_model
+        target_bot_skills: Department bot skills (bot_skill_set of the compiled department config)
+        check_target_skills: Require a bot-skill message (False when the frame has no TARGET_SKILL_PER_MESSAGE)
+        debug_info: Optional dict receiving 'details' for the drop reason
     
     Returns:
-        XML string representation of the conversation
+        Drop reason ('no_target_skill_match', 'participants_missing') or None when the conversation is kept
     """
-    # Get department configuration
-    departments_config = get_snowflake_llm_departments_config()
-    if department_name not in departments_config:
-        if isinstance(debug_info, dict):
-            debug_info['reason'] = 'department_not_configured'
-        return None
-        
-    dept_config = departments_config[department_name]
-    target_bot_skills = dept_config['bot_skills']
-    target_agent_skills = dept_config['agent_skills']
-    
-    # Preprocess the conversation
-    conv_df = preprocess_conversation_dataframe(conv_df.copy())
-    
-    # Check required columns exist (using Snowflake column names)
-    required_columns = ['CONVERSATION_ID', 'MESSAGE_SENT_TIME', 'SENT_BY', 'TEXT']
-    missing_columns = [col for col in required_columns if col not in conv_df.columns]
-    if missing_columns:
-        if isinstance(debug_info, dict):
-            debug_info['reason'] = 'missing_columns'
-            debug_info['details'] = {'missing_columns': missing_columns}
-        return None
-    
     # Check if conversation contains target skills
-    if 'TARGET_SKILL_PER_MESSAGE' in conv_df.columns:
-        skills_series = conv_df['TARGET_SKILL_PER_MESSAGE'].fillna('')
-        skills = list(set(skills_series.tolist()))
+    if check_target_skills:
+        skills = list(conversation['skills'])
         if not any(skill in target_bot_skills for skill in skills):
             if isinstance(debug_info, dict):
-                debug_info['reason'] = 'no_target_skill_match'
-                debug_info['details'] = {'skills_found': skills, 'required_bot_skills': target_bot_skills}
-            return None
+                debug_info['details'] = {'skills_found': skills, 'required_bot_skills': sorted(target_bot_skills)}
+            return 'no_target_skill_match'
     
     # Get unique participants
-    sent_by_series = conv_df['SENT_BY'].fillna('')
-    participants = sorted(list(set(sent_by_series.tolist())))
+    participants = sorted(set(conversation['senders']))
     
     # Check if any participant is 'bot' or 'agent' (case-insensitive)
     has_bot_or_agent = any(p.lower() in ["bot", "agent"] for p in participants)
     has_consumer = any(p.lower() == "consumer" for p in participants)
     if not has_bot_or_agent or not has_consumer:
         if isinstance(debug_info, dict):
-            debug_info['reason'] = 'participants_missing'
             debug_info['details'] = {'participants': participants}
-        return None
+        return 'participants_missing'
     
-    # Get conversation ID
-    conv_id = conv_df['CONVERSATION_ID'].iloc[0] if len(conv_df) > 0 else "unknown"
-    
-    # Start building XML content
-    content_parts = []
-    
-    # Track last message details for duplicate detection
-    last_message_time = None
-    last_message_text = None
-    last_message_sender = None
-    last_message_type = None
-    
-    # Track the last skill seen in the conversation
-    last_skill = ""
-    is_our_bot = True
-    
-    # Process each message
-    for _, row in conv_df.iterrows():
-        # Get message time (using Snowflake column name)
-        message_time = row['MESSAGE_SENT_TIME']
-        if pd.notna(message_time):
-            current_time = str(message_time)
-        else:
-            current_time = ""
-        
-        # Get message text
-        text_value = row['TEXT']
-        current_text = str(text_value) if pd.notna(text_value) else ""
-        
-        # Get sender (using Snowflake column name)
-        sent_by_value = row['SENT_BY']
-        current_sender = str(sent_by_value) if pd.notna(sent_by_value) else ""
-        
-        # Get skill (using Snowflake column name)
-        skill_value = row.get('TARGET_SKILL_PER_MESSAGE', '')
-        current_skill = str(skill_value) if pd.notna(skill_value) else ""
-        
-        
-        # Get message type (using Snowflake column name)
-        message_type_value = row.get('MESSAGE_TYPE', '')
-        current_type = str(message_type_value).lower() if pd.notna(message_type_value) else ""
+    return None
 
-        # Skip transfer and private messages
-        if current_type == "transfer" or current_type == "private message" or current_type == "tool response":
-            continue
-        
-        # Handle bot messages from non-target skills
-        if current_sender.lower() == "bot" and current_skill not in target_bot_skills:
-            current_sender = "Agent_1"
-
-        # Handle empty messages
-        if (current_text == "" or pd.isna(text_value)) and current_type == "normal message":
-            current_text = "[Doc/Image]"
 
-        # Check if this is a duplicate message (same time, text, sender, and type)
-        is_duplicate = (current_time == last_message_time and 
-                      current_text == last_message_text and 
-                      current_sender == last_message_sender and 
-                      current_type == last_message_type)
+def render_xml_conversation_contents(conversation_model, target_bot_skills, include_tool_messages=True,
+                                     skipped_message_types=('transfer', 'private message', 'tool response'),
+                                     format_tool=format_tool_with_name_as_xml, serialization_options=(),
+                                     include_start_line=True):
+    """
+    Render the <content> body of every conversation in the model in one pass over the
+    model's message arrays (no per-row DataFrame access).
+    
+    Rules (same as LLM_UTILITIES.py convert_conversation_to_xml):
+    - transfer, private message and tool response messages are skipped (skipped_message_types)
+    - Bot messages from non-target skills are shown as Agent_1
+    - Empty normal messages become [Doc/Image]
+    - A message identical (time, text, sender, type) to the previous kept message is dropped;
+      comparing each candidate with the previous candidate is equivalent, because a dropped
+      duplicate equals the message it duplicates
+    - Tool messages with a payload become <tool> blocks and never count as the previous message
+    
+    Serialization options (all off by default):
+    - minified: one-line <tool> blocks, lines separated by one newline instead of a blank line
+    - relative_time: tool times as "+<seconds>s" since the conversation's first message,
+      which is given once in a leading <start> line of conversations with tool blocks
+    - collapse_tools: consecutive <tool> blocks become one block listing the tools (summarize_tool_run)
+    
+    Args:
+        conversation_model: Model from build_conversation_model (or a select_conversations subset)
+        target_bot_skills: Department bot skills
+        include_tool_messages: Render <tool> blocks
+        skipped_message_types: Lowercased MESSAGE_TYPE values left out of the content
+        format_tool: Formatter of <tool> blocks (tool_name, tool_output, tool_time)
+        serialization_options: SERIALIZATION_OPTIONS of the prompt (resolve_serialization_options)
+        include_start_line: Lead with the <start> line under relative_time (off when the envelope
+                            already carries the first message time)
+    
+    Returns:
+        Dictionary: {conversation_id: content_xml, or None when nothing is left after cleaning}
+    """
+    arrays, offsets = get_model_arrays(
+        conversation_model,
+        ['time', 'time_str', 'time_iso', 'text', 'sender', 'sender_lower', 'skill', 'message_type', 'tool_name', 'tool_output']
+    )
+    message_type = arrays['message_type']
+    conversation_index = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    
+    skipped = np.isin(message_type, list(skipped_message_types))
+    
+    # Bot messages from non-target skills are shown as Agent_1
+    sender = np.where(
+        (arrays['sender_lower'] == 'bot') & ~np.isin(arrays['skill'], list(target_bot_skills)), 'Agent_1', arrays['sender']
+    ).astype(object)
+    
+    # Empty normal messages become [Doc/Image]
+    text = np.where((arrays['text'] == "") & (message_type == 'normal message'), '[Doc/Image]', arrays['text']).astype(object)
+    has_text = text != ""
+    
+    tool_block = ~skipped & (message_type == 'tool') & has_text
+    candidate = np.flatnonzero(~skipped & ~tool_block & has_text)
+    
+    # Consecutive-duplicate removal within each conversation
+    duplicate = np.zeros(len(candidate), dtype=bool)
+    if len(candidate) > 1:
+        current, previous = candidate[1:], candidate[:-1]
+        duplicate[1:] = (
+            (conversation_index[current] == conversation_index[previous])
+            & (arrays['time_str'][current] == arrays['time_str'][previous])
+            & (text[current] == text[previous])
+            & (sender[current] == sender[previous])
+            & (message_type[current] == message_type[previous])
+        )
+    message_positions = candidate[~duplicate]
+    
+    line_positions = [message_positions]
+    lines = [
+        f"[SYSTEM: {saxutils.escape(text[i])}]" if arrays['sender_lower'][i] == "system" else f"{sender[i]}: {saxutils.escape(text[i])}"
+        for i in message_positions
+    ]
+    tool_positions = np.flatnonzero(tool_block) if include_tool_messages else np.empty(0, dtype=np.int64)
+    
+    if not serialization_options:
+        line_positions.append(tool_positions)
+        lines.extend(
+            format_tool(arrays['tool_name'][i] or "Unknown_Tool", arrays['tool_output'][i] or "{}", arrays['time'][i])
+            for i in tool_positions
+        )
+    else:
+        tool_times = arrays['time']
+        if 'relative_time' in serialization_options:
+            relative_seconds, start_iso = compute_relative_seconds(arrays['time_iso'], offsets)
+            tool_times = np.array([f"+{value}s" if value is not None else time_value
+                                   for value, time_value in zip(relative_seconds, arrays['time'])], dtype=object)
+        if 'minified' in serialization_options:
+            format_tool = format_tool_compact_xml
         
-        # Update last skill if we have a skill value and this is not a duplicate
-        if current_skill and not is_duplicate and current_skill != "nan":
-            last_skill = current_skill
+        # Runs of consecutive tool blocks (no message line in between) are rendered as one block
+        tool_runs = [[i] for i in tool_positions]
+        if 'collapse_tools' in serialization_options and len(tool_positions):
+            all_positions = np.concatenate([message_positions, tool_positions])
+            is_tool_line = np.concatenate([np.zeros(len(message_positions), dtype=bool), np.ones(len(tool_positions), dtype=bool)])
+            order = np.argsort(all_positions, kind='stable')
+            continues = get_tool_run_continuations(is_tool_line[order], conversation_index[all_positions[order]])
+            tool_runs = []
+            for position, is_tool, continues_run in zip(all_positions[order], is_tool_line[order], continues):
+                if continues_run:
+                    tool_runs[-1].append(position)
+                elif is_tool:
+                    tool_runs.append([position])
         
-        # Add tool message by resolving tool name and matching tool response content
-        if current_type == "tool" and current_text and is_our_bot:
-            if include_tool_messages:
-                tool_time = row.get('MESSAGE_SENT_TIME', '')
-                
-                tool_name, tool_output = get_tool_name_and_response(conv_df, text_value)
-                
-                tool_xml = format_tool_with_name_as_xml(tool_name or "Unknown_Tool", tool_output or "{}", tool_time)
-                content_parts.append(tool_xml)
-            continue
-
-        # If there's a message and it's not a duplicate, add it
-        if current_text and not is_duplicate:
-            # Escape XML special characters in the message content
-            escaped_text = saxutils.escape(current_text)
-            
-            # Special formatting for system messages
-            if current_sender.lower() == "system":
-                message_line = f"[SYSTEM: {escaped_text}]"
-            else:
-                message_line = f"{current_sender}: {escaped_text}"
-            
-            content_parts.append(message_line)
-            
-            # Update last message details
-            last_message_time = current_time
-            last_message_text = current_text
-            last_message_sender = current_sender
-            last_message_type = current_type
-    
-    # Only proceed if we have content
-    if not content_parts:
-        if isinstance(debug_info, dict):
-            debug_info['reason'] = 'no_content_after_cleaning'
-        return None
+        line_positions.append(np.array([run[0] for run in tool_runs], dtype=np.int64))
+        lines.extend(
+            format_tool(
+                summarize_tool_run([arrays['tool_name'][i] or "Unknown_Tool" for i in run]) if len(run) > 1 else (arrays['tool_name'][run[0]] or "Unknown_Tool"),
+                arrays['tool_output'][run[0]] or "{}", tool_times[run[0]]
+            )
+            for run in tool_runs
+        )
+    
+    # Put message lines and tool blocks back in message order, then cut per conversation
+    line_positions = np.concatenate(line_positions)
+    order = np.argsort(line_positions, kind='stable')
+    line_positions = line_positions[order]
+    lines = [lines[i] for i in order]
+    bounds = np.searchsorted(line_positions, offsets)
+    
+    separator = "\n" if 'minified' in serialization_options else "\n\n"
+    contents = {
+        conv_id: (separator.join(lines[bounds[k]:bounds[k + 1]]) if bounds[k + 1] > bounds[k] else None)
+        for k, conv_id in enumerate(conversation_model['conversations'])
+    }
     
-    # Join all content parts with newlines
-    content_xml = "\n\n".join(content_parts)
+    # Relative tool times need their origin: a <start> line heads each conversation with tool blocks
+    if 'relative_time' in serialization_options and include_start_line:
+        tool_conversations = set(conversation_index[run[0]] for run in tool_runs)
+        for k, conv_id in enumerate(conversation_model['conversations']):
+            if k in tool_conversations and start_iso[k]:
+                contents[conv_id] = f"<start>{saxutils.escape(start_iso[k])}</start>{separator}{contents[conv_id]}"
     
-    # Build the full XML structure
-    full_xml = f"""<conversation>
+    return contents
+
+
+def wrap_conversation_xml(conv_id, content_xml, serialization_options=()):
+    """
+    Wrap a rendered content body in the <conversation> envelope
+    (without the padding blank lines for the minified serialization).
+    """
+    if 'minified' in serialization_options:
+        return f"<conversation><chatID>{saxutils.escape(str(conv_id))}</chatID><content>\n{content_xml}\n</content></conversation>"
+    return f"""<conversation>
 <chatID>{saxutils.escape(str(conv_id))}</chatID>
 <content>
 
@@ -234,17 +257,65 @@ def convert_single_conversation_to_xml(conv_df, department_name, include_tool_me
 
 </content>
 </conversation>"""
+
+
+def convert_single_conversation_to_xml(conversation_model, conv_id, department_name, include_tool_messages=True, debug_info=None,
+                                       serialization_options=()):
+    """
+    Convert a single conversation to XML format
+    Adapted from LLM_UTILITIES.py convert_conversation_to_xml()
+    
+    Args:
+        conversation_model: Model from build_conversation_model containing the conversation
+        conv_id: Conversation ID to convert
+        department_name: Department name for skill filtering
+        serialization_options: Compact serialization options of the prompt (default: none)
+    
+    Returns:
+        XML string representation of the conversation
+    """
+    # Get department configuration
+    dept_config = get_department_config(department_name)
+    if dept_config is None:
+        if isinstance(debug_info, dict):
+            debug_info['reason'] = 'department_not_configured'
+        return None
+    
+    target_bot_skills = dept_config['bot_skill_set']
+    check_target_skills = 'TARGET_SKILL_PER_MESSAGE' in conversation_model['columns']
+    
+    reason = get_xml_drop_reason(conversation_model['conversations'][conv_id], target_bot_skills, check_target_skills, debug_info)
+    if reason is not None:
+        if isinstance(debug_info, dict):
+            debug_info['reason'] = reason
+        return None
+    
+    content_xml = render_xml_conversation_contents(
+        select_conversations(conversation_model, [conv_id]), target_bot_skills, include_tool_messages,
+        serialization_options=serialization_options
+    )[conv_id]
     
-    return full_xml
+    # Only proceed if we have content
+    if content_xml is None:
+        if isinstance(debug_info, dict):
+            debug_info['reason'] = 'no_content_after_cleaning'
+        return None
+    
+    return wrap_conversation_xml(conv_id, content_xml, serialization_options)
 
 
-def convert_conversations_to_xml_dataframe(filtered_df, department_name, include_tool_messages=True):
+def convert_conversations_to_xml_dataframe(filtered_df, department_name, include_tool_messages=True, conversation_model=None,
+                                           serialization_options=()):
     """
     Convert filtered DataFrame conversations to XML format without saving CSV files.
     
     Args:
         filtered_df: Filtered DataFrame from Phase 1 processing
         department_name: Department name for configuration
+        conversation_model: Optional prebuilt model of filtered_df (build_conversation_model);
+                            built here when not given
+        serialization_options: Compact serialization options of the prompt (resolve_serialization_options;
+                               default: none, the standard XML)
     
     Returns:
         DataFrame with columns: conversation_id, content_xml_view, department, last_skill
@@ -271,24 +342,56 @@ def convert_conversations_to_xml_dataframe(filtered_df, department_name, include
         print(f"    ❌ CONVERSATION_ID column not found in DataFrame")
         return pd.DataFrame(columns=['conversation_id', 'content_xml_view', 'department', 'last_skill'])
     
-    execution_id_map = get_execution_id_map(filtered_df, department_name)
+    if conversation_model is None:
+        conversation_model = build_conversation_model(filtered_df, department_name)
+    
+    if conversation_model['missing_columns']:
+        total_conversations = filtered_df['CONVERSATION_ID'].nunique()
+        dropped_missing_columns = total_conversations
+    
+    check_target_skills = 'TARGET_SKILL_PER_MESSAGE' in conversation_model['columns']
+    has_agent_name = 'AGENT_NAME' in conversation_model['columns']
+    has_customer_name = 'CUSTOMER_NAME' in conversation_model['columns']
+    
+    # Conversation-level checks first, then render every kept conversation in one pass
+    dept_config = get_department_config(department_name)
+    target_bot_skills = dept_config['bot_skill_set'] if dept_config is not None else None
+    drop_reasons = {}
+    for conv_id, conversation in conversation_model['conversations'].items():
+        if target_bot_skills is None:
+            drop_reasons[conv_id] = 'department_not_configured'
+        else:
+            drop_reasons[conv_id] = get_xml_drop_reason(conversation, target_bot_skills, check_target_skills)
+    
+    kept_ids = [conv_id for conv_id, reason in drop_reasons.items() if reason is None]
+    contents = render_xml_conversation_contents(
+        select_conversations(conversation_model, kept_ids), target_bot_skills, include_tool_messages,
+        serialization_options=serialization_options
+    ) if kept_ids else {}
 
-    for conv_id, conv_df in filtered_df.groupby('CONVERSATION_ID'):
+    for conv_id, conversation in conversation_model['conversations'].items():
         total_conversations += 1
         # Convert conversation to XML with debug capture
-        drop_info = {}
-        xml_content = convert_single_conversation_to_xml(conv_df, department_name, include_tool_messages, debug_info=drop_info)
+        drop_info = {'reason': drop_reasons[conv_id]} if drop_reasons[conv_id] else {}
+        xml_content = None
+        if conv_id in contents:
+            if contents[conv_id] is None:
+                drop_info['reason'] = 'no_content_after_cleaning'
+            else:
+                xml_content = wrap_conversation_xml(conv_id, contents[conv_id], serialization_options)
         
         if xml_content:
+            metadata = conversation['metadata']
+            customer_name = get_first_non_null(metadata['CUSTOMER_NAME']) if has_customer_name else None
             xml_conversations.append({
                 'conversation_id': str(conv_id),
                 'content_xml_view': xml_content,
                 'department': department_name,
-                'last_skill': conv_df['SKILL'].iloc[0],
-                'execution_id': execution_id_map.get(conv_id, ''),
-                'agent_names': ", ".join(sorted(set(conv_df['AGENT_NAME'].dropna().astype(str)))) if 'AGENT_NAME' in conv_df.columns else "",
-                'shadowed_by': conv_df['SHADOWED_BY'].iloc[0],
-                'customer_name': (conv_df['CUSTOMER_NAME'].dropna().astype(str).iloc[0] if ('CUSTOMER_NAME' in conv_df.columns and not conv_df['CUSTOMER_NAME'].dropna().empty) else ""),
+                'last_skill': get_first_value(metadata['SKILL']),
+                'execution_id': conversation['execution_id'],
+                'agent_names': ", ".join(sorted(set(str(name) for name in metadata['AGENT_NAME'] if pd.notna(name)))) if has_agent_name else "",
+                'shadowed_by': get_first_value(metadata['SHADOWED_BY']),
+                'customer_name': str(customer_name) if customer_name is not None else "",
             })
             processed_count += 1
         else:
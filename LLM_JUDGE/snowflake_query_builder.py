@@ -0,0 +1,102 @@
+"""
+Query Builder Module for Snowflake LLM Analysis
+Shared SQL predicate builders for date and department filters
+Emits half-open ranges on bare columns so Snowflake can prune micro-partitions
+(no DATE(col), day(col), month(col) or year(col) wrappers on the filtered column)
+"""
+
+from datetime import datetime, date, timedelta
+
+
+def _to_date(target_date):
+    """
+    Normalize a 'YYYY-MM-DD' string, date or datetime to a date.
+    """
+    if isinstance(target_date, datetime):
+        return target_date.date()
+    if isinstance(target_date, date):
+        return target_date
+    return datetime.strptime(str(target_date)[:10], '%Y-%m-%d').date()
+
+
+def _sql_literal(value):
+    """
+    Quote a Python value as a SQL string literal.
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def build_date_range_predicate(column, target_date, days=1):
+    """
+    Build a half-open date range predicate on a bare column.
+
+    Args:
+        column: Column to filter (DATE or TIMESTAMP), e.g. 'DATE', 'UPDATED_AT', 'd.DATE'
+        target_date: First day of the range ('YYYY-MM-DD', date or datetime)
+        days: Number of days covered by the range
+
+    Returns:
+        SQL predicate, e.g. "DATE >= DATE('2025-08-04') AND DATE < DATE('2025-08-05')"
+    """
+    start_date = _to_date(target_date)
+    end_date = start_date + timedelta(days=days)
+    return (
+        f"{column} >= DATE('{start_date.strftime('%Y-%m-%d')}') "
+        f"AND {column} < DATE('{end_date.strftime('%Y-%m-%d')}')"
+    )
+
+
+def build_department_predicate(department_name, column='DEPARTMENT'):
+    """
+    Build a department predicate on a bare column.
+    AT_Filipina covers every AT_Filipina_* sub-department through a case-insensitive prefix
+    ILIKE, so sub-department values written in another case still match.
+
+    Args:
+        department_name: Department name
+        column: Department column, e.g. 'DEPARTMENT' or 'department'
+
+    Returns:
+        SQL predicate, e.g. "DEPARTMENT = 'Doctors'"
+    """
+    if department_name == 'AT_Filipina':
+        return f"{column} ILIKE 'AT_Filipina%'"
+    return f"{column} = {_sql_literal(department_name)}"
+
+
+
+def build_hash_shard_predicate(column, shard_index, shard_count):
+    """
+    Build a predicate selecting one hash shard of a column, so a day can be loaded in
+    shard_count disjoint pieces that together cover every row exactly once.
+    NULL keys always land in shard 0.
+
+    Args:
+        column: Shard key column, e.g. 'CONVERSATION_ID'
+        shard_index: Shard to select (0 .. shard_count - 1)
+        shard_count: Total number of shards
+
+    Returns:
+        SQL predicate, e.g. "(CONVERSATION_ID IS NOT NULL AND MOD(ABS(HASH(CONVERSATION_ID)), 4) = 1)"
+    """
+    if shard_count < 1 or not 0 <= shard_index < shard_count:
+        raise ValueError(f"Invalid shard {shard_index} of {shard_count}")
+
+    shard_expression = f"MOD(ABS(HASH({column})), {shard_count}) = {shard_index}"
+    if shard_index == 0:
+        return f"({column} IS NULL OR {shard_expression})"
+    return f"({column} IS NOT NULL AND {shard_expression})"
+
+
+def build_json_parse_expression(column):
+    """
+    Build a TRY_PARSE_JSON expression of an LLM response column, cleaned like safe_json_parse
+    (surrounding whitespace and ```json / ``` fences removed). NULL when the response is not valid JSON.
+
+    Args:
+        column: Response column, e.g. 'LLM_RESPONSE'
+
+    Returns:
+        SQL expression, e.g. "TRY_PARSE_JSON(REGEXP_REPLACE(TRIM(LLM_RESPONSE), '^```(json)?|```$', ''))"
+    """
+    return f"TRY_PARSE_JSON(REGEXP_REPLACE(TRIM({column}), '^```(json)?|```$', ''))"
@@ -0,0 +1,220 @@
+"""
+Tests for the Phase 1 loaders' handling of the rows a query returns
+"""
+
+from datetime import datetime
+
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+pytest.importorskip("sklearn")
+
+import LLM_JUDGE.clean_chats_phase2_core_analytics as phase1
+from snowflake_query_builder import build_date_range_predicate
+
+
+class FrameResult:
+    def __init__(self, df):
+        self.df = df
+
+    def to_pandas(self):
+        return self.df.copy()
+
+
+class FrameSession:
+    def __init__(self, df):
+        self.df = df
+
+    def sql(self, query):
+        return FrameResult(self.df)
+
+
+def test_multi_day_drops_rows_outside_the_day_windows(monkeypatch):
+    projected_columns = phase1.get_phase1_projected_columns(None)
+    raw_df = pd.DataFrame({column: ['value'] * 4 for column in projected_columns})
+    # Day 2025-08-04 loads from UPDATED_AT 2025-08-05; a NaT and a later day map to no requested date
+    raw_df['UPDATED_AT'] = pd.to_datetime(['2025-08-05 10:00:00', '2025-08-03 23:59:59', None, '2025-08-07 00:00:00'])
+
+    preprocessed = []
+    monkeypatch.setattr(phase1, 'validate_phase1_columns', lambda *args: None)
+    monkeypatch.setattr(phase1, 'preprocess_data_snowflake_phase1',
+                        lambda df, *args, **kwargs: preprocessed.append(df) or pd.DataFrame())
+
+    phase1.process_department_phase1_multi_day(FrameSession(raw_df), 'Doctors', '2025-08-04', use_cache=False)
+
+    assert len(preprocessed) == 1
+    assert preprocessed[0]['DAY_OFFSET'].dtype == 'int64'
+    assert preprocessed[0][['PROCESSING_DATE', 'DAY_OFFSET']].values.tolist() == [['2025-08-04', 0], ['2025-08-02', 2]]
+
+
+def test_shared_table_defaults_to_yesterday(recording_session, monkeypatch):
+    monkeypatch.setattr(phase1, 'validate_phase1_columns', lambda *args: None)
+    results = phase1.process_shared_table_phase1(recording_session, ['AT_Filipina', 'AT_African'], use_cache=False)
+
+    # Yesterday's conversations load from UPDATED_AT = today
+    today = datetime.now().date()
+    assert build_date_range_predicate('UPDATED_AT', today) in recording_session.queries[0]
+    assert all(not success and 'No data found' in stats['error'] for _, stats, success in results.values())
+
+
+PUSHDOWN_CONFIG = {'Doctors': {'table_name': 'CHATS', 'agent_skills': ['Doctors_Agents'], 'bot_skills': ['GPT_Doctors']}}
+
+
+def chat_row(conversation_id, time, sent_by, target_skill, through_skill, message_type='Normal Message'):
+    return {
+        'CONVERSATION_ID': conversation_id, 'MESSAGE_SENT_TIME': pd.Timestamp(time), 'MESSAGE_TYPE': message_type,
+        'SENT_BY': sent_by, 'TEXT': f"{sent_by} at {time}", 'TARGET_SKILL_PER_MESSAGE': target_skill,
+        'THROUGH_SKILL': through_skill, 'EXECUTION_ID': None, 'SKILL': None, 'AGENT_NAME': None,
+        'CUSTOMER_NAME': None, 'SHADOWED_BY': None
+    }
+
+
+# Day 2 of target date 2025-08-04 is 2025-08-04; each conversation exercises one filter
+PUSHDOWN_FIXTURE = pd.DataFrame([
+    chat_row('bot', '2025-08-04 09:00', 'Consumer', None, 'GPT_Doctors'),
+    chat_row('bot', '2025-08-04 09:01', 'Bot', 'GPT_Doctors', 'GPT_Doctors'),
+    chat_row('agent', '2025-08-03 23:50', 'consumer ', None, 'GPT_Doctors,Doctors_Agents', 'Normal Message '),
+    chat_row('agent', '2025-08-04 00:10', 'Agent', ' Doctors_Agents', 'GPT_Doctors,Doctors_Agents'),
+    chat_row('n8n', '2025-08-04 09:00', 'Consumer', None, 'GPT_Doctors'),
+    chat_row('n8n', '2025-08-04 09:01', 'Bot', 'GPT_Doctors', 'n8n_test'),
+    chat_row('day1_only', '2025-08-03 09:00', 'Consumer', None, 'GPT_Doctors'),
+    chat_row('day1_only', '2025-08-03 09:01', 'Bot', 'GPT_Doctors', 'GPT_Doctors'),
+    chat_row('first_skill', '2025-08-04 09:00', 'Consumer', None, 'OTHER_SKILL'),
+    chat_row('first_skill', '2025-08-04 09:01', 'Bot', 'GPT_Doctors', 'GPT_Doctors'),
+    chat_row('no_consumer', '2025-08-04 09:00', 'Bot', 'GPT_Doctors', 'GPT_Doctors'),
+    chat_row('private', '2025-08-04 09:00', 'Consumer', None, 'GPT_Doctors', 'Private Message'),
+    chat_row('private', '2025-08-04 09:01', 'Bot', 'GPT_Doctors', 'GPT_Doctors'),
+    chat_row('other_bot', '2025-08-04 09:00', 'Consumer', None, 'GPT_Doctors'),
+    chat_row('other_bot', '2025-08-04 09:01', 'Bot', 'GPT_Other', 'GPT_Doctors'),
+])
+
+
+def pushdown_qualifying_conversations(df, dept_config, day2_date):
+    """
+    The predicates of build_phase1_pushdown_query evaluated on a raw frame, CTE by CTE.
+    """
+    message_type = df['MESSAGE_TYPE'].str.strip().str.lower()
+    sent_by = df['SENT_BY'].str.strip().str.lower()
+    target_skill = df['TARGET_SKILL_PER_MESSAGE'].str.strip()
+    is_normal = message_type == 'normal message'
+    rows = df.assign(
+        HAS_CONSUMER=is_normal & (sent_by == 'consumer'),
+        HAS_AGENT=is_normal & (sent_by == 'agent') & target_skill.isin(dept_config['agent_skills']),
+        HAS_BOT=is_normal & (sent_by == 'bot') & target_skill.isin(dept_config['bot_skills']),
+        HAS_N8N_TEST=(df['TARGET_SKILL_PER_MESSAGE'].str.contains('n8n_test', case=False, na=False)
+                      | df['THROUGH_SKILL'].str.contains('n8n_test', case=False, na=False)),
+        HAS_DAY2=df['MESSAGE_SENT_TIME'].dt.normalize() == pd.Timestamp(day2_date)
+    )
+    flags = rows.groupby('CONVERSATION_ID')[['HAS_CONSUMER', 'HAS_AGENT', 'HAS_BOT', 'HAS_N8N_TEST', 'HAS_DAY2']].any()
+    first_rows = df.sort_values('MESSAGE_SENT_TIME').drop_duplicates('CONVERSATION_ID').set_index('CONVERSATION_ID')
+    first_has_bot_skill = first_rows['THROUGH_SKILL'].astype(str).map(
+        lambda through_skill: any(bot_skill in through_skill for bot_skill in dept_config['bot_skills'])
+    )
+    qualifying = (flags['HAS_CONSUMER'] & (flags['HAS_AGENT'] | flags['HAS_BOT']) & ~flags['HAS_N8N_TEST']
+                  & flags['HAS_DAY2'] & first_has_bot_skill.reindex(flags.index, fill_value=False))
+    return set(flags.index[qualifying])
+
+
+def test_pushdown_predicates_match_the_pandas_filters(monkeypatch):
+    monkeypatch.setattr(phase1, 'get_snowflake_departments_config', lambda: PUSHDOWN_CONFIG)
+    query = phase1.build_phase1_pushdown_query('Doctors', '2025-08-04')
+    for predicate in ("TRIM(TARGET_SKILL_PER_MESSAGE) IN ('Doctors_Agents')", "TRIM(TARGET_SKILL_PER_MESSAGE) IN ('GPT_Doctors')",
+                      "ILIKE '%N8N_TEST%'", "DATE('2025-08-04')", "CONTAINS(r.THROUGH_SKILL::STRING, 'GPT_Doctors')"):
+        assert predicate in query
+
+    processed = phase1.preprocess_data_snowflake_phase1(PUSHDOWN_FIXTURE.copy(), 'Doctors', '2025-08-04')
+    legacy_df, _ = phase1.filter_conversations_snowflake_combined(processed, 'Doctors', '2025-08-04')
+    pushdown_conversations = pushdown_qualifying_conversations(PUSHDOWN_FIXTURE, PUSHDOWN_CONFIG['Doctors'], '2025-08-04')
+
+    assert pushdown_conversations == {'bot', 'agent'}
+    assert set(legacy_df['CONVERSATION_ID'].unique()) == pushdown_conversations
+
+
+def test_pushdown_query_returns_the_unfiltered_window_size():
+    query = phase1.build_phase1_pushdown_query('Doctors', '2025-08-04', PUSHDOWN_CONFIG, with_window_counts=True)
+    assert 'COUNT(DISTINCT CONVERSATION_ID) AS PHASE1_WINDOW_CONVERSATIONS\n        FROM day_rows' in query
+    assert 'SELECT d.*, w.PHASE1_WINDOW_ROWS, w.PHASE1_WINDOW_CONVERSATIONS' in query
+    assert 'PHASE1_WINDOW' not in phase1.build_phase1_pushdown_query('Doctors', '2025-08-04', PUSHDOWN_CONFIG)
+
+
+def test_pushdown_stats_are_relative_to_the_unfiltered_window():
+    stats = phase1.rebase_pushdown_filtering_stats(
+        {'total_original_conversations': 40, 'engagement_valid_conversations': 40, 'final_valid_conversations': 30,
+         'engagement_retention_rate': 100.0, 'overall_retention_rate': 75.0},
+        window_conversations=120, window_rows=900
+    )
+    assert (stats['total_original_conversations'], stats['pushdown_loaded_conversations'], stats['window_rows']) == (120, 40, 900)
+    assert stats['overall_retention_rate'] == 25.0
+    assert stats['filter_counts_scope'] == 'post_pushdown'
+
+
+class ColumnsResult:
+    def __init__(self, columns):
+        self.columns = list(columns)
+
+    def collect(self):
+        return [{'column_name': column} for column in self.columns]
+
+
+class ColumnsSession:
+    def __init__(self, columns):
+        self.columns = columns
+        self.queries = []
+
+    def sql(self, query):
+        self.queries.append(query)
+        return ColumnsResult(self.columns)
+
+
+def test_table_columns_are_looked_up_once_per_table(monkeypatch):
+    monkeypatch.setattr(phase1, '_phase1_table_columns', {})
+    session = ColumnsSession(['CONVERSATION_ID', 'TEXT'])
+
+    phase1.validate_phase1_columns(session, 'db.chats', ['CONVERSATION_ID'])
+    phase1.validate_phase1_columns(session, 'DB.CHATS', ['TEXT'])
+    assert session.queries == ['SHOW COLUMNS IN db.chats']
+
+    # A missing column is checked against a fresh lookup before failing
+    session.columns.append('SKILL')
+    phase1.validate_phase1_columns(session, 'DB.CHATS', ['SKILL'])
+    with pytest.raises(ValueError, match='AGENT_NAME'):
+        phase1.validate_phase1_columns(session, 'DB.CHATS', ['AGENT_NAME'])
+    assert len(session.queries) == 3
+
+
+def compacted_fixture():
+    rows = []
+    for number in range(6):
+        conversation_id = f"c{number}"
+        agent_name = 'Sara' if number % 2 else None
+        rows += [
+            {**chat_row(conversation_id, '2025-08-04 09:00', ' Consumer', None, 'GPT_Doctors'), 'TEXT': 'Hi <doctor>'},
+            {**chat_row(conversation_id, '2025-08-04 09:01', 'Bot', 'GPT_Doctors ', 'GPT_Doctors'), 'TEXT': 'Hello!', 'SKILL': 'GPT_Doctors'},
+            {**chat_row(conversation_id, '2025-08-04 09:02', 'Agent', 'Doctors_Agents', 'GPT_Doctors'),
+             'TEXT': f"Reply {number}", 'AGENT_NAME': agent_name, 'SKILL': 'GPT_Doctors'},
+        ]
+    return pd.DataFrame(rows)
+
+
+def test_compacted_frame_filters_and_converts_like_the_object_frame(monkeypatch):
+    from snowflake_llm_json_converter import convert_conversations_to_json_dataframe
+    from snowflake_llm_segment_converter import convert_conversations_to_segment_dataframe
+    from snowflake_llm_xml_converter import convert_conversations_to_xml_dataframe
+
+    monkeypatch.setattr(phase1, 'get_snowflake_departments_config', lambda: {
+        'Doctors': {'table_name': 'CHATS', 'agent_skills': ['Doctors_Agents'], 'bot_skills': ['GPT_Doctors']}
+    })
+    compacted = phase1.preprocess_data_snowflake_phase1(compacted_fixture(), 'Doctors', '2025-08-04')
+    categorical_columns = [column for column in compacted.columns if isinstance(compacted[column].dtype, pd.CategoricalDtype)]
+    assert {'MESSAGE_TYPE', 'SENT_BY', 'SKILL', 'AGENT_NAME'} <= set(categorical_columns)
+    object_frame = compacted.astype({column: object for column in categorical_columns})
+
+    compacted_filtered, compacted_stats = phase1.filter_conversations_snowflake_combined(compacted, 'Doctors', '2025-08-04')
+    object_filtered, object_stats = phase1.filter_conversations_snowflake_combined(object_frame, 'Doctors', '2025-08-04')
+    assert compacted_stats == object_stats and len(compacted_filtered) == 18
+    pd.testing.assert_frame_equal(compacted_filtered.astype(object_filtered.dtypes.to_dict()), object_filtered)
+
+    for convert in (convert_conversations_to_xml_dataframe, convert_conversations_to_segment_dataframe,
+                    convert_conversations_to_json_dataframe):
+        pd.testing.assert_frame_equal(convert(compacted_filtered, 'Doctors'), convert(object_filtered, 'Doctors'))
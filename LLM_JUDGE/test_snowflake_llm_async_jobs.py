@@ -0,0 +1,107 @@
+"""
+Tests for the async job runner and its concurrency settings
+"""
+
+from snowflake_llm_async_jobs import DEFAULT_LLM_CONCURRENCY, get_llm_concurrency, iter_async_query_results
+
+
+class FakeAsyncJob:
+    def __init__(self, session, query):
+        self.session = session
+        self.query = query
+        self.polls = 0
+        self.cancelled = False
+
+    def is_done(self):
+        self.polls += 1
+        return self.polls >= self.session.polls_needed.get(self.query, 1)
+
+    def result(self):
+        if self.query in self.session.failing:
+            raise RuntimeError(f"failed: {self.query}")
+        return [self.query]
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class FakeQuery:
+    def __init__(self, session, query):
+        self.session = session
+        self.query = query
+
+    def collect_nowait(self):
+        job = FakeAsyncJob(self.session, self.query)
+        self.session.submitted.append(job)
+        self.session.peak_running = max(self.session.peak_running, self.session.running())
+        return job
+
+
+class FakeSession:
+    def __init__(self, polls_needed=None, failing=()):
+        self.polls_needed = polls_needed or {}
+        self.failing = set(failing)
+        self.submitted = []
+        self.finished = set()
+        self.peak_running = 0
+
+    def running(self):
+        return len([job for job in self.submitted if job.query not in self.finished])
+
+    def sql(self, query):
+        return FakeQuery(self, query)
+
+
+def run_jobs(session, queries, max_concurrency):
+    results = []
+    for job, rows, error in iter_async_query_results(session, [{'query': query} for query in queries],
+                                                     max_concurrency=max_concurrency, poll_seconds=0):
+        session.finished.add(job['query'])
+        results.append((job['query'], rows, error))
+    return results
+
+
+def test_concurrency_defaults_to_one(monkeypatch):
+    monkeypatch.delenv('LLM_JUDGE_LLM_CONCURRENCY', raising=False)
+    assert DEFAULT_LLM_CONCURRENCY == 1
+    assert get_llm_concurrency() == 1
+
+
+def test_concurrency_opt_in_by_argument_or_environment(monkeypatch):
+    monkeypatch.setenv('LLM_JUDGE_LLM_CONCURRENCY', '3')
+    assert get_llm_concurrency() == 3
+    assert get_llm_concurrency(2) == 2
+    assert get_llm_concurrency(0) == 1
+
+
+def test_sequential_by_default_yields_in_submission_order(monkeypatch):
+    monkeypatch.delenv('LLM_JUDGE_LLM_CONCURRENCY', raising=False)
+    session = FakeSession()
+    results = run_jobs(session, ['q1', 'q2', 'q3'], max_concurrency=None)
+    assert [query for query, _, _ in results] == ['q1', 'q2', 'q3']
+    assert session.peak_running == 1
+
+
+def test_concurrent_jobs_are_capped_and_yield_in_completion_order():
+    session = FakeSession(polls_needed={'slow': 3})
+    results = run_jobs(session, ['slow', 'fast1', 'fast2'], max_concurrency=2)
+    assert [query for query, _, _ in results] == ['fast1', 'fast2', 'slow']
+    assert session.peak_running == 2
+
+
+def test_failed_job_is_yielded_with_error():
+    session = FakeSession(failing=['bad'])
+    results = run_jobs(session, ['ok', 'bad'], max_concurrency=2)
+    errors = {query: error for query, _, error in results}
+    assert errors['ok'] is None
+    assert isinstance(errors['bad'], RuntimeError)
+
+
+def test_stopping_early_cancels_running_jobs():
+    session = FakeSession(polls_needed={'slow': 100})
+    iterator = iter_async_query_results(session, [{'query': 'fast'}, {'query': 'slow'}], max_concurrency=2, poll_seconds=0)
+    job, rows, error = next(iterator)
+    assert job['query'] == 'fast' and rows == ['fast'] and error is None
+    iterator.close()
+    slow_job = next(job for job in session.submitted if job.query == 'slow')
+    assert slow_job.cancelled
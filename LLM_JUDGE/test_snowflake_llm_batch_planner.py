@@ -0,0 +1,61 @@
+"""
+Tests for the LLM batch planner: shard balancing, batch counts and the SQL it emits
+"""
+
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_helpers import plan_conversion_shards
+from snowflake_llm_batch_planner import (
+    build_batch_filter,
+    estimate_tokens_from_length,
+    fetch_pending_llm_sizes,
+    plan_llm_batches
+)
+
+
+def test_shards_are_balanced_longest_first():
+    shards = plan_conversion_shards({'a': 10, 'b': 7, 'c': 5, 'd': 3, 'e': 2}, 2)
+    assert [shard['messages'] for shard in shards] == [13, 14]
+    assert shards[0]['longest'] == 10
+    assert sorted(conv_id for shard in shards for conv_id in shard['conversation_ids']) == ['a', 'b', 'c', 'd', 'e']
+
+
+def test_shard_count_is_capped_by_conversation_count():
+    assert len(plan_conversion_shards({'a': 1, 'b': 1}, 8)) == 2
+
+
+def test_token_estimate_rounds_up():
+    assert estimate_tokens_from_length(0) == 0
+    assert estimate_tokens_from_length(None) == 0
+    assert estimate_tokens_from_length(7) == 3
+
+
+def test_batch_count_follows_token_budget_and_row_limit():
+    sizes = {f'c{i}': {'tokens': 100, 'rows': 1} for i in range(10)}
+    assert len(plan_llm_batches(sizes, batch_tokens=250, batch_max_rows=100)) == 4
+    assert len(plan_llm_batches(sizes, batch_tokens=10000, batch_max_rows=3)) == 4
+    assert plan_llm_batches({}, batch_tokens=250, batch_max_rows=100) == []
+
+
+def test_batches_cover_every_conversation_heaviest_first():
+    sizes = {'big': {'tokens': 500, 'rows': 2}, 'mid': {'tokens': 300, 'rows': 1}, 'small': {'tokens': 150, 'rows': 1}}
+    batches = plan_llm_batches(sizes, batch_tokens=500, batch_max_rows=100)
+    assert [batch['batch_index'] for batch in batches] == [0, 1]
+    assert batches[0] == {'batch_index': 0, 'conversation_ids': ['big'], 'estimated_tokens': 500, 'rows': 2}
+    assert sorted(batches[1]['conversation_ids']) == ['mid', 'small']
+
+
+def test_batch_filter_sql():
+    assert build_batch_filter('TEMP_LLM_BATCH_PLAN_X', 3) == (
+        "CONVERSATION_ID IN (SELECT CONVERSATION_ID FROM TEMP_LLM_BATCH_PLAN_X WHERE BATCH_INDEX = 3)"
+    )
+
+
+def test_pending_sizes_are_grouped_by_conversation(recording_session):
+    assert fetch_pending_llm_sizes(recording_session, 'OUT_TABLE', "PROCESSING_STATUS = 'PENDING'") == {}
+    query = recording_session.queries[0]
+    assert "FROM OUT_TABLE" in query
+    assert "WHERE PROCESSING_STATUS = 'PENDING'" in query
+    assert "GROUP BY CONVERSATION_ID" in query
@@ -0,0 +1,57 @@
+"""
+Tests for the compiled configuration registry: read-only compiled configs and stable config hashes
+"""
+
+from types import MappingProxyType
+
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_config import (
+    _freeze_config_value,
+    compile_prompt_config,
+    compute_config_hash,
+    get_compiled_departments_config,
+    get_config_hash,
+    is_per_skill_prompt
+)
+
+PER_SKILL_PROMPT = {'system_prompt': {'GPT_AT_Filipina': 'Rate the chat'}, 'model': 'gpt-4o-mini', 'output_table': 'OUT_TABLE'}
+
+
+def test_compiled_registry_is_read_only():
+    compiled_config = get_compiled_departments_config()
+    dept_name, dept_config = next(iter(compiled_config.items()))
+    assert get_compiled_departments_config() is compiled_config
+
+    with pytest.raises(TypeError):
+        compiled_config['New_Department'] = {}
+    with pytest.raises(TypeError):
+        dept_config['bot_skills'] = ()
+    assert isinstance(dept_config['bot_skills'], tuple)
+    for prompt_config in dept_config['llm_prompts'].values():
+        with pytest.raises(TypeError):
+            prompt_config['model'] = 'other'
+
+
+def test_config_hash_is_the_same_for_frozen_and_plain_configs():
+    config = {'bot_skills': ['GPT_Doctors'], 'llm_prompts': {'categorizing': {'model': 'gpt-4o-mini', 'temperature': 0.2}}}
+    assert compute_config_hash(_freeze_config_value(config)) == compute_config_hash(config)
+    assert compute_config_hash(dict(reversed(list(config.items())))) == compute_config_hash(config)
+
+
+def test_department_config_hash_is_stable():
+    dept_name = next(iter(get_compiled_departments_config()))
+    assert get_config_hash(dept_name) == get_config_hash(dept_name)
+    assert len(get_config_hash()) == 64
+
+
+def test_per_skill_prompt_flag_with_and_without_compilation():
+    compiled = compile_prompt_config(PER_SKILL_PROMPT)
+    assert isinstance(compiled, MappingProxyType) and isinstance(compiled['system_prompt'], MappingProxyType)
+    assert is_per_skill_prompt(compiled)
+    assert is_per_skill_prompt(PER_SKILL_PROMPT)
+    assert is_per_skill_prompt({'system_prompt': MappingProxyType({'GPT_AT_Filipina': 'Rate the chat'})})
+    assert not is_per_skill_prompt(compile_prompt_config({**PER_SKILL_PROMPT, 'system_prompt': 'Rate the chat'}))
+    assert compiled['prompt_hash'] == compute_config_hash(PER_SKILL_PROMPT)
@@ -0,0 +1,58 @@
+"""
+Tests for conversion cache fingerprints (cache-key stability)
+"""
+
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_conversion_cache import compute_conversation_fingerprints
+
+
+def _messages_frame():
+    return pd.DataFrame({
+        'CONVERSATION_ID': ['c1', 'c1', 'c2'],
+        'MESSAGE_SENT_TIME': pd.to_datetime(['2025-08-04 10:00:00', '2025-08-04 10:01:00', '2025-08-04 11:00:00']),
+        'SENT_BY': ['consumer', 'bot', 'consumer'],
+        'TEXT': ['hello', 'hi there', 'help'],
+        'MESSAGE_TYPE': ['normal message', 'normal message', 'normal message'],
+        'TARGET_SKILL_PER_MESSAGE': ['GPT_A', 'GPT_A', 'GPT_B'],
+        'DAY_OFFSET': [0, 0, 0],
+        'PROCESSING_DATE': ['2025-08-04', '2025-08-04', '2025-08-04'],
+    })
+
+
+def test_fingerprints_ignore_day_bookkeeping_columns():
+    df = _messages_frame()
+    shifted = df.copy()
+    shifted['DAY_OFFSET'] = 2
+    shifted['PROCESSING_DATE'] = '2025-08-06'
+    assert compute_conversation_fingerprints(df, 'v1') == compute_conversation_fingerprints(shifted, 'v1')
+
+
+def test_fingerprints_match_without_bookkeeping_columns():
+    df = _messages_frame()
+    single_day = df.drop(columns=['DAY_OFFSET', 'PROCESSING_DATE'])
+    assert compute_conversation_fingerprints(df, 'v1') == compute_conversation_fingerprints(single_day, 'v1')
+
+
+def test_fingerprints_ignore_row_order():
+    df = _messages_frame()
+    shuffled = df.iloc[::-1].reset_index(drop=True)
+    assert compute_conversation_fingerprints(df, 'v1') == compute_conversation_fingerprints(shuffled, 'v1')
+
+
+def test_fingerprints_change_with_converter_input():
+    df = _messages_frame()
+    edited = df.copy()
+    edited.loc[0, 'TEXT'] = 'hello again'
+    before = compute_conversation_fingerprints(df, 'v1')
+    after = compute_conversation_fingerprints(edited, 'v1')
+    assert before['c1'] != after['c1']
+    assert before['c2'] == after['c2']
+
+
+def test_fingerprints_change_with_converter_version():
+    df = _messages_frame()
+    assert compute_conversation_fingerprints(df, 'v1')['c1'] != compute_conversation_fingerprints(df, 'v2')['c1']
@@ -0,0 +1,76 @@
+"""
+Parity tests for JSON timestamps: format_message_times() and the JSON converter output against
+the per-message conversion the converter used before timestamps were formatted per frame
+"""
+
+import json
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_time_format import clean_datetime_format_snowflake, format_message_times
+from snowflake_llm_json_converter import convert_conversations_to_json_dataframe
+
+TARGET_SKILL = 'GPT_Doctors'
+
+# Whole seconds, microseconds and nanoseconds in one column
+NAIVE_TIMES = ['2025-08-04 10:00:00', '2025-08-04 10:00:05.123456', '2025-08-04 10:00:09.123456789']
+
+
+def legacy_json_timestamp(time_value):
+    """
+    Per-message timestamp of the JSON converter before format_message_times().
+    """
+    cleaned_time = clean_datetime_format_snowflake(time_value)
+    try:
+        return pd.to_datetime(cleaned_time, errors='coerce').isoformat()
+    except:
+        return str(cleaned_time)
+
+
+def _time_series(tz):
+    series = pd.Series(pd.to_datetime(NAIVE_TIMES, format='ISO8601'))
+    return series.dt.tz_localize(tz) if tz else series
+
+
+TIME_VARIANTS = {
+    'naive': lambda: _time_series(None),
+    'utc': lambda: _time_series('UTC'),
+    'dubai': lambda: _time_series('Asia/Dubai'),
+    'new_york': lambda: _time_series('America/New_York'),
+    'microsecond_unit': lambda: _time_series(None).iloc[:2].astype('datetime64[us]'),
+    'with_nat': lambda: pd.concat([_time_series('Asia/Dubai'), pd.Series([pd.NaT], dtype='datetime64[ns, Asia/Dubai]')],
+                                  ignore_index=True),
+}
+
+
+@pytest.mark.parametrize('variant', sorted(TIME_VARIANTS))
+def test_format_message_times_matches_legacy(variant):
+    series = TIME_VARIANTS[variant]()
+    formatted = format_message_times(series)
+    assert list(formatted['time_iso']) == [legacy_json_timestamp(value) for value in series]
+
+
+@pytest.mark.parametrize('variant', ['naive', 'utc', 'dubai', 'new_york', 'microsecond_unit'])
+def test_json_output_timestamps_match_legacy(variant):
+    times = TIME_VARIANTS[variant]()
+    count = len(times)
+    df = pd.DataFrame({
+        'CONVERSATION_ID': ['c1'] * count,
+        'MESSAGE_SENT_TIME': times,
+        'SENT_BY': ['Consumer', 'Bot', 'Consumer'][:count],
+        'TEXT': [f'message {i}' for i in range(count)],
+        'MESSAGE_TYPE': ['normal message'] * count,
+        'TARGET_SKILL_PER_MESSAGE': [TARGET_SKILL] * count,
+        'SKILL': [TARGET_SKILL] * count,
+        'CUSTOMER_NAME': ['Customer'] * count,
+        'AGENT_NAME': [None] * count,
+        'SHADOWED_BY': [None] * count,
+    })
+
+    json_df = convert_conversations_to_json_dataframe(df, 'Doctors')
+
+    conversation = json.loads(json_df.iloc[0]['content_json_view'])
+    timestamps = [message['timestamp'] for message in conversation['conversation']]
+    assert timestamps == [legacy_json_timestamp(value) for value in times]
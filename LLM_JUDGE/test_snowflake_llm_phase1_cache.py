@@ -0,0 +1,80 @@
+"""
+Tests for the Phase 1 cache: key stability, round trips and eviction
+"""
+
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import pandas as pd
+
+import snowflake_llm_phase1_cache as phase1_cache
+from snowflake_llm_phase1_cache import (
+    build_phase1_cache_key,
+    hash_phase1_config,
+    invalidate_phase1_cache,
+    is_closed_update_date,
+    read_phase1_cache,
+    write_phase1_cache
+)
+
+CONFIG = {'department': 'Doctors', 'bot_skills': ['GPT_Doctors'], 'columns': ['CONVERSATION_ID', 'TEXT'], 'apply_filter_5': True}
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    monkeypatch.setenv('LLM_JUDGE_PHASE1_CACHE_DIR', str(tmp_path))
+    monkeypatch.delenv('LLM_JUDGE_PHASE1_CACHE', raising=False)
+    return tmp_path
+
+
+def test_config_hash_ignores_key_order():
+    assert hash_phase1_config(CONFIG) == hash_phase1_config(dict(reversed(list(CONFIG.items()))))
+
+
+def test_config_hash_changes_with_config_and_version(monkeypatch):
+    config_hash = hash_phase1_config(CONFIG)
+    assert hash_phase1_config({**CONFIG, 'apply_filter_5': False}) != config_hash
+    assert hash_phase1_config({**CONFIG, 'columns': ['CONVERSATION_ID']}) != config_hash
+    monkeypatch.setattr(phase1_cache, 'PHASE1_CACHE_VERSION', phase1_cache.PHASE1_CACHE_VERSION + 1)
+    assert hash_phase1_config(CONFIG) != config_hash
+
+
+def test_cache_key_is_file_name_safe():
+    config_hash = hash_phase1_config(CONFIG)
+    assert build_phase1_cache_key('llm_eval.raw_data.mv_client_chats', '2025-08-04', config_hash, namespace='multi_day') == (
+        f"multi_day__LLM_EVAL_RAW_DATA_MV_CLIENT_CHATS__2025-08-04__{config_hash[:16]}"
+    )
+
+
+def test_only_past_update_dates_are_closed():
+    assert is_closed_update_date((datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d'))
+    assert not is_closed_update_date(datetime.now().strftime('%Y-%m-%d'))
+
+
+def test_round_trip_and_invalidate(cache_dir):
+    cache_key = build_phase1_cache_key('T', '2025-08-04', hash_phase1_config(CONFIG))
+    frame = pd.DataFrame({'CONVERSATION_ID': ['c1', 'c2'], 'TEXT': ['hi', 'bye']})
+
+    assert read_phase1_cache(cache_key) is None
+    assert write_phase1_cache(cache_key, frame, {'raw_rows': 2}, {'table_name': 'T', 'date': '2025-08-04', 'department': 'Doctors'})
+    cached_df, stats = read_phase1_cache(cache_key)
+    pd.testing.assert_frame_equal(cached_df, frame)
+    assert stats == {'raw_rows': 2}
+
+    assert invalidate_phase1_cache(department='Other') == 0
+    assert invalidate_phase1_cache(date='2025-08-04') == 1
+    assert read_phase1_cache(cache_key) is None
+
+
+def test_eviction_keeps_the_most_recently_used_entry(cache_dir, monkeypatch):
+    frame = pd.DataFrame({'TEXT': ['x' * 100]})
+    write_phase1_cache('single__T__2025-08-03__a', frame, {})
+    entry_size = sum(path.stat().st_size for path in cache_dir.iterdir())
+    for path in cache_dir.iterdir():
+        os.utime(path, (1, 1))
+
+    monkeypatch.setenv('LLM_JUDGE_PHASE1_CACHE_MAX_BYTES', str(entry_size + entry_size // 2))
+    write_phase1_cache('single__T__2025-08-04__b', frame, {})
+    assert sorted(path.name for path in cache_dir.iterdir()) == ['single__T__2025-08-04__b.json', 'single__T__2025-08-04__b.parquet']
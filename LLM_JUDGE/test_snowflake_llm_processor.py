@@ -0,0 +1,222 @@
+"""
+Tests for the processor's batch LLM run bookkeeping and its keyed MERGE of prompt output rows
+"""
+
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+pytest.importorskip("sklearn")
+
+import snowflake_llm_processor as processor
+
+
+def make_run(prompt_type, plan_table):
+    return {
+        'prompt_type': prompt_type,
+        'pending_count': 2,
+        'pending_filter': "PROCESSING_STATUS = 'PENDING'",
+        'batches': [{'batch_index': 0, 'conversation_ids': ['c1'], 'estimated_tokens': 10, 'rows': 1},
+                    {'batch_index': 1, 'conversation_ids': ['c2'], 'estimated_tokens': 10, 'rows': 1}],
+        'plan_table': plan_table
+    }
+
+
+def dropped_tables(session):
+    return [query.split()[-1] for query in session.queries if query.startswith('DROP TABLE')]
+
+
+def test_concurrent_updates_drop_plan_tables_when_planning_crashes(recording_session, monkeypatch):
+    runs = iter([make_run('first', 'PLAN_FIRST'), make_run('second', 'PLAN_SECOND')])
+    monkeypatch.setattr(processor, 'prepare_batch_llm_run', lambda *args: next(runs))
+
+    def failing_query(run, batch):
+        raise KeyError('system_prompt_sql')
+    monkeypatch.setattr(processor, 'build_llm_batch_query', failing_query)
+
+    with pytest.raises(KeyError):
+        processor.run_concurrent_llm_updates(recording_session, 'Doctors', '2025-08-04', {'first': {}, 'second': {}}, 2)
+    assert dropped_tables(recording_session) == ['PLAN_FIRST', 'PLAN_SECOND']
+
+
+def test_batch_update_drops_plan_table_when_a_batch_crashes(recording_session, monkeypatch):
+    monkeypatch.setattr(processor, 'prepare_batch_llm_run', lambda *args: make_run('first', 'PLAN_FIRST'))
+    monkeypatch.setattr(processor, 'build_llm_batch_query', lambda run, batch: 'SELECT 1')
+
+    def interrupted(*args):
+        raise KeyboardInterrupt
+    monkeypatch.setattr(processor, 'commit_llm_batch', interrupted)
+
+    with pytest.raises(KeyboardInterrupt):
+        processor.run_batch_llm_update(recording_session, {}, 'Doctors', '2025-08-04', 'first')
+    assert dropped_tables(recording_session) == ['PLAN_FIRST']
+
+
+class MergeResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def collect(self):
+        return self.rows
+
+
+class MergeWriter:
+    def __init__(self, session, dataframe):
+        self.session = session
+        self.dataframe = dataframe
+
+    def mode(self, mode):
+        return self
+
+    def save_as_table(self, table_name, table_type=""):
+        self.session.staged[table_name] = self.dataframe
+        self.session.table_types[table_name] = table_type
+
+
+class MergeDataFrame:
+    def __init__(self, session, dataframe):
+        self.write = MergeWriter(session, dataframe)
+
+
+class MergeSession:
+    """
+    Session stand-in for merge_llm_raw_data: an existing output table with the given columns,
+    the given PENDING count after the MERGE and two pruned rows.
+    """
+    def __init__(self, table_columns, pending_count):
+        self.table_columns = table_columns
+        self.pending_count = pending_count
+        self.queries = []
+        self.staged = {}
+        self.table_types = {}
+
+    def sql(self, query):
+        self.queries.append(query)
+        if 'INFORMATION_SCHEMA.TABLES' in query:
+            return MergeResult([{'COUNT': 1}])
+        if query.startswith('SHOW COLUMNS'):
+            return MergeResult([{'column_name': column} for column in self.table_columns])
+        if 'AS PENDING_COUNT' in query:
+            return MergeResult([{'PENDING_COUNT': self.pending_count}])
+        if query.strip().startswith('DELETE'):
+            return MergeResult([(2,)])
+        return MergeResult([])
+
+    def create_dataframe(self, dataframe):
+        return MergeDataFrame(self, dataframe)
+
+    def query_containing(self, text):
+        return next(query for query in self.queries if text in query)
+
+
+MERGE_COLUMNS = ['CONVERSATION_ID', 'SEGMENT_ID', 'PROMPT_TYPE', 'CONVERSATION_CONTENT', 'CONTENT_HASH', 'PROCESSING_STATUS']
+
+
+def merge_rows(rows):
+    return pd.DataFrame(rows, columns=MERGE_COLUMNS)
+
+
+def test_content_hash_is_stable_and_covers_every_input():
+    inputs = ['<conversation/>', 'GPT_Doctors', 'exec-1', 'v1:abc']
+    content_hash = processor.compute_llm_content_hash(*inputs)
+    assert processor.compute_llm_content_hash(*inputs) == content_hash
+    for position in range(len(inputs)):
+        changed = list(inputs)
+        changed[position] = changed[position] + 'x'
+        assert processor.compute_llm_content_hash(*changed) != content_hash
+
+
+def test_merge_is_keyed_and_only_rewrites_changed_or_unfinished_rows():
+    session = MergeSession(['DATE', 'DEPARTMENT', 'TIMESTAMP'] + MERGE_COLUMNS[:-1], pending_count=1)
+    dataframe = merge_rows([
+        ['c1', 'c1', 'categorizing', 'old', 'h0', 'PENDING'],
+        ['c1', 'c1', 'categorizing', 'new', 'h1', 'PENDING'],
+        ['c2', 'c2', 'categorizing', 'same', 'h2', 'PENDING'],
+    ])
+
+    summary = processor.merge_llm_raw_data(session, 'OUT_TABLE', 'Doctors', '2025-08-04', dataframe, MERGE_COLUMNS)
+
+    assert summary['status'] == 'success'
+    assert (summary['rows_written'], summary['rows_pending'], summary['rows_kept'], summary['rows_pruned']) == (2, 1, 1, 2)
+    assert 'ALTER TABLE OUT_TABLE ADD COLUMN IF NOT EXISTS PROCESSING_STATUS' in session.query_containing('ALTER TABLE')
+
+    staging_table, staged = next(iter(session.staged.items()))
+    assert staged[['CONVERSATION_ID', 'CONTENT_HASH']].values.tolist() == [['c1', 'h1'], ['c2', 'h2']]
+    assert session.table_types[staging_table] == 'temporary'
+
+    merge_query = session.query_containing('MERGE INTO OUT_TABLE t')
+    assert (
+        "ON EQUAL_NULL(t.CONVERSATION_ID, s.CONVERSATION_ID) AND EQUAL_NULL(t.SEGMENT_ID, s.SEGMENT_ID)"
+        " AND EQUAL_NULL(t.DATE, CAST(s.DATE AS DATE)) AND EQUAL_NULL(t.DEPARTMENT, s.DEPARTMENT)"
+        " AND EQUAL_NULL(t.PROMPT_TYPE, s.PROMPT_TYPE)"
+    ) in merge_query
+    assert 't.CONTENT_HASH IS DISTINCT FROM s.CONTENT_HASH' in merge_query
+    assert "t.PROCESSING_STATUS IS DISTINCT FROM 'COMPLETED'" in merge_query
+    assert 'WHEN MATCHED THEN UPDATE SET TIMESTAMP = CAST(s.TIMESTAMP AS TIMESTAMP)' in merge_query
+
+    prune_query = session.query_containing('DELETE FROM OUT_TABLE')
+    assert "DATE >= DATE('2025-08-04') AND DATE < DATE('2025-08-05') AND DEPARTMENT = 'Doctors'" in prune_query
+    assert "PROMPT_TYPE IN ('categorizing')" in prune_query
+    assert f"TIMESTAMP < '{summary['timestamp']}'" in prune_query
+    assert session.queries[-1] == f"DROP TABLE IF EXISTS {staging_table}"
+
+
+def test_merge_without_prune_keeps_other_rows():
+    session = MergeSession(['DATE', 'DEPARTMENT', 'TIMESTAMP'] + MERGE_COLUMNS, pending_count=0)
+    dataframe = merge_rows([['c1', 'c1', 'categorizing', 'same', 'h1', 'PENDING']])
+
+    summary = processor.merge_llm_raw_data(session, 'OUT_TABLE', 'Doctors', '2025-08-04', dataframe, MERGE_COLUMNS, prune=False)
+
+    assert (summary['rows_kept'], summary['rows_pruned']) == (1, 0)
+    assert not any(query.strip().startswith('DELETE') for query in session.queries)
+    assert not any('ALTER TABLE' in query for query in session.queries)
+
+
+def test_merge_reports_column_mismatch_as_error():
+    session = MergeSession([], pending_count=0)
+    summary = processor.merge_llm_raw_data(session, 'OUT_TABLE', 'Doctors', '2025-08-04', merge_rows([]), MERGE_COLUMNS[:-1])
+
+    assert summary['status'] == 'error'
+    assert session.queries == [] and session.staged == {}
+
+
+def test_merge_rerun_with_missing_segment_id_matches_the_written_rows():
+    # The same rows as they reach the merge on different runs: a NULL segment ID, the text
+    # clean_dataframe_for_snowflake makes of it, and a missing value after a reload
+    runs = [
+        merge_rows([['c1', None, 'categorizing', 'chat', 'h1', 'PENDING'], ['c2', 'c2_1', None, 'chat', 'h2', 'PENDING']]),
+        merge_rows([['c1', 'None', 'categorizing', 'chat', 'h1', 'PENDING'], ['c2', 'c2_1', 'None', 'chat', 'h2', 'PENDING']]),
+        merge_rows([['c1', float('nan'), 'categorizing', 'chat', 'h1', 'PENDING'], ['c2', 'c2_1', '', 'chat', 'h2', 'PENDING']]),
+    ]
+    table = None
+    for dataframe in runs:
+        session = MergeSession(['DATE', 'DEPARTMENT', 'TIMESTAMP'] + MERGE_COLUMNS, pending_count=0)
+        processor.merge_llm_raw_data(session, 'OUT_TABLE', 'Doctors', '2025-08-04', dataframe, MERGE_COLUMNS, prune=False)
+        staged = next(iter(session.staged.values()))
+        assert staged[processor.LLM_RAW_KEY_COLUMNS].notna().all().all()
+
+        # MERGE semantics: staged rows whose key is not in the table are inserted
+        if table is None:
+            table = staged
+        else:
+            matched = staged.merge(table[processor.LLM_RAW_KEY_COLUMNS], on=processor.LLM_RAW_KEY_COLUMNS, how='left', indicator=True)
+            assert (matched['_merge'] == 'both').all()
+
+    assert table[['SEGMENT_ID', 'PROMPT_TYPE']].values.tolist() == [['c1', 'categorizing'], ['c2_1', '']]
+
+
+def test_batch_commit_updates_rows_by_their_full_key():
+    session = MergeSession([], pending_count=0)
+    run = {'table_name': 'OUT_TABLE', 'use_response_cache': False, 'pending_filter': "PROCESSING_STATUS = 'PENDING'"}
+    key = {'CONVERSATION_ID': 'c1', 'DATE': '2025-08-04', 'DEPARTMENT': 'Doctors', 'PROMPT_TYPE': 'categorizing'}
+    batch_results = [{**key, 'SEGMENT_ID': 'c1_1', 'LLM_RESPONSE': 'first'}, {**key, 'SEGMENT_ID': 'c1_2', 'LLM_RESPONSE': 'second'}]
+
+    assert processor.commit_llm_batch(session, run, batch_results) == 2
+
+    results_table, staged = next(iter(session.staged.items()))
+    assert session.table_types[results_table] == 'temporary'
+    assert [row['SEGMENT_ID'] for row in staged] == ['c1_1', 'c1_2']
+    update_query = session.query_containing('UPDATE OUT_TABLE')
+    for column in processor.LLM_RAW_KEY_COLUMNS:
+        assert f"EQUAL_NULL(OUT_TABLE.{column}, temp.{column})" in update_query
+    assert "AND OUT_TABLE.PROCESSING_STATUS = 'PENDING'" in update_query
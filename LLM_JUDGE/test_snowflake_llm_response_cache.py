@@ -0,0 +1,80 @@
+"""
+Tests for the LLM response cache: prompt version and cache key stability, and the SQL it emits
+"""
+
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_response_cache import (
+    build_cache_key_sql,
+    build_cached_batch_query,
+    get_prompt_version,
+    invalidate_llm_response_cache,
+    store_llm_responses,
+    summarize_batch_cache_results
+)
+
+PROMPT = {'system_prompt': 'Rate the chat', 'model': 'gpt-4o-mini', 'temperature': 0.2, 'output_table': 'OUT_TABLE'}
+
+
+def test_prompt_version_is_stable_across_key_order():
+    assert get_prompt_version(PROMPT) == get_prompt_version(dict(reversed(list(PROMPT.items()))))
+    assert len(get_prompt_version(PROMPT)) == 16
+
+
+def test_prompt_version_changes_with_prompt_and_explicit_version():
+    version = get_prompt_version(PROMPT)
+    assert get_prompt_version({**PROMPT, 'system_prompt': 'Rate the chat again'}) != version
+    assert get_prompt_version({**PROMPT, 'prompt_version': 'v2'}).startswith('v2:')
+
+
+def test_prompt_version_uses_compiled_prompt_hash():
+    assert get_prompt_version({**PROMPT, 'prompt_hash': 'abc123' * 4}) == ('abc123' * 4)[:16]
+
+
+def test_cache_key_covers_every_llm_input_in_a_fixed_order():
+    key_sql = build_cache_key_sql("v'1")
+    positions = [key_sql.index(part) for part in (
+        "'v''1'", 'MODEL_NAME', 'TO_VARCHAR(TEMPERATURE)', 'TO_VARCHAR(MAX_TOKENS)',
+        "SHA2(COALESCE(SYSTEM_PROMPT, ''), 256)", "SHA2(COALESCE(CONVERSATION_CONTENT, ''), 256)"
+    )]
+    assert positions == sorted(positions)
+    assert build_cache_key_sql("v'1") == key_sql
+
+
+def test_cached_batch_query_calls_the_llm_once_per_missed_key(monkeypatch):
+    monkeypatch.setenv('LLM_JUDGE_RESPONSE_CACHE_TABLE', 'CACHE_DB.PUBLIC.CACHE')
+    query = build_cached_batch_query('SELECT * FROM OUT_TABLE', 'openai_chat_system', 'v1', ttl_days=7)
+    assert 'FROM CACHE_DB.PUBLIC.CACHE cache' in query
+    assert 'DATEADD(day, -7, CURRENT_TIMESTAMP()::TIMESTAMP_NTZ)' in query
+    assert 'GROUP BY keyed.CACHE_KEY' in query
+    assert query.count('openai_chat_system(') == 1
+
+
+def test_cached_batch_query_returns_the_row_key():
+    query = build_cached_batch_query('SELECT * FROM OUT_TABLE', 'openai_chat_system', 'v1', ttl_days=7,
+                                     key_columns=['CONVERSATION_ID', 'SEGMENT_ID'])
+    assert 'SELECT keyed.CONVERSATION_ID, keyed.SEGMENT_ID, answered.LLM_RESPONSE' in query
+
+
+def test_store_skips_errors_and_unparseable_json(recording_session):
+    store_llm_responses(recording_session, 'TEMP_BATCH_RESULTS_X', 'Doctors', "client's", 'v1', 'gpt-4o-mini', json_only=True)
+    query = recording_session.queries[0]
+    assert 'FROM TEMP_BATCH_RESULTS_X' in query
+    assert "LLM_RESPONSE NOT LIKE '%[openai_chat error]%'" in query
+    assert "LLM_RESPONSE NOT LIKE '%[gemini_chat error]%'" in query
+    assert 'TRY_PARSE_JSON' in query
+    assert "'client''s'" in query
+
+
+def test_invalidate_filters_by_department_and_version(recording_session):
+    invalidate_llm_response_cache(recording_session, department_name='Doctors', keep_prompt_version='v2')
+    assert recording_session.queries[0].endswith("WHERE DEPARTMENT = 'Doctors' AND PROMPT_VERSION <> 'v2'")
+
+
+def test_batch_cache_summary_counts_distinct_missed_keys():
+    rows = [{'CACHE_HIT': True, 'CACHE_KEY': 'a'}, {'CACHE_HIT': False, 'CACHE_KEY': 'b'},
+            {'CACHE_HIT': False, 'CACHE_KEY': 'b'}, {'CACHE_HIT': False, 'CACHE_KEY': 'c'}]
+    stats = summarize_batch_cache_results(rows, 'Doctors', 'client_suspecting_ai')
+    assert (stats['hits'], stats['misses'], stats['llm_calls'], stats['hit_rate']) == (1, 3, 2, 25.0)
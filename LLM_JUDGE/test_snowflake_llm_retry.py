@@ -0,0 +1,123 @@
+"""
+Tests for the LLM retry queue: backoff, error classification SQL and the retry rounds
+"""
+
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+
+import snowflake_llm_retry as retry
+from snowflake_llm_retry import (
+    build_error_class_sql,
+    compute_retry_delay,
+    get_llm_max_attempts,
+    get_retry_base_seconds,
+    run_llm_retries
+)
+
+ROW_FILTER = "DEPARTMENT = 'Doctors'"
+
+
+class ScriptedResult:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def collect(self):
+        return self.rows
+
+
+class ScriptedSession:
+    """
+    Answers the classification count queries with the scripted rows, in order; other queries return no rows.
+    """
+    def __init__(self, counts, fail_retry_round=False):
+        self.counts = list(counts)
+        self.fail_retry_round = fail_retry_round
+        self.queries = []
+
+    def sql(self, query):
+        self.queries.append(query)
+        if 'GROUP BY PROCESSING_STATUS, LLM_ERROR_CLASS' in query:
+            return ScriptedResult(self.counts.pop(0))
+        if self.fail_retry_round and 'LLM_RESPONSE =' in query:
+            raise RuntimeError('warehouse suspended')
+        return ScriptedResult([])
+
+    def retry_rounds(self):
+        return [query for query in self.queries if 'LLM_RESPONSE =' in query]
+
+
+def counts(retry_rows=0, failed_rows=0, error_class=retry.ERROR_CLASS_UNPARSEABLE_JSON):
+    rows = []
+    if retry_rows:
+        rows.append({'PROCESSING_STATUS': retry.RETRY_STATUS, 'LLM_ERROR_CLASS': error_class, 'ROW_COUNT': retry_rows})
+    if failed_rows:
+        rows.append({'PROCESSING_STATUS': 'COMPLETED', 'LLM_ERROR_CLASS': error_class, 'ROW_COUNT': failed_rows})
+    return rows
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(retry.time, 'sleep', delays.append)
+    return delays
+
+
+@pytest.mark.parametrize('retry_round, full_delay', [(1, 10.0), (2, 20.0), (3, 40.0), (5, 60.0), (10, 60.0)])
+def test_retry_delay_doubles_with_equal_jitter_and_cap(retry_round, full_delay, monkeypatch):
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: low)
+    assert compute_retry_delay(retry_round, base_seconds=10.0, max_seconds=60.0) == full_delay / 2
+    monkeypatch.setattr(retry.random, 'uniform', lambda low, high: high)
+    assert compute_retry_delay(retry_round, base_seconds=10.0, max_seconds=60.0) == full_delay
+
+
+def test_retry_settings_from_environment(monkeypatch):
+    monkeypatch.setenv('LLM_JUDGE_LLM_MAX_ATTEMPTS', '0')
+    monkeypatch.setenv('LLM_JUDGE_LLM_RETRY_BASE_SECONDS', '-5')
+    assert get_llm_max_attempts() == 1
+    assert get_retry_base_seconds() == 0.0
+
+
+def test_error_class_sql_checks_json_only_for_json_prompts():
+    json_sql = build_error_class_sql('json')
+    assert json_sql.index("'empty_response'") < json_sql.index("'llm_error'") < json_sql.index("'unparseable_json'")
+    assert "LLM_RESPONSE LIKE '%[openai_chat error]%'" in json_sql
+    assert 'TRY_PARSE_JSON' in json_sql
+    assert 'unparseable_json' not in build_error_class_sql('text')
+
+
+def test_failed_rows_are_retried_until_they_succeed(sleeps):
+    session = ScriptedSession([counts(retry_rows=2), counts()])
+    stats = run_llm_retries(session, 'OUT_TABLE', ROW_FILTER, 'openai_chat_system', '$$prompt$$', json_repair=True, max_attempts=3)
+
+    assert stats == {'rounds': 1, 'retried_rows': 2, 'first_failures': {'unparseable_json': 2}, 'failed': 0}
+    assert len(sleeps) == 1
+    assert session.queries[0] == 'ALTER TABLE OUT_TABLE ADD COLUMN IF NOT EXISTS LLM_ATTEMPTS NUMBER'
+    retry_update = session.retry_rounds()[0]
+    assert "WHEN LLM_ERROR_CLASS = 'unparseable_json'" in retry_update
+    assert f"WHERE PROCESSING_STATUS = 'RETRY'\n    AND {ROW_FILTER}" in retry_update
+
+
+def test_retries_stop_after_max_attempts(sleeps):
+    session = ScriptedSession([counts(retry_rows=1), counts(retry_rows=1), counts(failed_rows=1)])
+    stats = run_llm_retries(session, 'OUT_TABLE', ROW_FILTER, 'openai_chat_system', '$$prompt$$', max_attempts=3)
+
+    assert (stats['rounds'], stats['retried_rows'], stats['failed']) == (2, 2, 1)
+    assert len(session.retry_rounds()) == 2
+    assert 'CASE\n            WHEN LLM_ERROR_CLASS' not in session.retry_rounds()[0]
+
+
+def test_failed_round_releases_retry_rows(sleeps):
+    session = ScriptedSession([counts(retry_rows=3), counts(failed_rows=3)], fail_retry_round=True)
+    stats = run_llm_retries(session, 'OUT_TABLE', ROW_FILTER, 'openai_chat_system', '$$prompt$$', max_attempts=3)
+
+    assert (stats['rounds'], stats['failed']) == (0, 3)
+    assert any(query.strip().startswith('UPDATE OUT_TABLE\n    SET PROCESSING_STATUS = \'COMPLETED\'') for query in session.queries)
+
+
+def test_single_attempt_disables_retries(sleeps):
+    session = ScriptedSession([counts(failed_rows=4)])
+    stats = run_llm_retries(session, 'OUT_TABLE', ROW_FILTER, 'openai_chat_system', '$$prompt$$', max_attempts=1)
+
+    assert (stats['rounds'], stats['failed']) == (0, 4)
+    assert sleeps == [] and session.retry_rounds() == []
@@ -0,0 +1,73 @@
+"""
+Tests for the vectorized segmentation of the segment converter
+"""
+
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_conversation_model import build_conversation_model
+from snowflake_llm_segment_converter import segment_conversations
+
+
+def build_model(messages):
+    rows = [
+        {
+            'CONVERSATION_ID': conversation_id,
+            'MESSAGE_SENT_TIME': pd.Timestamp('2025-08-04 10:00') + pd.Timedelta(minutes=minute),
+            'SENT_BY': sender,
+            'TEXT': text,
+            'AGENT_NAME': agent_name,
+            'TARGET_SKILL_PER_MESSAGE': skill,
+            'MESSAGE_TYPE': 'Normal Message'
+        }
+        for minute, (conversation_id, sender, text, agent_name, skill) in enumerate(messages)
+    ]
+    return build_conversation_model(pd.DataFrame(rows), 'Doctors')
+
+
+def get_segments(result):
+    return [
+        (int(conversation), int(index), result['agent'][k], result['last_skill'][k],
+         result['lines'][result['start'][k]:result['stop'][k]])
+        for k, (conversation, index) in enumerate(zip(result['conversation'], result['segment_index']))
+    ]
+
+
+def test_segments_split_on_actor_changes_within_each_conversation():
+    model = build_model([
+        ('c1', 'Consumer', 'hi', None, None),
+        ('c1', 'Bot', 'hello', None, 'GPT_Doctors'),
+        ('c1', 'Consumer', 'help', None, None),
+        ('c1', 'Bot', 'one moment', None, 'GPT_Doctors_2'),
+        ('c1', 'Agent', 'I am here', 'Sara', 'Doctors_Agents'),
+        ('c1', 'Consumer', 'thanks', None, None),
+        ('c2', 'Agent', 'welcome', 'Omar', 'Doctors_Agents'),
+        ('c2', 'Agent', 'anything else?', 'Omar', 'Doctors_Agents'),
+    ])
+
+    assert get_segments(segment_conversations(model)) == [
+        (0, 0, 'BOT', 'GPT_Doctors_2', ['Consumer: hi', 'Bot: hello', 'Consumer: help', 'Bot: one moment']),
+        (0, 1, 'Sara', 'Doctors_Agents', ['Agent: I am here', 'Consumer: thanks']),
+        (1, 0, 'Omar', 'Doctors_Agents', ['Agent: welcome', 'Agent: anything else?']),
+    ]
+
+
+def test_segment_without_agent_or_bot_message_has_no_agent():
+    result = segment_conversations(build_model([
+        ('c1', 'Consumer', 'hi', None, None),
+        ('c1', 'Consumer', 'anyone?', None, None),
+    ]))
+
+    assert get_segments(result) == [(0, 0, None, None, ['Consumer: hi', 'Consumer: anyone?'])]
+
+
+def test_gpt_doctor_skill_marks_actor_lines_until_a_long_skill():
+    result = segment_conversations(build_model([
+        ('c1', 'Bot', 'triage', None, 'GPT_DOCTOR_TRIAGE'),
+        ('c1', 'Consumer', 'ok', None, None),
+        ('c1', 'Agent', 'taking over', 'Sara', 'A_VERY_LONG_AGENT_SKILL_NAME'),
+    ]))
+
+    assert result['lines'] == ['[IDENTIFIER] Bot: triage', 'Consumer: ok', 'Agent: taking over']
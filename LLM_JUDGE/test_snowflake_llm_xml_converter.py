@@ -0,0 +1,96 @@
+"""
+Parity tests for the XML converter: the vectorized renderer must produce the same XML as the
+per-message iterrows conversion it replaced (expected output captured from that version)
+"""
+
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+
+from snowflake_llm_xml_converter import convert_conversations_to_xml_dataframe
+
+START_TIME = pd.Timestamp('2025-08-04 10:00:00')
+
+
+def message(conversation_id, minute, sender, text, message_type='Normal Message', skill='GPT_Doctors', agent_name=None):
+    return {
+        'CONVERSATION_ID': conversation_id,
+        'MESSAGE_SENT_TIME': START_TIME + pd.Timedelta(minutes=minute),
+        'SENT_BY': sender,
+        'TEXT': text,
+        'MESSAGE_TYPE': message_type,
+        'TARGET_SKILL_PER_MESSAGE': skill,
+        'SKILL': 'GPT_Doctors',
+        'CUSTOMER_NAME': 'Customer',
+        'AGENT_NAME': agent_name,
+        'SHADOWED_BY': None
+    }
+
+
+CHAT = [
+    message('c1', 0, 'Consumer', 'Hi <doctor> & team'),
+    message('c1', 1, 'Bot', 'Hello!'),
+    message('c1', 1, 'Bot', 'Hello!'),
+    message('c1', 2, 'Consumer', None),
+    message('c1', 3, 'Bot', 'secret', 'Private Message'),
+    message('c1', 4, 'Bot', '{"tool_calls": [{"id": "call_1", "name": "lookup_patient"}]}', 'Tool'),
+    message('c1', 5, 'Bot', '{"tool_call_id": "call_1", "content": "ok"}', 'Tool Response'),
+    message('c1', 5, 'Bot', '{"name": "book_visit", "arguments": {"day": "Mon"}}', 'Tool'),
+    message('c1', 6, 'System', 'Transferred to agent'),
+    message('c1', 7, 'Bot', 'Other bot here', skill='SOME_OTHER_SKILL'),
+    message('c1', 8, 'Agent', 'Agent reply', skill='Doctors_Agents', agent_name='Sara'),
+    message('c1', 9, 'Consumer', 'thanks', 'Transfer'),
+    message('c2', 0, 'Consumer', 'only the consumer wrote'),
+    message('c3', 0, 'Consumer', 'no target bot skill', skill='OTHER'),
+    message('c3', 1, 'Bot', 'reply', skill='OTHER'),
+]
+
+
+def tool_xml(tool_name, tool_time):
+    # The legacy format keeps a space after the name element
+    return f"<tool>\n  <n>{tool_name}</n> \n  <t>{tool_time}</t>\n</tool>"
+
+
+EXPECTED_C1 = """<conversation>
+<chatID>c1</chatID>
+<content>
+
+Consumer: Hi &lt;doctor&gt; &amp; team
+
+Bot: Hello!
+
+Consumer: [Doc/Image]
+
+{tool_1}
+
+{tool_2}
+
+[SYSTEM: Transferred to agent]
+
+Agent_1: Other bot here
+
+Agent: Agent reply
+
+</content>
+</conversation>"""
+
+
+@pytest.mark.parametrize('tz, tool_times', [
+    (None, ('2025-08-04 10:04:00', '2025-08-04 10:05:00')),
+    ('Asia/Dubai', ('2025-08-04 10:04:00.123456+04:00', '2025-08-04 10:05:00.123456+04:00')),
+])
+def test_xml_output_matches_legacy(tz, tool_times):
+    df = pd.DataFrame(CHAT)
+    if tz:
+        df['MESSAGE_SENT_TIME'] = (df['MESSAGE_SENT_TIME'] + pd.Timedelta(microseconds=123456)).dt.tz_localize(tz)
+
+    xml_df = convert_conversations_to_xml_dataframe(df, 'Doctors')
+
+    assert list(xml_df['conversation_id']) == ['c1']
+    assert xml_df.iloc[0]['content_xml_view'] == EXPECTED_C1.format(
+        tool_1=tool_xml('lookup_patient', tool_times[0]), tool_2=tool_xml('book_visit', tool_times[1])
+    )
+    assert xml_df.iloc[0][['department', 'last_skill', 'agent_names', 'customer_name']].tolist() == [
+        'Doctors', 'GPT_Doctors', 'Sara', 'Customer'
+    ]
@@ -0,0 +1,56 @@
+"""
+Tests for the shared SQL predicate builders
+"""
+
+from datetime import date, datetime
+
+import pytest
+
+from snowflake_query_builder import (
+    build_date_range_predicate,
+    build_department_predicate,
+    build_hash_shard_predicate,
+    build_json_parse_expression
+)
+
+
+@pytest.mark.parametrize('target_date', ['2025-08-04', date(2025, 8, 4), datetime(2025, 8, 4, 15, 30)])
+def test_date_range_predicate_is_half_open_on_bare_column(target_date):
+    assert build_date_range_predicate('DATE', target_date) == "DATE >= DATE('2025-08-04') AND DATE < DATE('2025-08-05')"
+
+
+def test_date_range_predicate_spans_days_and_month_end():
+    assert build_date_range_predicate('d.UPDATED_AT', '2025-07-30', days=3) == (
+        "d.UPDATED_AT >= DATE('2025-07-30') AND d.UPDATED_AT < DATE('2025-08-02')"
+    )
+
+
+def test_department_predicate_equality():
+    assert build_department_predicate('Doctors') == "DEPARTMENT = 'Doctors'"
+    assert build_department_predicate("O'Brien", 'department') == "department = 'O''Brien'"
+
+
+def test_department_predicate_at_filipina_is_case_insensitive_prefix():
+    assert build_department_predicate('AT_Filipina') == "DEPARTMENT ILIKE 'AT_Filipina%'"
+    assert build_department_predicate('AT_Filipina', 'department') == "department ILIKE 'AT_Filipina%'"
+
+
+def test_hash_shard_predicate_puts_nulls_in_shard_zero():
+    assert build_hash_shard_predicate('CONVERSATION_ID', 0, 4) == (
+        "(CONVERSATION_ID IS NULL OR MOD(ABS(HASH(CONVERSATION_ID)), 4) = 0)"
+    )
+    assert build_hash_shard_predicate('CONVERSATION_ID', 3, 4) == (
+        "(CONVERSATION_ID IS NOT NULL AND MOD(ABS(HASH(CONVERSATION_ID)), 4) = 3)"
+    )
+
+
+@pytest.mark.parametrize('shard_index, shard_count', [(4, 4), (-1, 4), (0, 0)])
+def test_hash_shard_predicate_rejects_invalid_shards(shard_index, shard_count):
+    with pytest.raises(ValueError):
+        build_hash_shard_predicate('CONVERSATION_ID', shard_index, shard_count)
+
+
+def test_json_parse_expression_strips_markdown_fences():
+    assert build_json_parse_expression('LLM_RESPONSE') == (
+        "TRY_PARSE_JSON(REGEXP_REPLACE(TRIM(LLM_RESPONSE), '^```(json)?|```$', ''))"
+    )
@@ -0,0 +1,136 @@
+"""
+SQL text of every query that filters by date or department through snowflake_query_builder:
+each call site must emit the half-open range on the bare column (no DATE(col) / day() wrappers)
+"""
+
+import re
+
+import pytest
+import pandas as pd
+
+pytest.importorskip("snowflake.snowpark")
+pytest.importorskip("sklearn")
+
+import snowflake_llm_metrics_calc as metrics_calc
+import snowflake_llm_processor as processor
+import LLM_JUDGE.clean_chats_phase2_core_analytics as phase1
+
+TARGET_DATE = '2025-08-04'
+
+
+def half_open(column, start_date, end_date):
+    return f"{column} >= DATE('{start_date}') AND {column} < DATE('{end_date}')"
+
+
+def assert_sargable(queries, column, start_date='2025-08-04', end_date='2025-08-05'):
+    """
+    Some recorded query filters on the half-open range, and none wraps the column in a function.
+    """
+    assert any(half_open(column, start_date, end_date) in query for query in queries), queries
+    wrapped = re.compile(rf"\b(DATE|DAY|MONTH|YEAR)\(\s*{column}\s*\)", re.IGNORECASE)
+    assert not any(wrapped.search(query) for query in queries)
+
+
+def run_recorded(function, session, *args, **kwargs):
+    """
+    Call a query function against the recording session; failures on its empty results are expected.
+    """
+    try:
+        function(session, *args, **kwargs)
+    except Exception:
+        pass
+    return session.queries
+
+
+METRIC_SITES = [
+    ('analyze_categorizing_data_snowflake', 'DATE'),
+    ('analyze_doctors_categorizing_data_snowflake', 'DATE'),
+    ('calculate_call_request_metrics', 'DATE'),
+    ('calculate_cc_sales_policy_violation_metrics', 'DATE'),
+    ('calculate_clarity_score_percentage', 'DATE'),
+    ('calculate_client_suspecting_ai_percentage', 'DATE'),
+    ('calculate_false_promises_percentage', 'DATE'),
+    ('calculate_ftr_percentage', 'DATE'),
+    ('calculate_legal_metrics', 'DATE'),
+    ('calculate_misprescription_percentage', 'DATE'),
+    ('calculate_missing_policy_metrics', 'DATE'),
+    ('calculate_policy_escalation_percentage', 'DATE'),
+    ('calculate_policy_violation_metrics', 'DATE'),
+    ('calculate_threatening_percentage', 'DATE'),
+    ('calculate_transer_escalation_percentage', 'DATE'),
+    ('calculate_transer_known_flow_percentage', 'DATE'),
+    ('calculate_unclear_policy_metrics', 'DATE'),
+    ('calculate_unnecessary_clinic_percentage', 'DATE'),
+    ('calculate_weighted_nps_per_department', 'DATE'),
+    ('create_clinic_reasons_summary_report', 'DATE'),
+    ('create_loss_interest_summary_report', 'DATE'),
+    ('create_shadowing_automation_summary_report', 'CREATION_DATE'),
+    ('create_system_prompt_token_summary_report', 'DATE'),
+    ('generate_at_filipina_tool_summary_report', 'DATE'),
+    ('generate_mv_resolvers_missing_tool_summary_report', 'DATE'),
+    ('generate_mv_resolvers_wrong_tool_summary_report', 'DATE'),
+    ('generate_tool_summary_report', 'DATE'),
+]
+
+
+@pytest.mark.parametrize('function_name, column', METRIC_SITES)
+def test_metrics_query_uses_half_open_range(function_name, column, recording_session, monkeypatch):
+    monkeypatch.setattr(metrics_calc, 'get_department_agent_names_snowflake', lambda *args: ['AGENT'])
+    queries = run_recorded(getattr(metrics_calc, function_name), recording_session, 'Doctors', TARGET_DATE)
+    assert_sargable(queries, column)
+
+
+PROCESSOR_SITES = {
+    'summary_row_exists': ('T', 'Doctors', TARGET_DATE),
+    'insert_raw_data_partial': ('T', 'Doctors', TARGET_DATE, {'METRIC': 1}),
+    'insert_raw_data_with_cleanup': ('T', 'Doctors', TARGET_DATE, pd.DataFrame({'METRIC': [1]}), ['METRIC']),
+    'prune_llm_raw_data': ('T', 'Doctors', TARGET_DATE, ['p'], '2025-08-04 00:00:00'),
+    'count_llm_results': ('T', 'Doctors', TARGET_DATE),
+    'count_llm_results_with_extra_filter': ('T', 'Doctors', TARGET_DATE, ''),
+    'filter_conversations_by_category': (pd.DataFrame({'CONVERSATION_ID': ['c1']}), 'Category', 'Doctors', TARGET_DATE),
+    'prepare_batch_llm_run': ({'output_table': 'T', 'model_type': 'openai', 'system_prompt': 'Prompt'}, 'Doctors', TARGET_DATE),
+}
+
+
+@pytest.mark.parametrize('function_name', sorted(PROCESSOR_SITES))
+def test_processor_query_uses_half_open_range(function_name, recording_session):
+    queries = run_recorded(getattr(processor, function_name), recording_session, *PROCESSOR_SITES[function_name])
+    assert_sargable(queries, 'DATE')
+
+
+def test_insert_raw_data_cleanup_deletes_by_range(recording_session):
+    queries = run_recorded(processor.insert_raw_data_with_cleanup, recording_session,
+                           'T', 'Doctors', TARGET_DATE, pd.DataFrame({'METRIC': [1]}), ['METRIC'])
+    delete_queries = [query for query in queries if 'DELETE FROM T' in query]
+    assert delete_queries
+    assert half_open('DATE', '2025-08-04', '2025-08-05') + " AND DEPARTMENT = 'Doctors'" in delete_queries[0]
+
+
+# Phase 1 reads the conversations updated on the day after target_date
+PHASE1_LOADERS = {
+    'process_department_phase1': ('Doctors', TARGET_DATE),
+    'process_shared_table_phase1': (['Doctors'], TARGET_DATE),
+}
+
+
+@pytest.mark.parametrize('function_name', sorted(PHASE1_LOADERS))
+def test_phase1_loader_uses_half_open_range(function_name, recording_session, monkeypatch):
+    monkeypatch.setattr(phase1, 'validate_phase1_columns', lambda *args: None)
+    queries = run_recorded(getattr(phase1, function_name), recording_session, *PHASE1_LOADERS[function_name], use_cache=False)
+    assert_sargable(queries, 'UPDATED_AT', '2025-08-05', '2025-08-06')
+
+
+def test_phase1_multi_day_loader_uses_one_range_per_day(recording_session, monkeypatch):
+    monkeypatch.setattr(phase1, 'validate_phase1_columns', lambda *args: None)
+    queries = run_recorded(phase1.process_department_phase1_multi_day, recording_session, 'Doctors', TARGET_DATE, use_cache=False)
+    for start_date, end_date in [('2025-08-03', '2025-08-04'), ('2025-08-04', '2025-08-05'), ('2025-08-05', '2025-08-06')]:
+        assert_sargable(queries, 'UPDATED_AT', start_date, end_date)
+
+
+def test_phase1_shard_estimate_uses_half_open_range(recording_session):
+    queries = run_recorded(phase1.estimate_phase1_shard_count, recording_session, 'Doctors', TARGET_DATE, 100)
+    assert_sargable(queries, 'UPDATED_AT', '2025-08-05', '2025-08-06')
+
+
+def test_phase1_pushdown_query_uses_half_open_range():
+    assert_sargable([phase1.build_phase1_pushdown_query('Doctors', TARGET_DATE)], 'UPDATED_AT', '2025-08-05', '2025-08-06')
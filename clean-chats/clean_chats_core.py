@@ -16,6 +16,7 @@ if llm_judge_path not in sys.path:
 
 # Import LLM_JUDGE filtering logic
 from clean_chats_phase2_core_analytics import process_department_phase1
+from snowflake_query_builder import build_date_range_predicate, build_department_predicate
 from clean_chats_config import (
     get_clean_chats_departments_config,
     get_clean_chats_flagging_config,
@@ -65,12 +66,8 @@ def process_department_phase1_from_delay_table(session, department_name, target_
     try:
         print(f"    🔍 Loading conversations from delay_analysis_raw_data for {department_name} on {target_date}")
         
-        # Parse target_date to extract day and month
-        from datetime import datetime
-        date_obj = datetime.strptime(target_date, '%Y-%m-%d')
-        day = date_obj.day
-        month = date_obj.month
-        year = date_obj.year
+        # Half-open range on the bare date column (prunable, unlike day()/month()/year())
+        date_filter = build_date_range_predicate('date', target_date)
 
         
         
@@ -78,18 +75,14 @@ def process_department_phase1_from_delay_table(session, department_name, target_
         query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
         """
 
@@ -97,43 +90,33 @@ def process_department_phase1_from_delay_table(session, department_name, target_
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.wrong_tool_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
         """
         if department_name=='MV_Delighters':
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             AND department = 'Delighters'        
             
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.FALSE_PROMISES_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             AND department = 'MV_Delighters'
             """
             
@@ -141,50 +124,38 @@ def process_department_phase1_from_delay_table(session, department_name, target_
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.CLIENT_SUSPECTING_AI_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.MISSING_POLICY_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.WRONG_TOOL_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.MISSING_TOOL_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
             """
 
@@ -194,51 +165,39 @@ def process_department_phase1_from_delay_table(session, department_name, target_
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.TOOL_SUMMARY
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
             AND IS_PARSED = 'TRUE'
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.MISSING_POLICY_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.WRONG_ANSWER_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
         """
 
@@ -246,54 +205,42 @@ def process_department_phase1_from_delay_table(session, department_name, target_
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
-            AND department ILIKE 'AT_Filipina%'
+            WHERE {date_filter}
+            AND {build_department_predicate('AT_Filipina', 'department')}
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.TOOL_SUMMARY
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
-            AND department ILIKE 'AT_Filipina%'
+            WHERE {date_filter}
+            AND {build_department_predicate('AT_Filipina', 'department')}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
-            AND department ILIKE 'AT_Filipina%'
+            WHERE {date_filter}
+            AND {build_department_predicate('AT_Filipina', 'department')}
         """
 
         if department_name == 'AT_Filipina_In_PHL' or department_name == 'AT_Filipina_Outside_UAE' or department_name == 'AT_Filipina_Inside_UAE':
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
            
@@ -302,9 +249,7 @@ def process_department_phase1_from_delay_table(session, department_name, target_
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
         """
 
@@ -312,42 +257,34 @@ def process_department_phase1_from_delay_table(session, department_name, target_
             query = f"""
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.delay_analysis_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.sa_raw_data
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
 
 
             UNION
             SELECT DISTINCT conversation_id 
             FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA
-            WHERE day(date) = {day:02d}
-            AND month(date) = {month:02d}
-            AND year(date) = {year}
+            WHERE {date_filter}
             {get_department_filter_lowercase(department_name)}
             AND IS_PARSED = 'TRUE'
         """
 
         
-        print(f"    📊 Executing query: day={day:02d}, month={month:02d}, year={year}, department={department_name}")
+        print(f"    📊 Executing query: {date_filter}, department={department_name}")
         
         # Execute query
         result = session.sql(query).collect()
@@ -379,10 +316,7 @@ def get_department_filter(department_name):
     Returns:
         str: SQL WHERE clause for department filtering
     """
-    if department_name == 'AT_Filipina':
-        return "AND DEPARTMENT ILIKE 'AT_Filipina%'"
-    else:
-        return f"AND DEPARTMENT = '{department_name}'"
+    return f"AND {build_department_predicate(department_name, 'DEPARTMENT')}"
 
 def get_department_filter_lowercase(department_name):
     """
@@ -394,10 +328,7 @@ def get_department_filter_lowercase(department_name):
     Returns:
         str: SQL WHERE clause for department filtering
     """
-    if department_name == 'AT_Filipina':
-        return "AND department ILIKE 'AT_Filipina%'"
-    else:
-        return f"AND department = '{department_name}'"
+    return f"AND {build_department_predicate(department_name, 'department')}"
 
 def check_all_conversations_flagged_status_batch(session, conversation_ids, department_name, target_date):
     """
@@ -448,7 +379,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     LLM_RESPONSE,
                     PROCESSING_STATUS
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND PROMPT_TYPE = '{prompt_type}'
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
@@ -507,7 +438,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     LLM_RESPONSE,
                     PROCESSING_STATUS
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND PROMPT_TYPE = '{prompt_type}'
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
@@ -565,7 +496,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     LLM_RESPONSE,
                     PROCESSING_STATUS
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND PROMPT_TYPE = '{prompt_type}'
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
@@ -623,7 +554,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     LLM_RESPONSE,
                     PROCESSING_STATUS
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND PROMPT_TYPE = '{prompt_type}'
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
@@ -679,7 +610,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 SELECT 
                     CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 """
@@ -723,7 +654,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     LLM_RESPONSE,
                     PROCESSING_STATUS
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND PROMPT_TYPE = '{prompt_type}'
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
@@ -836,7 +767,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE,
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 """
@@ -930,7 +861,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 """
@@ -1023,7 +954,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -1050,7 +981,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 """
@@ -1143,7 +1074,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.POLICY_VIOLATION_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -1170,7 +1101,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 """
@@ -1263,7 +1194,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     LLM_RESPONSE,
                     PROCESSING_STATUS
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND PROMPT_TYPE = '{prompt_type}'
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
@@ -1358,7 +1289,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -1484,7 +1415,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -1611,7 +1542,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -1737,7 +1668,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -1856,7 +1787,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -1975,7 +1906,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -2094,7 +2025,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -2213,7 +2144,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -2313,7 +2244,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -2498,7 +2429,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 """
@@ -2608,7 +2539,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'true'
@@ -2721,7 +2652,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -2834,7 +2765,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                     CONVERSATION_ID,
                     LLM_RESPONSE
                 FROM LLM_EVAL.PUBLIC.{table_name}
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'TRUE'
@@ -2954,7 +2885,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.WRONG_TOOL_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -3034,7 +2965,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.MISSING_TOOL_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -3114,7 +3045,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -3194,7 +3125,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -3274,7 +3205,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
@@ -3354,7 +3285,7 @@ def check_all_conversations_flagged_status_batch(session, conversation_ids, depa
                 is_parsed_query = f"""
                 SELECT DISTINCT CONVERSATION_ID
                 FROM LLM_EVAL.PUBLIC.TOOL_RAW_DATA
-                WHERE DATE(DATE) = DATE('{target_date}')
+                WHERE {build_date_range_predicate('DATE', target_date)}
                 {get_department_filter(department_name)}
                 AND CONVERSATION_ID IN ('{conv_ids_str}')
                 AND IS_PARSED = 'FALSE'
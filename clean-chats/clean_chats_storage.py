@@ -21,6 +21,7 @@ from clean_chats_config import (
     get_llm_response_based_criteria,
     get_table_existence_based_criteria
 )
+from snowflake_query_builder import build_date_range_predicate
 
 def extract_flagging_source_counts(flagging_breakdown_dict):
     """
@@ -144,7 +145,7 @@ def save_clean_chats_summary(session, department_results, target_date):
         # Clear existing data for this date
         cleanup_sql = f"""
         DELETE FROM LLM_EVAL.PUBLIC.CLEAN_CHATS_SUMMARY 
-        WHERE DATE = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         """
         session.sql(cleanup_sql).collect()
         print(f"    🧹 Cleared existing summary data for {target_date}")
@@ -358,7 +359,7 @@ def save_clean_chats_raw_data(session, department_results, target_date):
         # Clear existing data for this date
         cleanup_sql = f"""
         DELETE FROM LLM_EVAL.PUBLIC.CLEAN_CHATS_RAW_DATA 
-        WHERE DATE = DATE('{target_date}')
+        WHERE {build_date_range_predicate('DATE', target_date)}
         """
         session.sql(cleanup_sql).collect()
         print(f"    🧹 Cleared existing raw data for {target_date}")
@@ -516,7 +517,7 @@ def get_clean_chats_summary_report(session, target_date=None, department_filter=
         where_clauses = []
         
         if target_date:
-            where_clauses.append(f"DATE = DATE('{target_date}')")
+            where_clauses.append(build_date_range_predicate('DATE', target_date))
         
         if department_filter:
             where_clauses.append(f"DEPARTMENT = '{department_filter}'")
@@ -620,7 +621,7 @@ def get_clean_chats_detail_report(session, target_date=None, department_filter=N
         where_clauses = []
         
         if target_date:
-            where_clauses.append(f"DATE = DATE('{target_date}')")
+            where_clauses.append(build_date_range_predicate('DATE', target_date))
         
         if department_filter:
             where_clauses.append(f"DEPARTMENT = '{department_filter}'")
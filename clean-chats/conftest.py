@@ -0,0 +1,45 @@
+"""
+pytest configuration: clean-chats modules import the LLM_JUDGE modules flat, so the clean-chats
+directory, LLM_JUDGE and the repository root go on sys.path
+"""
+
+import os
+import sys
+
+import pytest
+
+CLEAN_CHATS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPOSITORY_DIR = os.path.dirname(CLEAN_CHATS_DIR)
+
+for path in (CLEAN_CHATS_DIR, os.path.join(REPOSITORY_DIR, 'LLM_JUDGE'), REPOSITORY_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+class RecordingResult:
+    """
+    Empty query result: collect() gives no rows and to_pandas() an empty frame.
+    """
+    def collect(self):
+        return []
+
+    def to_pandas(self):
+        import pandas as pd
+        return pd.DataFrame()
+
+
+class RecordingSession:
+    """
+    Session stand-in that records the SQL text of every session.sql() call.
+    """
+    def __init__(self):
+        self.queries = []
+
+    def sql(self, query):
+        self.queries.append(query)
+        return RecordingResult()
+
+
+@pytest.fixture
+def recording_session():
+    return RecordingSession()
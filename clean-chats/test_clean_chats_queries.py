@@ -0,0 +1,73 @@
+"""
+SQL text of the clean chats queries that filter by date or department through snowflake_query_builder
+"""
+
+import re
+
+import pytest
+
+pytest.importorskip("snowflake.snowpark")
+pytest.importorskip("sklearn")
+
+import clean_chats_core
+import clean_chats_storage
+
+TARGET_DATE = '2025-08-04'
+DAY_RANGE = "{column} >= DATE('2025-08-04') AND {column} < DATE('2025-08-05')"
+
+
+def assert_sargable(queries, column):
+    """
+    Some recorded query filters on the half-open range, and none wraps the column in a function.
+    """
+    assert any(DAY_RANGE.format(column=column) in query for query in queries), queries
+    wrapped = re.compile(rf"\b(DATE|DAY|MONTH|YEAR)\(\s*{column}\s*\)", re.IGNORECASE)
+    assert not any(wrapped.search(query) for query in queries)
+
+
+def run_recorded(function, session, *args):
+    """
+    Call a query function against the recording session; failures on its empty results are expected.
+    """
+    try:
+        function(session, *args)
+    except Exception:
+        pass
+    return session.queries
+
+
+def test_department_filters():
+    assert clean_chats_core.get_department_filter('Doctors') == "AND DEPARTMENT = 'Doctors'"
+    assert clean_chats_core.get_department_filter('AT_Filipina') == "AND DEPARTMENT ILIKE 'AT_Filipina%'"
+    assert clean_chats_core.get_department_filter_lowercase('AT_Filipina') == "AND department ILIKE 'AT_Filipina%'"
+
+
+def test_delay_table_query_uses_half_open_range(recording_session):
+    queries = run_recorded(clean_chats_core.process_department_phase1_from_delay_table, recording_session,
+                           'Doctors', TARGET_DATE)
+    assert_sargable(queries, 'date')
+    assert any("department = 'Doctors'" in query for query in queries)
+
+
+@pytest.mark.parametrize('department_name, department_sql', [
+    ('Doctors', "DEPARTMENT = 'Doctors'"),
+    ('AT_Filipina', "DEPARTMENT ILIKE 'AT_Filipina%'"),
+])
+def test_flagged_status_queries_use_half_open_range(department_name, department_sql, recording_session):
+    queries = run_recorded(clean_chats_core.check_all_conversations_flagged_status_batch, recording_session,
+                           ['c1'], department_name, TARGET_DATE)
+    assert queries
+    for query in queries:
+        assert_sargable([query], 'DATE')
+        assert department_sql in query
+
+
+@pytest.mark.parametrize('function_name, args', [
+    ('save_clean_chats_summary', ({'Doctors': {}}, TARGET_DATE)),
+    ('save_clean_chats_raw_data', ({'Doctors': {}}, TARGET_DATE)),
+    ('get_clean_chats_summary_report', (TARGET_DATE,)),
+    ('get_clean_chats_detail_report', (TARGET_DATE,)),
+])
+def test_storage_query_uses_half_open_range(function_name, args, recording_session):
+    queries = run_recorded(getattr(clean_chats_storage, function_name), recording_session, *args)
+    assert_sargable(queries, 'DATE')